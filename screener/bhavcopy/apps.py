@@ -4,3 +4,27 @@ from django.apps import AppConfig
 class BhavcopyConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'bhavcopy'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from bhavcopy.db_tuning import configure_connection
+        from bhavcopy.signals import bhavcopy_dates_written
+        from bhavcopy.columnar_store import sync_written_dates
+        from bhavcopy.trading_calendar import learn_sessions_from_data
+        from bhavcopy.indicators import update_written_dates
+        from bhavcopy.indices import refresh_relative_strength
+        from bhavcopy.corporate_actions import detect_written_dates
+        from bhavcopy.hot_cache import apply_written_dates
+        from bhavcopy.ingest_events import record_written_dates
+
+        connection_created.connect(configure_connection, dispatch_uid='bhavcopy_sqlite_pragmas')
+
+        bhavcopy_dates_written.connect(sync_written_dates, dispatch_uid='bhavcopy_columnar_store')
+        bhavcopy_dates_written.connect(learn_sessions_from_data, dispatch_uid='bhavcopy_trading_calendar')
+        bhavcopy_dates_written.connect(update_written_dates, dispatch_uid='bhavcopy_indicators')
+        bhavcopy_dates_written.connect(refresh_relative_strength, dispatch_uid='bhavcopy_relative_strength')
+        bhavcopy_dates_written.connect(detect_written_dates, dispatch_uid='bhavcopy_corporate_actions')
+        # Last, so cached cross-sections are dropped after the indicators are written
+        bhavcopy_dates_written.connect(apply_written_dates, dispatch_uid='bhavcopy_hot_cache')
+        # After everything derived from the new rows, so subscribers reacting to an event read fresh data
+        bhavcopy_dates_written.connect(record_written_dates, dispatch_uid='bhavcopy_ingest_events')
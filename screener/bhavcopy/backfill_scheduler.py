@@ -0,0 +1,240 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+import queue
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+DEFAULT_RATE = 0.5  # Requests per second shared by all workers
+DEFAULT_BURST = 1
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by all download workers.
+
+    Tokens refill continuously at `rate` per second up to `capacity`, so the
+    total request rate stays bounded no matter how many workers are waiting.
+    A rate of 0 or less disables limiting.
+    """
+
+    def __init__(self, rate, capacity=DEFAULT_BURST):
+        self.rate = float(rate)
+        self.capacity = float(max(capacity, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """
+        Block until a token is available.
+
+        Args:
+            timeout: maximum seconds to wait, None waits forever
+
+        Returns:
+            bool: True if a token was taken, False if the timeout ran out first
+        """
+        if self.rate <= 0:
+            return True
+
+        give_up_at = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+
+            if give_up_at is not None and now + wait > give_up_at:
+                return False
+            time.sleep(wait)
+
+
+class BackfillScheduler:
+    """
+    Download and store Bhavcopy files for many dates concurrently.
+
+    Downloads run on a bounded pool of worker threads that share one
+    TokenBucket, so network latency overlaps while the request rate stays
+    polite. Parsing and database writes run in a separate stage on the thread
+    that calls run(), fed through a bounded queue, so only one thread writes
+    to the database at a time.
+
+    Progress is reported as event dicts passed to `on_event`:
+        run_started    {"total"}
+        date_fetched   {"date", "status"}
+        date_completed {"date", "result", "completed", "total", "successful", "failed", "skipped"}
+        run_finished   {"total", "successful", "failed", "skipped", "elapsed"}
+    """
+
+    def __init__(self, downloader=None, workers=None, rate=None, deadline=None, on_event=None):
+        """
+        Args:
+            downloader: YearlyBhavcopyDownloaderView used for sessions, fetch
+                and store; a fresh one is created when omitted
+            workers: number of download threads (BHAVCOPY_BACKFILL_WORKERS)
+            rate: requests per second across all workers (BHAVCOPY_BACKFILL_RATE)
+            deadline: seconds the whole run may take; dates not started by
+                then are reported as skipped
+            on_event: callable receiving each progress event dict
+        """
+        if downloader is None:
+            from bhavcopy.yearly_bhavcopy_download_views import YearlyBhavcopyDownloaderView
+            downloader = YearlyBhavcopyDownloaderView()
+
+        self.downloader = downloader
+        self.workers = int(workers or getattr(settings, 'BHAVCOPY_BACKFILL_WORKERS', DEFAULT_WORKERS))
+        if rate is None:
+            rate = getattr(settings, 'BHAVCOPY_BACKFILL_RATE', DEFAULT_RATE)
+        self.rate_limiter = TokenBucket(rate)
+        self.deadline = deadline
+        self.on_event = on_event
+        self._stop = threading.Event()
+        self._abandoned = threading.Event()
+
+    def stop(self):
+        """
+        Ask the workers to stop picking up new dates.
+
+        Dates already downloading are still stored; the rest are reported as
+        skipped, so run() returns once the in-flight ones are done.
+        """
+        self._stop.set()
+
+    def _emit(self, event, **data):
+        data["event"] = event
+        if self.on_event:
+            try:
+                self.on_event(data)
+            except Exception as e:
+                logger.error(f"Error in backfill event handler: {str(e)}")
+        return data
+
+    def _remaining(self):
+        """Seconds left before the deadline, or None without a deadline."""
+        if self.deadline is None:
+            return None
+        return self._deadline_at - time.monotonic()
+
+    def _fetch(self, dt):
+        """Worker stage: wait for a rate token and download one date."""
+        date_str = dt.strftime('%d-%m-%Y')
+        try:
+            if self._stop.is_set():
+                return {"date": date_str, "status": "skipped", "reason": "Run stopped"}
+
+            # Archived dates never use a rate token or a session
+            archived = self.downloader._fetch_archived_csv(dt)
+            if archived is not None:
+                return archived
+
+            remaining = self._remaining()
+            if remaining is not None and remaining <= 0:
+                return {"date": date_str, "status": "skipped", "reason": "Deadline exceeded"}
+            if not self.rate_limiter.acquire(timeout=remaining):
+                return {"date": date_str, "status": "skipped", "reason": "Deadline exceeded"}
+
+            # The session is the shared NSE client, which refreshes cookies itself
+            session = self.downloader._establish_session()
+            if not session:
+                return {"date": date_str, "status": "failed", "error": "Could not establish session"}
+            return self.downloader._fetch_bhavcopy_csv(session, dt)
+
+        except Exception as e:
+            logger.error(f"Error fetching date {date_str}: {str(e)}")
+            return {"date": date_str, "status": "failed", "error": str(e)}
+
+    def _fetch_into(self, out, dt):
+        fetched = self._fetch(dt)
+        # Give up on the hand-off only if the writer stage has gone away;
+        # after stop() it still waits for one result per date
+        while not self._abandoned.is_set():
+            try:
+                out.put((dt, fetched), timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def run(self, dates):
+        """
+        Fetch and store every date, returning once all of them are accounted for.
+
+        Args:
+            dates: iterable of datetime objects to process
+
+        Returns:
+            dict with total_dates, successful_dates, failed_dates,
+            skipped_dates, elapsed and the per-date results
+        """
+        dates = list(dates)
+        started = time.monotonic()
+        if self.deadline is not None:
+            self._deadline_at = started + float(self.deadline)
+
+        summary = {
+            "total_dates": len(dates),
+            "successful_dates": 0,
+            "failed_dates": 0,
+            "skipped_dates": 0,
+            "results": [],
+        }
+        self._emit("run_started", total=len(dates))
+
+        # Bounded hand-off keeps at most a few downloaded files in memory
+        out = queue.Queue(maxsize=self.workers * 2)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bhavcopy-fetch') as pool:
+            for dt in dates:
+                pool.submit(self._fetch_into, out, dt)
+
+            try:
+                for _ in range(len(dates)):
+                    dt, fetched = out.get()
+                    self._emit("date_fetched", date=fetched["date"], status=fetched["status"])
+
+                    if fetched["status"] == "fetched":
+                        result = self.downloader._store_bhavcopy_csv(fetched["content"], dt)
+                    else:
+                        result = fetched
+
+                    if result["status"] == "success":
+                        summary["successful_dates"] += 1
+                    elif result["status"] == "failed":
+                        summary["failed_dates"] += 1
+                    else:  # skipped
+                        summary["skipped_dates"] += 1
+                    summary["results"].append(result)
+
+                    self._emit(
+                        "date_completed",
+                        date=result["date"],
+                        result=result,
+                        completed=len(summary["results"]),
+                        total=len(dates),
+                        successful=summary["successful_dates"],
+                        failed=summary["failed_dates"],
+                        skipped=summary["skipped_dates"],
+                    )
+            except BaseException:
+                # Release workers blocked on the queue before the pool shuts down
+                self.stop()
+                self._abandoned.set()
+                raise
+
+        summary["elapsed"] = time.monotonic() - started
+        self._emit(
+            "run_finished",
+            total=len(dates),
+            successful=summary["successful_dates"],
+            failed=summary["failed_dates"],
+            skipped=summary["skipped_dates"],
+            elapsed=summary["elapsed"],
+        )
+        return summary
@@ -0,0 +1,401 @@
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.db import connections
+import itertools
+import multiprocessing
+import os
+import numpy as np
+import pandas as pd
+import logging
+from bhavcopy.columnar_store import get_columnar_store
+from bhavcopy.indicators import forward_fill, rolling_mean, rolling_extreme
+from bhavcopy.models import CorporateAction, DailyBar, FIXED_POINT_FIELDS, FIXED_POINT_SCALE
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ['OPEN_PRICE', 'HIGH_PRICE', 'LOW_PRICE', 'CLOSE_PRICE', 'AVG_PRICE',
+          'TTL_TRD_QNTY', 'TURNOVER_LACS', 'DELIV_PER']
+PRICE_FIELDS = ['OPEN_PRICE', 'HIGH_PRICE', 'LOW_PRICE', 'CLOSE_PRICE', 'AVG_PRICE']
+LAKH = 100000
+TRADING_DAYS_PER_YEAR = 252
+
+# Execution defaults, see simulate()
+DEFAULT_CAPITAL = 1e7
+DEFAULT_REBALANCE_DAYS = 5
+DEFAULT_SLIPPAGE_BPS = 5
+DEFAULT_IMPACT = 0.1
+DEFAULT_COST_BPS = 10
+DEFAULT_PARTICIPATION = 0.05
+DEFAULT_ADV_DAYS = 20
+
+# Derived matrices (SMAs, rolling highs...) kept per MarketData
+DEFAULT_DERIVED_ENTRIES = 16
+
+
+class MarketData:
+    """
+    Date x symbol matrices for one series, as loaded by load_market_data.
+
+    `fields` maps bhavcopy column names to float matrices with NaN where a
+    symbol did not trade. Matrices derived from them (forward-filled closes,
+    moving averages, ...) are memoized, so strategies in a parameter sweep
+    that share a window compute it once per process.
+    """
+
+    def __init__(self, dates, symbols, fields):
+        self.dates = dates
+        self.symbols = symbols
+        self.fields = fields
+        self._derived = OrderedDict()
+
+    def __getitem__(self, field):
+        return self.fields[field]
+
+    @property
+    def shape(self):
+        return len(self.dates), len(self.symbols)
+
+    def derived(self, key, compute):
+        """Return the memoized matrix for `key`, calling compute() on a miss."""
+        if key in self._derived:
+            self._derived.move_to_end(key)
+            return self._derived[key]
+        value = compute()
+        self._derived[key] = value
+        while len(self._derived) > DEFAULT_DERIVED_ENTRIES:
+            self._derived.popitem(last=False)
+        return value
+
+    @property
+    def close(self):
+        """CLOSE_PRICE carried over days a symbol did not trade (NaN before its first day)."""
+        return self.derived('close', lambda: forward_fill(self['CLOSE_PRICE'], np.full(self.shape[1], np.nan)))
+
+    @property
+    def observations(self):
+        """Number of trading days seen so far per symbol."""
+        return self.derived('observations', lambda: np.cumsum(~np.isnan(self['CLOSE_PRICE']), axis=0))
+
+    def sma(self, window):
+        return self.derived(('sma', window), lambda: rolling_mean(self.close, window))
+
+    def rolling_high(self, window):
+        return self.derived(('rolling_high', window), lambda: rolling_extreme(self['CLOSE_PRICE'], window))
+
+    def adv(self, window):
+        """Average daily turnover in rupees over the `window` days before each date."""
+        def compute():
+            turnover = rolling_mean(self['TURNOVER_LACS'], window) * LAKH
+            return shift(turnover, 1)
+        return self.derived(('adv', window), compute)
+
+
+def shift(values, periods):
+    """Move rows down by `periods`, filling the top with NaN (values known `periods` days earlier)."""
+    out = np.full_like(values, np.nan)
+    if periods < len(values):
+        out[periods:] = values[:len(values) - periods]
+    return out
+
+
+def _from_db(start, end, series):
+    bars = DailyBar.objects.filter(security__SERIES=series)
+    if start:
+        bars = bars.filter(DATE1__gte=start)
+    if end:
+        bars = bars.filter(DATE1__lte=end)
+    df = pd.DataFrame.from_records(bars.values_list('DATE1', 'security__SYMBOL', *FIELDS).iterator(chunk_size=10000),
+                                   columns=['DATE1', 'SYMBOL'] + FIELDS)
+    if df.empty:
+        return np.array([], dtype='datetime64[D]'), np.array([], dtype=object), {f: np.empty((0, 0)) for f in FIELDS}
+
+    date_codes, dates = pd.factorize(df['DATE1'], sort=True)
+    symbol_codes, symbols = pd.factorize(df['SYMBOL'], sort=True)
+    fields = {}
+    for field in FIELDS:
+        values = df[field].to_numpy(dtype='float64')
+        if field in FIXED_POINT_FIELDS:
+            values = values / FIXED_POINT_SCALE
+        fields[field] = np.full((len(dates), len(symbols)), np.nan)
+        fields[field][date_codes, symbol_codes] = values
+    return np.asarray(dates, dtype='datetime64[D]'), np.asarray(symbols, dtype=object), fields
+
+
+def apply_corporate_actions(data, series='EQ'):
+    """
+    Adjust prices and traded quantity in place for stored corporate actions.
+
+    Rows before each ex-date are scaled by the action's factor, one slice
+    per action. Turnover and delivery % need no adjustment.
+    """
+    columns = {symbol: i for i, symbol in enumerate(data.symbols)}
+    actions = CorporateAction.objects.filter(FACTOR__isnull=False, security__SERIES=series) \
+        .values_list('security__SYMBOL', 'EX_DATE', 'FACTOR')
+    applied = 0
+    for symbol, ex_date, factor in actions:
+        column = columns.get(symbol)
+        if column is None:
+            continue
+        rows = int(np.searchsorted(data.dates, np.datetime64(ex_date, 'D')))
+        for field in PRICE_FIELDS:
+            data.fields[field][:rows, column] *= factor
+        data.fields['TTL_TRD_QNTY'][:rows, column] /= factor
+        applied += 1
+    return applied
+
+
+def load_market_data(start=None, end=None, series='EQ', source=None, adjust=True):
+    """
+    Load FIELDS as date x symbol matrices.
+
+    Args:
+        start, end: inclusive date bounds
+        series: SERIES to load
+        source: 'columnar' (Parquet mirror) or 'db'; by default the columnar
+            store when it is enabled, which is much faster for long ranges
+        adjust: apply corporate actions so splits and bonuses do not show
+            up as price crashes
+
+    Returns:
+        MarketData
+    """
+    store = get_columnar_store()
+    if source is None:
+        source = 'columnar' if store.enabled and os.path.isdir(store.root) else 'db'
+    if source == 'columnar':
+        dates, symbols, fields = store.matrices(FIELDS, start, end, series=series)
+    elif source == 'db':
+        dates, symbols, fields = _from_db(start, end, series)
+    else:
+        raise ValueError(f"Unknown market data source '{source}'")
+
+    data = MarketData(dates, symbols, fields)
+    if adjust and len(dates):
+        applied = apply_corporate_actions(data, series)
+        if applied:
+            logger.info(f"Applied {applied} corporate actions to market data")
+    return data
+
+
+# Strategies. Each takes MarketData plus its parameters and returns target
+# portfolio weights as a (dates x symbols) matrix decided at each day's
+# close from data up to that day; simulate() trades them on the next day.
+
+def top_n(scores, eligible, top):
+    """Weight 1 / top on the `top` highest scoring eligible symbols of every row."""
+    scores = np.where(eligible & np.isfinite(scores), scores, -np.inf)
+    top = max(1, min(int(top), scores.shape[1]))
+    picks = np.argpartition(-scores, top - 1, axis=1)[:, :top]
+    chosen = np.take_along_axis(scores, picks, axis=1) > -np.inf
+    weights = np.zeros_like(scores)
+    np.put_along_axis(weights, picks, chosen / top, axis=1)
+    return weights
+
+
+def momentum(data, lookback=126, skip=21, top=20, min_adv=100):
+    """Hold the best performers from `lookback` to `skip` days ago."""
+    close = data.close
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = shift(close, skip) / shift(close, lookback) - 1
+    eligible = (data.observations > lookback) & (data.adv(DEFAULT_ADV_DAYS) >= min_adv * LAKH)
+    return top_n(scores, eligible, top)
+
+
+def sma_trend(data, fast=50, slow=200, top=20, min_adv=100):
+    """Hold the symbols whose fast moving average is furthest above the slow one."""
+    fast_sma, slow_sma = data.sma(fast), data.sma(slow)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = fast_sma / slow_sma - 1
+    eligible = (scores > 0) & (data.close > fast_sma) & (data.observations >= slow) & \
+        (data.adv(DEFAULT_ADV_DAYS) >= min_adv * LAKH)
+    return top_n(scores, eligible, top)
+
+
+def delivery_breakout(data, window=20, min_delivery=50, top=20, min_adv=100):
+    """Hold closes at a `window`-day high on high delivery, highest delivery first."""
+    previous_high = shift(data.rolling_high(window), 1)
+    delivery = data['DELIV_PER']
+    eligible = (data['CLOSE_PRICE'] > previous_high) & (delivery >= min_delivery) & \
+        (data.observations > window) & (data.adv(DEFAULT_ADV_DAYS) >= min_adv * LAKH)
+    return top_n(delivery, eligible, top)
+
+
+STRATEGIES = {
+    'momentum': momentum,
+    'sma_trend': sma_trend,
+    'delivery_breakout': delivery_breakout,
+}
+
+
+def execution_settings(**overrides):
+    """simulate() keyword arguments from settings, with explicit values taking precedence."""
+    defaults = {
+        'capital': getattr(settings, 'BHAVCOPY_BACKTEST_CAPITAL', DEFAULT_CAPITAL),
+        'rebalance_every': DEFAULT_REBALANCE_DAYS,
+        'slippage_bps': getattr(settings, 'BHAVCOPY_BACKTEST_SLIPPAGE_BPS', DEFAULT_SLIPPAGE_BPS),
+        'impact': getattr(settings, 'BHAVCOPY_BACKTEST_IMPACT', DEFAULT_IMPACT),
+        'cost_bps': getattr(settings, 'BHAVCOPY_BACKTEST_COST_BPS', DEFAULT_COST_BPS),
+        'participation': getattr(settings, 'BHAVCOPY_BACKTEST_PARTICIPATION', DEFAULT_PARTICIPATION),
+        'adv_days': DEFAULT_ADV_DAYS,
+    }
+    defaults.update({k: v for k, v in overrides.items() if v is not None})
+    return defaults
+
+
+def simulate(data, weights, capital=DEFAULT_CAPITAL, rebalance_every=DEFAULT_REBALANCE_DAYS,
+             slippage_bps=DEFAULT_SLIPPAGE_BPS, impact=DEFAULT_IMPACT, cost_bps=DEFAULT_COST_BPS,
+             participation=DEFAULT_PARTICIPATION, adv_days=DEFAULT_ADV_DAYS):
+    """
+    Trade target weights and track the portfolio value.
+
+    Every `rebalance_every` days the previous close's target weights are
+    traded at the day's AVG_PRICE (VWAP). Fills are worse than VWAP by
+    `slippage_bps` plus `impact` times the trade's share of the symbol's
+    average daily turnover, and pay `cost_bps` of the traded value. A trade
+    is capped at `participation` of that turnover, and symbols that did not
+    trade on the day are not traded. Holdings are in (fractional) shares
+    between rebalances.
+
+    Only the rebalances are a Python loop, each one vector operations over
+    all symbols; the daily valuation of a holding period is one matrix
+    product over its closes.
+
+    Returns:
+        dict with "equity" (array, one value per date) and "stats"
+    """
+    n_dates, n_symbols = data.shape
+    close = np.nan_to_num(data.close)
+    price = data['AVG_PRICE']
+    tradable = np.isfinite(price) & (price > 0)
+    adv = np.nan_to_num(data.adv(adv_days))
+
+    equity = np.full(n_dates, float(capital))
+    holdings = np.zeros(n_symbols)
+    cash = float(capital)
+    executions = np.arange(1, n_dates, max(1, int(rebalance_every)))
+    traded_value = costs = 0.0
+    capped = rebalances = 0
+    for j, day in enumerate(executions):
+        end = executions[j + 1] if j + 1 < len(executions) else n_dates
+        ok = tradable[day]
+        px = np.where(ok, price[day], close[day - 1])
+        current = holdings * px
+        value = cash + current.sum()
+        desired = np.where(ok, weights[day - 1] * value - current, 0.0)
+
+        if desired.any():
+            limit = participation * adv[day]
+            trade = np.clip(desired, -limit, limit)
+            capped += int(np.count_nonzero(np.abs(desired) > limit + 1e-6))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                share_of_adv = np.where(adv[day] > 0, np.abs(trade) / adv[day], 0.0)
+            slippage = (np.abs(trade) * (slippage_bps / 10000 + impact * share_of_adv)).sum()
+            fees = np.abs(trade).sum() * cost_bps / 10000
+
+            holdings = holdings + np.where(ok, trade / px, 0.0)
+            cash -= trade.sum() + slippage + fees
+            traded_value += np.abs(trade).sum()
+            costs += slippage + fees
+            rebalances += 1
+
+        equity[day:end] = cash + close[day:end] @ holdings
+
+    return {"equity": equity, "stats": performance(equity, traded_value, costs, rebalances, capped, capital)}
+
+
+def performance(equity, traded_value=0.0, costs=0.0, rebalances=0, capped=0, capital=DEFAULT_CAPITAL):
+    """Summary statistics of an equity curve."""
+    returns = np.diff(equity) / equity[:-1] if len(equity) > 1 else np.array([])
+    years = len(returns) / TRADING_DAYS_PER_YEAR
+    total = equity[-1] / equity[0] - 1 if len(equity) else 0.0
+    volatility = returns.std() * np.sqrt(TRADING_DAYS_PER_YEAR) if len(returns) > 1 else 0.0
+    drawdown = 1 - equity / np.maximum.accumulate(equity) if len(equity) else np.array([0.0])
+    return {
+        "total_return": round(float(total), 6),
+        "cagr": round(float((1 + total) ** (1 / years) - 1), 6) if years and total > -1 else None,
+        "volatility": round(float(volatility), 6),
+        "sharpe": round(float(returns.mean() / returns.std() * np.sqrt(TRADING_DAYS_PER_YEAR)), 4)
+        if len(returns) > 1 and returns.std() > 0 else None,
+        "max_drawdown": round(float(drawdown.max()), 6),
+        "turnover": round(float(traded_value / capital / years), 4) if years else 0.0,
+        "costs": round(float(costs), 2),
+        "rebalances": rebalances,
+        "capped_trades": capped,
+        "final_equity": round(float(equity[-1]), 2) if len(equity) else float(capital),
+    }
+
+
+def run_backtest(data, strategy, params=None, **execution):
+    """
+    Run one strategy configuration.
+
+    Args:
+        data: MarketData
+        strategy: name in STRATEGIES
+        params: strategy keyword arguments
+        execution: simulate() keyword arguments, see execution_settings()
+
+    Returns:
+        dict with "equity" and "stats" (see simulate)
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy '{strategy}', choose from {', '.join(STRATEGIES)}")
+    weights = STRATEGIES[strategy](data, **(params or {}))
+    return simulate(data, weights, **execution_settings(**execution))
+
+
+def parameter_grid(grid):
+    """Every combination of a {parameter: [values]} grid, as a list of dicts."""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+# Set in each sweep worker by _init_worker
+_worker_data = None
+
+
+def _init_worker(data):
+    global _worker_data
+    _worker_data = data
+
+
+def _run_config(task):
+    strategy, params, execution = task
+    try:
+        stats = run_backtest(_worker_data, strategy, params, **execution)["stats"]
+        return {"params": params, **stats}
+    except Exception as e:
+        return {"params": params, "error": str(e)}
+
+
+def sweep(data, strategy, grid, workers=None, **execution):
+    """
+    Run every configuration of a parameter grid across a process pool.
+
+    The market data is handed to each worker once: inherited without a
+    copy where processes fork, pickled once per worker elsewhere. Workers
+    keep their memoized derived matrices between configurations, and
+    itertools.product order keeps configurations sharing leading
+    parameters together.
+
+    Returns:
+        list of {"params", **stats} dicts, best Sharpe ratio first
+    """
+    configs = parameter_grid(grid)
+    workers = workers or getattr(settings, 'BHAVCOPY_BACKTEST_WORKERS', None) or os.cpu_count() or 1
+    tasks = [(strategy, params, execution) for params in configs]
+
+    if workers == 1 or len(tasks) == 1:
+        _init_worker(data)
+        results = [_run_config(task) for task in tasks]
+    else:
+        # Workers never touch the database; do not share open connections with them
+        connections.close_all()
+        context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+        chunksize = max(1, len(tasks) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(data,)) as pool:
+            results = list(pool.map(_run_config, tasks, chunksize=chunksize))
+
+    return sorted(results, key=lambda r: (r.get("sharpe") is None, -(r.get("sharpe") or 0)))
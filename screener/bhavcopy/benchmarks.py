@@ -0,0 +1,442 @@
+from contextlib import contextmanager
+from datetime import date, datetime
+from django.conf import settings
+from django.db import DatabaseError, connection, connections, transaction
+from django.test import Client
+from django.test.utils import override_settings
+import django
+import json
+import os
+import platform
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+import numpy as np
+import pandas as pd
+import logging
+from bhavcopy.backfill_scheduler import BackfillScheduler
+from bhavcopy.bulk_upsert import prepare_bhavcopy_columns, write_bhavcopy_columns
+from bhavcopy.db_tuning import bulk_ingest, get_pragmas, read_pragmas
+from bhavcopy.parsing import parse_bhavcopy, get_engine
+from bhavcopy.raw_archive import RawArchive
+from bhavcopy.synthetic import StubNSEServer, generate_bhavcopy_csv, symbol_universe
+from bhavcopy.trading_calendar import reset_trading_calendar
+from bhavcopy.yearly_bhavcopy_download_views import YearlyBhavcopyDownloaderView
+import bhavcopy.columnar_store as columnar_store
+import bhavcopy.hot_cache as hot_cache
+import bhavcopy.raw_archive as raw_archive
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SYMBOLS = 2500
+DEFAULT_DAYS = 20
+DEFAULT_REPEAT = 5
+# First synthetic trading date; backfill dates follow the upsert dates
+FIRST_DATE = date(2024, 1, 1)
+# Slowdown against a previous run reported as a regression
+DEFAULT_THRESHOLD = 0.10
+
+BENCHMARKS = ('parse', 'clean', 'upsert_fresh', 'upsert_repeat', 'backfill', 'backfill_archive', 'read',
+              'read_during_write')
+
+READ_SCREEN = 'DELIV_PER > 60 and TURNOVER_LACS > 5'
+
+# Read-during-write modes: (name, pragmas over the configured ones, writer in bulk_ingest)
+READ_WRITE_MODES = [
+    ('rollback_journal', {'journal_mode': 'DELETE', 'synchronous': 'FULL'}, False),
+    ('wal', {}, False),
+    ('wal_bulk_ingest', {}, True),
+]
+# Requests a reader keeps making while the writer runs
+READ_WRITE_REQUESTS = ('cross_section', 'symbol_series', 'screen_past')
+
+
+def _timings(func, repeat):
+    """Seconds taken by each of `repeat` calls, after one untimed warm-up call."""
+    func()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def _result(timings, rows=None):
+    """Benchmark result dict from per-run timings and the rows one run handles."""
+    median = statistics.median(timings)
+    result = {"median_seconds": median, "min_seconds": min(timings), "runs": len(timings)}
+    if rows is not None:
+        result["rows"] = rows
+        result["rows_per_second"] = rows / median if median else None
+    return result
+
+
+def trading_dates(start, days):
+    """`days` weekdays from `start`; the scratch database has no holidays."""
+    return list(pd.bdate_range(start, periods=days).date)
+
+
+def environment():
+    """What a result file was measured on, so runs on different machines are not compared blindly."""
+    return {
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "pyarrow": pa.__version__ if pa is not None else None,
+        "database": connection.vendor,
+        "csv_engine": get_engine(),
+        "cpu_count": os.cpu_count(),
+        "platform": platform.platform(),
+    }
+
+
+@contextmanager
+def scratch_environment(keep=False):
+    """
+    Run the block against a throwaway database and data directories.
+
+    The default database is swapped for a freshly migrated test database
+    (a SQLite file in the scratch directory, or test_<NAME> elsewhere), and
+    the raw archive and columnar mirror point into the scratch directory, so
+    benchmarks exercise the real ingest path, signal receivers included,
+    without touching stored data. Process-wide caches are dropped on the
+    way in and out.
+
+    Yields:
+        str: the scratch directory
+    """
+    root = tempfile.mkdtemp(prefix='bhavcopy-benchmark-')
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_test_name = test_settings.get('NAME')
+    if connection.vendor == 'sqlite':
+        test_settings['NAME'] = os.path.join(root, 'benchmark.sqlite3')
+
+    overrides = override_settings(
+        BHAVCOPY_ARCHIVE_DIR=os.path.join(root, 'archive'),
+        BHAVCOPY_COLUMNAR_DIR=os.path.join(root, 'columnar') if pa is not None else None,
+        BHAVCOPY_HOT_CACHE_SHARED=None,
+        BHAVCOPY_HOLIDAY_FILE=None,
+        ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ['testserver'],
+    )
+
+    def reset_caches():
+        # Singletons are configured from settings on first use
+        columnar_store._default_store = None
+        hot_cache._default_cache = None
+        raw_archive._default_archive = None
+        reset_trading_calendar()
+
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        with overrides:
+            reset_caches()
+            try:
+                yield root
+            finally:
+                reset_caches()
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keep)
+        test_settings['NAME'] = old_test_name
+        if keep:
+            logger.info(f"Benchmark data kept in {root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_parse(content, repeat):
+    """Raw CSV bytes to a typed, cleaned DataFrame (parse_bhavcopy)."""
+    df, _ = parse_bhavcopy(content)
+    return _result(_timings(lambda: parse_bhavcopy(content), repeat), len(df))
+
+
+def bench_clean(content, repeat):
+    """Parsed frame to write-ready columns: validation, de-duplication, fixed point."""
+    df, _ = parse_bhavcopy(content)
+    return _result(_timings(lambda: prepare_bhavcopy_columns(df), repeat), len(df))
+
+
+def bench_upsert(files):
+    """
+    Write each prepared file in its own transaction.
+
+    Signal receivers are left out (notify=False); backfill measures the
+    full path. Called on new dates this times inserts, on stored dates
+    updates.
+    """
+    timings = []
+    rows = 0
+    for content in files:
+        df, _ = parse_bhavcopy(content)
+        columns, stats = prepare_bhavcopy_columns(df)
+        started = time.perf_counter()
+        with transaction.atomic():
+            write_bhavcopy_columns(columns, notify=False)
+        timings.append(time.perf_counter() - started)
+        rows = stats["rows"]
+    return _result(timings, rows)
+
+
+def bench_backfill(dates, archive, stub=None, workers=None):
+    """
+    Download and store `dates` through BackfillScheduler.
+
+    With a stub server the files come over HTTP from it; with an offline
+    archive they are re-read from disk. Either way each date is parsed,
+    upserted and announced to the receivers (columnar mirror, calendar,
+    corporate actions, hot cache) as in a real backfill.
+    """
+    downloader = YearlyBhavcopyDownloaderView()
+    downloader.archive = archive
+    if stub is not None:
+        downloader.bhavcopy_url = stub.bhavcopy_url
+    days = [datetime.combine(d, datetime.min.time()) for d in dates]
+    # No rate limit: the stub is local
+    scheduler = BackfillScheduler(downloader=downloader, workers=workers, rate=1e6)
+    summary = scheduler.run(days)
+    if summary["failed_dates"]:
+        errors = {r["date"]: r.get("error") for r in summary["results"] if r["status"] == "failed"}
+        raise RuntimeError(f"Backfill failed for {len(errors)} dates: {errors}")
+    rows = sum(r.get("total_rows", 0) for r in summary["results"])
+    return {"seconds": summary["elapsed"], "dates": len(days), "rows": rows,
+            "rows_per_second": rows / summary["elapsed"] if summary["elapsed"] else None,
+            "seconds_per_date": summary["elapsed"] / len(days) if days else None}
+
+
+def read_requests(dates, symbol):
+    """The read API calls timed by bench_reads, as (name, path, query parameters) tuples."""
+    latest = dates[-1].strftime('%d-%m-%Y')
+    first = dates[0].strftime('%d-%m-%Y')
+    return [
+        ("cross_section", f"/bhavcopy/dates/{latest}/", {"series": "EQ"}),
+        ("cross_section_page", f"/bhavcopy/dates/{latest}/", {"limit": 100, "fields": "SYMBOL,CLOSE_PRICE"}),
+        ("symbol_series", f"/bhavcopy/symbols/{symbol}/", {}),
+        ("adjusted_series", f"/bhavcopy/symbols/{symbol}/adjusted/", {}),
+        ("export_csv", "/bhavcopy/export/", {"start": first, "end": latest, "stream": "csv"}),
+        ("screen_latest", "/bhavcopy/screen/", {"q": READ_SCREEN, "limit": 50}),
+        ("screen_past", "/bhavcopy/screen/", {"q": READ_SCREEN, "date": first, "limit": 50}),
+    ]
+
+
+def bench_reads(dates, symbol, repeat):
+    """Median time of each read API call against the stored data, through the full view stack."""
+    client = Client()
+    results = {}
+    for name, path, params in read_requests(dates, symbol):
+        size = {}
+
+        def call():
+            response = client.get(path, params)
+            if response.status_code != 200:
+                raise RuntimeError(f"{path} returned {response.status_code}")
+            body = b''.join(response.streaming_content) if response.streaming else response.content
+            size["bytes"] = len(body)
+
+        results[name] = {**_result(_timings(call, repeat)), **size}
+    return results
+
+
+def bench_read_during_write(stored_dates, write_dates, symbol, stub, archive_root, workers=None):
+    """
+    Read latency while a backfill writes, for each of READ_WRITE_MODES.
+
+    A writer thread backfills one range of `write_dates` per mode from the
+    stub server (a yearly import when given a year of dates) while this
+    thread keeps making READ_WRITE_REQUESTS against `stored_dates`. In
+    rollback-journal mode readers wait for every commit of the writer; with
+    WAL they read the last committed state and only share CPU and disk.
+
+    Returns:
+        dict of mode -> reads, errors (non-200 or database errors), median,
+        95th percentile and worst read seconds, and the writer's throughput
+    """
+    requests = [r for r in read_requests(stored_dates, symbol) if r[0] in READ_WRITE_REQUESTS]
+    results = {}
+    for (mode, pragmas, bulk), dates in zip(READ_WRITE_MODES, write_dates):
+        # New connections pick up the mode's pragmas; a journal_mode switch
+        # needs the file to itself, so this thread connects before the writer
+        connections.close_all()
+        with override_settings(BHAVCOPY_SQLITE_PRAGMAS={**get_pragmas(), **pragmas}):
+            client = Client()
+            client.get(requests[0][1], requests[0][2])
+            journal_mode = read_pragmas(connection, ['journal_mode'])['journal_mode'] \
+                if connection.vendor == 'sqlite' else None
+            written = {}
+
+            def write():
+                try:
+                    with bulk_ingest(enabled=bulk):
+                        written.update(bench_backfill(dates, RawArchive(root=os.path.join(archive_root, mode), max_bytes=0),
+                                                      stub=stub, workers=workers))
+                except Exception as e:
+                    written["error"] = str(e)
+                finally:
+                    connections.close_all()
+
+            writer = threading.Thread(target=write, name=f'benchmark-writer-{mode}')
+            latencies = []
+            errors = 0
+            writer.start()
+            while writer.is_alive():
+                for _, path, params in requests:
+                    started = time.perf_counter()
+                    try:
+                        response = client.get(path, params)
+                        if response.status_code != 200:
+                            errors += 1
+                    except DatabaseError:
+                        errors += 1
+                    latencies.append(time.perf_counter() - started)
+            writer.join()
+            connections.close_all()
+
+        if "error" in written:
+            raise RuntimeError(f"Writer failed in {mode} mode: {written['error']}")
+        latencies = np.array(latencies or [np.nan])
+        results[mode] = {
+            "journal_mode": journal_mode,
+            "median_seconds": float(np.median(latencies)),
+            "p95_seconds": float(np.percentile(latencies, 95)),
+            "max_seconds": float(latencies.max()),
+            "reads": len(latencies),
+            "errors": errors,
+            "write_seconds": written["seconds"],
+            "write_rows_per_second": written["rows_per_second"],
+        }
+    return results
+
+
+def run_benchmarks(symbols=DEFAULT_SYMBOLS, days=DEFAULT_DAYS, repeat=DEFAULT_REPEAT, workers=None,
+                   latency=0.0, only=None, keep=False, progress=None):
+    """
+    Run the ingest and read benchmarks on synthetic data.
+
+    Upserts write `days` synthetic dates from FIRST_DATE; the backfill then
+    fetches the next `days` dates from a StubNSEServer and stores them the
+    way download_bhavcopy_yearwise does, and backfill_archive re-ingests the
+    same dates from the raw archive. Reads run over everything stored, and
+    read_during_write then backfills `days` more dates per mode while
+    reading.
+
+    Args:
+        symbols: rows per synthetic file
+        days: dates written by the upsert and backfill benchmarks
+        repeat: timed runs of parse, clean and each read
+        workers: backfill download threads
+        latency: seconds the stub server waits before each response
+        only: names from BENCHMARKS to run, all by default
+        keep: leave the scratch database and directories in place
+        progress: optional callable(name, result) called after each benchmark
+
+    Returns:
+        dict with "created_at", "environment", "config" and "results"
+        (benchmark name -> timings), ready for json.dump
+    """
+    only = set(only or BENCHMARKS)
+    unknown = only - set(BENCHMARKS)
+    if unknown:
+        raise ValueError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    upsert_dates = trading_dates(FIRST_DATE, days)
+    backfill_dates = trading_dates(upsert_dates[-1] + pd.offsets.BDay(1), days)
+    # One fresh range per read-during-write mode, after the backfill range
+    write_dates = [trading_dates(backfill_dates[-1] + pd.offsets.BDay(1 + i * days), days)
+                   for i in range(len(READ_WRITE_MODES))]
+    report = {
+        "created_at": datetime.now().isoformat(timespec='seconds'),
+        "environment": environment(),
+        "config": {"symbols": symbols, "days": days, "repeat": repeat, "workers": workers, "latency": latency},
+        "results": {},
+    }
+
+    def record(name, result):
+        report["results"][name] = result
+        if progress:
+            progress(name, result)
+
+    sample = generate_bhavcopy_csv(upsert_dates[0], symbols)
+    if 'parse' in only:
+        record('parse', bench_parse(sample, repeat))
+    if 'clean' in only:
+        record('clean', bench_clean(sample, repeat))
+
+    with scratch_environment(keep=keep) as root:
+        stored_dates = []
+        symbol = next(name for name, serie, _ in symbol_universe(symbols) if serie == 'EQ')
+        if only & {'upsert_fresh', 'upsert_repeat', 'read', 'read_during_write'}:
+            files = [generate_bhavcopy_csv(d, symbols) for d in upsert_dates]
+            fresh = bench_upsert(files)
+            stored_dates += upsert_dates
+            if 'upsert_fresh' in only:
+                record('upsert_fresh', fresh)
+            if 'upsert_repeat' in only:
+                record('upsert_repeat', bench_upsert(files))
+
+        if only & {'backfill', 'backfill_archive', 'read'}:
+            archive_root = os.path.join(root, 'archive')
+            with StubNSEServer(symbols=symbols, latency=latency) as stub:
+                backfill = bench_backfill(backfill_dates, RawArchive(root=archive_root, max_bytes=0),
+                                          stub=stub, workers=workers)
+            stored_dates += backfill_dates
+            if 'backfill' in only:
+                record('backfill', backfill)
+            if 'backfill_archive' in only:
+                record('backfill_archive', bench_backfill(
+                    backfill_dates, RawArchive(root=archive_root, max_bytes=0, offline=True), workers=workers))
+
+        if 'read' in only:
+            for name, result in bench_reads(stored_dates, symbol, repeat).items():
+                record(f"read_{name}", result)
+
+        if 'read_during_write' in only:
+            with StubNSEServer(symbols=symbols, latency=latency) as stub:
+                for mode, result in bench_read_during_write(stored_dates, write_dates, symbol, stub,
+                                                            os.path.join(root, 'write_archive'), workers).items():
+                    record(f"read_during_write_{mode}", result)
+
+    return report
+
+
+def _seconds(result):
+    return result.get("median_seconds", result.get("seconds"))
+
+
+def compare_results(current, previous, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare two run_benchmarks reports benchmark by benchmark.
+
+    Returns:
+        list of dicts with "name", "previous" and "current" seconds, "change"
+        (relative, positive is slower) and "regression" (slower by more than
+        `threshold`), for every benchmark present in both
+    """
+    rows = []
+    for name, result in current["results"].items():
+        before = previous.get("results", {}).get(name)
+        if before is None:
+            continue
+        old, new = _seconds(before), _seconds(result)
+        change = (new - old) / old if old else None
+        rows.append({"name": name, "previous": old, "current": new, "change": change,
+                     "regression": change is not None and change > threshold})
+    return rows
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_results(report, path):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, default=str)
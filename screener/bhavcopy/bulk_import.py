@@ -0,0 +1,255 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from django.db import connections, transaction
+import django
+import gzip
+import multiprocessing
+import os
+import re
+import time
+import numpy as np
+import logging
+from bhavcopy.bulk_upsert import (UNIQUE_FIELDS, UPDATE_FIELDS, prepare_bhavcopy_columns,
+                                  write_bhavcopy_columns, notify_dates_written)
+from bhavcopy.parsing import parse_bhavcopy
+
+try:
+    import pyarrow as pa
+except ImportError:  # without pyarrow workers hand back plain NumPy arrays
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+# Rows written per transaction by the writer
+DEFAULT_COMMIT_ROWS = 200000
+# Parsed files waiting for the writer, per worker
+QUEUE_DEPTH = 4
+# Share of the run the writer must be busy for writes to count as the bottleneck
+WRITER_SATURATED = 0.85
+
+FILE_PATTERN = re.compile(r'\.csv(\.gz)?$', re.IGNORECASE)
+DATE_IN_NAME = re.compile(r'(\d{8})')
+
+
+def _name_date(path):
+    """Date in a file name like sec_bhavdata_full_15032024.csv (or 20240315), if any."""
+    match = DATE_IN_NAME.search(os.path.basename(path))
+    if match:
+        for fmt in ('%d%m%Y', '%Y%m%d'):
+            try:
+                return datetime.strptime(match.group(1), fmt).date()
+            except ValueError:
+                pass
+    return None
+
+
+def find_bhavcopy_files(root):
+    """
+    Every .csv / .csv.gz under `root`, oldest first by the date in the file
+    name (files without one sort after, by path).
+    """
+    paths = []
+    for directory, _, names in os.walk(root):
+        paths.extend(os.path.join(directory, name) for name in names if FILE_PATTERN.search(name))
+    return sorted(paths, key=lambda p: (_name_date(p) is None, _name_date(p) or datetime.min.date(), p))
+
+
+def encode_columns(columns):
+    """
+    Pack prepared columns for the trip back to the writer.
+
+    With pyarrow they become one Arrow IPC stream (dictionary-encoded
+    symbols, date32 dates, int64 values), so the parent receives a single
+    buffer instead of a pickled DataFrame.
+    """
+    if pa is None:
+        return columns
+    arrays = {
+        'SYMBOL': pa.array(columns['SYMBOL'], pa.string()).dictionary_encode(),
+        'SERIES': pa.array(columns['SERIES'], pa.string()).dictionary_encode(),
+        'DATE1': pa.array(columns['DATE1'], pa.date32()),
+    }
+    arrays.update({field: pa.array(columns[field], pa.int64()) for field in UPDATE_FIELDS})
+    table = pa.table(arrays)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def decode_columns(payload):
+    """Inverse of encode_columns, in the layout write_bhavcopy_columns expects."""
+    if isinstance(payload, dict):
+        return payload
+    table = pa.ipc.open_stream(payload).read_all()
+    columns = {}
+    for field in UNIQUE_FIELDS:
+        column = table.column(field).combine_chunks()
+        if field == 'DATE1':
+            columns[field] = column.to_numpy(zero_copy_only=False).astype('datetime64[D]').astype(object)
+        else:
+            columns[field] = column.dictionary_decode().to_numpy(zero_copy_only=False)
+    for field in UPDATE_FIELDS:
+        columns[field] = table.column(field).to_numpy()
+    return columns
+
+
+def parse_file(path):
+    """
+    Worker task: read, parse and prepare one bhavcopy file.
+
+    Returns:
+        dict with "path", "payload" (encode_columns output), "rows",
+        "invalid_rows", "duplicate_rows", "seconds" of CPU work, or "error"
+    """
+    started = time.perf_counter()
+    try:
+        with open(path, 'rb') as f:
+            content = f.read()
+        if path.lower().endswith('.gz'):
+            content = gzip.decompress(content)
+        df, _ = parse_bhavcopy(content)
+        columns, stats = prepare_bhavcopy_columns(df)
+        return {"path": path, "payload": encode_columns(columns), **stats,
+                "seconds": time.perf_counter() - started}
+    except Exception as e:
+        return {"path": path, "error": f"{type(e).__name__}: {e}", "seconds": time.perf_counter() - started}
+
+
+def _parsed_in_order(pool, paths, workers, summary):
+    """Submit parse_file for every path, keeping a bounded queue, and yield results in path order."""
+    queue = deque()
+    remaining = iter(paths)
+    for path in remaining:
+        queue.append(pool.submit(parse_file, path))
+        if len(queue) >= workers * QUEUE_DEPTH:
+            break
+    while queue:
+        waited = time.perf_counter()
+        result = queue.popleft().result()
+        summary["wait_seconds"] += time.perf_counter() - waited
+        summary["parse_seconds"] += result["seconds"]
+        next_path = next(remaining, None)
+        if next_path is not None:
+            queue.append(pool.submit(parse_file, next_path))
+        yield result
+
+
+def _pool(workers):
+    """Process pool whose workers can import the bhavcopy modules."""
+    if 'fork' in multiprocessing.get_all_start_methods():
+        # Forked workers inherit the configured app registry
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+    return ProcessPoolExecutor(max_workers=workers, initializer=django.setup)
+
+
+def import_directory(root, workers=None, batch_size=None, commit_rows=None, dry_run=False, progress=None):
+    """
+    Re-import every bhavcopy file under `root`.
+
+    Worker processes parse and prepare files; the calling process is the
+    only writer. It takes the results in file order (at most QUEUE_DEPTH
+    per worker waiting), writes them with write_bhavcopy_columns and
+    commits every `commit_rows` rows. Listeners get one
+    bhavcopy_dates_written for all dates at the end.
+
+    The timings returned show where the time went: "parse_seconds" is the
+    workers' total CPU time, "write_seconds" the writer's busy time and
+    "wait_seconds" how long the writer sat idle waiting for parsed files.
+    A writer that never waits is the bottleneck.
+
+    Args:
+        root: directory to scan (see find_bhavcopy_files)
+        workers: parser processes, os.cpu_count() by default
+        batch_size: rows per INSERT statement
+        commit_rows: rows per transaction, DEFAULT_COMMIT_ROWS by default
+        dry_run: parse only, write nothing
+        progress: optional callable(result dict) called for every file
+
+    Returns:
+        dict with counts, timings and "failed" (list of (path, error))
+    """
+    workers = workers or os.cpu_count() or 1
+    commit_rows = commit_rows or DEFAULT_COMMIT_ROWS
+    paths = find_bhavcopy_files(root)
+    summary = {
+        "files": len(paths), "workers": workers, "rows": 0, "records_created": 0, "records_updated": 0,
+        "records_with_errors": 0, "dates": 0, "failed": [],
+        "parse_seconds": 0.0, "write_seconds": 0.0, "wait_seconds": 0.0, "elapsed_seconds": 0.0,
+    }
+    if not paths:
+        return summary
+
+    started = time.perf_counter()
+    written_dates = set()
+    # Workers never touch the database; do not share open connections with them
+    connections.close_all()
+    with _pool(workers) as pool:
+        results = _parsed_in_order(pool, paths, workers, summary)
+        finished = False
+        while not finished:
+            finished = True
+            with transaction.atomic():
+                pending_rows = 0
+                for result in results:
+                    if "error" in result:
+                        summary["failed"].append((result["path"], result["error"]))
+                        logger.error(f"Could not parse {result['path']}: {result['error']}")
+                    else:
+                        summary["rows"] += result["rows"]
+                        summary["records_with_errors"] += result["invalid_rows"]
+                        summary["records_updated"] += result["duplicate_rows"]
+                        if not dry_run:
+                            writing = time.perf_counter()
+                            written = write_bhavcopy_columns(decode_columns(result["payload"]),
+                                                             batch_size=batch_size, notify=False)
+                            summary["write_seconds"] += time.perf_counter() - writing
+                            summary["records_created"] += written["records_created"]
+                            summary["records_updated"] += written["records_updated"]
+                            summary["records_with_errors"] += written["records_with_errors"]
+                            written_dates.update(written["dates"])
+                            pending_rows += result["rows"]
+                    if progress:
+                        progress(result)
+                    if pending_rows >= commit_rows:
+                        finished = False
+                        break
+                committing = time.perf_counter()
+            if not dry_run:
+                summary["write_seconds"] += time.perf_counter() - committing
+
+    summary["elapsed_seconds"] = time.perf_counter() - started
+    summary["dates"] = len(written_dates)
+    if written_dates:
+        notify_dates_written(sorted(written_dates))
+    return summary
+
+
+def scaling_report(summary):
+    """
+    Throughput figures for an import_directory summary.
+
+    Returns:
+        dict with "rows_per_second" overall, "parse_rows_per_worker_second",
+        "write_rows_per_second", "writer_busy" (share of the elapsed time),
+        "bottleneck" ('parsing' or 'writes') and "saturating_workers", the
+        worker count at which parsing would outpace the writer
+    """
+    rows = summary["rows"]
+    elapsed = summary["elapsed_seconds"] or float('nan')
+    parse_rate = rows / summary["parse_seconds"] if summary["parse_seconds"] else None
+    write_rate = rows / summary["write_seconds"] if summary["write_seconds"] else None
+    writer_busy = summary["write_seconds"] / elapsed if summary["write_seconds"] else 0.0
+    saturating = int(np.ceil(write_rate / parse_rate)) if parse_rate and write_rate else None
+    # The writer is saturated when it barely ever waits for a parsed file, or
+    # when the workers can already parse faster than it writes
+    saturated = write_rate and (writer_busy >= WRITER_SATURATED or summary["workers"] >= saturating)
+    return {
+        "rows_per_second": rows / elapsed if rows else 0.0,
+        "parse_rows_per_worker_second": parse_rate,
+        "write_rows_per_second": write_rate,
+        "writer_busy": writer_busy,
+        "bottleneck": 'writes' if saturated else 'parsing',
+        "saturating_workers": saturating,
+    }
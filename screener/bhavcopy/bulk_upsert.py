@@ -0,0 +1,373 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+import io
+import time
+import numpy as np
+import pandas as pd
+from bhavcopy.models import Bhavcopy, DailyBar, Security, FIXED_POINT_FIELDS, FIXED_POINT_SCALE
+from bhavcopy.partitioning import ensure_year_partitions
+from bhavcopy.signals import bhavcopy_dates_written
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Natural key of a bhavcopy row; (SYMBOL, SERIES) resolves to a Security
+UNIQUE_FIELDS = ['SYMBOL', 'SERIES', 'DATE1']
+
+# Columns overwritten when a row for the same key already exists
+UPDATE_FIELDS = ['PREV_CLOSE', 'OPEN_PRICE', 'HIGH_PRICE', 'LOW_PRICE',
+                 'LAST_PRICE', 'CLOSE_PRICE', 'AVG_PRICE', 'TTL_TRD_QNTY',
+                 'TURNOVER_LACS', 'NO_OF_TRADES', 'DELIV_QTY', 'DELIV_PER']
+
+INTEGER_FIELDS = ['TTL_TRD_QNTY', 'NO_OF_TRADES', 'DELIV_QTY']
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Session-local table COPY loads into before the upsert into DailyBar
+STAGING_TABLE = 'bhavcopy_dailybar_staging'
+
+
+def get_batch_size(batch_size=None):
+    """Resolve the batch size from the argument or BHAVCOPY_UPSERT_BATCH_SIZE."""
+    if batch_size:
+        return int(batch_size)
+    return int(getattr(settings, 'BHAVCOPY_UPSERT_BATCH_SIZE', DEFAULT_BATCH_SIZE))
+
+
+def _validate_columns(df):
+    """
+    Split a bhavcopy DataFrame into column arrays ready for insertion.
+
+    Args:
+        df: pandas DataFrame with the bhavcopy columns
+
+    Returns:
+        tuple: (columns, valid_mask) where columns maps field name to a numpy
+        array and valid_mask flags rows that can be written
+    """
+    valid = pd.Series(True, index=df.index)
+    columns = {}
+
+    for field in UNIQUE_FIELDS:
+        values = df[field]
+        if field != 'DATE1':
+            values = values.astype('string').str.strip()
+        valid &= values.notna()
+        if field != 'DATE1':
+            valid &= values.fillna('') != ''
+        columns[field] = values.to_numpy(dtype=object)
+
+    for field in UPDATE_FIELDS:
+        values = pd.to_numeric(df[field], errors='coerce')
+        valid &= values.notna()
+        columns[field] = values.to_numpy()
+
+    return columns, valid.to_numpy()
+
+
+def _encode_fixed_point(columns):
+    """Scale the FIXED_POINT_FIELDS to integers and cast the counts, in place."""
+    for field in UPDATE_FIELDS:
+        values = columns[field].astype('float64')
+        if field in FIXED_POINT_FIELDS:
+            values = np.rint(values * FIXED_POINT_SCALE)
+        columns[field] = values.astype('int64')
+
+
+def _resolve_securities(columns):
+    """
+    Map every (SYMBOL, SERIES) in the rows to a Security id.
+
+    The dimension table is small (one row per traded instrument), so it is
+    read whole instead of sending thousands of symbols as query parameters.
+    New pairs are inserted in one statement.
+
+    Returns:
+        dict of (SYMBOL, SERIES) -> Security id
+    """
+    ids = {(symbol, series): pk for symbol, series, pk in
+           Security.objects.values_list('SYMBOL', 'SERIES', 'id')}
+    pairs = set(zip(columns['SYMBOL'], columns['SERIES']))
+    missing = [pair for pair in pairs if pair not in ids]
+    if missing:
+        Security.objects.bulk_create(
+            [Security(SYMBOL=symbol, SERIES=series) for symbol, series in sorted(missing)],
+            ignore_conflicts=True,
+        )
+        ids = {(symbol, series): pk for symbol, series, pk in
+               Security.objects.values_list('SYMBOL', 'SERIES', 'id')}
+    return ids
+
+
+def _update_listing_dates(dates):
+    """Widen Security.FIRST_DATE/LAST_DATE to cover the dates just written."""
+    for dt in dates:
+        traded = Security.objects.filter(bars__DATE1=dt)
+        traded.filter(Q(FIRST_DATE__isnull=True) | Q(FIRST_DATE__gt=dt)).update(FIRST_DATE=dt)
+        traded.filter(Q(LAST_DATE__isnull=True) | Q(LAST_DATE__lt=dt)).update(LAST_DATE=dt)
+
+
+# Column order of the row tuples handed to _write_batch
+ROW_FIELDS = ['security_id', 'DATE1'] + UPDATE_FIELDS
+
+# Backends whose INSERT ... ON CONFLICT (...) DO UPDATE ... EXCLUDED is written directly
+UPSERT_VENDORS = ('sqlite', 'postgresql')
+
+
+def _build_rows(columns, positions, security_ids):
+    """Row tuples in ROW_FIELDS order for the given row positions."""
+    ids = [security_ids[pair] for pair in zip(columns['SYMBOL'][positions], columns['SERIES'][positions])]
+    values = [columns[field][positions].tolist() for field in UPDATE_FIELDS]
+    return list(zip(ids, columns['DATE1'][positions].tolist(), *values))
+
+
+def _upsert_sql():
+    quote = connection.ops.quote_name
+    updates = ', '.join(f'{quote(c)} = EXCLUDED.{quote(c)}' for c in UPDATE_FIELDS)
+    return (f'INSERT INTO {quote(DailyBar._meta.db_table)} ({", ".join(quote(c) for c in ROW_FIELDS)}) '
+            f'VALUES ({", ".join(["%s"] * len(ROW_FIELDS))}) '
+            f'ON CONFLICT ({quote("security_id")}, {quote("DATE1")}) DO UPDATE SET {updates}')
+
+
+def _write_batch(rows):
+    """
+    Upsert a batch of row tuples with INSERT ... ON CONFLICT DO UPDATE.
+
+    On SQLite and PostgreSQL the statement is run through executemany
+    directly: building model instances and compiling a many-row INSERT
+    costs several times more than the database spends storing the rows.
+    Other backends go through bulk_create.
+    """
+    with transaction.atomic():
+        if connection.vendor in UPSERT_VENDORS:
+            with connection.cursor() as cursor:
+                cursor.executemany(_upsert_sql(), rows)
+            return
+        DailyBar.objects.bulk_create(
+            [DailyBar(**dict(zip(ROW_FIELDS, row))) for row in rows],
+            update_conflicts=True,
+            unique_fields=['security', 'DATE1'],
+            update_fields=UPDATE_FIELDS,
+        )
+
+
+def use_copy():
+    """Whether writes go through COPY (PostgreSQL and BHAVCOPY_POSTGRES_COPY)."""
+    return connection.vendor == 'postgresql' and getattr(settings, 'BHAVCOPY_POSTGRES_COPY', True)
+
+
+def _copy_buffer(columns, security_ids):
+    """The prepared rows as CSV in ROW_FIELDS order, ready for COPY FROM STDIN."""
+    frame = pd.DataFrame({field: columns[field] for field in UPDATE_FIELDS})
+    frame.insert(0, 'DATE1', columns['DATE1'])
+    frame.insert(0, 'security_id', [security_ids[pair] for pair in zip(columns['SYMBOL'], columns['SERIES'])])
+    buffer = io.StringIO()
+    frame.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    return frame, buffer
+
+
+def _copy_from(cursor, sql, buffer):
+    """Run COPY ... FROM STDIN on the underlying psycopg2 or psycopg (3) cursor."""
+    raw = cursor.cursor
+    if hasattr(raw, 'copy_expert'):
+        raw.copy_expert(sql, buffer)
+        return
+    with raw.copy(sql) as copy:
+        copy.write(buffer.getvalue())
+
+
+def _copy_upsert(columns, security_ids):
+    """
+    Upsert every row in one COPY and one INSERT ... SELECT (PostgreSQL).
+
+    COPY cannot resolve conflicts, so the rows go to a temporary staging
+    table first and are merged into DailyBar from there. The staging table
+    lives for the session and is emptied on every call.
+
+    Returns:
+        list of (security_id, DATE1) keys written
+    """
+    quote = connection.ops.quote_name
+    fields = ', '.join(quote(c) for c in ROW_FIELDS)
+    updates = ', '.join(f'{quote(c)} = EXCLUDED.{quote(c)}' for c in UPDATE_FIELDS)
+    frame, buffer = _copy_buffer(columns, security_ids)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'CREATE TEMPORARY TABLE IF NOT EXISTS {quote(STAGING_TABLE)} AS '
+                       f'SELECT {fields} FROM {quote(DailyBar._meta.db_table)} WITH NO DATA')
+        cursor.execute(f'TRUNCATE {quote(STAGING_TABLE)}')
+        _copy_from(cursor, f'COPY {quote(STAGING_TABLE)} ({fields}) FROM STDIN WITH (FORMAT csv)', buffer)
+        cursor.execute(f'INSERT INTO {quote(DailyBar._meta.db_table)} ({fields}) '
+                       f'SELECT {fields} FROM {quote(STAGING_TABLE)} '
+                       f'ON CONFLICT ({quote("security_id")}, {quote("DATE1")}) DO UPDATE SET {updates}')
+    return list(zip(frame['security_id'].tolist(), frame['DATE1'].tolist()))
+
+
+def prepare_bhavcopy_columns(df):
+    """
+    Validate, deduplicate and encode a bhavcopy DataFrame for writing.
+
+    This is the CPU-bound half of an upsert and needs no database, so bulk
+    imports run it in worker processes (see bhavcopy.bulk_import).
+
+    Returns:
+        tuple: (columns, stats) where columns maps UNIQUE_FIELDS and
+        UPDATE_FIELDS to arrays of the rows to write (prices as fixed-point
+        int64) and stats has "rows", "invalid_rows" and "duplicate_rows"
+    """
+    stats = {"rows": 0 if df is None else len(df), "invalid_rows": 0, "duplicate_rows": 0}
+    if df is None or df.empty:
+        return {field: np.array([], dtype=object if field in UNIQUE_FIELDS else 'int64')
+                for field in UNIQUE_FIELDS + UPDATE_FIELDS}, stats
+
+    df = df.reset_index(drop=True)
+    columns, valid = _validate_columns(df)
+
+    stats["invalid_rows"] = int((~valid).sum())
+    if stats["invalid_rows"]:
+        logger.error(f"Skipping {stats['invalid_rows']} rows with missing keys or non-numeric values")
+
+    # Later rows win for duplicate keys, the same as repeated update_or_create calls
+    valid_positions = valid.nonzero()[0]
+    keys = pd.DataFrame({field: columns[field][valid_positions] for field in UNIQUE_FIELDS})
+    duplicate = keys.duplicated(keep='last').to_numpy()
+    positions = valid_positions[~duplicate]
+    stats["duplicate_rows"] = int(duplicate.sum())
+
+    columns = {field: values[positions] for field, values in columns.items()}
+    _encode_fixed_point(columns)
+    return columns, stats
+
+
+def write_bhavcopy_columns(columns, batch_size=None, notify=True):
+    """
+    Upsert rows prepared by prepare_bhavcopy_columns.
+
+    Each batch is written with one INSERT ... ON CONFLICT statement and the
+    existing keys are looked up once for all rows so created/updated counts
+    stay exact. If a batch fails it is retried row by row so a single bad
+    row does not sink the rest.
+
+    On PostgreSQL the year partitions are created first and, unless
+    BHAVCOPY_POSTGRES_COPY is off, all rows are loaded with one COPY (see
+    _copy_upsert), reported as a single batch; if that fails the rows are
+    written in batches as above.
+
+    Args:
+        columns: output of prepare_bhavcopy_columns
+        batch_size: rows per INSERT statement (see get_batch_size)
+        notify: send bhavcopy_dates_written once the transaction commits;
+            callers writing many dates may pass False and call
+            notify_dates_written once at the end
+
+    Returns:
+        dict with records_created, records_updated, records_with_errors,
+        a per-batch breakdown under "batches" and the sorted "dates" written
+    """
+    result = {"records_created": 0, "records_updated": 0, "records_with_errors": 0, "batches": [], "dates": []}
+    if not len(columns['DATE1']):
+        return result
+
+    batch_size = get_batch_size(batch_size)
+    security_ids = _resolve_securities(columns)
+
+    # One lookup for every key already stored on the dates being written
+    dates = sorted(set(columns['DATE1']))
+    existing = set(
+        DailyBar.objects.filter(DATE1__in=dates).values_list('security_id', 'DATE1')
+    )
+
+    written_dates = set()
+
+    def count(batch, keys):
+        for key in keys:
+            written_dates.add(key[1])
+            if key in existing:
+                batch["updated"] += 1
+            else:
+                batch["created"] += 1
+                existing.add(key)
+        result["records_created"] += batch["created"]
+        result["records_updated"] += batch["updated"]
+        result["records_with_errors"] += batch["errors"]
+        result["batches"].append(batch)
+
+    starts = range(0, len(columns['DATE1']), batch_size)
+    if connection.vendor == 'postgresql':
+        ensure_year_partitions({dt.year for dt in dates})
+    if use_copy():
+        batch = {"batch": 0, "rows": len(columns['DATE1']), "created": 0, "updated": 0, "errors": 0}
+        try:
+            count(batch, _copy_upsert(columns, security_ids))
+            starts = range(0)
+        except Exception as e:
+            logger.error(f"COPY failed, writing in batches instead: {str(e)}")
+
+    for start in starts:
+        batch_positions = np.arange(start, min(start + batch_size, len(columns['DATE1'])))
+        rows = _build_rows(columns, batch_positions, security_ids)
+        batch = {"batch": len(result["batches"]), "rows": len(rows),
+                 "created": 0, "updated": 0, "errors": 0}
+
+        try:
+            _write_batch(rows)
+            written = rows
+        except Exception as e:
+            logger.error(f"Batch {batch['batch']} failed, retrying row by row: {str(e)}")
+            written = []
+            for i, row in zip(batch_positions, rows):
+                try:
+                    _write_batch([row])
+                    written.append(row)
+                except Exception as row_error:
+                    batch["errors"] += 1
+                    logger.error(f"Error processing row {columns['SYMBOL'][i]} for date {row[1]}: {str(row_error)}")
+
+        count(batch, [row[:2] for row in written])
+
+    dates = result["dates"] = sorted(written_dates)
+    if dates:
+        _update_listing_dates(dates)
+        if notify:
+            transaction.on_commit(lambda: notify_dates_written(dates))
+    return result
+
+
+def bulk_upsert_bhavcopy(df, batch_size=None):
+    """
+    Insert or update bhavcopy rows in batches.
+
+    Replaces the per-row update_or_create loop (see write_bhavcopy_columns).
+    Rows are stored as DailyBar facts: symbols are resolved to Security ids
+    and prices encoded as fixed-point integers before writing.
+
+    Args:
+        df: pandas DataFrame with SYMBOL, SERIES, DATE1 and the numeric columns
+        batch_size: rows per INSERT statement, defaults to
+            settings.BHAVCOPY_UPSERT_BATCH_SIZE or DEFAULT_BATCH_SIZE
+
+    Returns:
+        dict with records_created, records_updated, records_with_errors,
+        total_rows, a per-batch breakdown under "batches" and the time spent
+        validating ("prepare_seconds") and writing ("write_seconds")
+    """
+    started = time.perf_counter()
+    columns, stats = prepare_bhavcopy_columns(df)
+    prepared = time.perf_counter()
+    result = write_bhavcopy_columns(columns, batch_size=batch_size)
+    result["prepare_seconds"] = prepared - started
+    result["write_seconds"] = time.perf_counter() - prepared
+    result.pop("dates")
+    result["total_rows"] = stats["rows"]
+    result["records_with_errors"] += stats["invalid_rows"]
+    # Collapsed duplicates were applied as overwrites of the surviving row
+    result["records_updated"] += stats["duplicate_rows"]
+    return result
+
+
+def notify_dates_written(dates):
+    """Tell listeners (columnar mirror, caches) which dates changed."""
+    for receiver, response in bhavcopy_dates_written.send_robust(sender=Bhavcopy, dates=dates):
+        if isinstance(response, Exception):
+            logger.error(f"Error in bhavcopy_dates_written receiver {receiver}: {str(response)}")
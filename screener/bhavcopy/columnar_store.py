@@ -0,0 +1,257 @@
+from django.conf import settings
+import numpy as np
+import pandas as pd
+import os
+import threading
+import logging
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.fs as pafs
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional, the store is disabled without it
+    pa = None
+
+from bhavcopy.models import Bhavcopy
+from bhavcopy.bulk_upsert import UNIQUE_FIELDS, UPDATE_FIELDS, INTEGER_FIELDS
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = UNIQUE_FIELDS + UPDATE_FIELDS
+DICTIONARY_FIELDS = ['SYMBOL', 'SERIES']
+
+
+def _schema():
+    fields = [
+        pa.field('SYMBOL', pa.dictionary(pa.int32(), pa.string())),
+        pa.field('SERIES', pa.dictionary(pa.int8(), pa.string())),
+        pa.field('DATE1', pa.date32()),
+    ]
+    for name in UPDATE_FIELDS:
+        fields.append(pa.field(name, pa.int64() if name in INTEGER_FIELDS else pa.float64()))
+    return pa.schema(fields)
+
+
+class ColumnarStore:
+    """
+    Parquet mirror of the Bhavcopy table for whole-market analytical scans.
+
+    Rows are partitioned by month, one file per partition:
+        <root>/year=2024/month=03/data.parquet
+
+    SYMBOL and SERIES are dictionary encoded. Reads go through a memory-mapped
+    Arrow dataset so only the requested columns and the partitions overlapping
+    the date range are touched. The mirror is kept in sync from the
+    bhavcopy_dates_written signal; sync_columnar_store rebuilds it from the DB.
+    """
+
+    def __init__(self, root=None):
+        if root is None:
+            root = getattr(settings, 'BHAVCOPY_COLUMNAR_DIR', None)
+        self.root = str(root) if root else None
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return pa is not None and self.root is not None
+
+    def _partition_path(self, year, month):
+        return os.path.join(self.root, f'year={year}', f'month={month:02d}', 'data.parquet')
+
+    def _frame_from_db(self, dates):
+        """Read the committed rows for the given dates as a typed DataFrame."""
+        rows = Bhavcopy.objects.filter(DATE1__in=dates).values_list(*COLUMNS)
+        df = pd.DataFrame.from_records(list(rows), columns=COLUMNS)
+        return df
+
+    def _to_table(self, df):
+        df = df.copy()
+        df['DATE1'] = pd.to_datetime(df['DATE1']).dt.date
+        for name in DICTIONARY_FIELDS:
+            df[name] = df[name].astype(str)
+        for name in UPDATE_FIELDS:
+            df[name] = df[name].astype('int64' if name in INTEGER_FIELDS else 'float64')
+        df = df.sort_values(['DATE1', 'SYMBOL'], kind='stable')
+        table = pa.Table.from_pandas(df[COLUMNS], preserve_index=False)
+        return table.cast(_schema())
+
+    def _write_partition(self, year, month, dates, new_rows):
+        """Replace the given dates inside one month partition."""
+        path = self._partition_path(year, month)
+
+        if os.path.exists(path):
+            existing = pq.read_table(path, memory_map=True)
+            keep = pc.invert(pc.is_in(existing.column('DATE1'), value_set=pa.array(dates, pa.date32())))
+            new_rows = pd.concat([existing.filter(keep).to_pandas(), new_rows], ignore_index=True)
+
+        table = self._to_table(new_rows)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        pq.write_table(table, tmp_path, compression='zstd', use_dictionary=DICTIONARY_FIELDS)
+        os.replace(tmp_path, path)
+
+    def sync_dates(self, dates):
+        """
+        Mirror the committed DB rows for the given dates into the store.
+
+        Args:
+            dates: iterable of datetime.date values that changed
+
+        Returns:
+            int: number of rows written
+        """
+        if not self.enabled:
+            return 0
+
+        dates = sorted(set(pd.to_datetime(list(dates)).date))
+        if not dates:
+            return 0
+
+        df = self._frame_from_db(dates)
+        by_month = {}
+        for d in dates:
+            by_month.setdefault((d.year, d.month), []).append(d)
+
+        with self.lock:
+            for (year, month), month_dates in by_month.items():
+                month_rows = df[df['DATE1'].isin(month_dates)]
+                self._write_partition(year, month, month_dates, month_rows)
+
+        logger.info(f"Columnar store synced {len(df)} rows for {len(dates)} dates")
+        return len(df)
+
+    def _dataset(self):
+        return ds.dataset(
+            self.root,
+            format='parquet',
+            partitioning='hive',
+            filesystem=pafs.LocalFileSystem(use_mmap=True),
+        )
+
+    def read_table(self, columns=None, start=None, end=None, symbols=None, series=None):
+        """
+        Read a slice of the store as an Arrow table.
+
+        Args:
+            columns: list of bhavcopy columns to load, all when omitted
+            start, end: inclusive datetime.date bounds on DATE1
+            symbols: optional list of SYMBOL values
+            series: optional SERIES value or list, e.g. 'EQ'
+
+        Returns:
+            pyarrow.Table with the requested columns
+        """
+        if not self.enabled:
+            raise RuntimeError("Columnar store is disabled (install pyarrow and set BHAVCOPY_COLUMNAR_DIR)")
+        if not os.path.isdir(self.root):
+            return _schema().empty_table().select(columns or COLUMNS)
+
+        dataset = self._dataset()
+        expr = None
+
+        def _and(a, b):
+            return b if a is None else a & b
+
+        # Partition pruning first, then row filters on DATE1
+        if start is not None:
+            expr = _and(expr, (ds.field('year') > start.year) |
+                        ((ds.field('year') == start.year) & (ds.field('month') >= start.month)))
+            expr = _and(expr, ds.field('DATE1') >= pa.scalar(start, pa.date32()))
+        if end is not None:
+            expr = _and(expr, (ds.field('year') < end.year) |
+                        ((ds.field('year') == end.year) & (ds.field('month') <= end.month)))
+            expr = _and(expr, ds.field('DATE1') <= pa.scalar(end, pa.date32()))
+        if symbols is not None:
+            expr = _and(expr, ds.field('SYMBOL').isin(list(symbols)))
+        if series is not None:
+            expr = _and(expr, ds.field('SERIES').isin([series] if isinstance(series, str) else list(series)))
+
+        return dataset.to_table(columns=list(columns or COLUMNS), filter=expr)
+
+    def read_frame(self, columns=None, start=None, end=None, symbols=None, series=None):
+        """Same as read_table but returns a pandas DataFrame."""
+        return self.read_table(columns, start, end, symbols, series).to_pandas()
+
+    def matrices(self, fields, start=None, end=None, symbols=None, series='EQ'):
+        """
+        Load several fields as aligned date x symbol matrices from one scan.
+
+        Built straight from the dictionary codes with NumPy scatter rather than
+        a pandas pivot, and the series filter is applied on dictionary codes
+        instead of strings. When several series are included, a symbol's last
+        series in the file wins, so pass a single series for clean data.
+
+        Returns:
+            tuple: (dates as datetime64[D] array, symbols as object array,
+            dict of field -> float64 matrix with NaN where a symbol has no row)
+        """
+        columns = ['SYMBOL', 'DATE1'] + list(fields) + (['SERIES'] if series is not None else [])
+        table = self.read_table(columns, start, end, symbols)
+        if table.num_rows == 0:
+            return (np.array([], dtype='datetime64[D]'), np.array([], dtype=object),
+                    {field: np.empty((0, 0)) for field in fields})
+
+        table = table.unify_dictionaries()
+        symbol_chunks = table.column('SYMBOL').chunks
+        symbol_names = np.asarray(symbol_chunks[0].dictionary.to_pylist(), dtype=object)
+        symbol_codes = np.concatenate([c.indices.to_numpy(zero_copy_only=False) for c in symbol_chunks])
+        date_values = table.column('DATE1').cast(pa.int32()).to_numpy()  # days since epoch
+        values = {field: table.column(field).to_numpy().astype('float64') for field in fields}
+
+        if series is not None:
+            wanted = [series] if isinstance(series, str) else list(series)
+            series_chunks = table.column('SERIES').chunks
+            wanted_codes = [i for i, name in enumerate(series_chunks[0].dictionary.to_pylist()) if name in wanted]
+            series_codes = np.concatenate([c.indices.to_numpy(zero_copy_only=False) for c in series_chunks])
+            keep = np.isin(series_codes, wanted_codes)
+            symbol_codes, date_values = symbol_codes[keep], date_values[keep]
+            values = {field: column[keep] for field, column in values.items()}
+
+        # Hash-based factorize is O(n); only the uniques need sorting
+        date_codes, dates = pd.factorize(date_values)
+        order = np.argsort(dates)
+        date_codes = np.argsort(order)[date_codes]
+        dates = dates[order]
+
+        used = np.bincount(symbol_codes, minlength=len(symbol_names)) > 0
+        symbol_position = np.cumsum(used) - 1
+        columns = symbol_position[symbol_codes]
+
+        out = {}
+        for field, column in values.items():
+            out[field] = np.full((len(dates), int(used.sum())), np.nan)
+            out[field][date_codes, columns] = column
+        return dates.astype('datetime64[D]'), symbol_names[used], out
+
+    def matrix(self, field='CLOSE_PRICE', start=None, end=None, symbols=None, series='EQ'):
+        """
+        Load one field as a wide date x symbol matrix (see matrices).
+
+        Returns:
+            pandas DataFrame indexed by DATE1 with one column per SYMBOL
+        """
+        dates, symbol_names, values = self.matrices([field], start, end, symbols, series)
+        if not len(dates):
+            return pd.DataFrame(dtype='float64')
+        index = pd.DatetimeIndex(dates, name='DATE1')
+        return pd.DataFrame(values[field], index=index, columns=symbol_names)
+
+
+_default_store = None
+
+
+def get_columnar_store():
+    """Return the process-wide columnar store configured from settings."""
+    global _default_store
+    if _default_store is None:
+        _default_store = ColumnarStore()
+    return _default_store
+
+
+def sync_written_dates(sender, dates, **kwargs):
+    """bhavcopy_dates_written receiver that keeps the Parquet mirror current."""
+    store = get_columnar_store()
+    if store.enabled:
+        store.sync_dates(dates)
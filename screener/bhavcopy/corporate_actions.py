@@ -0,0 +1,332 @@
+from django.conf import settings
+from django.db import transaction
+import numpy as np
+import pandas as pd
+import logging
+from bhavcopy.hot_cache import get_hot_cache
+from bhavcopy.models import CorporateAction, DailyBar, Security
+from bhavcopy.trading_calendar import get_trading_calendar
+
+logger = logging.getLogger(__name__)
+
+# A PREV_CLOSE this far (relative) from the previous session's close is an action
+DEFAULT_TOLERANCE = 0.02
+# How far (relative) an inferred factor may be from the nearest ACTION_FACTORS entry
+DEFAULT_FACTOR_TOLERANCE = 0.01
+
+# Face values (rupees) a split or consolidation moves between
+FACE_VALUES = (1, 2, 5, 10)
+# Largest term of an a:b bonus issue
+MAX_BONUS_TERM = 5
+
+
+def _action_factors():
+    """
+    Price factors of the splits, consolidations and bonus issues an inferred
+    action may have: new/old face value for a split or consolidation, and
+    b/(a+b) for an a:b bonus (a new shares for every b held).
+    """
+    factors = {new / old for old in FACE_VALUES for new in FACE_VALUES if new != old}
+    factors |= {held / (bonus + held) for bonus in range(1, MAX_BONUS_TERM + 1)
+                for held in range(1, MAX_BONUS_TERM + 1)}
+    return np.array(sorted(factors))
+
+
+ACTION_FACTORS = _action_factors()
+
+# Scaled by the factor / divided by it in an adjusted series
+ADJUSTED_PRICE_FIELDS = ['PREV_CLOSE', 'OPEN_PRICE', 'HIGH_PRICE', 'LOW_PRICE',
+                         'LAST_PRICE', 'CLOSE_PRICE', 'AVG_PRICE']
+ADJUSTED_QUANTITY_FIELDS = ['TTL_TRD_QNTY', 'DELIV_QTY']
+
+
+def nearest_action_factors(ratios, tolerance=None):
+    """
+    The ACTION_FACTORS entry closest to each ratio, NaN where none is within
+    `tolerance` (relative, BHAVCOPY_CORPORATE_ACTION_FACTOR_TOLERANCE).
+    """
+    if tolerance is None:
+        tolerance = getattr(settings, 'BHAVCOPY_CORPORATE_ACTION_FACTOR_TOLERANCE', DEFAULT_FACTOR_TOLERANCE)
+    ratios = np.asarray(ratios, dtype='float64')
+    with np.errstate(invalid='ignore'):
+        distance = np.abs(ratios[:, None] / ACTION_FACTORS - 1)
+    nearest = np.argmin(np.nan_to_num(distance, nan=np.inf), axis=1)
+    factors = ACTION_FACTORS[nearest]
+    with np.errstate(invalid='ignore'):
+        return np.where(distance[np.arange(len(ratios)), nearest] <= tolerance, factors, np.nan)
+
+
+def previous_sessions(days, calendar):
+    """The trading day before each of `days` (a datetime64[D] array)."""
+    if not len(days):
+        return days
+    sessions = calendar.trading_days(calendar.previous_trading_day(days.min().astype(object)), days.max())
+    return sessions[np.searchsorted(sessions, days, side='left') - 1]
+
+
+def price_ratios(start=None, end=None, security_ids=None, calendar=None):
+    """
+    PREV_CLOSE of every bar divided by the CLOSE_PRICE of the same security's
+    bar on the previous trading day.
+
+    NSE adjusts PREV_CLOSE on the ex-date of a split or bonus, so the ratio is
+    the adjustment factor there and exactly 1 on ordinary days. Bars are
+    only compared across consecutive sessions of the trading calendar: when
+    the previous session is not stored (not downloaded yet, or the security
+    did not trade) PREV_CLOSE refers to a close we do not have, and no ratio
+    is reported. Rows are read in (security, date) order and compared with
+    the row before them in one vectorized pass.
+
+    Args:
+        start, end: range of bar dates to return ratios for (default: all)
+        security_ids: limit to these securities
+        calendar: TradingCalendar, defaults to get_trading_calendar()
+
+    Returns:
+        tuple of arrays: (security_ids, dates, ratios)
+    """
+    calendar = calendar or get_trading_calendar()
+    bars = DailyBar.objects.all()
+    if start:
+        bars = bars.filter(DATE1__gte=calendar.previous_trading_day(start))
+    if end:
+        bars = bars.filter(DATE1__lte=end)
+    if security_ids is not None:
+        bars = bars.filter(security_id__in=list(security_ids))
+    rows = list(bars.order_by('security_id', 'DATE1').values_list('security_id', 'DATE1', 'PREV_CLOSE', 'CLOSE_PRICE'))
+    if len(rows) < 2:
+        return np.array([], dtype='int64'), np.array([], dtype=object), np.array([], dtype='float64')
+
+    ids, dates, prev_close, close = (np.array(column) for column in zip(*rows))
+    days = dates.astype('datetime64[D]')
+    prev_close = prev_close.astype('float64')
+    close = close.astype('float64')
+    keep = (ids[1:] == ids[:-1]) & (close[:-1] > 0) & (days[:-1] == previous_sessions(days[1:], calendar))
+    if start:
+        keep &= days[1:] >= np.datetime64(start, 'D')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratios = prev_close[1:] / close[:-1]
+    return ids[1:][keep], dates[1:][keep], ratios[keep]
+
+
+def detect_corporate_actions(start=None, end=None, tolerance=None, calendar=None):
+    """
+    Fill in, discover and retract corporate actions from the stored bars.
+
+    Actions loaded without a factor get the price ratio of their ex-date.
+    A discontinuity larger than `tolerance` whose ratio is also near a
+    split or bonus factor (see nearest_action_factors) is stored as an
+    inferred action with that factor. Inferred actions in the range are
+    updated when their bars changed and deleted when no pair of bars on
+    consecutive sessions supports them any more. Cached adjusted series
+    of the affected symbols are dropped.
+
+    Returns:
+        dict with "filled", "created", "updated" and "deleted" counts
+    """
+    if tolerance is None:
+        tolerance = getattr(settings, 'BHAVCOPY_CORPORATE_ACTION_TOLERANCE', DEFAULT_TOLERANCE)
+    ids, dates, ratios = price_ratios(start, end, calendar=calendar)
+    counts = {"filled": 0, "created": 0, "updated": 0, "deleted": 0}
+
+    existing = CorporateAction.objects.all()
+    if start:
+        existing = existing.filter(EX_DATE__gte=start)
+    if end:
+        existing = existing.filter(EX_DATE__lte=end)
+    existing = {(a.security_id, a.EX_DATE): a for a in existing}
+
+    factors = nearest_action_factors(ratios)
+    flagged = (np.abs(ratios - 1) > tolerance) & ~np.isnan(factors)
+    created, changed, supported = [], [], set()
+    for security_id, dt, ratio, factor, action_like in zip(ids.tolist(), dates, ratios.tolist(),
+                                                           factors.tolist(), flagged):
+        action = existing.get((security_id, dt))
+        if action_like:
+            supported.add((security_id, dt))
+        if action is None:
+            if action_like:
+                created.append(CorporateAction(
+                    security_id=security_id, EX_DATE=dt, FACTOR=round(factor, 6),
+                    source=CorporateAction.SOURCE_INFERRED, PURPOSE=f"PREV_CLOSE {ratio:.4f}x previous close",
+                ))
+                counts["created"] += 1
+        elif action.FACTOR is None:
+            action.FACTOR = round(ratio, 6)
+            changed.append(action)
+            counts["filled"] += 1
+        elif action_like and action.source == CorporateAction.SOURCE_INFERRED and action.FACTOR != round(factor, 6):
+            action.FACTOR = round(factor, 6)
+            changed.append(action)
+            counts["updated"] += 1
+
+    stale = [a for key, a in existing.items()
+             if a.source == CorporateAction.SOURCE_INFERRED and key not in supported]
+    counts["deleted"] = len(stale)
+
+    if created or changed or stale:
+        with transaction.atomic():
+            CorporateAction.objects.bulk_create(created)
+            CorporateAction.objects.bulk_update(changed, ['FACTOR'])
+            CorporateAction.objects.filter(pk__in=[a.pk for a in stale]).delete()
+        actions_changed({a.security_id for a in created + changed + stale})
+    return counts
+
+
+def load_action_file(path):
+    """
+    Load corporate actions from a CSV file.
+
+    Accepts the NSE corporate actions export (SYMBOL, SERIES, PURPOSE,
+    EX-DATE such as 14-Mar-2024) or any CSV with "symbol" and "ex_date" plus
+    optional "series", "purpose" and "factor" columns. Actions without a
+    factor get it from the stored bars of their ex-date; the bars themselves
+    are never rewritten.
+
+    Returns:
+        dict with "loaded", "unknown_symbols" and "factors_filled" counts
+    """
+    df = pd.read_csv(path, dtype=str, skipinitialspace=True).fillna('')
+    columns = {c.strip().lower().replace('-', '_').replace(' ', '_'): c for c in df.columns}
+    for required in ('symbol', 'ex_date'):
+        if required not in columns:
+            raise ValueError(f"{path} has no '{required}' column")
+
+    symbols = df[columns['symbol']].str.strip().str.upper()
+    series = df[columns['series']].str.strip().str.upper().replace('', 'EQ') \
+        if 'series' in columns else pd.Series('EQ', index=df.index)
+    ex_dates = pd.to_datetime(df[columns['ex_date']].str.strip(), dayfirst=True, format='mixed').dt.date
+    purposes = df[columns['purpose']].str.strip() if 'purpose' in columns else pd.Series('', index=df.index)
+    factors = pd.to_numeric(df[columns['factor']], errors='coerce') \
+        if 'factor' in columns else pd.Series(np.nan, index=df.index)
+
+    security_ids = dict(((s.SYMBOL, s.SERIES), s.pk) for s in Security.objects.filter(SYMBOL__in=set(symbols)))
+    actions = {}
+    unknown = 0
+    for symbol, serie, ex_date, purpose, factor in zip(symbols, series, ex_dates, purposes, factors):
+        security_id = security_ids.get((symbol, serie))
+        if security_id is None:
+            unknown += 1
+            continue
+        actions[(security_id, ex_date)] = CorporateAction(
+            security_id=security_id, EX_DATE=ex_date, PURPOSE=purpose[:200],
+            FACTOR=None if np.isnan(factor) else float(factor), source=CorporateAction.SOURCE_FILE,
+        )
+
+    with transaction.atomic():
+        CorporateAction.objects.bulk_create(
+            list(actions.values()),
+            update_conflicts=True,
+            unique_fields=['security', 'EX_DATE'],
+            update_fields=['FACTOR', 'PURPOSE', 'source', 'updated_at'],
+        )
+    affected = {security_id for security_id, _ in actions}
+    actions_changed(affected)
+    filled = fill_missing_factors(affected)
+    return {"loaded": len(actions), "unknown_symbols": unknown, "factors_filled": filled}
+
+
+def fill_missing_factors(security_ids=None):
+    """Infer FACTOR for actions stored without one whose ex-date bars are now available."""
+    pending = CorporateAction.objects.filter(FACTOR__isnull=True)
+    if security_ids is not None:
+        pending = pending.filter(security_id__in=list(security_ids))
+    pending = {(a.security_id, a.EX_DATE): a for a in pending}
+    if not pending:
+        return 0
+
+    ids, dates, ratios = price_ratios(security_ids={security_id for security_id, _ in pending})
+    filled = []
+    for security_id, dt, ratio in zip(ids.tolist(), dates, ratios.tolist()):
+        action = pending.get((security_id, dt))
+        if action is not None:
+            action.FACTOR = round(ratio, 6)
+            filled.append(action)
+    if filled:
+        CorporateAction.objects.bulk_update(filled, ['FACTOR'])
+        actions_changed({a.security_id for a in filled})
+    return len(filled)
+
+
+def actions_changed(security_ids):
+    """Drop cached adjusted series of these securities, here and in other processes."""
+    pairs = Security.objects.filter(pk__in=list(security_ids)).values_list('SYMBOL', 'SERIES')
+    get_hot_cache().actions_changed(set(pairs))
+
+
+def cumulative_factors(dates, ex_dates, factors):
+    """
+    Factor applied to each date: the product of the factors of all actions
+    with a later ex-date.
+
+    Args:
+        dates: sorted datetime64[D] array of bar dates
+        ex_dates: sorted datetime64[D] array of action ex-dates
+        factors: float array aligned with ex_dates
+    """
+    # suffix[i] = product of factors[i:], with suffix[len] = 1
+    suffix = np.append(np.cumprod(np.asarray(factors, dtype='float64')[::-1])[::-1], 1.0)
+    return suffix[np.searchsorted(ex_dates, dates, side='right')]
+
+
+def load_actions(symbol, series='EQ'):
+    """Actions of one symbol with a known factor, oldest first, as (EX_DATE, FACTOR, PURPOSE, source) tuples."""
+    return list(CorporateAction.objects.filter(security__SYMBOL=symbol, security__SERIES=series, FACTOR__isnull=False)
+                .order_by('EX_DATE').values_list('EX_DATE', 'FACTOR', 'PURPOSE', 'source'))
+
+
+def adjust_series(columns, actions):
+    """
+    Apply corporate actions to a series from load_symbol_series.
+
+    Returns:
+        a new dict of arrays: prices multiplied and quantities divided by the
+        cumulative factor, which is added as ADJ_FACTOR
+    """
+    ex_dates = np.array([a[0] for a in actions], dtype='datetime64[D]')
+    factor = cumulative_factors(columns['DATE1'], ex_dates, [a[1] for a in actions])
+    adjusted = dict(columns)
+    for field in ADJUSTED_PRICE_FIELDS:
+        adjusted[field] = columns[field] * factor
+    for field in ADJUSTED_QUANTITY_FIELDS:
+        adjusted[field] = columns[field] / factor
+    adjusted['ADJ_FACTOR'] = factor
+    return adjusted
+
+
+def adjusted_series(symbol, series='EQ'):
+    """
+    A symbol's full daily series adjusted for its corporate actions.
+
+    Built lazily on first use from the cached raw series and memoized in the
+    hot cache; new bars or a changed action of the symbol drop it.
+
+    Returns:
+        tuple: (columns, actions) as from adjust_series and load_actions
+    """
+    cache = get_hot_cache()
+
+    def loader():
+        actions = load_actions(symbol, series)
+        return {'columns': adjust_series(cache.symbol_series(symbol, series), actions), 'actions': actions}
+
+    entry = cache.adjusted_series(symbol, series, loader)
+    return entry['columns'], entry['actions']
+
+
+def detect_written_dates(sender, dates, **kwargs):
+    """
+    bhavcopy_dates_written receiver: pick up actions whose ex-date was just stored.
+
+    The session after the written dates is checked as well: a backfilled
+    date can make its bars the previous session of bars already stored,
+    which confirms or retracts what was inferred for them.
+    """
+    if not dates or not getattr(settings, 'BHAVCOPY_CORPORATE_ACTIONS_AUTO', True):
+        return
+    calendar = get_trading_calendar()
+    counts = detect_corporate_actions(min(dates), calendar.next_trading_day(max(dates)), calendar=calendar)
+    counts["filled"] += fill_missing_factors(
+        CorporateAction.objects.filter(FACTOR__isnull=True, EX_DATE__in=dates).values_list('security_id', flat=True))
+    if any(counts.values()):
+        logger.info(f"Corporate actions for {len(dates)} written dates: {counts}")
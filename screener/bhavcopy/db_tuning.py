@@ -0,0 +1,118 @@
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import connections
+from django.db.utils import DatabaseError
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Applied to every new SQLite connection (BHAVCOPY_SQLITE_PRAGMAS)
+DEFAULT_PRAGMAS = {
+    # Readers keep reading the last commit while an ingest transaction is open
+    'journal_mode': 'WAL',
+    # With WAL the file stays consistent; a power failure can lose only the last commits
+    'synchronous': 'NORMAL',
+    # Negative sizes are KiB: 64 MiB of page cache per connection
+    'cache_size': -65536,
+    'mmap_size': 256 * 1024 ** 2,
+    'temp_store': 'MEMORY',
+}
+
+# Layered on top while bulk_ingest() is active (BHAVCOPY_SQLITE_BULK_PRAGMAS)
+DEFAULT_BULK_PRAGMAS = {
+    # No fsyncs at all: an OS crash or power loss mid-import can corrupt the
+    # file, so only for backfills that can be rerun from the raw archive
+    'synchronous': 'OFF',
+    'cache_size': -262144,
+    # Checkpoint every ~40 MiB of WAL instead of every 4 MiB
+    'wal_autocheckpoint': 10000,
+}
+
+# (alias, thread id) pairs inside bulk_ingest(), so a reopened connection stays in the mode
+_bulk_connections = set()
+
+
+def get_pragmas():
+    pragmas = getattr(settings, 'BHAVCOPY_SQLITE_PRAGMAS', None)
+    return DEFAULT_PRAGMAS if pragmas is None else pragmas
+
+
+def get_bulk_pragmas():
+    pragmas = getattr(settings, 'BHAVCOPY_SQLITE_BULK_PRAGMAS', None)
+    return DEFAULT_BULK_PRAGMAS if pragmas is None else pragmas
+
+
+def read_pragmas(connection, names):
+    """Current values of the named pragmas on a SQLite connection."""
+    values = {}
+    with connection.cursor() as cursor:
+        for name in names:
+            cursor.execute(f'PRAGMA {name}')
+            row = cursor.fetchone()
+            values[name] = row[0] if row else None
+    return values
+
+
+def apply_pragmas(connection, pragmas):
+    """
+    Set pragmas on a SQLite connection; other backends are left alone.
+
+    A pragma the database refuses (switching journal_mode while another
+    connection has the file open, say) is logged and skipped.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            try:
+                cursor.execute(f'PRAGMA {name} = {value}')
+            except DatabaseError as e:
+                logger.warning(f"Could not set PRAGMA {name} = {value}: {str(e)}")
+
+
+def configure_connection(sender, connection, **kwargs):
+    """connection_created receiver: tune every new SQLite connection."""
+    apply_pragmas(connection, get_pragmas())
+    if (connection.alias, threading.get_ident()) in _bulk_connections:
+        apply_pragmas(connection, get_bulk_pragmas())
+
+
+@contextmanager
+def bulk_ingest(using='default', enabled=True):
+    """
+    Write-optimized mode for the connection a large import writes through.
+
+    Applies BHAVCOPY_SQLITE_BULK_PRAGMAS to the connection of `using` in
+    this thread, which is the single writer in every import path, including
+    when it is closed and reopened inside the block, and puts the previous
+    values back on the way out. The WAL is then checkpointed and truncated
+    and the query planner statistics refreshed. Other connections keep
+    their normal settings throughout.
+
+    Args:
+        using: database alias
+        enabled: False makes this a no-op, for commands where the mode is
+            an option
+    """
+    connection = connections[using]
+    if not enabled or connection.vendor != 'sqlite':
+        yield
+        return
+
+    pragmas = get_bulk_pragmas()
+    key = (using, threading.get_ident())
+    connection.ensure_connection()
+    previous = read_pragmas(connection, pragmas)
+    _bulk_connections.add(key)
+    apply_pragmas(connection, pragmas)
+    logger.info(f"Bulk ingest mode on for '{using}': {pragmas}")
+    try:
+        yield
+    finally:
+        _bulk_connections.discard(key)
+        apply_pragmas(connection, previous)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            cursor.execute('PRAGMA optimize')
+        logger.info(f"Bulk ingest mode off for '{using}'")
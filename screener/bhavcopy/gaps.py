@@ -0,0 +1,88 @@
+from django.conf import settings
+from django.db.models import Count, Max
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from bhavcopy.models import DailyBar
+from bhavcopy.trading_calendar import EXCHANGE_TIMEZONE, get_trading_calendar
+
+DEFAULT_PARTIAL_RATIO = 0.5
+# Calendar days checked when no start date is given
+DEFAULT_LOOKBACK_DAYS = 30
+# Trading days on each side used for the reference row count of a date
+PARTIAL_WINDOW = 10
+# NSE publishes the day's bhavcopy in the evening, India time
+DEFAULT_PUBLISH_HOUR = 18
+
+
+def last_published_date(now=None):
+    """Latest date whose bhavcopy should be out: today after BHAVCOPY_PUBLISH_HOUR, else yesterday."""
+    now = (now or datetime.now(EXCHANGE_TIMEZONE)).astimezone(EXCHANGE_TIMEZONE)
+    publish_hour = getattr(settings, 'BHAVCOPY_PUBLISH_HOUR', DEFAULT_PUBLISH_HOUR)
+    today = now.date()
+    return today if now.hour >= publish_hour else today - timedelta(days=1)
+
+
+def _row_counts(first, end):
+    """Stored rows per date from `first` to `end`, in one grouped query."""
+    counts = DailyBar.objects.filter(DATE1__gte=first, DATE1__lte=end)
+    return dict(counts.values('DATE1').annotate(rows=Count('id')).order_by().values_list('DATE1', 'rows'))
+
+
+def find_gaps(start=None, end=None, partial_ratio=None, calendar=None):
+    """
+    Compare stored dates against the trading calendar.
+
+    Row counts per date come from a single grouped query over the
+    (DATE1, security) index, bounded to the checked range plus
+    PARTIAL_WINDOW sessions before it. A date is partial when it has fewer
+    than `partial_ratio` times the median row count of the surrounding
+    2 * PARTIAL_WINDOW trading days, so the reference follows the growing
+    number of listed securities over the years.
+
+    Without a start only the last BHAVCOPY_CATCHUP_LOOKBACK_DAYS calendar
+    days are checked, from the first date stored in them, so a frequent
+    catch-up never scans the whole history; pass a start for that. When
+    nothing is stored in that window (ingest has been failing for longer,
+    or the database is empty) the check starts at the latest stored date,
+    or covers the whole window when there is none.
+
+    Args:
+        start: first date to check
+        end: last date to check, defaults to last_published_date()
+        partial_ratio: BHAVCOPY_PARTIAL_RATIO by default
+        calendar: TradingCalendar, defaults to get_trading_calendar()
+
+    Returns:
+        dict with "missing" and "partial" date lists, "checked" (number of
+        trading days in range), "start" and "end"
+    """
+    if partial_ratio is None:
+        partial_ratio = getattr(settings, 'BHAVCOPY_PARTIAL_RATIO', DEFAULT_PARTIAL_RATIO)
+    calendar = calendar or get_trading_calendar()
+    end = end or last_published_date()
+    since = start or end - timedelta(days=getattr(settings, 'BHAVCOPY_CATCHUP_LOOKBACK_DAYS', DEFAULT_LOOKBACK_DAYS))
+
+    counts = _row_counts(calendar.offset(since, -PARTIAL_WINDOW), end)
+
+    if not start:
+        stored = [d for d in counts if d >= since]
+        if stored:
+            start = min(stored)
+        else:
+            latest = DailyBar.objects.filter(DATE1__lt=since).aggregate(latest=Max('DATE1'))['latest']
+            start = latest or since
+            if latest:
+                counts = _row_counts(calendar.offset(latest, -PARTIAL_WINDOW), end)
+    result = {"start": start, "end": end, "checked": 0, "missing": [], "partial": []}
+
+    expected = calendar.trading_dates(start, end)
+    result["checked"] = len(expected)
+    result["missing"] = [d for d in expected if d not in counts]
+
+    stored = pd.Series(counts, dtype='int64').sort_index()
+    if len(stored):
+        reference = stored.rolling(2 * PARTIAL_WINDOW + 1, center=True, min_periods=1).median()
+        partial = stored.to_numpy() < reference.to_numpy() * partial_ratio
+        result["partial"] = [d for d in np.asarray(stored.index)[partial] if start <= d <= end]
+    return result
@@ -0,0 +1,384 @@
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Max
+import numpy as np
+import sys
+import threading
+import time
+import logging
+from bhavcopy.bulk_upsert import UPDATE_FIELDS
+from bhavcopy.models import CorporateAction, DailyBar, IngestEvent, FIXED_POINT_FIELDS, FIXED_POINT_SCALE
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 256 * 1024 ** 2
+DEFAULT_VERSION_SECONDS = 5.0
+
+# Entry kinds; keys are tuples starting with the kind
+CROSS_SECTION = 'cross_section'  # (CROSS_SECTION, date, series, ...)
+SERIES = 'series'  # (SERIES, symbol, series)
+ADJUSTED = 'adjusted'  # (ADJUSTED, symbol, series)
+OHLC = 'ohlc'  # (OHLC, symbol, series, ...)
+
+# Keys in the shared Django cache used to keep workers coherent
+GENERATION_KEY = 'bhavcopy:hot_cache:generation'
+CHANGES_KEY = 'bhavcopy:hot_cache:changes:{generation}'
+SHARED_TIMEOUT = 24 * 60 * 60
+
+# The ingest event log is re-read this many ids back, so an event whose id was
+# taken before a higher one but committed after it is still applied
+EVENT_RESCAN_IDS = 100
+
+
+def _nbytes(value):
+    """Approximate memory held by a dict of arrays (object arrays include their strings)."""
+    if isinstance(value, dict):
+        return sum(_nbytes(v) for v in value.values())
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            return value.nbytes + sum(sys.getsizeof(v) for v in value)
+        return value.nbytes
+    return sys.getsizeof(value)
+
+
+def load_symbol_series(symbol, series='EQ'):
+    """
+    Every stored day for one symbol as column arrays.
+
+    Returns:
+        dict with DATE1 (datetime64[D]) and the UPDATE_FIELDS as float arrays,
+        prices decoded from fixed point, oldest first
+    """
+    rows = list(DailyBar.objects.filter(security__SYMBOL=symbol, security__SERIES=series)
+                .order_by('DATE1').values_list('DATE1', *UPDATE_FIELDS))
+    columns = {'DATE1': np.array([r[0] for r in rows], dtype='datetime64[D]')}
+    for i, field in enumerate(UPDATE_FIELDS, start=1):
+        values = np.array([r[i] for r in rows], dtype='float64')
+        columns[field] = values / FIXED_POINT_SCALE if field in FIXED_POINT_FIELDS else values
+    return columns
+
+
+class HotCache:
+    """
+    Process-local read-through cache of recent market data as NumPy arrays.
+
+    Holds date cross-sections, per-symbol series and their corporate-action
+    adjusted copies, evicting the least recently used entries once their
+    arrays exceed `max_bytes`. Writes are applied from the
+    bhavcopy_dates_written signal: cross-sections of the written dates are
+    dropped, cached symbol series get the new rows patched in and adjusted
+    series of those symbols are dropped, so a daily ingest does not flush the
+    whole cache. A changed corporate action drops only that symbol's
+    adjusted series. Resampled OHLC candles are dropped by any write.
+
+    Writes made by other processes, such as run_download_worker, are found
+    through the IngestEvent log: whenever data_version() is re-read (at
+    most every `version_seconds`, and before serving a read) the dates of
+    events not applied yet are applied the same way, and a changed
+    corporate action drops every adjusted series and candle.
+
+    With a shared Django cache alias configured, each change also bumps a
+    generation counter there together with its dates or symbols, and every
+    process replays changes it has not seen before serving a read.
+    """
+
+    def __init__(self, max_bytes=None, shared_alias=None, version_seconds=None):
+        if max_bytes is None:
+            max_bytes = getattr(settings, 'BHAVCOPY_HOT_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)
+        if shared_alias is None:
+            shared_alias = getattr(settings, 'BHAVCOPY_HOT_CACHE_SHARED', None)
+        if version_seconds is None:
+            version_seconds = getattr(settings, 'BHAVCOPY_HOT_CACHE_VERSION_SECONDS', DEFAULT_VERSION_SECONDS)
+        self.max_bytes = int(max_bytes)
+        self.version_seconds = float(version_seconds)
+        self.version = None
+        self.version_expires = 0.0
+        # Highest IngestEvent id and the recent ids already applied; None before the first look
+        self.event_id = None
+        self.applied_events = set()
+        self.action_version = None
+        self.actions_applied = False
+        self.shared = caches[shared_alias] if shared_alias else None
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.generation = self._shared_generation()
+
+    def _shared_generation(self):
+        if self.shared is None:
+            return None
+        return self.shared.get(GENERATION_KEY, 0)
+
+    def _sync_shared(self):
+        """Apply writes other processes announced since our last look."""
+        current = self._shared_generation()
+        if current is None or current == self.generation:
+            return
+        seen = self.generation or 0
+        dates, symbols = set(), set()
+        for generation in range(seen + 1, current + 1):
+            changes = self.shared.get(CHANGES_KEY.format(generation=generation))
+            if changes is None:
+                # The log expired or we fell too far behind: start over
+                logger.info("Hot cache lost track of shared writes, clearing it")
+                self.clear()
+                dates, symbols = set(), set()
+                break
+            dates.update(np.datetime64(d, 'D').astype(object) for d in changes['dates'])
+            symbols.update(tuple(pair) for pair in changes['symbols'])
+        if dates:
+            self._apply_dates(sorted(dates))
+        if symbols:
+            self._drop_adjusted(symbols)
+        self.generation = current
+
+    def _put(self, key, value):
+        size = _nbytes(value)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= self.sizes[key]
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            self.sizes[key] = size
+            self.bytes += size
+            while self.bytes > self.max_bytes and self.entries:
+                old_key, _ = self.entries.popitem(last=False)
+                self.bytes -= self.sizes.pop(old_key)
+                self.evictions += 1
+
+    def _drop(self, key):
+        self.entries.pop(key, None)
+        self.bytes -= self.sizes.pop(key, 0)
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for `key`, calling loader() on a miss."""
+        self.data_version()
+        if self.shared is not None:
+            self._sync_shared()
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+        value = loader()
+        self._put(key, value)
+        return value
+
+    def cross_section(self, dt, series, loader, version=None):
+        """
+        A date's cross-section. `version` distinguishes copies built from
+        different derived data (e.g. indicator state); older versions of the
+        same date and series are dropped when a new one is stored.
+        """
+        key = (CROSS_SECTION, dt, series, version)
+        with self.lock:
+            for stale in [k for k in self.entries if k[:3] == key[:3] and k != key]:
+                self._drop(stale)
+        return self.get_or_load(key, loader)
+
+    def symbol_series(self, symbol, series='EQ'):
+        """A symbol's full daily series (see load_symbol_series)."""
+        return self.get_or_load((SERIES, symbol, series), lambda: load_symbol_series(symbol, series))
+
+    def adjusted_series(self, symbol, series, loader):
+        """A symbol's corporate-action adjusted series, built by loader() on a miss."""
+        return self.get_or_load((ADJUSTED, symbol, series), loader)
+
+    def ohlc(self, key, loader):
+        """Resampled candles (see bhavcopy.ohlc) for a key starting with (symbol, series)."""
+        return self.get_or_load((OHLC,) + tuple(key), loader)
+
+    def _sync_events(self):
+        """
+        Apply the dates of ingest events this cache has not applied yet,
+        whichever process recorded them.
+
+        Returns:
+            int: the highest event id, 0 for an empty log
+        """
+        with self.lock:
+            last_id = self.event_id
+        if last_id is None:
+            # Nothing cached yet predates the log as it is now
+            recent = list(IngestEvent.objects.order_by('-id').values_list('id', flat=True)[:EVENT_RESCAN_IDS])
+            with self.lock:
+                self.event_id = max(recent, default=0)
+                self.applied_events = set(recent)
+                return self.event_id
+
+        events = list(IngestEvent.objects.filter(id__gt=last_id - EVENT_RESCAN_IDS).values_list('id', 'DATE1'))
+        with self.lock:
+            new = [(pk, dt) for pk, dt in events if pk not in self.applied_events]
+        if new:
+            self._apply_dates(sorted({dt for _, dt in new}))
+        with self.lock:
+            latest = max([self.event_id] + [pk for pk, _ in events])
+            self.applied_events = {pk for pk in self.applied_events | {pk for pk, _ in new}
+                                   if pk > latest - EVENT_RESCAN_IDS}
+            self.event_id = latest
+        return latest
+
+    def data_version(self):
+        """
+        Marker of the stored data for HTTP validators: the latest ingest event
+        and corporate action change.
+
+        Re-read from the database at most every `version_seconds`, so
+        requests in between can be answered without a query; a new ingest
+        event or action recorded by this process expires it at once. Each
+        re-read first applies what other processes wrote (see HotCache).
+        """
+        now = time.monotonic()
+        with self.lock:
+            if self.version is not None and now < self.version_expires:
+                return self.version
+        event = self._sync_events()
+        action = CorporateAction.objects.aggregate(latest=Max('updated_at'))['latest']
+        action = action.timestamp() if action else 0
+        with self.lock:
+            # Our own action changes already dropped their symbols' entries
+            if self.action_version is not None and action != self.action_version and not self.actions_applied:
+                for key in [k for k in self.entries if k[0] in (ADJUSTED, OHLC)]:
+                    self._drop(key)
+                self.invalidations += 1
+            self.action_version = action
+            self.actions_applied = False
+            self.version = f"{event}-{action}"
+            self.version_expires = now + self.version_seconds
+            return self.version
+
+    def expire_version(self):
+        with self.lock:
+            self.version = None
+
+    def _drop_adjusted(self, symbols):
+        with self.lock:
+            for key in [k for k in self.entries if k[0] in (ADJUSTED, OHLC) and (k[1], k[2]) in symbols]:
+                self._drop(key)
+            self.invalidations += 1
+            self.version = None
+            self.actions_applied = True
+
+    def _apply_dates(self, dates):
+        """Drop cross-sections of `dates` and patch their rows into cached series."""
+        dates = set(dates)
+        with self.lock:
+            for key in [k for k in self.entries if (k[0] == CROSS_SECTION and k[1] in dates) or k[0] == OHLC]:
+                self._drop(key)
+            cached_series = [k for k in self.entries if k[0] in (SERIES, ADJUSTED)]
+            self.invalidations += 1
+        if not cached_series:
+            return
+
+        wanted = {(k[1], k[2]) for k in cached_series}
+        rows = DailyBar.objects.filter(DATE1__in=dates).values_list(
+            'security__SYMBOL', 'security__SERIES', 'DATE1', *UPDATE_FIELDS)
+        updates = {}
+        for row in rows.iterator():
+            if (row[0], row[1]) in wanted:
+                updates.setdefault((row[0], row[1]), []).append(row[2:])
+
+        with self.lock:
+            for symbol, series in updates:
+                self._drop((ADJUSTED, symbol, series))
+            for (symbol, series), new_rows in updates.items():
+                key = (SERIES, symbol, series)
+                if key not in self.entries:
+                    continue
+                # Copy on write: readers may still hold the old arrays
+                columns = {field: values.copy() for field, values in self.entries[key].items()}
+                for row in new_rows:
+                    day = np.datetime64(row[0], 'D')
+                    position = int(np.searchsorted(columns['DATE1'], day))
+                    exists = position < len(columns['DATE1']) and columns['DATE1'][position] == day
+                    values = {'DATE1': day}
+                    for field, value in zip(UPDATE_FIELDS, row[1:]):
+                        values[field] = value / FIXED_POINT_SCALE if field in FIXED_POINT_FIELDS else value
+                    for field, value in values.items():
+                        if exists:
+                            columns[field][position] = value
+                        else:
+                            columns[field] = np.insert(columns[field], position, value)
+                size = _nbytes(columns)
+                self.entries[key] = columns
+                self.bytes += size - self.sizes[key]
+                self.sizes[key] = size
+
+    def dates_written(self, dates):
+        """Apply a write locally and announce it to other processes."""
+        self._apply_dates(dates)
+        self._announce(dates=[d.isoformat() for d in dates])
+
+    def actions_changed(self, symbols):
+        """Drop adjusted series of (symbol, series) pairs whose corporate actions changed."""
+        symbols = set(symbols)
+        self._drop_adjusted(symbols)
+        self._announce(symbols=sorted(symbols))
+
+    def _announce(self, dates=(), symbols=()):
+        if self.shared is None:
+            return
+        try:
+            generation = self.shared.incr(GENERATION_KEY)
+        except ValueError:
+            self.shared.add(GENERATION_KEY, 0, timeout=None)
+            generation = self.shared.incr(GENERATION_KEY)
+        self.shared.set(CHANGES_KEY.format(generation=generation),
+                        {'dates': list(dates), 'symbols': [list(pair) for pair in symbols]}, timeout=SHARED_TIMEOUT)
+        # Our own change is already applied
+        if self.generation == generation - 1:
+            self.generation = generation
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.sizes.clear()
+            self.bytes = 0
+            self.invalidations += 1
+            self.version = None
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "cross_sections": sum(1 for k in self.entries if k[0] == CROSS_SECTION),
+                "series": sum(1 for k in self.entries if k[0] == SERIES),
+                "adjusted_series": sum(1 for k in self.entries if k[0] == ADJUSTED),
+                "ohlc": sum(1 for k in self.entries if k[0] == OHLC),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "shared": self.shared is not None,
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_hot_cache():
+    """Return the process-wide HotCache configured from settings."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = HotCache()
+        return _default_cache
+
+
+def apply_written_dates(sender, dates, **kwargs):
+    """bhavcopy_dates_written receiver that keeps the hot cache current."""
+    get_hot_cache().dates_written(dates)
@@ -0,0 +1,400 @@
+from django.conf import settings
+from django.db import transaction
+from datetime import timedelta
+import numpy as np
+import io
+import logging
+from bhavcopy.bulk_upsert import get_batch_size
+from bhavcopy.models import DailyBar, DailyIndicator, IndicatorState, Security, FIXED_POINT_SCALE
+from bhavcopy.trading_calendar import get_trading_calendar
+
+logger = logging.getLogger(__name__)
+
+# DailyIndicator column -> (kernel, window in trading days)
+INDICATORS = {
+    'SMA_20': ('sma', 20),
+    'SMA_50': ('sma', 50),
+    'SMA_200': ('sma', 200),
+    'EMA_12': ('ema', 12),
+    'EMA_26': ('ema', 26),
+    'RSI_14': ('rsi', 14),
+    'ATR_14': ('atr', 14),
+    'HIGH_52W': ('rolling_high', 252),
+    'LOW_52W': ('rolling_low', 252),
+}
+
+# Kernels that need the last `window` rows rather than a recursive state
+WINDOW_KERNELS = ('sma', 'rolling_high', 'rolling_low')
+
+# Trading days computed per pass when catching up or rebuilding
+DEFAULT_CHUNK_DAYS = 250
+
+
+def enabled_indicators():
+    """Indicator names from BHAVCOPY_INDICATORS (all of INDICATORS by default), in column order."""
+    names = getattr(settings, 'BHAVCOPY_INDICATORS', None) or list(INDICATORS)
+    unknown = sorted(set(names) - set(INDICATORS))
+    if unknown:
+        raise ValueError(f"Unknown indicators: {', '.join(unknown)}")
+    return [name for name in INDICATORS if name in names]
+
+
+def buffer_length(names):
+    """Rows of price history the window kernels need (at least one, for the previous close)."""
+    return max([INDICATORS[name][1] for name in names if INDICATORS[name][0] in WINDOW_KERNELS] + [1])
+
+
+# Kernels. Every input is a (dates x securities) float matrix with NaN for
+# "no data"; each operation is vectorized across all securities at once and
+# only the recursive smoothers loop, over the date axis.
+
+def forward_fill(values, seed):
+    """Carry each column's last value over NaN rows, starting from the `seed` row."""
+    stacked = np.vstack([seed[np.newaxis, :], values])
+    rows = np.where(np.isnan(stacked), 0, np.arange(len(stacked))[:, np.newaxis])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return np.take_along_axis(stacked, rows, axis=0)[1:]
+
+
+def rolling_mean(values, window):
+    """Mean of the last `window` rows from prefix sums; the first window - 1 rows are partial."""
+    sums = np.cumsum(np.nan_to_num(values), axis=0)
+    sums[window:] -= sums[:-window].copy()
+    return sums / window
+
+
+def rolling_extreme(values, window, ufunc=np.maximum):
+    """
+    Rolling max (or min with ufunc=np.minimum) over the last `window` rows.
+
+    Doubles the covered span with log2(window) shifted ufunc passes, then
+    combines two overlapping spans, so the cost does not grow with the window.
+    Early rows cover whatever history exists.
+    """
+    fill = -np.inf if ufunc is np.maximum else np.inf
+    spans = np.where(np.isnan(values), fill, values)
+    span = 1
+    while span * 2 <= window:
+        spans[span:] = ufunc(spans[span:], spans[:-span])
+        span *= 2
+    rest = window - span
+    result = spans.copy()
+    if rest:
+        result[rest:] = ufunc(spans[rest:], spans[:-rest])
+    result[np.isinf(result)] = np.nan
+    return result
+
+
+def smooth(values, alpha, initial):
+    """
+    Exponential smoothing down the date axis, continuing from `initial`.
+
+    A column starts at its first value; NaN rows leave the state unchanged.
+
+    Returns:
+        tuple: (smoothed matrix, state after the last row)
+    """
+    out = np.empty_like(values)
+    current = initial.copy()
+    for i, row in enumerate(values):
+        updated = current + alpha * (row - current)
+        current = np.where(np.isnan(current), row, np.where(np.isnan(row), current, updated))
+        out[i] = current
+    return out, current
+
+
+def ema(close, span, initial):
+    return smooth(close, 2.0 / (span + 1), initial)
+
+
+def rsi(close, previous_close, period, initial_gain, initial_loss):
+    """
+    Wilder's RSI from closes and the close before the first row.
+
+    Returns:
+        tuple: (RSI matrix, average gain state, average loss state)
+    """
+    change = close - np.vstack([previous_close[np.newaxis, :], close[:-1]])
+    gain = np.where(np.isnan(change), np.nan, np.clip(change, 0, None))
+    loss = np.where(np.isnan(change), np.nan, np.clip(-change, 0, None))
+    average_gain, gain_state = smooth(gain, 1.0 / period, initial_gain)
+    average_loss, loss_state = smooth(loss, 1.0 / period, initial_loss)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = 100 - 100 / (1 + average_gain / average_loss)
+    values = np.where(average_loss == 0, np.where(average_gain == 0, 50.0, 100.0), values)
+    return values, gain_state, loss_state
+
+
+def atr(high, low, close, previous_close, period, initial):
+    """Wilder's average true range. Returns (ATR matrix, state)."""
+    previous = np.vstack([previous_close[np.newaxis, :], close[:-1]])
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - previous), np.abs(low - previous)))
+    return smooth(true_range, 1.0 / period, initial)
+
+
+def _state_keys(name):
+    kernel = INDICATORS[name][0]
+    if kernel == 'rsi':
+        return [f'{name}_gain', f'{name}_loss']
+    if kernel in ('ema', 'atr'):
+        return [name]
+    return []
+
+
+def empty_state(names, security_ids):
+    """Rolling state for securities with no history."""
+    n = len(security_ids)
+    state = {
+        'indicators': np.array(names),
+        'security_ids': np.asarray(security_ids, dtype='int64'),
+        'observations': np.zeros(n, dtype='int64'),
+        'close': np.empty((0, n)),
+        'high': np.empty((0, n)),
+        'low': np.empty((0, n)),
+    }
+    for name in names:
+        for key in _state_keys(name):
+            state[key] = np.full(n, np.nan)
+    return state
+
+
+def widen_state(state, security_ids):
+    """Add columns for securities listed since the state was saved."""
+    security_ids = np.union1d(state['security_ids'], security_ids)
+    if len(security_ids) == len(state['security_ids']):
+        return state
+    names = [str(name) for name in state['indicators']]
+    widened = empty_state(names, security_ids)
+    positions = np.searchsorted(security_ids, state['security_ids'])
+    for key in ('close', 'high', 'low'):
+        widened[key] = np.full((len(state[key]), len(security_ids)), np.nan)
+    for key, values in state.items():
+        if key not in ('indicators', 'security_ids'):
+            widened[key][..., positions] = values
+    return widened
+
+
+def compute_step(state, close, high, low):
+    """
+    Compute the indicators for new rows from the carried state.
+
+    The state holds, per security, the last buffer_length() rows of
+    forward-filled prices, the number of days since its first trade and the
+    recursive EMA/RSI/ATR values, so the cost depends on the new rows only,
+    never on the length of the history.
+
+    Days a security did not trade repeat its last close (as high and low
+    too), so windows are counted in exchange trading days. An indicator is
+    NaN until the security has traded for its full window.
+
+    Args:
+        state: dict from empty_state(), advanced in place
+        close, high, low: (new dates x securities) price matrices, NaN where
+            the security did not trade, columns in state['security_ids'] order
+
+    Returns:
+        dict of indicator name -> (new dates x securities) matrix
+    """
+    names = [str(name) for name in state['indicators']]
+    history = len(state['close'])
+    previous_close = state['close'][-1] if history else np.full(close.shape[1], np.nan)
+
+    close = forward_fill(close, previous_close)
+    high = np.where(np.isnan(high), close, high)
+    low = np.where(np.isnan(low), close, low)
+    observations = state['observations'] + np.cumsum(~np.isnan(close), axis=0)
+    buffered = {key: np.vstack([state[key], values]) for key, values in
+                (('close', close), ('high', high), ('low', low))}
+
+    values = {}
+    for name in names:
+        kernel, window = INDICATORS[name]
+        minimum = window
+        if kernel == 'sma':
+            result = rolling_mean(buffered['close'], window)[history:]
+        elif kernel == 'rolling_high':
+            result = rolling_extreme(buffered['high'], window, np.maximum)[history:]
+            minimum = 1
+        elif kernel == 'rolling_low':
+            result = rolling_extreme(buffered['low'], window, np.minimum)[history:]
+            minimum = 1
+        elif kernel == 'ema':
+            result, state[name] = ema(close, window, state[name])
+        elif kernel == 'rsi':
+            result, state[f'{name}_gain'], state[f'{name}_loss'] = rsi(
+                close, previous_close, window, state[f'{name}_gain'], state[f'{name}_loss'])
+            minimum = window + 1
+        elif kernel == 'atr':
+            result, state[name] = atr(high, low, close, previous_close, window, state[name])
+        values[name] = np.where(observations >= minimum, result, np.nan)
+
+    keep = buffer_length(names)
+    for key, matrix in buffered.items():
+        state[key] = matrix[-keep:]
+    state['observations'] = observations[-1]
+    return values
+
+
+def load_prices(start, end, security_ids):
+    """
+    Read close/high/low for a date range into (dates x securities) matrices.
+
+    Returns:
+        tuple: (dates, close, high, low) with NaN where a security has no row
+    """
+    rows = list(DailyBar.objects.filter(DATE1__range=(start, end))
+                .values_list('DATE1', 'security_id', 'CLOSE_PRICE', 'HIGH_PRICE', 'LOW_PRICE'))
+    dates = sorted({row[0] for row in rows})
+    shape = (len(dates), len(security_ids))
+    matrices = [np.full(shape, np.nan) for _ in range(3)]
+    if not rows:
+        return dates, *matrices
+
+    date_index = {d: i for i, d in enumerate(dates)}
+    row_dates, ids, *prices = zip(*rows)
+    positions = np.fromiter((date_index[d] for d in row_dates), dtype='int64', count=len(rows))
+    columns = np.searchsorted(security_ids, np.array(ids, dtype='int64'))
+    for matrix, field in zip(matrices, prices):
+        matrix[positions, columns] = np.array(field, dtype='float64') / FIXED_POINT_SCALE
+    return dates, *matrices
+
+
+def write_indicators(dates, security_ids, traded, values, batch_size=None):
+    """Upsert DailyIndicator rows for every (date, security) that traded."""
+    rows, columns = np.nonzero(traded)
+    fields = {}
+    for name in INDICATORS:
+        if name in values:
+            extracted = values[name][rows, columns]
+            field = extracted.astype(object)
+            field[np.isnan(extracted)] = None
+        else:
+            field = np.full(len(rows), None, dtype=object)
+        fields[name] = field
+
+    ids = security_ids[columns]
+    objects = [
+        DailyIndicator(security_id=int(ids[i]), DATE1=dates[rows[i]],
+                       **{name: fields[name][i] for name in INDICATORS})
+        for i in range(len(rows))
+    ]
+    DailyIndicator.objects.bulk_create(
+        objects,
+        batch_size=get_batch_size(batch_size),
+        update_conflicts=True,
+        unique_fields=['security', 'DATE1'],
+        update_fields=list(INDICATORS),
+    )
+    return len(objects)
+
+
+def load_state(names):
+    """
+    Return (state, as_of) from IndicatorState, or (None, None) when there is
+    none or it was built for a different indicator set.
+    """
+    row = IndicatorState.objects.order_by('-pk').first()
+    if row is None:
+        return None, None
+    with np.load(io.BytesIO(bytes(row.payload))) as payload:
+        state = {key: payload[key] for key in payload.files}
+    if [str(name) for name in state['indicators']] != list(names):
+        logger.warning("Indicator state was built for a different BHAVCOPY_INDICATORS, a rebuild is needed")
+        return None, None
+    return state, row.as_of
+
+
+def save_state(state, as_of):
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **state)
+    IndicatorState.objects.exclude(pk=1).delete()
+    IndicatorState.objects.update_or_create(pk=1, defaults={"as_of": as_of, "payload": buffer.getvalue()})
+
+
+def _contiguous(pending, as_of, calendar):
+    """Cut `pending` at the first trading day after `as_of` that is not stored yet."""
+    if not pending or as_of is None:
+        return pending
+    expected = calendar.trading_dates(as_of + timedelta(days=1), pending[-1])
+    stored = set(pending)
+    for day in expected:
+        if day not in stored:
+            return [d for d in pending if d < day]
+    return pending
+
+
+def update_indicators(rebuild=False, end=None, chunk_days=None, contiguous=False, batch_size=None):
+    """
+    Compute indicators for every stored date after the saved state.
+
+    Runs compute_step over the new dates `chunk_days` at a time, so a daily
+    update touches one day of bars and a rebuild streams the history with
+    bounded memory. Each chunk's rows and the advanced state are committed
+    together.
+
+    Args:
+        rebuild: discard the state and recompute every stored date
+        end: last date to compute, defaults to the latest stored date
+        chunk_days: dates per pass, defaults to DEFAULT_CHUNK_DAYS
+        contiguous: stop before the first trading day (per the trading
+            calendar) that has no bars yet, so out-of-order downloads never
+            advance the state past a hole
+        batch_size: rows per INSERT statement
+
+    Returns:
+        dict with "dates" computed, "rows" written, "start", "end" and
+        "rebuilt"
+    """
+    names = enabled_indicators()
+    state, as_of = (None, None) if rebuild else load_state(names)
+    rebuilt = as_of is None
+    chunk_days = int(chunk_days or DEFAULT_CHUNK_DAYS)
+
+    pending = DailyBar.objects.values_list('DATE1', flat=True).distinct().order_by('DATE1')
+    if as_of is not None:
+        pending = pending.filter(DATE1__gt=as_of)
+    if end is not None:
+        pending = pending.filter(DATE1__lte=end)
+    pending = list(pending)
+    if contiguous:
+        pending = _contiguous(pending, as_of, get_trading_calendar())
+
+    result = {"dates": len(pending), "rows": 0, "rebuilt": rebuilt,
+              "start": pending[0] if pending else None, "end": pending[-1] if pending else None}
+    if rebuilt:
+        DailyIndicator.objects.all().delete()
+    if not pending:
+        return result
+
+    security_ids = np.array(sorted(Security.objects.values_list('id', flat=True)), dtype='int64')
+    state = widen_state(state, security_ids) if state is not None else empty_state(names, security_ids)
+    security_ids = state['security_ids']
+
+    for start in range(0, len(pending), chunk_days):
+        chunk = pending[start:start + chunk_days]
+        dates, close, high, low = load_prices(chunk[0], chunk[-1], security_ids)
+        traded = ~np.isnan(close)
+        values = compute_step(state, close, high, low)
+        with transaction.atomic():
+            result["rows"] += write_indicators(dates, security_ids, traded, values, batch_size)
+            save_state(state, dates[-1])
+        logger.info(f"Indicators computed for {dates[0]} to {dates[-1]}")
+    return result
+
+
+def update_written_dates(sender, dates, **kwargs):
+    """
+    bhavcopy_dates_written receiver that extends the indicators by new days.
+
+    Only runs once compute_indicators has built a state. Dates at or before
+    the state are not recomputed (that needs a rebuild); newer ones are
+    computed as soon as every trading day up to them is stored.
+    """
+    if not getattr(settings, 'BHAVCOPY_INDICATORS_AUTO', True):
+        return
+    as_of = IndicatorState.objects.order_by('-pk').values_list('as_of', flat=True).first()
+    if as_of is None:
+        return
+    if min(dates) <= as_of:
+        logger.warning(f"Bars rewritten on or before {as_of}; run compute_indicators --rebuild to refresh indicators")
+    update_indicators(contiguous=True)
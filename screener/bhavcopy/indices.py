@@ -0,0 +1,209 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+import numpy as np
+import logging
+from bhavcopy.bulk_upsert import get_batch_size
+from bhavcopy.metrics import timed_stage
+from bhavcopy.models import DailyBar, IndexBar, IndexConstituent, RelativeStrength, FIXED_POINT_SCALE
+from bhavcopy.parsing import parse_index_snapshot
+from bhavcopy.raw_archive import SOURCE_INDICES
+from bhavcopy.trading_calendar import get_trading_calendar, record_missing_day
+from bhavcopy.yearly_bhavcopy_download_views import YearlyBhavcopyDownloaderView
+import bhavcopy.constants as constant
+
+logger = logging.getLogger(__name__)
+
+INDEX_VALUE_FIELDS = ['OPEN_VALUE', 'HIGH_VALUE', 'LOW_VALUE', 'CLOSE_VALUE', 'POINTS_CHANGE',
+                      'CHANGE_PCT', 'VOLUME', 'TURNOVER_CR', 'PE', 'PB', 'DIV_YIELD']
+
+# Index every security is compared against, on top of the sector indices it belongs to
+DEFAULT_BENCHMARK = 'Nifty 50'
+
+# RelativeStrength column -> lookback in trading days
+RS_WINDOWS = {'RS_21': 21, 'RS_63': 63, 'RS_126': 126, 'RS_252': 252}
+
+
+def bulk_upsert_index_bars(df, batch_size=None):
+    """
+    Insert or update IndexBar rows from parse_index_snapshot output.
+
+    Relative strength for the written dates is refreshed once the
+    transaction commits.
+
+    Returns:
+        dict with records_created, records_updated and total_rows
+    """
+    result = {"records_created": 0, "records_updated": 0, "total_rows": 0 if df is None else len(df)}
+    if df is None or df.empty:
+        return result
+
+    df = df.drop_duplicates(['INDEX_NAME', 'DATE1'], keep='last')
+    dates = sorted(set(df['DATE1']))
+    existing = set(IndexBar.objects.filter(DATE1__in=dates).values_list('INDEX_NAME', 'DATE1'))
+
+    values = {field: df[field].to_numpy(dtype='float64') for field in INDEX_VALUE_FIELDS}
+    objects = []
+    for i, (name, dt) in enumerate(zip(df['INDEX_NAME'], df['DATE1'])):
+        row = {field: (None if np.isnan(values[field][i]) else
+                       int(values[field][i]) if field == 'VOLUME' else float(values[field][i]))
+               for field in INDEX_VALUE_FIELDS}
+        objects.append(IndexBar(INDEX_NAME=name, DATE1=dt, **row))
+        if (name, dt) in existing:
+            result["records_updated"] += 1
+        else:
+            result["records_created"] += 1
+
+    IndexBar.objects.bulk_create(
+        objects,
+        batch_size=get_batch_size(batch_size),
+        update_conflicts=True,
+        unique_fields=['INDEX_NAME', 'DATE1'],
+        update_fields=INDEX_VALUE_FIELDS,
+    )
+    transaction.on_commit(lambda: update_relative_strength(dates))
+    return result
+
+
+class IndexSnapshotDownloader(YearlyBhavcopyDownloaderView):
+    """
+    Downloader for the NiftyIndices daily snapshot (ind_close_all_DDMMYYYY.csv).
+
+    Plugs into BackfillScheduler in place of the bhavcopy downloader, so index
+    backfills share its worker pool, token bucket rate limit, raw-file
+    archive (under SOURCE_INDICES) and the pooled NSE client, which warms
+    niftyindices.com cookies on its own.
+    """
+    bhavcopy_url = constant.link_nse_indices
+    source = SOURCE_INDICES
+
+    def _store_bhavcopy_csv(self, content, dt):
+        """Parse and upsert a downloaded index snapshot."""
+        date_str = dt.strftime('%d-%m-%Y')
+        try:
+            with timed_stage(self.source, 'parse', dt=dt) as measured:
+                df = parse_index_snapshot(content)
+                measured["rows"] = len(df)
+            if df.empty:
+                logger.warning(f"Empty index snapshot for {date_str}")
+                record_missing_day(dt, "Empty index snapshot published")
+                return {"date": date_str, "status": "skipped", "reason": "Empty data"}
+
+            with timed_stage(self.source, 'write', dt=dt) as measured, transaction.atomic():
+                upsert_result = bulk_upsert_index_bars(df, batch_size=self.batch_size)
+                measured["rows"] = len(df)
+
+            return {
+                "date": date_str,
+                "status": "success",
+                "records_created": upsert_result["records_created"],
+                "records_updated": upsert_result["records_updated"],
+                "records_with_errors": 0,
+                "total_rows": len(df),
+            }
+        except Exception as e:
+            logger.error(f"Error processing index snapshot for {date_str}: {str(e)}")
+            return {"date": date_str, "status": "failed", "error": str(e)}
+
+
+def _latest_on_or_before(model, dt):
+    return model.objects.filter(DATE1__lte=dt).aggregate(latest=Max('DATE1'))['latest']
+
+
+def _matrix(rows, dates, keys):
+    """Scatter (date, key, value) rows into a dates x keys float matrix."""
+    matrix = np.full((len(dates), len(keys)), np.nan)
+    date_index = {d: i for i, d in enumerate(dates)}
+    key_index = {k: i for i, k in enumerate(keys)}
+    for dt, key, value in rows:
+        if value is not None and key in key_index:
+            matrix[date_index[dt], key_index[key]] = value
+    return matrix
+
+
+def compute_relative_strength(dt, benchmark=None):
+    """
+    Relative strength of every EQ security on `dt` against the benchmark and
+    each sector index it is a constituent of.
+
+    Closes are read for `dt` plus one anchor date per window (the last stored
+    date on or before the session RS_WINDOWS days earlier). Growth over each
+    window is then a vector per security and per index, and the ratios for
+    all securities x indices x windows come out of one broadcast division;
+    the membership mask keeps the pairs worth storing.
+
+    Returns:
+        int: RelativeStrength rows written (0 when bars or index values for
+        `dt` are missing)
+    """
+    benchmark = benchmark or getattr(settings, 'BHAVCOPY_RS_BENCHMARK', DEFAULT_BENCHMARK)
+    index_names = sorted(set(IndexBar.objects.filter(DATE1=dt).values_list('INDEX_NAME', flat=True)))
+    if benchmark not in index_names or not DailyBar.objects.filter(DATE1=dt).exists():
+        return 0
+
+    constituents = {}
+    for name, symbol in IndexConstituent.objects.filter(INDEX_NAME__in=index_names).values_list('INDEX_NAME', 'SYMBOL'):
+        constituents.setdefault(name, set()).add(symbol)
+    indices = [benchmark] + sorted(name for name in constituents if name != benchmark)
+
+    securities = list(DailyBar.objects.filter(DATE1=dt, security__SERIES='EQ')
+                      .order_by('security_id').values_list('security_id', 'security__SYMBOL'))
+    security_ids = [pk for pk, _ in securities]
+    symbols = np.array([symbol for _, symbol in securities], dtype=object)
+
+    calendar = get_trading_calendar()
+    anchors = [_latest_on_or_before(DailyBar, calendar.offset(dt, -window)) for window in RS_WINDOWS.values()]
+    dates = sorted({dt} | {a for a in anchors if a is not None})
+
+    bars = DailyBar.objects.filter(DATE1__in=dates, security__SERIES='EQ') \
+        .values_list('DATE1', 'security_id', 'CLOSE_PRICE')
+    stock = _matrix(((d, pk, close / FIXED_POINT_SCALE) for d, pk, close in bars.iterator()), dates, security_ids)
+    index = _matrix(IndexBar.objects.filter(DATE1__in=dates, INDEX_NAME__in=indices)
+                    .values_list('DATE1', 'INDEX_NAME', 'CLOSE_VALUE'), dates, indices)
+
+    # windows x securities and windows x indices growth factors
+    now = dates.index(dt)
+    positions = [dates.index(a) if a is not None else None for a in anchors]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stock_growth = np.array([stock[now] / stock[p] if p is not None else np.full(len(security_ids), np.nan)
+                                 for p in positions])
+        index_growth = np.array([index[now] / index[p] if p is not None else np.full(len(indices), np.nan)
+                                 for p in positions])
+        ratios = stock_growth[:, :, np.newaxis] / index_growth[:, np.newaxis, :]
+    ratios[~np.isfinite(ratios)] = np.nan
+
+    members = np.zeros((len(security_ids), len(indices)), dtype=bool)
+    members[:, 0] = True
+    for k, name in enumerate(indices[1:], start=1):
+        members[:, k] = np.isin(symbols, list(constituents[name]))
+
+    rows, columns = np.nonzero(members)
+    objects = []
+    for r, c in zip(rows, columns):
+        values = {field: (None if np.isnan(ratios[w, r, c]) else float(ratios[w, r, c]))
+                  for w, field in enumerate(RS_WINDOWS)}
+        objects.append(RelativeStrength(security_id=security_ids[r], DATE1=dt, INDEX_NAME=indices[c], **values))
+    with transaction.atomic():
+        RelativeStrength.objects.bulk_create(
+            objects,
+            batch_size=get_batch_size(),
+            update_conflicts=True,
+            unique_fields=['security', 'DATE1', 'INDEX_NAME'],
+            update_fields=list(RS_WINDOWS),
+        )
+    return len(objects)
+
+
+def update_relative_strength(dates):
+    """Recompute relative strength for each date that has both bars and index values."""
+    written = 0
+    for dt in dates:
+        written += compute_relative_strength(dt)
+    if written:
+        logger.info(f"Relative strength computed for {len(dates)} dates ({written} rows)")
+    return written
+
+
+def refresh_relative_strength(sender, dates, **kwargs):
+    """bhavcopy_dates_written receiver: refresh relative strength for new bars."""
+    update_relative_strength(dates)
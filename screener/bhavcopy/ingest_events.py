@@ -0,0 +1,279 @@
+from collections import deque
+from django.conf import settings
+from django.db.models import Max
+import asyncio
+import hashlib
+import json
+import threading
+import time
+import logging
+from bhavcopy.bulk_upsert import UPDATE_FIELDS
+from bhavcopy.hot_cache import get_hot_cache
+from bhavcopy.models import DailyBar, IngestEvent
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_SECONDS = 2.0
+DEFAULT_HEARTBEAT_SECONDS = 15.0
+
+# Recent events kept in memory, so subscribers catching up do not query the log
+BACKLOG_EVENTS = 500
+
+# Milliseconds an EventSource waits before reconnecting
+RETRY_MILLISECONDS = 5000
+
+# An id missing below newer events may belong to a transaction that has not
+# committed yet (PostgreSQL hands out ids before commit); the newer events are
+# held back this long before the missing id is taken as rolled back
+GAP_SECONDS = 10.0
+
+EVENT_FIELDS = ['id', 'DATE1', 'ROWS', 'CHECKSUM', 'created_at']
+
+
+def date_checksum(dt):
+    """
+    Row count and SHA-256 of the bars stored for one date.
+
+    Rows are hashed by (SYMBOL, SERIES) with their raw fixed-point values,
+    so the checksum does not depend on row ids or the database backend.
+
+    Returns:
+        tuple: (rows, hex digest)
+    """
+    digest = hashlib.sha256()
+    rows = 0
+    bars = (DailyBar.objects.filter(DATE1=dt).order_by('security__SYMBOL', 'security__SERIES')
+            .values_list('security__SYMBOL', 'security__SERIES', *UPDATE_FIELDS))
+    for bar in bars.iterator(chunk_size=5000):
+        digest.update(('|'.join(map(str, bar)) + '\n').encode('utf-8'))
+        rows += 1
+    return rows, digest.hexdigest()
+
+
+def record_dates(dates):
+    """
+    Append an IngestEvent for every date whose stored rows changed.
+
+    A date without rows, or whose checksum matches its latest event, is
+    skipped, so re-importing a file that is already stored stays silent.
+
+    Returns:
+        list of the IngestEvents created
+    """
+    if not dates:
+        return []
+    logged = {}
+    for dt, checksum in (IngestEvent.objects.filter(DATE1__gte=min(dates), DATE1__lte=max(dates))
+                         .order_by('id').values_list('DATE1', 'CHECKSUM')):
+        logged[dt] = checksum
+
+    events = []
+    for dt in dates:
+        rows, checksum = date_checksum(dt)
+        if rows and logged.get(dt) != checksum:
+            events.append(IngestEvent(DATE1=dt, ROWS=rows, CHECKSUM=checksum))
+    events = IngestEvent.objects.bulk_create(events)
+    if events:
+        logger.info(f"Recorded {len(events)} ingest events")
+        get_hot_cache().expire_version()
+        get_broadcaster().wake()
+    return events
+
+
+def record_written_dates(sender, dates, **kwargs):
+    """bhavcopy_dates_written receiver that appends to the ingest event log."""
+    try:
+        record_dates(dates)
+    except Exception as e:
+        logger.error(f"Error recording ingest events: {str(e)}")
+
+
+def serialize_event(event):
+    """An IngestEvent values() dict as JSON-ready data."""
+    return {
+        "id": event['id'],
+        "date": event['DATE1'].isoformat(),
+        "rows": event['ROWS'],
+        "checksum": event['CHECKSUM'],
+        "created_at": event['created_at'].isoformat(),
+    }
+
+
+def format_sse(event):
+    """One server-sent event; the log id is the SSE id clients resume from."""
+    return f"id: {event['id']}\nevent: ingest\ndata: {json.dumps(serialize_event(event))}\n\n"
+
+
+class EventBroadcaster:
+    """
+    Fans new IngestEvents out to every SSE subscriber of this process.
+
+    While anyone is subscribed, a single asyncio task polls the log every
+    `poll_seconds` (at once when this process recorded the event itself)
+    and wakes the subscribers, which then read from an in-memory backlog.
+    Idle subscribers are suspended coroutines, so a thousand of them cost
+    one query per interval and no threads. Events written by other
+    processes, such as a download worker, arrive with the next poll.
+
+    Events are delivered in id order, and only up to the first missing id,
+    so one that commits after a higher id is not skipped; a missing id is
+    given up after GAP_SECONDS.
+    """
+
+    def __init__(self, poll_seconds=None, heartbeat_seconds=None):
+        if poll_seconds is None:
+            poll_seconds = getattr(settings, 'BHAVCOPY_EVENTS_POLL_SECONDS', DEFAULT_POLL_SECONDS)
+        if heartbeat_seconds is None:
+            heartbeat_seconds = getattr(settings, 'BHAVCOPY_EVENTS_HEARTBEAT_SECONDS', DEFAULT_HEARTBEAT_SECONDS)
+        self.poll_seconds = float(poll_seconds)
+        self.heartbeat_seconds = float(heartbeat_seconds)
+        self.events = deque(maxlen=BACKLOG_EVENTS)
+        # Every event after backlog_from is in self.events
+        self.backlog_from = None
+        self.latest_id = None
+        # When the poll first found a missing id after latest_id
+        self.gap_since = None
+        self.subscribers = 0
+        self.loop = None
+        self.changed = None
+        self.starting = None
+        self.wakeup = None
+        self.task = None
+
+    def _bind(self):
+        """Attach to the running event loop (ASGI servers run one per process)."""
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.loop = loop
+            self.changed = asyncio.Condition()
+            self.starting = asyncio.Lock()
+            self.wakeup = asyncio.Event()
+            self.task = None
+
+    def wake(self):
+        """Poll now instead of at the next interval; safe to call from any thread."""
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self.wakeup.set)
+
+    async def _fetch(self, after_id, upto_id=None):
+        events = IngestEvent.objects.filter(id__gt=after_id).order_by('id').values(*EVENT_FIELDS)
+        if upto_id is not None:
+            events = events.filter(id__lte=upto_id)
+        return [event async for event in events[:BACKLOG_EVENTS]]
+
+    def _ready(self, events):
+        """
+        The leading events that can be delivered after latest_id: up to the
+        first missing id, or past it once it has been missing GAP_SECONDS.
+        """
+        ready = []
+        expected = self.latest_id + 1
+        for event in events:
+            if event['id'] > expected:
+                now = time.monotonic()
+                if self.gap_since is None:
+                    self.gap_since = now
+                if now - self.gap_since < GAP_SECONDS:
+                    break
+                logger.info(f"Ingest event ids {expected}-{event['id'] - 1} never committed, skipping them")
+            self.gap_since = None
+            ready.append(event)
+            expected = event['id'] + 1
+        return ready
+
+    async def _poll(self):
+        while self.subscribers:
+            try:
+                fetched = await self._fetch(self.latest_id)
+            except Exception as e:
+                logger.error(f"Error polling ingest events: {str(e)}")
+                fetched = []
+            events = self._ready(fetched)
+            for event in events:
+                if len(self.events) == self.events.maxlen:
+                    self.backlog_from = self.events[0]['id']
+                self.events.append(event)
+            if events:
+                self.latest_id = events[-1]['id']
+                async with self.changed:
+                    self.changed.notify_all()
+                if len(fetched) == len(events) == BACKLOG_EVENTS:
+                    continue
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+        self.task = None
+
+    async def subscribe(self, last_id=None):
+        """
+        Yield event dicts as they are logged.
+
+        Args:
+            last_id: id of the last event the client has seen; events after
+                it are replayed first. None starts with the next new event.
+
+        Yields:
+            IngestEvent values() dicts in id order, or None after
+            heartbeat_seconds without one so the caller can send a keepalive
+        """
+        self._bind()
+        self.subscribers += 1
+        try:
+            async with self.starting:
+                if self.task is None:
+                    # Nobody was polling: start over from the end of the log
+                    latest = await IngestEvent.objects.aaggregate(latest=Max('id'))
+                    self.events.clear()
+                    self.latest_id = self.backlog_from = latest['latest'] or 0
+                    self.task = asyncio.create_task(self._poll())
+
+            cursor = self.latest_id if last_id is None else last_id
+            while True:
+                if cursor < self.latest_id:
+                    if cursor >= self.backlog_from:
+                        pending = [event for event in self.events if event['id'] > cursor]
+                    else:
+                        pending = await self._fetch(cursor, self.latest_id)
+                    for event in pending:
+                        cursor = event['id']
+                        yield event
+                    if pending:
+                        continue
+                    cursor = self.latest_id
+
+                timed_out = False
+                async with self.changed:
+                    try:
+                        await asyncio.wait_for(self.changed.wait_for(lambda: self.latest_id > cursor),
+                                               self.heartbeat_seconds)
+                    except asyncio.TimeoutError:
+                        timed_out = True
+                if timed_out:
+                    yield None
+        finally:
+            self.subscribers -= 1
+            if not self.subscribers:
+                self.wakeup.set()
+
+
+_broadcaster = None
+_broadcaster_lock = threading.Lock()
+
+
+def get_broadcaster():
+    """Return the process-wide EventBroadcaster configured from settings."""
+    global _broadcaster
+    with _broadcaster_lock:
+        if _broadcaster is None:
+            _broadcaster = EventBroadcaster()
+        return _broadcaster
+
+
+async def sse_stream(last_id=None):
+    """The text/event-stream body for one subscriber."""
+    yield f"retry: {RETRY_MILLISECONDS}\n\n"
+    async for event in get_broadcaster().subscribe(last_id):
+        yield format_sse(event) if event is not None else ": keepalive\n\n"
@@ -0,0 +1,332 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from datetime import datetime, time as dt_time, timedelta
+import os
+import socket
+import time
+import logging
+from bhavcopy.backfill_scheduler import BackfillScheduler
+from bhavcopy.models import DownloadJob, DownloadTask
+from bhavcopy.raw_archive import SOURCE_BHAVCOPY
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_RETRY_DELAY = 60  # Seconds before the first retry, doubled on each further attempt
+DEFAULT_CLAIM_BATCH = 20
+
+# No file published for the date (a trading holiday): skipped, never retried
+NOT_PUBLISHED_HTTP_STATUSES = (404,)
+
+# Scheduler skips that mean "not attempted"; the task goes back to the queue
+RELEASED_REASONS = ('Run stopped', 'Deadline exceeded')
+
+
+def _setting(name, value, default):
+    return value if value is not None else getattr(settings, name, default)
+
+
+def default_owner():
+    """Lease owner name for this process."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue_download_job(dates, source=SOURCE_BHAVCOPY):
+    """
+    Create a job with one pending task per date.
+
+    If an active job for the same source and date range already exists it is
+    returned instead, so repeated requests (from any web worker) never start
+    duplicate crawls.
+
+    Args:
+        dates: iterable of date or datetime objects
+        source: archive source name the job downloads
+
+    Returns:
+        tuple: (job, created)
+    """
+    dates = sorted({d.date() if isinstance(d, datetime) else d for d in dates})
+    if not dates:
+        raise ValueError("No dates to download")
+
+    active = DownloadJob.objects.filter(
+        source=source, start_date=dates[0], end_date=dates[-1],
+        status__in=DownloadJob.ACTIVE_STATUSES,
+    )
+    job = active.first()
+    if job is not None:
+        return job, False
+
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            job = DownloadJob.objects.create(source=source, start_date=dates[0], end_date=dates[-1])
+            DownloadTask.objects.bulk_create([DownloadTask(job=job, date=d, available_at=now) for d in dates])
+    except IntegrityError:
+        # Lost the race against another process creating the same job
+        return active.get(), False
+
+    logger.info(f"Queued download job {job.id} with {len(dates)} dates")
+    return job, True
+
+
+def _claimable(now):
+    # Running tasks whose lease ran out belong to a worker that died
+    return (Q(status=DownloadTask.STATUS_PENDING, available_at__lte=now) |
+            Q(status=DownloadTask.STATUS_RUNNING, lease_expires_at__lt=now))
+
+
+def claim_tasks(owner, limit, lease_seconds=None, max_attempts=None, source=SOURCE_BHAVCOPY):
+    """
+    Lease up to `limit` tasks to `owner`.
+
+    Each candidate is taken with a conditional UPDATE that only matches while
+    the row is still claimable, so two workers can never hold the same task.
+    This needs no SELECT ... FOR UPDATE, which SQLite does not have. Tasks are
+    handed out oldest job first and in date order, so a restarted worker
+    resumes from the first unfinished date.
+
+    Returns:
+        list of DownloadTask objects now leased to `owner`
+    """
+    lease_seconds = _setting('BHAVCOPY_JOB_LEASE_SECONDS', lease_seconds, DEFAULT_LEASE_SECONDS)
+    max_attempts = _setting('BHAVCOPY_JOB_MAX_ATTEMPTS', max_attempts, DEFAULT_MAX_ATTEMPTS)
+    now = timezone.now()
+
+    # A date that kept killing its worker is given up instead of leased again
+    DownloadTask.objects.filter(
+        status=DownloadTask.STATUS_RUNNING, lease_expires_at__lt=now, attempts__gte=max_attempts,
+    ).update(status=DownloadTask.STATUS_FAILED, error='Lease expired', lease_owner=None, lease_expires_at=None)
+
+    candidates = list(
+        DownloadTask.objects.filter(_claimable(now), job__source=source,
+                                    job__status__in=DownloadJob.ACTIVE_STATUSES)
+        .order_by('job_id', 'date').values_list('id', flat=True)[:limit]
+    )
+
+    expires_at = now + timedelta(seconds=lease_seconds)
+    claimed = []
+    for pk in candidates:
+        updated = DownloadTask.objects.filter(_claimable(now), pk=pk).update(
+            status=DownloadTask.STATUS_RUNNING,
+            lease_owner=owner,
+            lease_expires_at=expires_at,
+            attempts=F('attempts') + 1,
+            updated_at=now,
+        )
+        if updated:
+            claimed.append(pk)
+
+    tasks = list(DownloadTask.objects.filter(pk__in=claimed).select_related('job').order_by('job_id', 'date'))
+    DownloadJob.objects.filter(id__in={t.job_id for t in tasks}, status=DownloadJob.STATUS_PENDING) \
+        .update(status=DownloadJob.STATUS_RUNNING, updated_at=now)
+    return tasks
+
+
+def renew_leases(owner, lease_seconds=None):
+    """Push back the lease expiry of every task `owner` still holds."""
+    lease_seconds = _setting('BHAVCOPY_JOB_LEASE_SECONDS', lease_seconds, DEFAULT_LEASE_SECONDS)
+    return DownloadTask.objects.filter(lease_owner=owner, status=DownloadTask.STATUS_RUNNING) \
+        .update(lease_expires_at=timezone.now() + timedelta(seconds=lease_seconds))
+
+
+def release_tasks(owner):
+    """Hand every task `owner` holds back to the queue without charging an attempt."""
+    return DownloadTask.objects.filter(lease_owner=owner, status=DownloadTask.STATUS_RUNNING).update(
+        status=DownloadTask.STATUS_PENDING, attempts=F('attempts') - 1,
+        lease_owner=None, lease_expires_at=None, available_at=timezone.now(),
+    )
+
+
+def finish_task(task, result, owner, max_attempts=None, retry_delay=None):
+    """
+    Record a scheduler result on a leased task.
+
+    Failures go back to pending with exponential backoff until max_attempts
+    is reached; dates with no published file are skipped straight away. Storing a date is an upsert, so a retry or a
+    date processed twice after a lost lease leaves the same rows.
+
+    Returns:
+        bool: False if `owner` no longer held the lease
+    """
+    max_attempts = _setting('BHAVCOPY_JOB_MAX_ATTEMPTS', max_attempts, DEFAULT_MAX_ATTEMPTS)
+    retry_delay = _setting('BHAVCOPY_JOB_RETRY_DELAY', retry_delay, DEFAULT_RETRY_DELAY)
+    now = timezone.now()
+    values = {
+        "status": result["status"],
+        "result": result,
+        "error": result.get("error", ""),
+        "lease_owner": None,
+        "lease_expires_at": None,
+        "updated_at": now,
+    }
+
+    if result["status"] == "skipped" and result.get("reason") in RELEASED_REASONS:
+        values.update(status=DownloadTask.STATUS_PENDING, attempts=F('attempts') - 1, available_at=now)
+    elif result["status"] == "failed" and result.get("http_status") in NOT_PUBLISHED_HTTP_STATUSES:
+        values.update(status=DownloadTask.STATUS_SKIPPED)
+    elif result["status"] == "failed" and task.attempts < max_attempts:
+        delay = retry_delay * 2 ** (task.attempts - 1)
+        values.update(status=DownloadTask.STATUS_PENDING, available_at=now + timedelta(seconds=delay))
+        logger.warning(f"Download of {task.date} failed (attempt {task.attempts}), retrying in {delay}s")
+
+    updated = DownloadTask.objects.filter(pk=task.pk, lease_owner=owner, status=DownloadTask.STATUS_RUNNING) \
+        .update(**values)
+    return bool(updated)
+
+
+def refresh_job_status(job):
+    """Mark a job completed or failed once every task has reached a final status."""
+    counts = dict(job.tasks.values_list('status').annotate(n=Count('id')))
+    unfinished = sum(n for s, n in counts.items() if s not in DownloadTask.FINAL_STATUSES)
+    if unfinished:
+        return job
+
+    job.status = DownloadJob.STATUS_FAILED if counts.get(DownloadTask.STATUS_FAILED) else DownloadJob.STATUS_COMPLETED
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'finished_at', 'updated_at'])
+    logger.info(f"Download job {job.id} {job.status}")
+    return job
+
+
+def job_progress(job):
+    """
+    Summarize a job for the status endpoint.
+
+    Returns:
+        dict with the job fields, per-status task counts, percent complete,
+        the next date still to be downloaded and the failed dates
+    """
+    counts = dict(job.tasks.values_list('status').annotate(n=Count('id')))
+    total = sum(counts.values())
+    done = sum(counts.get(s, 0) for s in DownloadTask.FINAL_STATUSES)
+    next_date = job.tasks.exclude(status__in=DownloadTask.FINAL_STATUSES) \
+        .order_by('date').values_list('date', flat=True).first()
+    failed = job.tasks.filter(status=DownloadTask.STATUS_FAILED).order_by('date') \
+        .values('date', 'attempts', 'error')
+
+    return {
+        "job_id": job.id,
+        "source": job.source,
+        "start_date": job.start_date,
+        "end_date": job.end_date,
+        "status": job.status,
+        "total_dates": total,
+        "completed_dates": done,
+        "progress": round(done * 100.0 / total, 1) if total else 100.0,
+        "counts": {status: counts.get(status, 0) for status, _ in DownloadTask.STATUS_CHOICES},
+        "next_date": next_date,
+        "failed": list(failed),
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+        "finished_at": job.finished_at,
+    }
+
+
+class DownloadWorker:
+    """
+    Process that drains the DownloadTask queue.
+
+    Claims a batch of leased tasks, runs them through the BackfillScheduler
+    (concurrent downloads, shared rate limit, single DB writer) and records
+    each date's outcome as it completes, renewing its leases as it goes.
+    With a `deadline` (seconds), run() stops starting downloads once it has
+    passed, hands the unstarted dates back to the queue and returns.
+    """
+
+    def __init__(self, downloader=None, workers=None, rate=None, batch=None, lease_seconds=None,
+                 max_attempts=None, retry_delay=None, owner=None, on_event=None, deadline=None):
+        if downloader is None:
+            from bhavcopy.yearly_bhavcopy_download_views import YearlyBhavcopyDownloaderView
+            downloader = YearlyBhavcopyDownloaderView()
+
+        self.downloader = downloader
+        self.workers = workers
+        self.rate = rate
+        self.batch = int(_setting('BHAVCOPY_JOB_CLAIM_BATCH', batch, DEFAULT_CLAIM_BATCH))
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.owner = owner or default_owner()
+        self.on_event = on_event
+        self.deadline = deadline
+        self._deadline_at = None
+
+    def _remaining(self):
+        """Seconds left before the deadline, or None without a deadline."""
+        if self._deadline_at is None:
+            return None
+        return max(self._deadline_at - time.monotonic(), 0.0)
+
+    def deadline_passed(self):
+        """Whether the deadline of the current or last run() has passed."""
+        return self._remaining() == 0
+
+    def _handle_event(self, tasks_by_date, event):
+        if event["event"] == "date_completed":
+            task = tasks_by_date.get(event["date"])
+            if task is not None and not finish_task(task, event["result"], self.owner,
+                                                    self.max_attempts, self.retry_delay):
+                logger.warning(f"Lost the lease on {task.date} before recording its result")
+            renew_leases(self.owner, self.lease_seconds)
+        if self.on_event:
+            self.on_event(event)
+
+    def run_once(self):
+        """
+        Claim and process one batch of tasks.
+
+        Returns:
+            int: number of tasks processed, 0 when the queue was empty
+        """
+        if self.deadline_passed():
+            return 0
+        tasks = claim_tasks(self.owner, self.batch, self.lease_seconds, self.max_attempts,
+                            source=SOURCE_BHAVCOPY)
+        if not tasks:
+            return 0
+
+        tasks_by_date = {t.date.strftime('%d-%m-%Y'): t for t in tasks}
+        scheduler = BackfillScheduler(
+            downloader=self.downloader,
+            workers=self.workers,
+            rate=self.rate,
+            deadline=self._remaining(),
+            on_event=lambda event: self._handle_event(tasks_by_date, event),
+        )
+        try:
+            scheduler.run([datetime.combine(t.date, dt_time()) for t in tasks])
+        finally:
+            # Anything not recorded (e.g. on Ctrl-C) goes straight back to the queue
+            release_tasks(self.owner)
+            for job in {t.job_id: t.job for t in tasks}.values():
+                refresh_job_status(job)
+        return len(tasks)
+
+    def run(self, poll=5, once=False):
+        """
+        Process batches until the queue is empty (once=True), the deadline
+        has passed or forever, sleeping `poll` seconds whenever there is
+        nothing to claim.
+
+        Returns:
+            int: total number of tasks processed
+        """
+        if self.deadline is not None:
+            self._deadline_at = time.monotonic() + float(self.deadline)
+        processed = 0
+        while True:
+            count = self.run_once()
+            processed += count
+            remaining = self._remaining()
+            if remaining == 0:
+                return processed
+            if count:
+                continue
+            if once:
+                return processed
+            time.sleep(poll if remaining is None else min(poll, remaining))
@@ -0,0 +1,40 @@
+from django.core.management.base import CommandError
+from bhavcopy.management.commands.download_bhavcopy_yearwise import Command as YearwiseCommand
+from bhavcopy.db_tuning import bulk_ingest
+from bhavcopy.metrics import get_metrics, run_summary
+from datetime import datetime
+
+class Command(YearwiseCommand):
+    help = 'Download Bhavcopy data for every business day in a date range'
+
+    def add_arguments(self, parser):
+        parser.add_argument('start', type=str, help='First date to download (DD-MM-YYYY)')
+        parser.add_argument('end', type=str, help='Last date to download (DD-MM-YYYY)')
+        self.add_backfill_arguments(parser)
+
+    def handle(self, *args, **options):
+        try:
+            start_dt = datetime.strptime(options['start'], "%d-%m-%Y")
+            end_dt = datetime.strptime(options['end'], "%d-%m-%Y")
+        except ValueError as e:
+            raise CommandError(f"Invalid date: {str(e)}")
+        if end_dt < start_dt:
+            raise CommandError("End date must not be before start date")
+
+        downloader = self.build_downloader(options)
+        business_days = downloader._get_business_days_between(start_dt, end_dt)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Starting backfill from {options['start']} to {options['end']}. Total dates: {len(business_days)}"
+        ))
+
+        scheduler = self.build_scheduler(downloader, options)
+        before = get_metrics().snapshot()
+        with bulk_ingest(enabled=options.get('bulk_ingest')):
+            summary = scheduler.run(business_days)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfill completed in {summary['elapsed']:.1f}s. Success: {summary['successful_dates']}, "
+            f"Failed: {summary['failed_dates']}, Skipped: {summary['skipped_dates']}"
+        ))
+        self.report_metrics(run_summary(before))
@@ -0,0 +1,6 @@
+from bhavcopy.management.commands.backfill_bhavcopy import Command as BackfillCommand
+from bhavcopy.indices import IndexSnapshotDownloader
+
+class Command(BackfillCommand):
+    help = 'Download NiftyIndices daily index snapshots for every business day in a date range'
+    downloader_class = IndexSnapshotDownloader
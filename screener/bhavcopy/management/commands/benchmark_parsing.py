@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+import pandas as pd
+import numpy as np
+import io
+import statistics
+import time
+from datetime import date
+from bhavcopy.parsing import parse_bhavcopy, NUMERIC_COLUMNS, ENGINES, get_engine
+from bhavcopy.synthetic import generate_bhavcopy_csv
+
+def legacy_parse(content):
+    """The read and clean steps the views used before bhavcopy.parsing, kept as the baseline."""
+    df = pd.read_csv(io.StringIO(content.decode('utf-8')))
+    df.columns = df.columns.str.strip()
+    df['DATE1'] = pd.to_datetime(df['DATE1'].str.strip(), format='%d-%b-%Y').dt.date
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype(str).str.strip()
+            df[col] = df[col].replace(['-', ' -', '- ', ' - '], '')
+            df[col] = df[col].replace('', np.nan)
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    return df
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark the bhavcopy CSV parse-and-clean step against the legacy implementation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', type=str, help='Path to a real sec_bhavdata_full CSV (synthetic if omitted)')
+        parser.add_argument('--symbols', type=int, default=3000, help='Rows in the synthetic file')
+        parser.add_argument('--repeat', type=int, default=7, help='Timed runs per implementation')
+
+    def time_it(self, func, content, repeat):
+        func(content)  # warm-up
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func(content)
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings)
+
+    def handle(self, *args, **options):
+        if options.get('file'):
+            with open(options['file'], 'rb') as f:
+                content = f.read()
+        else:
+            content = generate_bhavcopy_csv(date(2024, 3, 15), symbols=options['symbols'])
+
+        repeat = options['repeat']
+        baseline = self.time_it(legacy_parse, content, repeat)
+        self.stdout.write(f"File: {len(content) / 1024:.0f} KiB, repeat: {repeat}")
+        self.stdout.write(f"legacy            {baseline * 1000:8.2f} ms")
+
+        _, stats = parse_bhavcopy(content)
+        for engine in ENGINES:
+            if get_engine(engine) != engine:
+                self.stdout.write(f"{engine:<17} skipped (not installed)")
+                continue
+            elapsed = self.time_it(lambda c: parse_bhavcopy(c, engine=engine), content, repeat)
+            self.stdout.write(f"parse_bhavcopy/{engine:<3}{elapsed * 1000:8.2f} ms  ({baseline / elapsed:.1f}x)")
+
+        self.stdout.write(f"Rows: {stats['rows']}, values filled: {stats['filled']}")
+        for col, col_stats in stats["columns"].items():
+            if col_stats["missing"] or col_stats["invalid"]:
+                self.stdout.write(f"  {col}: missing {col_stats['missing']}, invalid {col_stats['invalid']}")
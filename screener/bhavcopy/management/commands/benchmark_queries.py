@@ -0,0 +1,172 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.db.models import Max
+import numpy as np
+import pandas as pd
+import os
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+from bhavcopy.models import Bhavcopy, DailyBar
+from bhavcopy.streaming import ORDERING, apply_cursor, encode_cursor
+from bhavcopy.synthetic import symbol_universe
+
+BENCHMARK_ALIAS = 'query_benchmark'
+
+# Last migration with the wide bhavcopy table the synthetic rows are inserted into
+LEGACY_MIGRATION = '0002_bhavcopy_indexes'
+
+class Command(BaseCommand):
+    help = 'Run representative Bhavcopy queries on a synthetic dataset and print query plans and timings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years', type=int, default=3, help='Years of synthetic data')
+        parser.add_argument('--symbols', type=int, default=1000, help='Symbols per day')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per query')
+        parser.add_argument('--path', type=str, help='SQLite file for the dataset; reused if it exists')
+        parser.add_argument('--database', type=str, help='Run against an existing database alias instead of synthetic data')
+
+    def setup_database(self, path, migration=None):
+        """Register a throwaway SQLite alias with the same settings as default."""
+        settings_dict = dict(connections['default'].settings_dict)
+        settings_dict['ENGINE'] = 'django.db.backends.sqlite3'
+        settings_dict['NAME'] = path
+        connections.settings[BENCHMARK_ALIAS] = settings_dict
+        self.migrate(BENCHMARK_ALIAS, migration)
+        return BENCHMARK_ALIAS
+
+    def migrate(self, alias, migration=None):
+        args = ['bhavcopy', migration] if migration else ['bhavcopy']
+        call_command('migrate', *args, database=alias, verbosity=0)
+
+    def populate(self, alias, years, symbols):
+        """
+        Insert years x business days x symbols synthetic rows.
+
+        Rows go into the wide pre-0003 table, so the database must be at
+        LEGACY_MIGRATION; migrating forward afterwards converts them in place.
+        """
+        universe = symbol_universe(symbols)
+        names = [u[0] for u in universe]
+        series = [u[1] for u in universe]
+        base = np.array([u[2] for u in universe])
+        end = date(2024, 12, 31)
+        days = pd.bdate_range(end - timedelta(days=365 * years), end).date
+        table = Bhavcopy._meta.db_table
+        columns = ['SYMBOL', 'SERIES', 'DATE1', 'PREV_CLOSE', 'OPEN_PRICE', 'HIGH_PRICE', 'LOW_PRICE',
+                   'LAST_PRICE', 'CLOSE_PRICE', 'AVG_PRICE', 'TTL_TRD_QNTY', 'TURNOVER_LACS',
+                   'NO_OF_TRADES', 'DELIV_QTY', 'DELIV_PER']
+        rng = np.random.default_rng(0)
+        connection = connections[alias]
+        quote = connection.ops.quote_name
+        sql = (f'INSERT INTO {quote(table)} ({", ".join(quote(c) for c in columns)}) '
+               f'VALUES ({", ".join(["%s"] * len(columns))})')
+        started = time.monotonic()
+        with transaction.atomic(using=alias), connection.cursor() as cursor:
+            for day in days:
+                close = np.round(base * (1 + rng.normal(0, 0.02, len(base))), 2)
+                qty = rng.integers(100, 1_000_000, len(base))
+                rows = [
+                    (names[i], series[i], day, close[i], close[i], close[i], close[i], close[i],
+                     close[i], close[i], int(qty[i]), float(close[i] * qty[i] / 1e5),
+                     int(qty[i] // 50), int(qty[i] // 2), 50.0)
+                    for i in range(len(names))
+                ]
+                cursor.executemany(sql, rows)
+        self.stdout.write(f"Inserted {len(days) * len(names)} rows in {time.monotonic() - started:.1f}s")
+
+    def representative_queries(self, alias, legacy=False):
+        """
+        The access patterns the read API, screens and ingest depend on.
+
+        With legacy=True the queries target a database still at
+        LEGACY_MIGRATION, where Bhavcopy is the wide table itself.
+        """
+        objects = Bhavcopy.objects.using(alias)
+        # Date-only queries skip the Security join by reading the fact table
+        facts = objects if legacy else DailyBar.objects.using(alias)
+        upsert_keys = ['SYMBOL', 'SERIES', 'DATE1'] if legacy else ['security_id', 'DATE1']
+        latest = facts.aggregate(latest=Max('DATE1'))['latest']
+        sample = objects.filter(DATE1=latest, SERIES='EQ').order_by('SYMBOL').values_list('SYMBOL', flat=True).first()
+        month_ago = latest - timedelta(days=30)
+        year_ago = latest - timedelta(days=365)
+
+        return [
+            ("latest date", facts.order_by('-DATE1').values_list('DATE1', flat=True)[:1]),
+            ("cross-section EQ on a date",
+             objects.filter(DATE1=latest, SERIES='EQ').order_by('SYMBOL').values_list('SYMBOL', 'CLOSE_PRICE')),
+            ("all series on a date", objects.filter(DATE1=latest).values_list('SYMBOL', 'SERIES', 'CLOSE_PRICE')),
+            ("date-range export (30 days)",
+             objects.filter(DATE1__range=(month_ago, latest)).order_by(*ORDERING).values_list(*ORDERING, 'CLOSE_PRICE')),
+            ("keyset page after cursor",
+             apply_cursor(objects.filter(DATE1__gte=month_ago), encode_cursor(month_ago, sample, 'EQ'))
+             .order_by(*ORDERING).values_list(*ORDERING)[:500]),
+            ("close series for a symbol",
+             objects.filter(SYMBOL=sample, SERIES='EQ').order_by('DATE1').values_list('DATE1', 'CLOSE_PRICE')),
+            ("symbol over last year",
+             objects.filter(SYMBOL=sample, DATE1__gte=year_ago).order_by('DATE1').values_list('DATE1', 'CLOSE_PRICE', 'TTL_TRD_QNTY')),
+            ("distinct dates", facts.values_list('DATE1', flat=True).distinct().order_by('DATE1')),
+            ("existing keys for upsert", facts.filter(DATE1__in=[latest]).values_list(*upsert_keys)),
+        ]
+
+    def time_queries(self, alias, repeat, legacy=False):
+        """
+        Run every representative query `repeat` times.
+
+        Returns:
+            list of (name, median seconds, rows, query plan) tuples
+        """
+        results = []
+        for name, queryset in self.representative_queries(alias, legacy):
+            plan = queryset.explain()
+            timings = []
+            rows = 0
+            for _ in range(repeat):
+                started = time.perf_counter()
+                rows = len(list(queryset.all()))
+                timings.append(time.perf_counter() - started)
+            results.append((name, statistics.median(timings), rows, plan))
+        return results
+
+    def handle(self, *args, **options):
+        alias = options.get('database')
+        cleanup = None
+
+        if not alias:
+            path = options.get('path')
+            if not path:
+                fd, path = tempfile.mkstemp(suffix='.sqlite3')
+                os.close(fd)
+                os.remove(path)
+                cleanup = path
+            if os.path.exists(path):
+                alias = self.setup_database(path)
+            else:
+                alias = self.setup_database(path, LEGACY_MIGRATION)
+                self.populate(alias, options['years'], options['symbols'])
+                self.migrate(alias)
+            with connections[alias].cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        try:
+            scans = 0
+            for name, elapsed, rows, plan in self.time_queries(alias, options['repeat']):
+                self.stdout.write(self.style.MIGRATE_HEADING(f"\n{name}: {elapsed * 1000:.2f} ms, {rows} rows"))
+                for line in plan.splitlines():
+                    # A bare SCAN of the table (no index) is what a missing index looks like
+                    if 'SCAN' in line and 'INDEX' not in line:
+                        scans += 1
+                        self.stdout.write(self.style.WARNING(f"  {line}"))
+                    else:
+                        self.stdout.write(f"  {line}")
+
+            if scans:
+                self.stdout.write(self.style.WARNING(f"\n{scans} full table scan(s) in query plans"))
+            else:
+                self.stdout.write(self.style.SUCCESS("\nAll queries use an index"))
+        finally:
+            if cleanup:
+                connections[alias].close()
+                os.remove(cleanup)
@@ -0,0 +1,73 @@
+from django.db import connections
+from django.db.utils import OperationalError
+import os
+import tempfile
+import time
+from bhavcopy.management.commands.benchmark_queries import Command as QueryBenchmarkCommand, LEGACY_MIGRATION
+
+class Command(QueryBenchmarkCommand):
+    help = 'Compare database size and query time of the wide Bhavcopy table against the compact schema'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years', type=int, default=3, help='Years of synthetic data')
+        parser.add_argument('--symbols', type=int, default=1000, help='Symbols per day')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per query')
+
+    def measure_size(self, alias, path):
+        """
+        Compact the file and report its size.
+
+        Returns:
+            tuple: (file bytes, {table or index name: bytes}); the breakdown is
+            empty when SQLite was built without the dbstat table
+        """
+        connection = connections[alias]
+        with connection.cursor() as cursor:
+            cursor.execute('VACUUM')
+            cursor.execute('ANALYZE')
+            try:
+                cursor.execute("SELECT name, SUM(pgsize) FROM dbstat WHERE name LIKE '%%bhavcopy%%' "
+                               "OR name LIKE '%%dailybar%%' GROUP BY name ORDER BY 2 DESC")
+                objects = dict(cursor.fetchall())
+            except OperationalError:
+                objects = {}
+        return os.path.getsize(path), objects
+
+    def write_sizes(self, label, size, objects):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n{label}: {size / 2**20:.1f} MiB"))
+        for name, pages in objects.items():
+            self.stdout.write(f"  {name:<55}{pages / 2**20:8.1f} MiB")
+
+    def handle(self, *args, **options):
+        fd, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        os.remove(path)
+
+        try:
+            alias = self.setup_database(path, LEGACY_MIGRATION)
+            self.populate(alias, options['years'], options['symbols'])
+
+            before_size, before_objects = self.measure_size(alias, path)
+            before = self.time_queries(alias, options['repeat'], legacy=True)
+
+            started = time.monotonic()
+            self.migrate(alias)
+            migrate_time = time.monotonic() - started
+
+            after_size, after_objects = self.measure_size(alias, path)
+            after = self.time_queries(alias, options['repeat'])
+
+            self.write_sizes("Wide table (before)", before_size, before_objects)
+            self.write_sizes("Compact schema (after)", after_size, after_objects)
+            self.stdout.write(f"\nIn-place conversion took {migrate_time:.1f}s, "
+                              f"file is {after_size / before_size:.0%} of its previous size")
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n{'query':<32}{'before':>12}{'after':>12}"))
+            for (name, before_time, before_rows, _), (_, after_time, after_rows, _) in zip(before, after):
+                if before_rows != after_rows:
+                    self.stdout.write(self.style.ERROR(f"{name}: {before_rows} rows before, {after_rows} after"))
+                self.stdout.write(f"{name:<32}{before_time * 1000:9.2f} ms{after_time * 1000:9.2f} ms")
+        finally:
+            connections[alias].close()
+            if os.path.exists(path):
+                os.remove(path)
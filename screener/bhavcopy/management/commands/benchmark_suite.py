@@ -0,0 +1,84 @@
+from django.core.management.base import BaseCommand, CommandError
+from bhavcopy.benchmarks import (BENCHMARKS, DEFAULT_DAYS, DEFAULT_REPEAT, DEFAULT_SYMBOLS, DEFAULT_THRESHOLD,
+                                 compare_results, load_results, run_benchmarks, save_results)
+from datetime import datetime
+
+class Command(BaseCommand):
+    help = ('Benchmark parse, clean, upsert, end-to-end backfill (against a local stub NSE server), read queries '
+            'and reads during a backfill on synthetic data in a scratch database, writing the results as JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', action='append', choices=BENCHMARKS, help='Benchmark to run (repeatable, default: all)')
+        parser.add_argument('--symbols', type=int, default=DEFAULT_SYMBOLS, help='Rows per synthetic file')
+        parser.add_argument('--days', type=int, default=DEFAULT_DAYS, help='Dates written by the upsert and backfill benchmarks')
+        parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='Timed runs of parse, clean and each read')
+        parser.add_argument('--workers', type=int, help='Backfill download threads')
+        parser.add_argument('--latency', type=float, default=0.0, help='Seconds the stub server waits before each response')
+        parser.add_argument('--output', type=str, help='JSON results file (default: benchmark-results/YYYYMMDD-HHMMSS.json)')
+        parser.add_argument('--compare', type=str, help='Previous results file to compare against')
+        parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                            help='Relative slowdown reported as a regression')
+        parser.add_argument('--fail_on_regression', action='store_true', help='Exit with an error when a benchmark regressed')
+        parser.add_argument('--keep', action='store_true', help='Keep the scratch database and directories')
+
+    def report_result(self, name, result):
+        seconds = result.get("median_seconds", result.get("seconds"))
+        line = f"{name:<36}{seconds * 1000:10.2f} ms"
+        if result.get("rows_per_second"):
+            line += f"  {result['rows_per_second']:>12,.0f} rows/s"
+        if result.get("dates"):
+            line += f"  ({result['dates']} dates)"
+        if "reads" in result:
+            line += (f"  p95 {result['p95_seconds'] * 1000:.2f} ms, max {result['max_seconds'] * 1000:.2f} ms, "
+                     f"{result['reads']} reads, {result['errors']} errors, "
+                     f"writer {result['write_rows_per_second']:,.0f} rows/s")
+        self.stdout.write(line)
+
+    def handle(self, *args, **options):
+        previous = None
+        if options.get('compare'):
+            try:
+                previous = load_results(options['compare'])
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read {options['compare']}: {str(e)}")
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{options['symbols']} symbols x {options['days']} days, repeat {options['repeat']}"
+        ))
+        report = run_benchmarks(
+            symbols=options['symbols'],
+            days=options['days'],
+            repeat=options['repeat'],
+            workers=options.get('workers'),
+            latency=options['latency'],
+            only=options.get('only'),
+            keep=options['keep'],
+            progress=self.report_result,
+        )
+
+        output = options.get('output') or f"benchmark-results/{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+        save_results(report, output)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
+
+        if previous is None:
+            return
+        if previous.get("config") != report["config"]:
+            self.stdout.write(self.style.WARNING(f"{options['compare']} was run with {previous.get('config')}"))
+        if previous.get("environment") != report["environment"]:
+            self.stdout.write(self.style.WARNING(f"{options['compare']} was run on a different environment"))
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n{'benchmark':<36}{'previous':>12}{'current':>12}{'change':>9}"))
+        comparison = compare_results(report, previous, options['threshold'])
+        for row in comparison:
+            change = f"{row['change']:+.0%}" if row['change'] is not None else '-'
+            line = f"{row['name']:<36}{row['previous'] * 1000:9.2f} ms{row['current'] * 1000:9.2f} ms{change:>9}"
+            self.stdout.write(self.style.ERROR(line) if row['regression'] else line)
+
+        regressions = [row['name'] for row in comparison if row['regression']]
+        if regressions:
+            message = f"{len(regressions)} benchmark(s) slower by more than {options['threshold']:.0%}: {', '.join(regressions)}"
+            if options['fail_on_regression']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS("No regressions"))
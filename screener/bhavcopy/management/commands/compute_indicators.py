@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from bhavcopy.indicators import update_indicators, enabled_indicators
+from datetime import datetime
+import time
+
+class Command(BaseCommand):
+    help = 'Compute technical indicators for stored bhavcopy dates not yet in DailyIndicator'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Discard stored indicators and recompute the full history')
+        parser.add_argument('--end', type=str, help='Last date to compute (DD-MM-YYYY)')
+        parser.add_argument('--chunk_days', type=int, help='Trading days computed per pass')
+        parser.add_argument('--batch_size', type=int, help='Rows per INSERT statement')
+
+    def handle(self, *args, **options):
+        end = datetime.strptime(options['end'], "%d-%m-%Y").date() if options.get('end') else None
+        self.stdout.write(f"Indicators: {', '.join(enabled_indicators())}")
+
+        started = time.monotonic()
+        result = update_indicators(
+            rebuild=options['rebuild'],
+            end=end,
+            chunk_days=options.get('chunk_days'),
+            batch_size=options.get('batch_size'),
+        )
+
+        if not result["dates"]:
+            self.stdout.write(self.style.SUCCESS("Indicators are up to date"))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Indicators {'rebuilt' if result['rebuilt'] else 'updated'} for {result['start']} to {result['end']}. "
+            f"Dates: {result['dates']}, Rows: {result['rows']}, Time: {time.monotonic() - started:.1f}s"
+        ))
@@ -1,86 +1,121 @@
 # For command line execution as a management command
 from django.core.management.base import BaseCommand
-import time
 from bhavcopy.yearly_bhavcopy_download_views import YearlyBhavcopyDownloaderView
-import datetime
+from bhavcopy.backfill_scheduler import BackfillScheduler
+from bhavcopy.raw_archive import RawArchive
+from bhavcopy.db_tuning import bulk_ingest
+from bhavcopy.jobs import enqueue_download_job
+from bhavcopy.metrics import STAGES, get_metrics, run_summary
+from datetime import datetime
 
 class Command(BaseCommand):
     help = 'Download Bhavcopy data for an entire year'
-    
+    downloader_class = YearlyBhavcopyDownloaderView
+
     def add_arguments(self, parser):
         parser.add_argument('year', type=int, help='Year to download data for')
         parser.add_argument('--start_from', type=str, help='Optional date to start from (DD-MM-YYYY)')
-        
+        parser.add_argument('--queue', action='store_true', help='Queue a download job for run_download_worker instead of downloading now')
+        self.add_backfill_arguments(parser)
+
+    def add_backfill_arguments(self, parser):
+        """Options shared by every command that runs the backfill scheduler."""
+        parser.add_argument('--batch_size', type=int, help='Rows per bulk upsert statement')
+        parser.add_argument('--workers', type=int, help='Number of concurrent download workers')
+        parser.add_argument('--rate', type=float, help='Maximum requests per second across all workers')
+        parser.add_argument('--deadline', type=float, help='Stop starting new downloads after this many seconds')
+        parser.add_argument('--offline', action='store_true', help='Rebuild from the raw-file archive only, never the network')
+        parser.add_argument('--revalidate', action='store_true', help='Revalidate archived files with the server (ETag/Last-Modified)')
+        parser.add_argument('--bulk_ingest', action='store_true',
+                            help='Write in SQLite bulk ingest mode (no fsyncs until the end; rerun the backfill after a crash)')
+
+    def build_downloader(self, options):
+        """Create the downloader configured from the shared backfill options."""
+        downloader = self.downloader_class()
+        downloader.batch_size = options.get('batch_size')
+        if options.get('offline') or options.get('revalidate'):
+            downloader.archive = RawArchive(offline=options.get('offline'), revalidate=options.get('revalidate'))
+        return downloader
+
+    def build_scheduler(self, downloader, options):
+        """Create the backfill scheduler configured from the shared backfill options."""
+        return BackfillScheduler(
+            downloader=downloader,
+            workers=options.get('workers'),
+            rate=options.get('rate'),
+            deadline=options.get('deadline'),
+            on_event=self.report_event,
+        )
+
     def handle(self, *args, **options):
         year = options['year']
         start_from = options.get('start_from')
-        
-        downloader = YearlyBhavcopyDownloaderView()
+
+        downloader = self.build_downloader(options)
         business_days = downloader._get_business_days(year)
-        
+
         # Filter dates if start_from is provided
         if start_from:
             start_dt = datetime.strptime(start_from, "%d-%m-%Y")
             business_days = [d for d in business_days if d >= start_dt]
-        
+
+        if options.get('queue'):
+            job, created = enqueue_download_job(business_days)
+            if created:
+                self.stdout.write(self.style.SUCCESS(f"Queued job {job.id} for year {year}. Total dates: {len(business_days)}"))
+            else:
+                self.stdout.write(self.style.WARNING(f"Job {job.id} for this range is already {job.status}"))
+            return
+
         self.stdout.write(self.style.SUCCESS(f"Starting download for year {year}. Total dates: {len(business_days)}"))
-        
-        # Track progress
-        successful_dates = 0
-        failed_dates = 0
-        skipped_dates = 0
-        
-        # Establish initial session
-        session = downloader._establish_session()
-        if not session:
-            self.stdout.write(self.style.ERROR("Could not establish initial session. Aborting."))
+
+        scheduler = self.build_scheduler(downloader, options)
+        before = get_metrics().snapshot()
+        with bulk_ingest(enabled=options.get('bulk_ingest')):
+            summary = scheduler.run(business_days)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Yearly download completed. Success: {summary['successful_dates']}, "
+            f"Failed: {summary['failed_dates']}, Skipped: {summary['skipped_dates']}"
+        ))
+        self.report_metrics(run_summary(before))
+
+    def report_metrics(self, summary, slowest=5):
+        """Write where the run's time went: per-stage timings, HTTP counts and the slowest dates."""
+        if not summary["stages"]:
             return
-        
-        # Track when to refresh the session
-        request_count = 0
-        
-        for dt in business_days:
-            try:
-                # Check if we need to refresh the session
-                if request_count >= downloader.session_refresh_interval:
-                    self.stdout.write("Refreshing session...")
-                    session = downloader._establish_session()
-                    if not session:
-                        self.stdout.write(self.style.ERROR("Failed to refresh session. Retrying..."))
-                        time.sleep(30)  # Wait longer before retry
-                        session = downloader._establish_session()
-                        if not session:
-                            self.stdout.write(self.style.ERROR("Could not re-establish session after retry. Aborting."))
-                            break
-                    request_count = 0
-                
-                # Process the data for this date
-                result = downloader._process_bhavcopy_data(session, dt)
-                
-                # Update counters
-                if result["status"] == "success":
-                    successful_dates += 1
-                    self.stdout.write(self.style.SUCCESS(f"Success: {dt.strftime('%d-%m-%Y')} - Created: {result['records_created']}, Updated: {result['records_updated']}"))
-                elif result["status"] == "failed":
-                    failed_dates += 1
-                    self.stdout.write(self.style.ERROR(f"Failed: {dt.strftime('%d-%m-%Y')} - {result.get('error', 'Unknown error')}"))
-                else:  # skipped
-                    skipped_dates += 1
-                    self.stdout.write(self.style.WARNING(f"Skipped: {dt.strftime('%d-%m-%Y')} - {result.get('reason', 'Unknown reason')}"))
-                
-                # Log progress
-                total_processed = successful_dates + failed_dates + skipped_dates
-                self.stdout.write(f"Progress: {total_processed}/{len(business_days)} dates processed. " +
-                               f"Success: {successful_dates}, Failed: {failed_dates}, Skipped: {skipped_dates}")
-                
-                # Increment request counter
-                request_count += 1
-                
-                # Rate limiting - wait between requests
-                time.sleep(3)  # 3 seconds between requests
-                
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f"Error processing date {dt.strftime('%d-%m-%Y')}: {str(e)}"))
-                failed_dates += 1
-        
-        self.stdout.write(self.style.SUCCESS(f"Yearly download completed. Success: {successful_dates}, Failed: {failed_dates}, Skipped: {skipped_dates}"))
\ No newline at end of file
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\n{'stage':<8}{'dates':>7}{'total':>11}{'mean':>11}{'p95':>11}{'max':>11}{'rows/s':>13}"))
+        for stage, timing in summary["stages"].items():
+            rate = f"{timing['rows_per_second']:,.0f}" if timing["rows_per_second"] else '-'
+            self.stdout.write(
+                f"{stage:<8}{timing['dates']:>7}{timing['seconds']:>10.2f}s"
+                f"{timing['mean'] * 1000:>9.1f}ms{timing['p95'] * 1000:>9.1f}ms{timing['max'] * 1000:>9.1f}ms{rate:>13}")
+
+        for title, counts in (("HTTP responses", summary["http_statuses"]), ("Retries", summary["retries"]),
+                              ("Session refreshes", summary["session_refreshes"])):
+            if counts:
+                self.stdout.write(f"{title}: " + ', '.join(f"{key} x {count}" for key, count in sorted(counts.items())))
+
+        dates = sorted(summary["dates"], key=lambda d: sum(d["stages"].values()), reverse=True)[:slowest]
+        if dates:
+            self.stdout.write("Slowest dates: " + '; '.join(
+                f"{d['date']} {sum(d['stages'].values()):.2f}s (" +
+                ', '.join(f"{stage} {d['stages'][stage]:.2f}s" for stage in STAGES if stage in d['stages']) + ")"
+                for d in dates))
+
+    def report_event(self, event):
+        """Write scheduler progress events to stdout."""
+        if event["event"] != "date_completed":
+            return
+
+        result = event["result"]
+        if result["status"] == "success":
+            self.stdout.write(self.style.SUCCESS(f"Success: {result['date']} - Created: {result['records_created']}, Updated: {result['records_updated']}"))
+        elif result["status"] == "failed":
+            self.stdout.write(self.style.ERROR(f"Failed: {result['date']} - {result.get('error', 'Unknown error')}"))
+        else:  # skipped
+            self.stdout.write(self.style.WARNING(f"Skipped: {result['date']} - {result.get('reason', 'Unknown reason')}"))
+
+        self.stdout.write(f"Progress: {event['completed']}/{event['total']} dates processed. " +
+                       f"Success: {event['successful']}, Failed: {event['failed']}, Skipped: {event['skipped']}")
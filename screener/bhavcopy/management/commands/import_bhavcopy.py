@@ -1,10 +1,18 @@
 from django.core.management.base import BaseCommand
-import requests
 import datetime
 import pandas as pd
 import io
+import os
 from datetime import datetime
-from bhavcopy.models import Bhavcopy
+from bhavcopy.bulk_upsert import bulk_upsert_bhavcopy
+from bhavcopy.raw_archive import get_archive, RawArchive, SOURCE_BHAVCOPY
+from bhavcopy.nse_client import get_nse_client
+from bhavcopy.parsing import parse_bhavcopy
+from bhavcopy.gaps import find_gaps
+from bhavcopy.bulk_import import import_directory, scaling_report
+from bhavcopy.backfill_scheduler import BackfillScheduler
+from bhavcopy.db_tuning import bulk_ingest
+from bhavcopy.yearly_bhavcopy_download_views import YearlyBhavcopyDownloaderView
 import logging
 import bhavcopy.constants as constant
 
@@ -13,9 +21,21 @@ logger = logging.getLogger(__name__)
 class Command(BaseCommand):
     help = 'Fetch and process Bhavcopy data from external source'
     timeout = 4
+    batch_size = None
+    archive = None
 
     def add_arguments(self, parser):
         parser.add_argument('--date', type=str, help='Date in YYYY-MM-DD format', required=False)
+        parser.add_argument('--batch_size', type=int, help='Rows per bulk upsert statement', required=False)
+        parser.add_argument('--offline', action='store_true', help='Only use the raw-file archive, never the network')
+        parser.add_argument('--catch_up', action='store_true', help='Fetch only the trading days that are missing or partial in the database')
+        parser.add_argument('--since', type=str, help='With --catch_up, first date to check in YYYY-MM-DD format (default: the first date stored in the last BHAVCOPY_CATCHUP_LOOKBACK_DAYS days, else the latest stored date)')
+        parser.add_argument('--dry_run', action='store_true', help='With --catch_up, list the dates without fetching them; with --from_dir, parse without writing')
+        parser.add_argument('--from_dir', type=str, help='Re-import every bhavcopy CSV (.csv or .csv.gz) under this directory')
+        parser.add_argument('--workers', type=int, help='With --from_dir, parser processes (default: CPU count)')
+        parser.add_argument('--commit_rows', type=int, help='With --from_dir, rows written per transaction')
+        parser.add_argument('--bulk_ingest', action='store_true',
+                            help='With --from_dir or --catch_up, write in SQLite bulk ingest mode (no fsyncs until the end)')
 
     def get(self, dt):
         """
@@ -39,39 +59,24 @@ class Command(BaseCommand):
             csv_url = constant.link_bhavcopy.format(dd=dd, mm=mm, yyyy=yyyy)
             print(csv_url)
             
-            # Setup headers for the request
-            headers = {
-                "Host": "www.niftyindices.com",
-                "Referer": "https://www.nseindia.com",
-                "X-Requested-With": "XMLHttpRequest",
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/84.0.4147.135 Safari/537.36",
-                "Accept": "*/*",
-                "Accept-Encoding": "gzip, deflate",
-                "Accept-Language": "en-GB,en-US;q=0.9,en;q=0.8",
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-            }
-            
-            # Create a session and update headers
-            session = requests.Session()
-            session.headers.update(headers)
-            
-            # Fetch the CSV file
-            response = session.get(csv_url, timeout=self.timeout)
-            
-            if response.status_code != 200:
-                self.stdout.write(self.style.ERROR(f"Failed to fetch CSV: {response.status_code}"))
-                return None
+            # Fetch the CSV file, from the raw archive when it is already there
+            fetched = (self.archive or get_archive()).fetch(get_nse_client(), SOURCE_BHAVCOPY, dt, csv_url,
+                                                            timeout=self.timeout)
             
-            # Parse CSV content with pandas
-            csv_content = io.StringIO(response.content.decode('utf-8'))
-            df = pd.read_csv(csv_content)
+            if fetched["content"] is None:
+                if fetched["origin"] == "offline":
+                    self.stdout.write(self.style.ERROR("Bhavcopy not in archive (offline mode)"))
+                else:
+                    self.stdout.write(self.style.ERROR(f"Failed to fetch CSV: {fetched.get('error') or fetched['status_code']}"))
+                return None
             
-            # Clean column names and handle potential spaces
-            df.columns = df.columns.str.strip()
+            if fetched["origin"] == "archive":
+                self.stdout.write(self.style.SUCCESS('Using archived copy.'))
             
-            # Convert date format
-            df['DATE1'] = pd.to_datetime(df['DATE1'], format='%d-%b-%Y').dt.date
+            # Parse and clean CSV content into typed columns
+            df, parse_stats = parse_bhavcopy(fetched["content"])
+            if parse_stats["filled"]:
+                self.stdout.write(f"Filled {parse_stats['filled']} missing values with 0")
             
             return df
             
@@ -93,50 +98,121 @@ class Command(BaseCommand):
             self.stdout.write(self.style.WARNING("No data to update."))
             return 0, 0
             
-        records_created = 0
-        records_updated = 0
-        
         try:
-            for _, row in df.iterrows():
-                # Convert row to dict
-                data_dict = row.to_dict()
-                
-                # Try to get existing record or create new one
-                try:
-                    obj, created = Bhavcopy.objects.update_or_create(
-                        SYMBOL=data_dict['SYMBOL'],
-                        SERIES=data_dict['SERIES'],
-                        DATE1=data_dict['DATE1'],
-                        defaults={
-                            'PREV_CLOSE': data_dict['PREV_CLOSE'],
-                            'OPEN_PRICE': data_dict['OPEN_PRICE'],
-                            'HIGH_PRICE': data_dict['HIGH_PRICE'],
-                            'LOW_PRICE': data_dict['LOW_PRICE'],
-                            'LAST_PRICE': data_dict['LAST_PRICE'],
-                            'CLOSE_PRICE': data_dict['CLOSE_PRICE'],
-                            'AVG_PRICE': data_dict['AVG_PRICE'],
-                            'TTL_TRD_QNTY': data_dict['TTL_TRD_QNTY'],
-                            'TURNOVER_LACS': data_dict['TURNOVER_LACS'],
-                            'NO_OF_TRADES': data_dict['NO_OF_TRADES'],
-                            'DELIV_QTY': data_dict['DELIV_QTY'],
-                            'DELIV_PER': data_dict['DELIV_PER'],
-                        }
-                    )
-                    
-                    if created:
-                        records_created += 1
-                    else:
-                        records_updated += 1
-                        
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(f"Error processing row {data_dict['SYMBOL']}: {str(e)}"))
+            result = bulk_upsert_bhavcopy(df, batch_size=self.batch_size)
+            
+            if result["records_with_errors"]:
+                self.stdout.write(self.style.ERROR(f"Rows with errors: {result['records_with_errors']}"))
             
-            return records_created, records_updated
+            return result["records_created"], result["records_updated"]
             
         except Exception as e:
             self.stdout.write(self.style.ERROR(f"Error updating database: {str(e)}"))
             return 0, 0
 
+    def catch_up(self, options):
+        """
+        Fetch only the missing and partial trading days.
+        
+        When everything is present this is one grouped query over the
+        recent lookback window plus the calendar lookup, so it is cheap to
+        run from cron every few minutes; --since checks further back. After
+        a longer outage it resumes from the latest stored date.
+        Storing a date is an upsert, so overlapping runs are harmless.
+        """
+        since = datetime.strptime(options['since'], '%Y-%m-%d').date() if options.get('since') else None
+        gaps = find_gaps(start=since)
+        
+        dates = sorted(set(gaps["missing"]) | set(gaps["partial"]))
+        if not dates:
+            self.stdout.write(self.style.SUCCESS(
+                f"Up to date: {gaps['checked']} trading days from {gaps['start']} to {gaps['end']}"
+            ))
+            return
+        
+        self.stdout.write(
+            f"Missing: {len(gaps['missing'])}, partial: {len(gaps['partial'])} "
+            f"of {gaps['checked']} trading days from {gaps['start']} to {gaps['end']}"
+        )
+        if options.get('dry_run'):
+            for d in dates:
+                self.stdout.write(f"  {d} {'partial' if d in gaps['partial'] else 'missing'}")
+            return
+        
+        downloader = YearlyBhavcopyDownloaderView()
+        downloader.batch_size = self.batch_size
+        downloader.archive = self.archive
+        with bulk_ingest(enabled=options.get('bulk_ingest')):
+            summary = BackfillScheduler(downloader=downloader).run(
+                [datetime.combine(d, datetime.min.time()) for d in dates]
+            )
+        for result in summary["results"]:
+            if result["status"] == "failed":
+                self.stdout.write(self.style.ERROR(f"Failed: {result['date']} - {result.get('error', 'Unknown error')}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Catch-up completed. Success: {summary['successful_dates']}, "
+            f"Failed: {summary['failed_dates']}, Skipped: {summary['skipped_dates']}"
+        ))
+
+    def from_dir(self, options):
+        """
+        Re-import a directory of stored bhavcopy files.
+        
+        Files are parsed in a process pool and written by this process alone
+        (see bhavcopy.bulk_import). The report shows whether parsing or the
+        database writes limited the run, and how many workers the writer can
+        keep up with.
+        """
+        path = options['from_dir']
+        if not os.path.isdir(path):
+            self.stdout.write(self.style.ERROR(f"Not a directory: {path}"))
+            return
+        
+        def progress(result):
+            if "error" in result:
+                self.stdout.write(self.style.ERROR(f"Failed: {result['path']} - {result['error']}"))
+        
+        with bulk_ingest(enabled=options.get('bulk_ingest') and not options.get('dry_run')):
+            summary = import_directory(
+                path,
+                workers=options.get('workers'),
+                batch_size=self.batch_size,
+                commit_rows=options.get('commit_rows'),
+                dry_run=options.get('dry_run'),
+                progress=progress,
+            )
+        if not summary["files"]:
+            self.stdout.write(self.style.WARNING(f"No .csv or .csv.gz files under {path}"))
+            return
+        
+        report = scaling_report(summary)
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Parsed' if options.get('dry_run') else 'Imported'} {summary['files'] - len(summary['failed'])} "
+            f"of {summary['files']} files with {summary['workers']} workers in {summary['elapsed_seconds']:.1f}s. "
+            f"Rows: {summary['rows']}, Created: {summary['records_created']}, Updated: {summary['records_updated']}, "
+            f"Errors: {summary['records_with_errors']}, Dates: {summary['dates']}"
+        ))
+        self.stdout.write(f"Throughput: {report['rows_per_second']:,.0f} rows/s")
+        self.stdout.write(
+            f"Parsing: {report['parse_rows_per_worker_second']:,.0f} rows/s per worker "
+            f"({summary['parse_seconds']:.1f} worker-seconds)"
+        )
+        if report['write_rows_per_second']:
+            self.stdout.write(
+                f"Writing: {report['write_rows_per_second']:,.0f} rows/s, writer busy {report['writer_busy']:.0%} "
+                f"of the run, idle {summary['wait_seconds']:.1f}s waiting for parsers"
+            )
+            if report['bottleneck'] == 'writes':
+                self.stdout.write(self.style.WARNING(
+                    f"Database writes are the bottleneck: workers beyond {report['saturating_workers']} "
+                    f"will not make the import faster"
+                ))
+            else:
+                self.stdout.write(
+                    f"Parsing is the bottleneck: throughput should grow with workers up to about "
+                    f"{report['saturating_workers']}, where the writer saturates"
+                )
+    
     def handle(self, *args, **options):
         """
         Main command handler that coordinates fetching and storing data.
@@ -144,6 +220,15 @@ class Command(BaseCommand):
         try:
             # Get date from arguments or use current date
             date_str = options.get('date')
+            self.batch_size = options.get('batch_size')
+            if options.get('offline'):
+                self.archive = RawArchive(offline=True)
+            if options.get('from_dir'):
+                self.from_dir(options)
+                return
+            if options.get('catch_up'):
+                self.catch_up(options)
+                return
             if date_str:
                 dt = datetime.strptime(date_str, '%Y-%m-%d')
             else:
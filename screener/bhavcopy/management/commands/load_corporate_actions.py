@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from bhavcopy.corporate_actions import load_action_file, detect_corporate_actions
+
+class Command(BaseCommand):
+    help = 'Load corporate actions from a CSV and/or infer them from PREV_CLOSE discontinuities in stored bars'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', type=str,
+                            help='Corporate actions CSV (NSE export, or symbol/series/ex_date/purpose/factor columns)')
+        parser.add_argument('--detect', action='store_true',
+                            help='Scan all stored bars for splits and bonuses missing from the table')
+        parser.add_argument('--tolerance', type=float, default=None,
+                            help='Relative PREV_CLOSE jump treated as an action (default BHAVCOPY_CORPORATE_ACTION_TOLERANCE)')
+
+    def handle(self, *args, **options):
+        if not options.get('path') and not options.get('detect'):
+            raise CommandError("Pass a corporate actions CSV path and/or --detect.")
+
+        if options.get('path'):
+            try:
+                counts = load_action_file(options['path'])
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not load {options['path']}: {str(e)}")
+            self.stdout.write(self.style.SUCCESS(
+                f"Loaded {counts['loaded']} actions ({counts['factors_filled']} factors inferred from bars)"
+            ))
+            if counts['unknown_symbols']:
+                self.stdout.write(self.style.WARNING(f"Skipped {counts['unknown_symbols']} rows for unknown symbols"))
+
+        if options.get('detect'):
+            counts = detect_corporate_actions(tolerance=options.get('tolerance'))
+            self.stdout.write(self.style.SUCCESS(
+                f"Inferred {counts['created']} new actions, filled {counts['filled']} factors, "
+                f"updated {counts['updated']}, removed {counts['deleted']} no longer supported"
+            ))
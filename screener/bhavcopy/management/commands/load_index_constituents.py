@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from bhavcopy.models import IndexConstituent, IndexBar
+from bhavcopy.indices import update_relative_strength
+import pandas as pd
+
+class Command(BaseCommand):
+    help = 'Load an index constituent list (NiftyIndices ind_<index>list.csv) used for sector relative strength'
+
+    def add_arguments(self, parser):
+        parser.add_argument('index_name', type=str, help='Index name exactly as in the daily snapshot, e.g. "Nifty IT"')
+        parser.add_argument('path', type=str, help='Constituent CSV with a Symbol column (and optionally Industry)')
+        parser.add_argument('--recompute', action='store_true', help='Recompute relative strength for every stored index date')
+
+    def handle(self, *args, **options):
+        index_name = options['index_name']
+        try:
+            df = pd.read_csv(options['path'], dtype=str, skipinitialspace=True).fillna('')
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not read {options['path']}: {str(e)}")
+        columns = {c.strip().lower(): c for c in df.columns}
+        if 'symbol' not in columns:
+            raise CommandError(f"{options['path']} has no 'Symbol' column")
+
+        symbols = df[columns['symbol']].str.strip()
+        industries = df[columns['industry']].str.strip() if 'industry' in columns else pd.Series('', index=df.index)
+        members = {s: i for s, i in zip(symbols, industries) if s}
+
+        if not IndexBar.objects.filter(INDEX_NAME=index_name).exists():
+            self.stdout.write(self.style.WARNING(f"No index values stored for '{index_name}' yet"))
+
+        # The list replaces the previous membership of the index
+        with transaction.atomic():
+            IndexConstituent.objects.filter(INDEX_NAME=index_name).delete()
+            IndexConstituent.objects.bulk_create([
+                IndexConstituent(INDEX_NAME=index_name, SYMBOL=symbol, INDUSTRY=industry[:100])
+                for symbol, industry in sorted(members.items())
+            ])
+        self.stdout.write(self.style.SUCCESS(f"Loaded {len(members)} constituents for {index_name}"))
+
+        if options['recompute']:
+            dates = list(IndexBar.objects.values_list('DATE1', flat=True).distinct().order_by('DATE1'))
+            rows = update_relative_strength(dates)
+            self.stdout.write(self.style.SUCCESS(f"Relative strength recomputed for {len(dates)} dates ({rows} rows)"))
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from bhavcopy.models import DailyBar, TradingCalendarDay
+from bhavcopy.trading_calendar import load_holiday_file, learn_sessions_from_data
+
+class Command(BaseCommand):
+    help = 'Load exchange holidays and special sessions into the trading calendar'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', type=str, help='Holiday CSV (defaults to settings.BHAVCOPY_HOLIDAY_FILE)')
+        parser.add_argument('--from_data', action='store_true',
+                            help='Also reconcile with stored data: traded weekends and holidays become special sessions')
+
+    def handle(self, *args, **options):
+        path = options.get('path') or getattr(settings, 'BHAVCOPY_HOLIDAY_FILE', None)
+        if not path and not options.get('from_data'):
+            raise CommandError("Pass a holiday CSV path or set BHAVCOPY_HOLIDAY_FILE.")
+
+        if path:
+            try:
+                counts = load_holiday_file(path)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not load {path}: {str(e)}")
+            self.stdout.write(self.style.SUCCESS(
+                f"Loaded {counts['holidays']} holidays and {counts['special_sessions']} special sessions from {path}"
+            ))
+
+        if options.get('from_data'):
+            # Only weekends and listed holidays can change, so only those dates are checked
+            listed = TradingCalendarDay.objects.filter(kind=TradingCalendarDay.KIND_HOLIDAY).values_list('date', flat=True)
+            traded = DailyBar.objects.filter(DATE1__week_day__in=[1, 7]).values_list('DATE1', flat=True).distinct()
+            dates = sorted(set(traded) | set(DailyBar.objects.filter(DATE1__in=list(listed))
+                                             .values_list('DATE1', flat=True).distinct()))
+            learn_sessions_from_data(dates=dates)
+            self.stdout.write(self.style.SUCCESS(f"Checked {len(dates)} traded weekend or holiday dates"))
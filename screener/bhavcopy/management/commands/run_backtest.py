@@ -0,0 +1,99 @@
+from django.core.management.base import BaseCommand, CommandError
+from bhavcopy.backtest import STRATEGIES, load_market_data, run_backtest, sweep, parameter_grid
+from datetime import datetime
+import json
+import time
+
+
+def _number(value):
+    """Parse a parameter value as int or float, leaving other strings alone."""
+    for kind in (int, float):
+        try:
+            return kind(value)
+        except ValueError:
+            pass
+    return value
+
+
+def _parse_assignments(values, multiple=False):
+    parsed = {}
+    for item in values or []:
+        name, sep, value = item.partition('=')
+        if not sep or not name:
+            raise CommandError(f"Expected name=value, got '{item}'")
+        parsed[name.strip()] = [_number(v.strip()) for v in value.split(',')] if multiple else _number(value.strip())
+    return parsed
+
+
+class Command(BaseCommand):
+    help = 'Backtest a strategy over the stored bhavcopy history, optionally sweeping its parameters across a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('strategy', type=str, choices=sorted(STRATEGIES), help='Strategy to run')
+        parser.add_argument('--param', action='append', help='Strategy parameter as name=value (repeatable)')
+        parser.add_argument('--sweep', action='append',
+                            help='Parameter values to sweep as name=v1,v2,... (repeatable; every combination is run)')
+        parser.add_argument('--start', type=str, help='First date (DD-MM-YYYY)')
+        parser.add_argument('--end', type=str, help='Last date (DD-MM-YYYY)')
+        parser.add_argument('--series', type=str, default='EQ', help='SERIES to trade')
+        parser.add_argument('--source', type=str, choices=['columnar', 'db'], help='Market data source (default: columnar store when enabled)')
+        parser.add_argument('--no_adjust', action='store_true', help='Use raw prices, ignoring corporate actions')
+        parser.add_argument('--rebalance_every', type=int, help='Trading days between rebalances')
+        parser.add_argument('--capital', type=float, help='Starting capital in rupees')
+        parser.add_argument('--slippage_bps', type=float, help='Slippage against AVG_PRICE in basis points')
+        parser.add_argument('--impact', type=float, help='Extra slippage per unit of average daily turnover traded')
+        parser.add_argument('--cost_bps', type=float, help='Fees and taxes in basis points of traded value')
+        parser.add_argument('--participation', type=float, help='Largest trade as a share of average daily turnover')
+        parser.add_argument('--workers', type=int, help='Sweep worker processes (default: CPU count)')
+        parser.add_argument('--top', type=int, default=10, help='Sweep results to print')
+        parser.add_argument('--output', type=str, help='Write the results as JSON to this path')
+
+    def handle(self, *args, **options):
+        try:
+            start = datetime.strptime(options['start'], "%d-%m-%Y").date() if options.get('start') else None
+            end = datetime.strptime(options['end'], "%d-%m-%Y").date() if options.get('end') else None
+        except ValueError:
+            raise CommandError("Dates must be in DD-MM-YYYY format.")
+        params = _parse_assignments(options.get('param'))
+        grid = _parse_assignments(options.get('sweep'), multiple=True)
+        execution = {name: options.get(name) for name in
+                     ('rebalance_every', 'capital', 'slippage_bps', 'impact', 'cost_bps', 'participation')}
+
+        started = time.monotonic()
+        data = load_market_data(start, end, series=options['series'], source=options.get('source'),
+                                adjust=not options['no_adjust'])
+        if not len(data.dates):
+            raise CommandError("No market data in the requested range.")
+        self.stdout.write(f"Loaded {data.shape[0]} dates x {data.shape[1]} symbols "
+                          f"({str(data.dates[0])} to {str(data.dates[-1])}) in {time.monotonic() - started:.1f}s")
+
+        started = time.monotonic()
+        if grid:
+            grid = {**{name: [value] for name, value in params.items()}, **grid}
+            configs = len(parameter_grid(grid))
+            results = sweep(data, options['strategy'], grid, workers=options.get('workers'), **execution)
+            self.stdout.write(self.style.SUCCESS(
+                f"Ran {configs} configurations in {time.monotonic() - started:.1f}s"
+            ))
+            for result in results[:options['top']]:
+                if "error" in result:
+                    self.stdout.write(self.style.ERROR(f"{result['params']}: {result['error']}"))
+                    continue
+                self.stdout.write(
+                    f"{result['params']}: sharpe {result['sharpe']}, CAGR {result['cagr']}, "
+                    f"max drawdown {result['max_drawdown']}, turnover {result['turnover']}"
+                )
+        else:
+            try:
+                stats = run_backtest(data, options['strategy'], params, **execution)["stats"]
+            except (TypeError, ValueError) as e:
+                raise CommandError(str(e))
+            results = [{"params": params, **stats}]
+            self.stdout.write(self.style.SUCCESS(f"Backtest finished in {time.monotonic() - started:.1f}s"))
+            for name, value in stats.items():
+                self.stdout.write(f"  {name}: {value}")
+
+        if options.get('output'):
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
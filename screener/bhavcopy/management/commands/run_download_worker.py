@@ -0,0 +1,38 @@
+from bhavcopy.management.commands.download_bhavcopy_yearwise import Command as YearwiseCommand
+from bhavcopy.jobs import DownloadWorker, release_tasks
+from bhavcopy.db_tuning import bulk_ingest
+
+class Command(YearwiseCommand):
+    help = 'Process queued download jobs, resuming unfinished dates after a restart'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when no task is ready instead of polling')
+        parser.add_argument('--poll', type=float, default=5, help='Seconds to wait between polls of an empty queue')
+        parser.add_argument('--batch', type=int, help='Tasks claimed per round')
+        parser.add_argument('--lease', type=int, help='Seconds a claimed task stays leased without progress')
+        self.add_backfill_arguments(parser)
+
+    def handle(self, *args, **options):
+        worker = DownloadWorker(
+            downloader=self.build_downloader(options),
+            workers=options.get('workers'),
+            rate=options.get('rate'),
+            batch=options.get('batch'),
+            lease_seconds=options.get('lease'),
+            deadline=options.get('deadline'),
+            on_event=self.report_event,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Download worker {worker.owner} started"))
+
+        try:
+            with bulk_ingest(enabled=options.get('bulk_ingest')):
+                processed = worker.run(poll=options['poll'], once=options['once'])
+        except KeyboardInterrupt:
+            release_tasks(worker.owner)
+            self.stdout.write(self.style.WARNING("Worker stopped, unfinished tasks returned to the queue"))
+            return
+
+        if worker.deadline_passed():
+            self.stdout.write(self.style.WARNING(f"Deadline reached, unfinished tasks stay queued. Tasks processed: {processed}"))
+            return
+        self.stdout.write(self.style.SUCCESS(f"Queue drained. Tasks processed: {processed}"))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from bhavcopy.models import DailyBar
+from bhavcopy.columnar_store import get_columnar_store
+from datetime import datetime
+import time
+
+class Command(BaseCommand):
+    help = 'Rebuild the Parquet mirror of the Bhavcopy table from the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=str, help='First date to sync (DD-MM-YYYY)')
+        parser.add_argument('--end', type=str, help='Last date to sync (DD-MM-YYYY)')
+
+    def handle(self, *args, **options):
+        store = get_columnar_store()
+        if not store.enabled:
+            raise CommandError("Columnar store is disabled. Install pyarrow and set BHAVCOPY_COLUMNAR_DIR.")
+
+        dates = DailyBar.objects.values_list('DATE1', flat=True).distinct().order_by('DATE1')
+        if options.get('start'):
+            dates = dates.filter(DATE1__gte=datetime.strptime(options['start'], "%d-%m-%Y").date())
+        if options.get('end'):
+            dates = dates.filter(DATE1__lte=datetime.strptime(options['end'], "%d-%m-%Y").date())
+        dates = list(dates)
+
+        # Sync a month at a time so each partition file is written once
+        by_month = {}
+        for d in dates:
+            by_month.setdefault((d.year, d.month), []).append(d)
+
+        started = time.monotonic()
+        total_rows = 0
+        for (year, month), month_dates in sorted(by_month.items()):
+            total_rows += store.sync_dates(month_dates)
+            self.stdout.write(f"Synced {year}-{month:02d}: {len(month_dates)} dates")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Columnar store rebuilt. Rows: {total_rows}, Dates: {len(dates)}, "
+            f"Time: {time.monotonic() - started:.1f}s"
+        ))
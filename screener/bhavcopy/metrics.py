@@ -0,0 +1,288 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime
+import bisect
+import threading
+import time
+import numpy as np
+
+# Stages of the ingest pipeline, in order
+STAGES = ('fetch', 'parse', 'clean', 'write', 'commit')
+
+# Upper bounds of the histogram buckets (+Inf is implied)
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+ROWS_PER_SECOND_BUCKETS = (1e3, 5e3, 1e4, 2.5e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6)
+
+# Dates whose per-stage timings are kept for summaries and ?format=json
+RECENT_DATES = 1000
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _label_text(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing count per label set."""
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, key, (), value) for key, value in sorted(self.values.items())]
+
+
+class Histogram:
+    """Observations counted into cumulative buckets per label set, with their sum."""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets, labels=()):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[position] += 1
+            self.values[key] = (counts, total + value)
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            for key, (counts, total) in sorted(self.values.items()):
+                cumulative = np.cumsum(counts).tolist()
+                for bound, count in zip(self.buckets + (float('inf'),), cumulative):
+                    samples.append((f'{self.name}_bucket', key, (('le', _number(bound)),), count))
+                samples.append((f'{self.name}_sum', key, (), total))
+                samples.append((f'{self.name}_count', key, (), cumulative[-1]))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    Process-wide metrics, rendered in the Prometheus text format.
+
+    Every process keeps its own: the web server's /metrics/ shows what the
+    web workers did, and the download commands summarize their own run.
+    Per-date stage timings are kept for the last RECENT_DATES dates
+    outside the Prometheus metrics, where a date label would create a new
+    time series every day.
+    """
+
+    def __init__(self):
+        self.metrics = OrderedDict()
+        self.lock = threading.Lock()
+        self.dates = OrderedDict()
+        self.sequence = 0
+
+    def _register(self, metric):
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(Counter(name, help_text, labels))
+
+    def histogram(self, name, help_text, buckets=SECONDS_BUCKETS, labels=()):
+        return self._register(Histogram(name, help_text, buckets, labels))
+
+    def record_date(self, source, dt, stage, seconds, rows=None):
+        """Keep a stage timing of one date, replacing an earlier one for the same stage."""
+        date_str = dt.strftime('%d-%m-%Y') if isinstance(dt, (date, datetime)) else str(dt)
+        with self.lock:
+            self.sequence += 1
+            entry = (self.dates.pop((source, date_str), None)
+                     or {"source": source, "date": date_str, "stages": {}, "rows": {}})
+            entry["stages"][stage] = seconds
+            if rows is not None:
+                entry["rows"][stage] = rows
+            entry["sequence"] = self.sequence
+            self.dates[(source, date_str)] = entry
+            while len(self.dates) > RECENT_DATES:
+                self.dates.popitem(last=False)
+
+    def date_timings(self, since=0):
+        """Per-date stage timings recorded after sequence number `since`, oldest first."""
+        with self.lock:
+            return [{**entry, "stages": dict(entry["stages"]), "rows": dict(entry["rows"])}
+                    for entry in self.dates.values() if entry["sequence"] > since]
+
+    def snapshot(self):
+        """Counter values and the current sequence, to diff a run against."""
+        with self.lock:
+            metrics = list(self.metrics.values())
+            sequence = self.sequence
+        counters = {}
+        for metric in metrics:
+            if metric.kind == 'counter':
+                for name, key, _, value in metric.samples():
+                    counters[(name, key)] = value
+        return {"sequence": sequence, "counters": counters}
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, key, extra, value in metric.samples():
+                lines.append(f'{name}{_label_text(metric.labels, key, extra)} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def as_dict(self):
+        """Metrics and recent per-date timings as JSON-ready data."""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        data = {}
+        for metric in metrics:
+            data[metric.name] = [{"name": name, "labels": dict(zip(metric.labels, key), **dict(extra)), "value": value}
+                                 for name, key, extra, value in metric.samples()]
+        return {"metrics": data, "dates": self.date_timings()}
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics():
+    """Return the process-wide MetricsRegistry."""
+    return _registry
+
+
+STAGE_SECONDS = _registry.histogram(
+    'bhavcopy_stage_seconds', 'Time spent per ingested file in each pipeline stage', labels=('source', 'stage'))
+STAGE_ROWS_PER_SECOND = _registry.histogram(
+    'bhavcopy_stage_rows_per_second', 'Rows handled per second by each pipeline stage',
+    buckets=ROWS_PER_SECOND_BUCKETS, labels=('source', 'stage'))
+STAGE_ROWS = _registry.counter('bhavcopy_stage_rows_total', 'Rows handled by each pipeline stage', labels=('source', 'stage'))
+FETCH_SECONDS = _registry.histogram(
+    'bhavcopy_fetch_seconds', 'Time to obtain a raw file, from the archive or the network', labels=('source', 'origin'))
+HTTP_REQUEST_SECONDS = _registry.histogram(
+    'bhavcopy_http_request_seconds', 'Latency of single HTTP attempts by the NSE client', labels=('site',))
+HTTP_RESPONSES = _registry.counter(
+    'bhavcopy_http_responses_total', 'HTTP responses received by the NSE client', labels=('site', 'status'))
+HTTP_RETRIES = _registry.counter(
+    'bhavcopy_http_retries_total', 'Requests retried by the NSE client, by the status or error that caused it',
+    labels=('site', 'reason'))
+SESSION_REFRESHES = _registry.counter(
+    'bhavcopy_session_refreshes_total', 'Cookie refreshes of pooled NSE sessions', labels=('site', 'result'))
+
+
+def observe_stage(source, stage, seconds, dt=None, rows=None):
+    """Record one pipeline stage of one file, and of its date when given."""
+    STAGE_SECONDS.observe(seconds, source=source, stage=stage)
+    if rows:
+        STAGE_ROWS.inc(rows, source=source, stage=stage)
+        if seconds > 0:
+            STAGE_ROWS_PER_SECOND.observe(rows / seconds, source=source, stage=stage)
+    if dt is not None:
+        _registry.record_date(source, dt, stage, seconds, rows=rows)
+
+
+@contextmanager
+def timed_stage(source, stage, dt=None):
+    """
+    Time the block as one pipeline stage.
+
+    Yields a dict; set "rows" in it to also record the stage's throughput.
+    """
+    measured = {"rows": None}
+    started = time.perf_counter()
+    try:
+        yield measured
+    finally:
+        observe_stage(source, stage, time.perf_counter() - started, dt=dt, rows=measured["rows"])
+
+
+def observe_file(source, dt, parse_stats, upsert_result, stored_seconds):
+    """
+    Record the parse, clean, write and commit stages of one stored file.
+
+    Args:
+        parse_stats: stats from parse_bhavcopy
+        upsert_result: result of bulk_upsert_bhavcopy
+        stored_seconds: time from the start of the upsert until its
+            transaction committed, on_commit receivers included
+    """
+    rows = parse_stats["rows"]
+    observe_stage(source, 'parse', parse_stats["read_seconds"], dt=dt, rows=rows)
+    observe_stage(source, 'clean', parse_stats["clean_seconds"] + upsert_result["prepare_seconds"], dt=dt, rows=rows)
+    observe_stage(source, 'write', upsert_result["write_seconds"], dt=dt, rows=rows)
+    commit = stored_seconds - upsert_result["prepare_seconds"] - upsert_result["write_seconds"]
+    observe_stage(source, 'commit', max(commit, 0.0), dt=dt)
+
+
+def run_summary(before):
+    """
+    What happened since a snapshot() was taken, for end-of-run reports.
+
+    Returns:
+        dict with per-stage "stages" ({"dates", "seconds", "mean", "p95",
+        "max", "rows", "rows_per_second"}), "http_statuses", "retries" and
+        "session_refreshes" counts, and the per-date timings under "dates"
+    """
+    after = _registry.snapshot()
+    counters = {key: value - before["counters"].get(key, 0) for key, value in after["counters"].items()}
+    dates = _registry.date_timings(since=before["sequence"])
+
+    stages = {}
+    for stage in STAGES:
+        seconds = np.array([d["stages"][stage] for d in dates if stage in d["stages"]])
+        if not len(seconds):
+            continue
+        rows = sum(d["rows"].get(stage, 0) for d in dates)
+        stages[stage] = {
+            "dates": len(seconds),
+            "seconds": float(seconds.sum()),
+            "mean": float(seconds.mean()),
+            "p95": float(np.percentile(seconds, 95)),
+            "max": float(seconds.max()),
+            "rows": rows,
+            "rows_per_second": rows / seconds.sum() if rows and seconds.sum() > 0 else None,
+        }
+
+    def totals(name, position):
+        counts = {}
+        for (metric, key), value in counters.items():
+            if metric == name and value:
+                counts[key[position]] = counts.get(key[position], 0) + value
+        return counts
+
+    return {
+        "stages": stages,
+        "http_statuses": totals(HTTP_RESPONSES.name, 1),
+        "retries": totals(HTTP_RETRIES.name, 1),
+        "session_refreshes": totals(SESSION_REFRESHES.name, 1),
+        "dates": dates,
+    }
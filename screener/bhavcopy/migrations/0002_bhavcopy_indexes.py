@@ -0,0 +1,25 @@
+# Generated by Django 5.1.6 on 2026-10-17 02:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bhavcopy', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bhavcopy',
+            index=models.Index(fields=['DATE1', 'SYMBOL', 'SERIES'], name='bhavcopy_date_symbol_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bhavcopy',
+            index=models.Index(fields=['DATE1', 'SERIES', 'SYMBOL'], name='bhavcopy_date_series_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bhavcopy',
+            index=models.Index(fields=['SYMBOL', 'SERIES', 'DATE1', 'CLOSE_PRICE'], name='bhavcopy_close_cover_idx'),
+        ),
+    ]
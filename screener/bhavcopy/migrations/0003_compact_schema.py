@@ -0,0 +1,121 @@
+# Generated by Django 5.1.6 on 2026-10-17 03:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+FIXED_POINT_SCALE = 100
+FIXED_POINT_FIELDS = ['PREV_CLOSE', 'OPEN_PRICE', 'HIGH_PRICE', 'LOW_PRICE',
+                      'LAST_PRICE', 'CLOSE_PRICE', 'AVG_PRICE', 'TURNOVER_LACS', 'DELIV_PER']
+VALUE_FIELDS = ['PREV_CLOSE', 'OPEN_PRICE', 'HIGH_PRICE', 'LOW_PRICE',
+                'LAST_PRICE', 'CLOSE_PRICE', 'AVG_PRICE', 'TTL_TRD_QNTY',
+                'TURNOVER_LACS', 'NO_OF_TRADES', 'DELIV_QTY', 'DELIV_PER']
+
+
+def q(name):
+    return f'"{name}"'
+
+
+def _encoded(field):
+    if field in FIXED_POINT_FIELDS:
+        return f'CAST(ROUND(b.{q(field)} * {FIXED_POINT_SCALE}) AS BIGINT)'
+    return f'b.{q(field)}'
+
+
+def _decoded(field):
+    if field in FIXED_POINT_FIELDS:
+        return f'b.{q(field)} / {FIXED_POINT_SCALE}.0'
+    return f'b.{q(field)}'
+
+
+# Old wide table -> dimension + fact tables, entirely inside the database
+POPULATE_SQL = [
+    f'''INSERT INTO "bhavcopy_security" ("SYMBOL", "SERIES", "FIRST_DATE", "LAST_DATE")
+        SELECT "SYMBOL", "SERIES", MIN("DATE1"), MAX("DATE1")
+        FROM "bhavcopy_bhavcopy" GROUP BY "SYMBOL", "SERIES"''',
+    f'''INSERT INTO "bhavcopy_dailybar" ("security_id", "DATE1", {", ".join(q(f) for f in VALUE_FIELDS)})
+        SELECT s."id", b."DATE1", {", ".join(_encoded(f) for f in VALUE_FIELDS)}
+        FROM "bhavcopy_bhavcopy" b
+        JOIN "bhavcopy_security" s ON s."SYMBOL" = b."SYMBOL" AND s."SERIES" = b."SERIES"''',
+]
+
+# Columns the Bhavcopy model (and the old table) exposes, decoded from the facts
+DECODED_SELECT = f'''SELECT s."SYMBOL", s."SERIES", b."DATE1", {", ".join(f"{_decoded(f)} AS {q(f)}" for f in VALUE_FIELDS)}
+        FROM "bhavcopy_dailybar" b
+        JOIN "bhavcopy_security" s ON s."id" = b."security_id"'''
+
+RESTORE_SQL = (f'INSERT INTO "bhavcopy_bhavcopy" ("SYMBOL", "SERIES", "DATE1", {", ".join(q(f) for f in VALUE_FIELDS)}) '
+               + DECODED_SELECT)
+
+CREATE_VIEW_SQL = ('CREATE VIEW "bhavcopy_bhavcopy" AS '
+                   + DECODED_SELECT.replace('SELECT ', 'SELECT b."id", ', 1))
+
+DROP_VIEW_SQL = 'DROP VIEW "bhavcopy_bhavcopy"'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bhavcopy', '0002_bhavcopy_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Security',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('SYMBOL', models.CharField(max_length=20)),
+                ('SERIES', models.CharField(max_length=5)),
+                ('ISIN', models.CharField(blank=True, max_length=12, null=True)),
+                ('FIRST_DATE', models.DateField(blank=True, null=True)),
+                ('LAST_DATE', models.DateField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Securities',
+                'unique_together': {('SYMBOL', 'SERIES')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyBar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('DATE1', models.DateField()),
+                ('PREV_CLOSE', models.IntegerField()),
+                ('OPEN_PRICE', models.IntegerField()),
+                ('HIGH_PRICE', models.IntegerField()),
+                ('LOW_PRICE', models.IntegerField()),
+                ('LAST_PRICE', models.IntegerField()),
+                ('CLOSE_PRICE', models.IntegerField()),
+                ('AVG_PRICE', models.IntegerField()),
+                ('TTL_TRD_QNTY', models.BigIntegerField()),
+                ('TURNOVER_LACS', models.BigIntegerField()),
+                ('NO_OF_TRADES', models.IntegerField()),
+                ('DELIV_QTY', models.BigIntegerField()),
+                ('DELIV_PER', models.IntegerField()),
+                ('security', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='bars', to='bhavcopy.security')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['DATE1', 'security'], name='dailybar_date_security_idx')],
+                'unique_together': {('security', 'DATE1')},
+            },
+        ),
+        migrations.RunSQL(POPULATE_SQL, reverse_sql=RESTORE_SQL),
+        # The wide table is dropped and Bhavcopy becomes an unmanaged model
+        # over a view with the same name and columns
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.DeleteModel(name='Bhavcopy'),
+            ],
+            state_operations=[
+                migrations.RemoveIndex(model_name='bhavcopy', name='bhavcopy_date_symbol_idx'),
+                migrations.RemoveIndex(model_name='bhavcopy', name='bhavcopy_date_series_idx'),
+                migrations.RemoveIndex(model_name='bhavcopy', name='bhavcopy_close_cover_idx'),
+                migrations.AlterUniqueTogether(name='bhavcopy', unique_together=set()),
+                migrations.AlterModelOptions(
+                    name='bhavcopy',
+                    options={'managed': False, 'verbose_name': 'Bhavcopy Data', 'verbose_name_plural': 'Bhavcopy Data'},
+                ),
+                migrations.AlterModelTable(name='bhavcopy', table='bhavcopy_bhavcopy'),
+            ],
+        ),
+        migrations.RunSQL(CREATE_VIEW_SQL, reverse_sql=DROP_VIEW_SQL),
+    ]
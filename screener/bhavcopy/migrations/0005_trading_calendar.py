@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-17 02:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bhavcopy', '0004_download_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TradingCalendarDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('kind', models.CharField(choices=[('holiday', 'Holiday'), ('special_session', 'Special session')], default='holiday', max_length=20)),
+                ('description', models.CharField(blank=True, default='', max_length=200)),
+                ('source', models.CharField(choices=[('file', 'Loaded from file'), ('learned', 'Learned from downloads')], default='file', max_length=20)),
+            ],
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.6 on 2026-10-17 02:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bhavcopy', '0005_trading_calendar'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndicatorState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateField()),
+                ('payload', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyIndicator',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('DATE1', models.DateField()),
+                ('SMA_20', models.FloatField(null=True)),
+                ('SMA_50', models.FloatField(null=True)),
+                ('SMA_200', models.FloatField(null=True)),
+                ('EMA_12', models.FloatField(null=True)),
+                ('EMA_26', models.FloatField(null=True)),
+                ('RSI_14', models.FloatField(null=True)),
+                ('ATR_14', models.FloatField(null=True)),
+                ('HIGH_52W', models.FloatField(null=True)),
+                ('LOW_52W', models.FloatField(null=True)),
+                ('security', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='indicators', to='bhavcopy.security')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['DATE1', 'security'], name='indicator_date_security_idx')],
+                'unique_together': {('security', 'DATE1')},
+            },
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.1.6 on 2026-10-17 02:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bhavcopy', '0006_daily_indicators'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexBar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('INDEX_NAME', models.CharField(max_length=100)),
+                ('DATE1', models.DateField()),
+                ('OPEN_VALUE', models.FloatField(null=True)),
+                ('HIGH_VALUE', models.FloatField(null=True)),
+                ('LOW_VALUE', models.FloatField(null=True)),
+                ('CLOSE_VALUE', models.FloatField(null=True)),
+                ('POINTS_CHANGE', models.FloatField(null=True)),
+                ('CHANGE_PCT', models.FloatField(null=True)),
+                ('VOLUME', models.BigIntegerField(null=True)),
+                ('TURNOVER_CR', models.FloatField(null=True)),
+                ('PE', models.FloatField(null=True)),
+                ('PB', models.FloatField(null=True)),
+                ('DIV_YIELD', models.FloatField(null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['DATE1'], name='indexbar_date_idx')],
+                'unique_together': {('INDEX_NAME', 'DATE1')},
+            },
+        ),
+        migrations.CreateModel(
+            name='IndexConstituent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('INDEX_NAME', models.CharField(max_length=100)),
+                ('SYMBOL', models.CharField(max_length=50)),
+                ('INDUSTRY', models.CharField(blank=True, max_length=100)),
+            ],
+            options={
+                'unique_together': {('INDEX_NAME', 'SYMBOL')},
+            },
+        ),
+        migrations.CreateModel(
+            name='RelativeStrength',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('DATE1', models.DateField()),
+                ('INDEX_NAME', models.CharField(max_length=100)),
+                ('RS_21', models.FloatField(null=True)),
+                ('RS_63', models.FloatField(null=True)),
+                ('RS_126', models.FloatField(null=True)),
+                ('RS_252', models.FloatField(null=True)),
+                ('security', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='relative_strength', to='bhavcopy.security')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['DATE1', 'INDEX_NAME'], name='rs_date_index_idx')],
+                'unique_together': {('security', 'DATE1', 'INDEX_NAME')},
+            },
+        ),
+    ]
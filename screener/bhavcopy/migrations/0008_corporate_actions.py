@@ -0,0 +1,29 @@
+# Generated by Django 5.1.6 on 2026-10-17 02:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bhavcopy', '0007_index_closes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorporateAction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('EX_DATE', models.DateField()),
+                ('PURPOSE', models.CharField(blank=True, default='', max_length=200)),
+                ('FACTOR', models.FloatField(null=True)),
+                ('source', models.CharField(choices=[('file', 'Loaded from a corporate actions file'), ('inferred', 'Inferred from a PREV_CLOSE discontinuity')], default='file', max_length=20)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('security', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='corporate_actions', to='bhavcopy.security')),
+            ],
+            options={
+                'unique_together': {('security', 'EX_DATE')},
+            },
+        ),
+    ]
@@ -0,0 +1,118 @@
+# Generated by Django 5.1.6 on 2026-10-17 02:51
+
+from datetime import date
+from django.db import migrations
+
+TABLE = 'bhavcopy_dailybar'
+OLD_TABLE = 'bhavcopy_dailybar_old'
+DEFAULT_PARTITION = 'bhavcopy_dailybar_default'
+VIEW = 'bhavcopy_bhavcopy'
+
+FIXED_POINT_SCALE = 100
+FIXED_POINT_FIELDS = ['PREV_CLOSE', 'OPEN_PRICE', 'HIGH_PRICE', 'LOW_PRICE',
+                      'LAST_PRICE', 'CLOSE_PRICE', 'AVG_PRICE', 'TURNOVER_LACS', 'DELIV_PER']
+VALUE_FIELDS = ['PREV_CLOSE', 'OPEN_PRICE', 'HIGH_PRICE', 'LOW_PRICE',
+                'LAST_PRICE', 'CLOSE_PRICE', 'AVG_PRICE', 'TTL_TRD_QNTY',
+                'TURNOVER_LACS', 'NO_OF_TRADES', 'DELIV_QTY', 'DELIV_PER']
+COLUMNS = ['id', 'DATE1'] + VALUE_FIELDS + ['security_id']
+
+
+def q(name):
+    return f'"{name}"'
+
+
+def _decoded(field):
+    if field in FIXED_POINT_FIELDS:
+        return f'CAST(b.{q(field)} AS DOUBLE PRECISION) / {FIXED_POINT_SCALE} AS {q(field)}'
+    return f'b.{q(field)}'
+
+
+# The Bhavcopy view depends on the table, so it is dropped and recreated around the swap
+CREATE_VIEW_SQL = (f'CREATE VIEW {q(VIEW)} AS '
+                   f'SELECT b."id", s."SYMBOL", s."SERIES", b."DATE1", {", ".join(_decoded(f) for f in VALUE_FIELDS)} '
+                   f'FROM {q(TABLE)} b JOIN "bhavcopy_security" s ON s."id" = b."security_id"')
+
+IS_PARTITIONED_SQL = ('SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid '
+                      'WHERE c.relname = %s AND pg_table_is_visible(c.oid)')
+
+
+def partition_sql(year):
+    return (f'CREATE TABLE IF NOT EXISTS {q(f"{TABLE}_y{year}")} PARTITION OF {q(TABLE)} '
+            f"FOR VALUES FROM ('{date(year, 1, 1).isoformat()}') TO ('{date(year + 1, 1, 1).isoformat()}')")
+
+
+def rebuild(connection, partitioned):
+    """
+    Recreate the DailyBar table, range-partitioned by DATE1 year or plain.
+
+    Rows are copied across and the constraints and indexes recreated under
+    their previous names, so later migrations find what they expect. A
+    partitioned table's primary key has to include the partition key, so
+    it becomes (id, DATE1); ids stay unique through the identity sequence.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(IS_PARTITIONED_SQL, [TABLE])
+        if (cursor.fetchone() is not None) == partitioned:
+            return
+
+        constraints = connection.introspection.get_constraints(cursor, TABLE)
+        cursor.execute(f'DROP VIEW IF EXISTS {q(VIEW)}')
+        cursor.execute(f'ALTER TABLE {q(TABLE)} RENAME TO {q(OLD_TABLE)}')
+        cursor.execute(f'CREATE TABLE {q(TABLE)} (LIKE {q(OLD_TABLE)} INCLUDING DEFAULTS INCLUDING IDENTITY)'
+                       + (' PARTITION BY RANGE ("DATE1")' if partitioned else ''))
+
+        if partitioned:
+            # A partition per stored year up to next year; the writer adds later ones
+            cursor.execute(f'SELECT EXTRACT(YEAR FROM MIN("DATE1")), EXTRACT(YEAR FROM MAX("DATE1")) FROM {q(OLD_TABLE)}')
+            first, last = cursor.fetchone()
+            this_year = date.today().year
+            first = int(first) if first is not None else this_year
+            last = max(int(last) if last is not None else this_year, this_year) + 1
+            for year in range(first, last + 1):
+                cursor.execute(partition_sql(year))
+            cursor.execute(f'CREATE TABLE {q(DEFAULT_PARTITION)} PARTITION OF {q(TABLE)} DEFAULT')
+
+        columns = ', '.join(q(c) for c in COLUMNS)
+        cursor.execute(f'INSERT INTO {q(TABLE)} ({columns}) OVERRIDING SYSTEM VALUE SELECT {columns} FROM {q(OLD_TABLE)}')
+        cursor.execute(f'DROP TABLE {q(OLD_TABLE)}')
+
+        # Constraints after the copy: building them once is faster than maintaining them per row
+        for name, info in constraints.items():
+            cols = ', '.join(q(c) for c in info['columns'])
+            if info['primary_key']:
+                key = '"id", "DATE1"' if partitioned else '"id"'
+                cursor.execute(f'ALTER TABLE {q(TABLE)} ADD CONSTRAINT {q(name)} PRIMARY KEY ({key})')
+            elif info['foreign_key']:
+                target, target_column = info['foreign_key']
+                cursor.execute(f'ALTER TABLE {q(TABLE)} ADD CONSTRAINT {q(name)} FOREIGN KEY ({cols}) '
+                               f'REFERENCES {q(target)} ({q(target_column)}) DEFERRABLE INITIALLY DEFERRED')
+            elif info['unique']:
+                cursor.execute(f'ALTER TABLE {q(TABLE)} ADD CONSTRAINT {q(name)} UNIQUE ({cols})')
+            elif info['index']:
+                cursor.execute(f'CREATE INDEX {q(name)} ON {q(TABLE)} ({cols})')
+
+        cursor.execute(f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), "
+                       f'COALESCE(MAX("id"), 0) + 1, false) FROM {q(TABLE)}')
+        cursor.execute(CREATE_VIEW_SQL)
+
+
+def partition(apps, schema_editor):
+    # Range partitions need PostgreSQL; SQLite keeps the plain table
+    if schema_editor.connection.vendor == 'postgresql':
+        rebuild(schema_editor.connection, partitioned=True)
+
+
+def unpartition(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        rebuild(schema_editor.connection, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bhavcopy', '0008_corporate_actions'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.6 on 2026-10-17 02:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bhavcopy', '0009_partition_daily_bars'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('DATE1', models.DateField()),
+                ('ROWS', models.IntegerField()),
+                ('CHECKSUM', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['DATE1', 'id'], name='ingestevent_date_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.6 on 2026-10-17 03:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bhavcopy', '0010_ingest_events'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailybar',
+            index=models.Index(fields=['security', 'DATE1', 'CLOSE_PRICE'], name='dailybar_close_cover_idx'),
+        ),
+    ]
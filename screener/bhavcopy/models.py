@@ -3,7 +3,72 @@ from django.db import models
 # Create your models here.
 from django.db import models
 
+# Prices, turnover and delivery % are stored as integers in hundredths:
+# paise for prices, so 1234.55 is kept as 123455
+FIXED_POINT_SCALE = 100
+FIXED_POINT_FIELDS = ['PREV_CLOSE', 'OPEN_PRICE', 'HIGH_PRICE', 'LOW_PRICE',
+                      'LAST_PRICE', 'CLOSE_PRICE', 'AVG_PRICE', 'TURNOVER_LACS', 'DELIV_PER']
+
+class Security(models.Model):
+    """One row per traded (symbol, series) pair, referenced by DailyBar."""
+    SYMBOL = models.CharField(max_length=20)
+    SERIES = models.CharField(max_length=5)
+    ISIN = models.CharField(max_length=12, null=True, blank=True)
+    # First and last trading dates seen in the bhavcopy files
+    FIRST_DATE = models.DateField(null=True, blank=True)
+    LAST_DATE = models.DateField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.SYMBOL} ({self.SERIES})"
+
+    class Meta:
+        unique_together = ('SYMBOL', 'SERIES')
+        verbose_name_plural = 'Securities'
+
+class DailyBar(models.Model):
+    """
+    Daily fact table behind Bhavcopy.
+
+    The FIXED_POINT_FIELDS hold integers scaled by FIXED_POINT_SCALE. Write
+    through bhavcopy.bulk_upsert and read through Bhavcopy, which converts
+    back to the float columns of the CSV.
+    """
+    # Indexed as the leading column of the unique key, no separate index
+    security = models.ForeignKey(Security, on_delete=models.CASCADE, related_name='bars', db_index=False)
+    DATE1 = models.DateField()
+    PREV_CLOSE = models.IntegerField()
+    OPEN_PRICE = models.IntegerField()
+    HIGH_PRICE = models.IntegerField()
+    LOW_PRICE = models.IntegerField()
+    LAST_PRICE = models.IntegerField()
+    CLOSE_PRICE = models.IntegerField()
+    AVG_PRICE = models.IntegerField()
+    TTL_TRD_QNTY = models.BigIntegerField()
+    TURNOVER_LACS = models.BigIntegerField()
+    NO_OF_TRADES = models.IntegerField()
+    DELIV_QTY = models.BigIntegerField()
+    DELIV_PER = models.IntegerField()
+
+    def __str__(self):
+        return f"{self.security_id} - {self.DATE1}"
+
+    class Meta:
+        # Also serves per-symbol series in date order
+        unique_together = ('security', 'DATE1')
+        indexes = [
+            # Cross-sections and date-range scans
+            models.Index(fields=['DATE1', 'security'], name='dailybar_date_security_idx'),
+            # Close-price series (indicators, backtests) read from the index alone
+            models.Index(fields=['security', 'DATE1', 'CLOSE_PRICE'], name='dailybar_close_cover_idx'),
+        ]
+
 class Bhavcopy(models.Model):
+    """
+    Read-only view joining DailyBar to Security with the original CSV columns.
+
+    Prices come back as rupees (float), so queries, serializers and the
+    columnar mirror work unchanged. The view keeps the old table name.
+    """
     SYMBOL = models.CharField(max_length=20)
     SERIES = models.CharField(max_length=5)
     DATE1 = models.DateField()
@@ -24,6 +89,266 @@ class Bhavcopy(models.Model):
         return f"{self.SYMBOL} - {self.DATE1}"
     
     class Meta:
-        unique_together = ('SYMBOL', 'SERIES', 'DATE1')
+        managed = False
+        db_table = 'bhavcopy_bhavcopy'
         verbose_name = 'Bhavcopy Data'
-        verbose_name_plural = 'Bhavcopy Data'
\ No newline at end of file
+        verbose_name_plural = 'Bhavcopy Data'
+
+class DownloadJob(models.Model):
+    """
+    A persisted request to download one source over a date range.
+
+    Work is split into one DownloadTask per business day and picked up by
+    the run_download_worker command, so progress survives restarts.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    ACTIVE_STATUSES = (STATUS_PENDING, STATUS_RUNNING)
+
+    source = models.CharField(max_length=50, default='sec_bhavdata_full')
+    start_date = models.DateField()
+    end_date = models.DateField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.source} {self.start_date} - {self.end_date} ({self.status})"
+
+    class Meta:
+        constraints = [
+            # At most one active crawl per source and range, across all web workers
+            models.UniqueConstraint(
+                fields=['source', 'start_date', 'end_date'],
+                condition=models.Q(status__in=['pending', 'running']),
+                name='downloadjob_one_active_per_range',
+            ),
+        ]
+
+class DownloadTask(models.Model):
+    """One date of a DownloadJob, claimed by a worker under a time-limited lease."""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCESS = 'success'
+    STATUS_FAILED = 'failed'
+    STATUS_SKIPPED = 'skipped'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCESS, 'Success'),
+        (STATUS_FAILED, 'Failed'),
+        (STATUS_SKIPPED, 'Skipped'),
+    ]
+    FINAL_STATUSES = (STATUS_SUCCESS, STATUS_FAILED, STATUS_SKIPPED)
+
+    job = models.ForeignKey(DownloadJob, on_delete=models.CASCADE, related_name='tasks')
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.IntegerField(default=0)
+    # Pending tasks wait until available_at; retries push it back
+    available_at = models.DateTimeField()
+    lease_owner = models.CharField(max_length=100, null=True, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.job_id} - {self.date} ({self.status})"
+
+    class Meta:
+        unique_together = ('job', 'date')
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='downloadtask_claim_idx'),
+        ]
+
+class TradingCalendarDay(models.Model):
+    """
+    Exceptions to the Monday-Friday exchange week used by bhavcopy.trading_calendar.
+
+    A holiday is a weekday without a session; a special session is a day that
+    trades even though it is a weekend or holiday, such as Muhurat trading.
+    """
+    KIND_HOLIDAY = 'holiday'
+    KIND_SPECIAL_SESSION = 'special_session'
+    KIND_CHOICES = [
+        (KIND_HOLIDAY, 'Holiday'),
+        (KIND_SPECIAL_SESSION, 'Special session'),
+    ]
+    SOURCE_FILE = 'file'
+    SOURCE_LEARNED = 'learned'
+    SOURCE_CHOICES = [
+        (SOURCE_FILE, 'Loaded from file'),
+        (SOURCE_LEARNED, 'Learned from downloads'),
+    ]
+
+    date = models.DateField(unique=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default=KIND_HOLIDAY)
+    description = models.CharField(max_length=200, blank=True, default='')
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES, default=SOURCE_FILE)
+
+    def __str__(self):
+        return f"{self.date} {self.kind} ({self.description})"
+
+class DailyIndicator(models.Model):
+    """
+    Technical indicators per security and trading day, computed by
+    bhavcopy.indicators. Columns not enabled in BHAVCOPY_INDICATORS, or
+    still warming up, are null.
+    """
+    security = models.ForeignKey(Security, on_delete=models.CASCADE, related_name='indicators', db_index=False)
+    DATE1 = models.DateField()
+    SMA_20 = models.FloatField(null=True)
+    SMA_50 = models.FloatField(null=True)
+    SMA_200 = models.FloatField(null=True)
+    EMA_12 = models.FloatField(null=True)
+    EMA_26 = models.FloatField(null=True)
+    RSI_14 = models.FloatField(null=True)
+    ATR_14 = models.FloatField(null=True)
+    HIGH_52W = models.FloatField(null=True)
+    LOW_52W = models.FloatField(null=True)
+
+    def __str__(self):
+        return f"{self.security_id} - {self.DATE1}"
+
+    class Meta:
+        unique_together = ('security', 'DATE1')
+        indexes = [
+            models.Index(fields=['DATE1', 'security'], name='indicator_date_security_idx'),
+        ]
+
+class IndicatorState(models.Model):
+    """
+    Rolling state carried between indicator runs (a single row).
+
+    `payload` is an npz archive with the security id axis, the last window of
+    forward-filled prices and the recursive EMA/RSI/ATR state, as of `as_of`.
+    """
+    as_of = models.DateField()
+    payload = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+class IndexBar(models.Model):
+    """
+    Daily index levels from the NiftyIndices ind_close_all snapshot.
+    Values the file reports as "-" are null.
+    """
+    INDEX_NAME = models.CharField(max_length=100)
+    DATE1 = models.DateField()
+    OPEN_VALUE = models.FloatField(null=True)
+    HIGH_VALUE = models.FloatField(null=True)
+    LOW_VALUE = models.FloatField(null=True)
+    CLOSE_VALUE = models.FloatField(null=True)
+    POINTS_CHANGE = models.FloatField(null=True)
+    CHANGE_PCT = models.FloatField(null=True)
+    VOLUME = models.BigIntegerField(null=True)
+    TURNOVER_CR = models.FloatField(null=True)
+    PE = models.FloatField(null=True)
+    PB = models.FloatField(null=True)
+    DIV_YIELD = models.FloatField(null=True)
+
+    def __str__(self):
+        return f"{self.INDEX_NAME} - {self.DATE1}"
+
+    class Meta:
+        unique_together = ('INDEX_NAME', 'DATE1')
+        indexes = [
+            models.Index(fields=['DATE1'], name='indexbar_date_idx'),
+        ]
+
+class IndexConstituent(models.Model):
+    """Index membership (e.g. Nifty IT constituents), loaded by load_index_constituents."""
+    INDEX_NAME = models.CharField(max_length=100)
+    SYMBOL = models.CharField(max_length=50)
+    INDUSTRY = models.CharField(max_length=100, blank=True)
+
+    def __str__(self):
+        return f"{self.INDEX_NAME} - {self.SYMBOL}"
+
+    class Meta:
+        unique_together = ('INDEX_NAME', 'SYMBOL')
+
+class RelativeStrength(models.Model):
+    """
+    Relative strength of a security against an index: the security's growth
+    over the last N trading days divided by the index's growth, so values
+    above 1 mean it outperformed.
+    """
+    security = models.ForeignKey(Security, on_delete=models.CASCADE, related_name='relative_strength', db_index=False)
+    DATE1 = models.DateField()
+    INDEX_NAME = models.CharField(max_length=100)
+    RS_21 = models.FloatField(null=True)
+    RS_63 = models.FloatField(null=True)
+    RS_126 = models.FloatField(null=True)
+    RS_252 = models.FloatField(null=True)
+
+    def __str__(self):
+        return f"{self.security_id} vs {self.INDEX_NAME} - {self.DATE1}"
+
+    class Meta:
+        unique_together = ('security', 'DATE1', 'INDEX_NAME')
+        indexes = [
+            models.Index(fields=['DATE1', 'INDEX_NAME'], name='rs_date_index_idx'),
+        ]
+
+class CorporateAction(models.Model):
+    """
+    A split, bonus or other action that changes a security's price scale.
+
+    Prices before EX_DATE are multiplied by FACTOR to make them comparable
+    with later ones (0.2 for a 1:5 split, 0.5 for a 1:1 bonus). Stored bars
+    stay raw; bhavcopy.corporate_actions applies the factors when an
+    adjusted series is read. FACTOR is null until the bars around EX_DATE
+    are stored and it can be inferred from them.
+    """
+    SOURCE_FILE = 'file'
+    SOURCE_INFERRED = 'inferred'
+    SOURCE_CHOICES = [
+        (SOURCE_FILE, 'Loaded from a corporate actions file'),
+        (SOURCE_INFERRED, 'Inferred from a PREV_CLOSE discontinuity'),
+    ]
+
+    security = models.ForeignKey(Security, on_delete=models.CASCADE, related_name='corporate_actions', db_index=False)
+    EX_DATE = models.DateField()
+    PURPOSE = models.CharField(max_length=200, blank=True, default='')
+    FACTOR = models.FloatField(null=True)
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES, default=SOURCE_FILE)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.security_id} - {self.EX_DATE} x{self.FACTOR}"
+
+    class Meta:
+        unique_together = ('security', 'EX_DATE')
+
+class IngestEvent(models.Model):
+    """
+    Append-only log of committed bhavcopy dates, written by
+    bhavcopy.ingest_events and streamed to subscribers over SSE.
+
+    The id orders the log and doubles as the SSE event id, so a client that
+    reconnects with Last-Event-ID gets exactly the events it missed.
+    CHECKSUM is a SHA-256 over the date's stored rows; a re-import that
+    changes nothing does not add an event.
+    """
+    DATE1 = models.DateField()
+    ROWS = models.IntegerField()
+    CHECKSUM = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.id} - {self.DATE1} ({self.ROWS} rows)"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['DATE1', 'id'], name='ingestevent_date_idx'),
+        ]
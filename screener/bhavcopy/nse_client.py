@@ -0,0 +1,279 @@
+from django.conf import settings
+from urllib.parse import urlsplit
+import httpx
+import asyncio
+import os
+import random
+import threading
+import time
+import logging
+from bhavcopy.metrics import HTTP_REQUEST_SECONDS, HTTP_RESPONSES, HTTP_RETRIES, SESSION_REFRESHES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/84.0.4147.135 Safari/537.36",
+    "Accept": "*/*",
+    "Accept-Encoding": "gzip, deflate",
+    "Accept-Language": "en-GB,en-US;q=0.9,en;q=0.8",
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+}
+
+# Page that hands out the anti-bot cookies for each site, keyed by domain
+WARM_URLS = {
+    'nseindia.com': 'https://www.nseindia.com/',
+    'niftyindices.com': 'https://www.niftyindices.com/',
+}
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_COOKIE_MAX_AGE = 300  # Seconds before a session's cookies are considered stale
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5  # Base delay in seconds, doubled on every retry
+DEFAULT_TIMEOUT = 15
+
+# Stale cookies: re-warm the session and try again
+SESSION_EXPIRED_STATUSES = (401, 403)
+# Transient server trouble: back off and try again
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def site_for(url, warm_urls=WARM_URLS):
+    """Return the WARM_URLS domain serving a URL, or None for other hosts."""
+    host = urlsplit(url).hostname or ''
+    for domain in warm_urls:
+        if host == domain or host.endswith('.' + domain):
+            return domain
+    return None
+
+
+class _PooledSession:
+    """One keep-alive AsyncClient and when its cookies were warmed, per site."""
+
+    def __init__(self, client):
+        self.client = client
+        self.warmed_at = {}
+
+
+class NSEClient:
+    """
+    Async HTTP client for NSE and NiftyIndices downloads.
+
+    Keeps a pool of httpx.AsyncClient sessions with HTTP keep-alive. Each
+    session fetches the site's home page once to pick up cookies and reuses
+    them until they are older than `cookie_max_age` or a 401/403 comes back.
+    A background task re-warms idle sessions before their cookies expire, so
+    a download is normally a single request on an open connection.
+
+    The pool is bound to the event loop it is first used on; synchronous code
+    should go through SyncNSEClient / get_nse_client() instead.
+    """
+
+    def __init__(self, pool_size=None, cookie_max_age=None, retries=None, backoff=None,
+                 timeout=DEFAULT_TIMEOUT, warm_urls=None):
+        """
+        Args:
+            pool_size: concurrent sessions (BHAVCOPY_NSE_POOL_SIZE)
+            cookie_max_age: seconds before cookies are refreshed
+                (BHAVCOPY_NSE_COOKIE_MAX_AGE)
+            retries: extra attempts per request (BHAVCOPY_NSE_RETRIES)
+            backoff: base delay for jittered exponential backoff
+                (BHAVCOPY_NSE_BACKOFF)
+            timeout: default request timeout in seconds
+            warm_urls: domain -> cookie page mapping, defaults to WARM_URLS
+        """
+        self.pool_size = int(pool_size or getattr(settings, 'BHAVCOPY_NSE_POOL_SIZE', DEFAULT_POOL_SIZE))
+        if cookie_max_age is None:
+            cookie_max_age = getattr(settings, 'BHAVCOPY_NSE_COOKIE_MAX_AGE', DEFAULT_COOKIE_MAX_AGE)
+        if retries is None:
+            retries = getattr(settings, 'BHAVCOPY_NSE_RETRIES', DEFAULT_RETRIES)
+        if backoff is None:
+            backoff = getattr(settings, 'BHAVCOPY_NSE_BACKOFF', DEFAULT_BACKOFF)
+
+        self.cookie_max_age = float(cookie_max_age)
+        self.retries = int(retries)
+        self.backoff = float(backoff)
+        self.timeout = timeout
+        self.warm_urls = dict(WARM_URLS if warm_urls is None else warm_urls)
+        self._sessions = []
+        self._idle = None
+        self._refresh_task = None
+
+    def _ensure_pool(self):
+        """Create the sessions and the refresh task on the running loop."""
+        if self._idle is not None:
+            return
+        self._idle = asyncio.Queue()
+        for _ in range(self.pool_size):
+            session = _PooledSession(httpx.AsyncClient(
+                headers=DEFAULT_HEADERS,
+                timeout=self.timeout,
+                follow_redirects=True,
+            ))
+            self._sessions.append(session)
+            self._idle.put_nowait(session)
+        self._refresh_task = asyncio.get_running_loop().create_task(self._refresh_loop())
+
+    def _is_stale(self, session, site):
+        warmed_at = session.warmed_at.get(site)
+        return warmed_at is None or time.monotonic() - warmed_at > self.cookie_max_age
+
+    def _backoff_delay(self, attempt):
+        """Full jitter: a random delay up to backoff * 2**attempt."""
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    async def _warm(self, session, site):
+        """Fetch the site's cookie page so the session carries fresh cookies."""
+        session.warmed_at.pop(site, None)
+        try:
+            response = await session.client.get(self.warm_urls[site])
+        except httpx.TransportError:
+            SESSION_REFRESHES.inc(site=site, result='error')
+            raise
+        if response.status_code != 200:
+            SESSION_REFRESHES.inc(site=site, result='failed')
+            logger.error(f"Failed to access {self.warm_urls[site]}: {response.status_code}")
+            return False
+        SESSION_REFRESHES.inc(site=site, result='ok')
+        session.warmed_at[site] = time.monotonic()
+        logger.info(f"Session cookies refreshed for {site}")
+        return True
+
+    async def _refresh_loop(self):
+        """Re-warm idle sessions whose cookies are about to go stale."""
+        interval = max(self.cookie_max_age / 4, 1)
+        while True:
+            await asyncio.sleep(interval)
+            # Only sessions sitting in the queue are touched, busy ones refresh on use
+            for _ in range(self._idle.qsize()):
+                session = self._idle.get_nowait()
+                try:
+                    for site, warmed_at in list(session.warmed_at.items()):
+                        if time.monotonic() - warmed_at > self.cookie_max_age * 0.75:
+                            await self._warm(session, site)
+                except Exception as e:
+                    logger.warning(f"Background cookie refresh failed: {str(e)}")
+                finally:
+                    self._idle.put_nowait(session)
+
+    async def warm_up(self, url):
+        """Warm every pooled session for the site serving `url` ahead of time."""
+        self._ensure_pool()
+        site = site_for(url, self.warm_urls)
+        if site is None:
+            return
+        sessions = [await self._idle.get() for _ in range(self.pool_size)]
+        try:
+            await asyncio.gather(*(self._warm(s, site) for s in sessions), return_exceptions=True)
+        finally:
+            for session in sessions:
+                self._idle.put_nowait(session)
+
+    async def get(self, url, headers=None, timeout=None):
+        """
+        GET a URL on a pooled session with warm cookies.
+
+        Transport errors and RETRY_STATUSES are retried with jittered
+        exponential backoff; a 401/403 re-warms the cookies before the retry.
+
+        Args:
+            url: URL to download
+            headers: extra request headers, e.g. conditional request headers
+            timeout: request timeout in seconds, defaults to the client's
+
+        Returns:
+            httpx.Response of the last attempt
+
+        Raises:
+            httpx.TransportError: when the final attempt failed to connect
+        """
+        self._ensure_pool()
+        site = site_for(url, self.warm_urls)
+        label = site or 'other'
+        session = await self._idle.get()
+        try:
+            response = None
+            for attempt in range(self.retries + 1):
+                try:
+                    if site is not None and self._is_stale(session, site):
+                        await self._warm(session, site)
+                    started = time.perf_counter()
+                    response = await session.client.get(url, headers=headers, timeout=timeout or self.timeout)
+                    HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, site=label)
+                    HTTP_RESPONSES.inc(site=label, status=response.status_code)
+                    if response.status_code in SESSION_EXPIRED_STATUSES and site is not None:
+                        logger.warning(f"HTTP {response.status_code} for {url}, refreshing cookies")
+                        session.warmed_at.pop(site, None)
+                    elif response.status_code not in RETRY_STATUSES:
+                        return response
+                    reason = str(response.status_code)
+                except httpx.TransportError as e:
+                    HTTP_RESPONSES.inc(site=label, status='error')
+                    if attempt == self.retries:
+                        raise
+                    logger.warning(f"Request to {url} failed: {str(e)}")
+                    reason = type(e).__name__
+
+                if attempt < self.retries:
+                    HTTP_RETRIES.inc(site=label, reason=reason)
+                    await asyncio.sleep(self._backoff_delay(attempt))
+            return response
+        finally:
+            self._idle.put_nowait(session)
+
+    async def aclose(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+        for session in self._sessions:
+            await session.client.aclose()
+        self._sessions = []
+        self._idle = None
+        self._refresh_task = None
+
+
+class SyncNSEClient:
+    """
+    Blocking wrapper around an NSEClient for management commands, views and
+    the backfill threads.
+
+    The async client lives on a private event loop thread, so every caller in
+    the process shares one warm session pool. get() mirrors
+    requests.Session.get, which lets it stand in as the `session` passed to
+    RawArchive.fetch.
+    """
+
+    def __init__(self, client=None):
+        self.client = client or NSEClient()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='nse-client', daemon=True)
+        self._thread.start()
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def get(self, url, headers=None, timeout=None):
+        return self._run(self.client.get(url, headers=headers, timeout=timeout))
+
+    def warm_up(self, url):
+        self._run(self.client.warm_up(url))
+
+    def close(self):
+        self._run(self.client.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+_default_client = None
+_default_client_pid = None
+_default_client_lock = threading.Lock()
+
+
+def get_nse_client():
+    """Return the process-wide SyncNSEClient, creating it on first use."""
+    global _default_client, _default_client_pid
+    with _default_client_lock:
+        # A forked child cannot reuse the parent's loop thread
+        if _default_client is None or _default_client_pid != os.getpid():
+            _default_client = SyncNSEClient()
+            _default_client_pid = os.getpid()
+        return _default_client
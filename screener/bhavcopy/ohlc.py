@@ -0,0 +1,114 @@
+import numpy as np
+from bhavcopy.corporate_actions import adjusted_series
+from bhavcopy.hot_cache import get_hot_cache
+
+# D passes daily bars through; W weeks start on Monday, Q quarters in January
+INTERVALS = ('D', 'W', 'M', 'Q')
+
+# Summed over the sessions of a candle
+SUM_FIELDS = ['TTL_TRD_QNTY', 'TURNOVER_LACS', 'NO_OF_TRADES', 'DELIV_QTY']
+
+OHLC_FIELDS = ['START_DATE', 'SESSIONS', 'PREV_CLOSE', 'OPEN_PRICE', 'HIGH_PRICE', 'LOW_PRICE', 'CLOSE_PRICE',
+               'AVG_PRICE'] + SUM_FIELDS + ['DELIV_PER']
+
+
+def _buckets(dates, interval):
+    """Integer candle number of every date; equal numbers share a candle."""
+    if interval == 'W':
+        # Day 0 (1970-01-01) was a Thursday; shifting by 3 makes weeks start on Monday
+        return (dates.astype('datetime64[D]').astype('int64') + 3) // 7
+    if interval in ('M', 'Q'):
+        months = dates.astype('datetime64[M]').astype('int64')
+        return months if interval == 'M' else months // 3
+    return dates.astype('datetime64[D]').astype('int64')
+
+
+def _weighted(values, weights, starts, totals):
+    """Per-candle average of `values` weighted by `weights` (NaN where the weights sum to 0)."""
+    sums = np.add.reduceat(values * weights, starts)
+    return np.divide(sums, totals, out=np.full(len(starts), np.nan), where=totals > 0)
+
+
+def resample(columns, interval):
+    """
+    Aggregate a daily series into candles.
+
+    The series must be sorted by date, as load_symbol_series returns it.
+    Open and PREV_CLOSE come from the first session of each candle, close
+    from the last, high and low are the extremes and the quantities are
+    summed. AVG_PRICE is weighted by traded quantity and DELIV_PER is the
+    delivered share of the candle's total quantity.
+
+    Args:
+        columns: dict of DATE1 (datetime64[D]) and UPDATE_FIELDS arrays
+        interval: one of INTERVALS
+
+    Returns:
+        dict with DATE1 (last session of each candle) and OHLC_FIELDS arrays
+    """
+    dates = columns['DATE1']
+    if not len(dates):
+        return {field: np.array([]) for field in ['DATE1'] + OHLC_FIELDS}
+
+    buckets = _buckets(dates, interval)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(dates)] - 1
+    quantity = np.asarray(columns['TTL_TRD_QNTY'], dtype='float64')
+    traded = np.add.reduceat(quantity, starts)
+
+    candles = {
+        'DATE1': dates[ends],
+        'START_DATE': dates[starts],
+        'SESSIONS': ends - starts + 1,
+        'PREV_CLOSE': columns['PREV_CLOSE'][starts],
+        'OPEN_PRICE': columns['OPEN_PRICE'][starts],
+        'HIGH_PRICE': np.maximum.reduceat(columns['HIGH_PRICE'], starts),
+        'LOW_PRICE': np.minimum.reduceat(columns['LOW_PRICE'], starts),
+        'CLOSE_PRICE': columns['CLOSE_PRICE'][ends],
+        'AVG_PRICE': _weighted(columns['AVG_PRICE'], quantity, starts, traded),
+    }
+    for field in SUM_FIELDS:
+        candles[field] = np.add.reduceat(columns[field], starts)
+    candles['DELIV_PER'] = np.divide(candles['DELIV_QTY'] * 100.0, traded,
+                                     out=np.full(len(starts), np.nan), where=traded > 0)
+    return candles
+
+
+def ohlc_series(symbol, series='EQ', interval='W', start=None, end=None, adjusted=False, version=None):
+    """
+    Candles for one symbol, memoized in the hot cache.
+
+    Built from the cached daily series (adjusted for corporate actions when
+    `adjusted`), restricted to sessions between `start` and `end`. Entries
+    are keyed by every argument, `version` (the hot cache's data_version)
+    included, and dropped when new bars or actions are applied.
+
+    Returns:
+        dict as from resample; empty arrays when the symbol has no data
+    """
+    def loader():
+        cache = get_hot_cache()
+        columns = adjusted_series(symbol, series)[0] if adjusted else cache.symbol_series(symbol, series)
+        selected = np.ones(len(columns['DATE1']), dtype=bool)
+        if start:
+            selected &= columns['DATE1'] >= np.datetime64(start, 'D')
+        if end:
+            selected &= columns['DATE1'] <= np.datetime64(end, 'D')
+        return resample({field: values[selected] for field, values in columns.items()}, interval)
+
+    return get_hot_cache().ohlc((symbol, series, interval, start, end, adjusted, version), loader)
+
+
+def candle_rows(candles):
+    """Candles as JSON-ready dicts, prices rounded to paise."""
+    fields = ['DATE1'] + OHLC_FIELDS
+    values = []
+    for field in fields:
+        column = candles[field]
+        if field in ('DATE1', 'START_DATE'):
+            values.append(column.astype(str).tolist())
+        elif column.dtype.kind == 'f':
+            values.append([None if np.isnan(v) else v for v in np.round(column, 2).tolist()])
+        else:
+            values.append(column.tolist())
+    return [dict(zip(fields, row)) for row in zip(*values)]
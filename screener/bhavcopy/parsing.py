@@ -0,0 +1,198 @@
+from django.conf import settings
+import pandas as pd
+import numpy as np
+import io
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# The sec_bhavdata_full schema, declared once for every ingest path
+STRING_COLUMNS = ['SYMBOL', 'SERIES']
+DATE_COLUMN = 'DATE1'
+DATE_FORMAT = '%d-%b-%Y'
+FLOAT_COLUMNS = ['PREV_CLOSE', 'OPEN_PRICE', 'HIGH_PRICE', 'LOW_PRICE',
+                 'LAST_PRICE', 'CLOSE_PRICE', 'AVG_PRICE', 'TURNOVER_LACS', 'DELIV_PER']
+INTEGER_COLUMNS = ['TTL_TRD_QNTY', 'NO_OF_TRADES', 'DELIV_QTY']
+NUMERIC_COLUMNS = ['PREV_CLOSE', 'OPEN_PRICE', 'HIGH_PRICE', 'LOW_PRICE',
+                   'LAST_PRICE', 'CLOSE_PRICE', 'AVG_PRICE', 'TTL_TRD_QNTY',
+                   'TURNOVER_LACS', 'NO_OF_TRADES', 'DELIV_QTY', 'DELIV_PER']
+
+# Placeholders NSE uses for "no value"; they are stored as 0 like before
+NA_TOKENS = ['-', ' -', '- ', ' - ', '']
+FILL_VALUE = 0
+
+ENGINES = ('c', 'pyarrow')
+
+
+def get_engine(engine=None):
+    """Resolve the read_csv engine from the argument or BHAVCOPY_CSV_ENGINE."""
+    engine = engine or getattr(settings, 'BHAVCOPY_CSV_ENGINE', 'c')
+    if engine == 'pyarrow':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            logger.warning("pyarrow not installed, falling back to the C CSV engine")
+            engine = 'c'
+    return engine
+
+
+def _read(buffer, engine):
+    """Read the raw CSV straight into typed columns, NA tokens become NaN."""
+    # Numbers are parsed as float64 so NaN fits; integers are cast after filling
+    dtype = {col: 'float64' for col in NUMERIC_COLUMNS}
+    dtype.update({col: 'string' for col in STRING_COLUMNS})
+    dtype[DATE_COLUMN] = 'string'
+
+    if engine == 'pyarrow':
+        # The pyarrow reader has no skipinitialspace, headers keep their padding
+        df = pd.read_csv(buffer, engine='pyarrow', na_values=NA_TOKENS, keep_default_na=False)
+        df.columns = df.columns.str.strip()
+        for col in STRING_COLUMNS + [DATE_COLUMN]:
+            df[col] = df[col].astype('string').str.strip()
+        return df
+
+    df = pd.read_csv(buffer, engine='c', skipinitialspace=True,
+                     na_values=NA_TOKENS, keep_default_na=False, dtype=dtype)
+    df.columns = df.columns.str.strip()
+    return df
+
+
+def _read_untyped(buffer):
+    """Slow path for files with unexpected tokens: read as text and coerce."""
+    df = pd.read_csv(buffer, engine='c', skipinitialspace=True, dtype=str,
+                     na_values=NA_TOKENS, keep_default_na=False)
+    df.columns = df.columns.str.strip()
+    return df
+
+
+def parse_bhavcopy(content, engine=None):
+    """
+    Parse a raw sec_bhavdata_full CSV into a typed, cleaned DataFrame.
+
+    Numeric columns go directly from the CSV reader into float64 arrays with
+    the NSE dash placeholders read as NaN, so there is no per-column string
+    round-trip. Missing values are then filled with 0 and the count columns
+    cast to int64.
+
+    Args:
+        content: raw CSV bytes (or str)
+        engine: 'c' or 'pyarrow', defaults to settings.BHAVCOPY_CSV_ENGINE
+
+    Returns:
+        tuple: (df, stats) where stats has "rows", "engine", "coerced_columns",
+        "filled" (total values filled), a per-column "columns" breakdown
+        with "missing" and "invalid" counts, and the time spent reading the
+        CSV ("read_seconds") and cleaning it afterwards ("clean_seconds")
+    """
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    engine = get_engine(engine)
+    stats = {"rows": 0, "engine": engine, "filled": 0, "coerced_columns": [], "columns": {},
+             "read_seconds": 0.0, "clean_seconds": 0.0}
+
+    started = time.perf_counter()
+    try:
+        df = _read(io.BytesIO(content), engine)
+        missing = df[[col for col in NUMERIC_COLUMNS if col in df.columns]].isna().sum()
+        invalid = {}
+    except ValueError:
+        # Some numeric column holds a token we do not know; coerce it to NaN
+        df = _read_untyped(io.BytesIO(content))
+        missing = {}
+        invalid = {}
+        for col in NUMERIC_COLUMNS:
+            if col not in df.columns:
+                continue
+            raw = df[col]
+            values = pd.to_numeric(raw, errors='coerce')
+            missing[col] = int(raw.isna().sum())
+            invalid[col] = int(values.isna().sum()) - missing[col]
+            if invalid[col]:
+                stats["coerced_columns"].append(col)
+            df[col] = values
+        logger.warning(f"Coerced non-numeric values in columns: {stats['coerced_columns']}")
+
+    stats["rows"] = len(df)
+    read = time.perf_counter()
+    stats["read_seconds"] = read - started
+    if df.empty:
+        return df, stats
+
+    for col in STRING_COLUMNS:
+        df[col] = df[col].astype(object)
+    df[DATE_COLUMN] = pd.to_datetime(df[DATE_COLUMN], format=DATE_FORMAT).dt.date
+
+    for col in NUMERIC_COLUMNS:
+        if col not in df.columns:
+            continue
+        col_missing = int(missing.get(col, 0))
+        col_invalid = int(invalid.get(col, 0))
+        stats["columns"][col] = {"missing": col_missing, "invalid": col_invalid}
+        stats["filled"] += col_missing + col_invalid
+
+        values = df[col].to_numpy(dtype='float64', na_value=np.nan)
+        values = np.where(np.isnan(values), FILL_VALUE, values)
+        df[col] = values.astype('int64') if col in INTEGER_COLUMNS else values
+
+    stats["clean_seconds"] = time.perf_counter() - read
+    return df, stats
+
+
+# The ind_close_all schema: CSV header -> IndexBar field
+INDEX_COLUMNS = {
+    'Index Name': 'INDEX_NAME',
+    'Index Date': 'DATE1',
+    'Open Index Value': 'OPEN_VALUE',
+    'High Index Value': 'HIGH_VALUE',
+    'Low Index Value': 'LOW_VALUE',
+    'Closing Index Value': 'CLOSE_VALUE',
+    'Points Change': 'POINTS_CHANGE',
+    'Change(%)': 'CHANGE_PCT',
+    'Volume': 'VOLUME',
+    'Turnover (Rs. Cr.)': 'TURNOVER_CR',
+    'P/E': 'PE',
+    'P/B': 'PB',
+    'Div Yield': 'DIV_YIELD',
+}
+INDEX_DATE_FORMAT = '%d-%m-%Y'
+
+
+def parse_index_snapshot(content):
+    """
+    Parse a raw ind_close_all CSV into a DataFrame with IndexBar field names.
+
+    Every value column is converted in one vectorized to_numeric pass; unlike
+    bhavcopy files, placeholders stay NaN (stored as null) because a missing
+    P/E or volume is not zero.
+
+    Args:
+        content: raw CSV bytes (or str)
+
+    Returns:
+        pandas DataFrame with INDEX_NAME, DATE1 (date) and float value columns;
+        rows without a name, date or closing value are dropped
+    """
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    df = pd.read_csv(io.BytesIO(content), engine='c', skipinitialspace=True, dtype=str,
+                     na_values=NA_TOKENS, keep_default_na=False)
+    df.columns = df.columns.str.strip()
+    missing = [c for c in INDEX_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Not an index snapshot, missing columns: {', '.join(missing)}")
+    df = df[list(INDEX_COLUMNS)].rename(columns=INDEX_COLUMNS)
+    if df.empty:
+        return df
+
+    df['INDEX_NAME'] = df['INDEX_NAME'].str.strip()
+    df['DATE1'] = pd.to_datetime(df['DATE1'].str.strip(), format=INDEX_DATE_FORMAT, errors='coerce').dt.date
+    for col in INDEX_COLUMNS.values():
+        if col not in ('INDEX_NAME', 'DATE1'):
+            # Thousands separators show up in volume and turnover
+            df[col] = pd.to_numeric(df[col].str.replace(',', '', regex=False), errors='coerce')
+
+    valid = df['INDEX_NAME'].notna() & (df['INDEX_NAME'] != '') & df['DATE1'].notna() & df['CLOSE_VALUE'].notna()
+    if not valid.all():
+        logger.warning(f"Dropping {int((~valid).sum())} index rows without a name, date or close")
+    return df[valid].reset_index(drop=True)
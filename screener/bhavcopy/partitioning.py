@@ -0,0 +1,85 @@
+from datetime import date
+from django.db import connection as default_connection, transaction
+from django.db.utils import DatabaseError
+import threading
+import logging
+from bhavcopy.models import DailyBar
+
+logger = logging.getLogger(__name__)
+
+# Years known to have a partition, per database alias
+_known_years = {}
+_known_years_lock = threading.Lock()
+
+
+def _quote(connection, name):
+    return connection.ops.quote_name(name)
+
+
+def partition_name(year):
+    return f'{DailyBar._meta.db_table}_y{year}'
+
+
+def is_partitioned(connection=None):
+    """Whether the DailyBar table is a PostgreSQL partitioned table."""
+    connection = connection or default_connection
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid '
+            'WHERE c.relname = %s AND pg_table_is_visible(c.oid)',
+            [DailyBar._meta.db_table],
+        )
+        return cursor.fetchone() is not None
+
+
+def partition_years(connection=None):
+    """Years that have their own DailyBar partition."""
+    connection = connection or default_connection
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = %s AND pg_table_is_visible(p.oid)',
+            [DailyBar._meta.db_table],
+        )
+        prefix = partition_name('')
+        return sorted(int(name[len(prefix):]) for name, in cursor.fetchall()
+                      if name.startswith(prefix) and name[len(prefix):].isdigit())
+
+
+def _create_partition(cursor, connection, year):
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS {_quote(connection, partition_name(year))} '
+        f'PARTITION OF {_quote(connection, DailyBar._meta.db_table)} '
+        f"FOR VALUES FROM ('{date(year, 1, 1).isoformat()}') TO ('{date(year + 1, 1, 1).isoformat()}')"
+    )
+
+
+def ensure_year_partitions(years, connection=None):
+    """
+    Create the DailyBar partitions for `years` that do not exist yet.
+
+    A no-op off PostgreSQL or on an unpartitioned table. Years already seen
+    are remembered per process, so the writer can call this for every file.
+    A partition that cannot be created (its year already has rows in the
+    default partition) is logged and the rows keep going to the default.
+    """
+    connection = connection or default_connection
+    if connection.vendor != 'postgresql':
+        return
+    with _known_years_lock:
+        if connection.alias not in _known_years:
+            # None for an unpartitioned table: nothing to create
+            _known_years[connection.alias] = set(partition_years(connection)) if is_partitioned(connection) else None
+        known = _known_years[connection.alias]
+        if known is None:
+            return
+        for year in sorted(set(years) - known):
+            try:
+                with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+                    _create_partition(cursor, connection, year)
+                logger.info(f"Created partition {partition_name(year)}")
+            except DatabaseError as e:
+                logger.warning(f"Could not create partition {partition_name(year)}: {str(e)}")
+            known.add(year)
@@ -0,0 +1,300 @@
+from django.conf import settings
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Source names used as archive keys
+SOURCE_BHAVCOPY = 'sec_bhavdata_full'
+SOURCE_INDICES = 'ind_close_all'
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+# Eviction trims the archive to this share of max_bytes, so it runs once per many puts
+EVICT_TO = 0.9
+
+
+def is_csv(content):
+    """Whether a payload looks like a CSV file rather than an HTML error or maintenance page."""
+    head = content[:4096].lstrip(b'\xef\xbb\xbf \t\r\n')
+    if not head or head.startswith(b'<'):
+        return False
+    return b',' in head.split(b'\n', 1)[0]
+
+
+class RawArchive:
+    """
+    Content-addressed on-disk archive of raw downloaded CSV files.
+
+    Payloads are gzip-compressed and stored once under their SHA-256 in
+    `objects/`; small JSON refs under `refs/<source>/<yyyy>/<yyyymmdd>.json`
+    map a (source, date) pair to the payload plus the ETag and Last-Modified
+    headers it was served with, so a later fetch can revalidate cheaply.
+
+    Layout:
+        <root>/objects/ab/abcdef....csv.gz
+        <root>/refs/sec_bhavdata_full/2024/20240315.json
+    """
+
+    def __init__(self, root=None, max_bytes=None, offline=None, revalidate=None):
+        """
+        Args:
+            root: archive directory (BHAVCOPY_ARCHIVE_DIR)
+            max_bytes: evict least recently used payloads above this size
+                (BHAVCOPY_ARCHIVE_MAX_BYTES), 0 disables eviction
+            offline: never touch the network, misses fail (BHAVCOPY_ARCHIVE_OFFLINE)
+            revalidate: send a conditional request even when the date is
+                archived (BHAVCOPY_ARCHIVE_REVALIDATE)
+        """
+        if root is None:
+            root = getattr(settings, 'BHAVCOPY_ARCHIVE_DIR', settings.BASE_DIR / 'bhavcopy_archive')
+        if max_bytes is None:
+            max_bytes = getattr(settings, 'BHAVCOPY_ARCHIVE_MAX_BYTES', DEFAULT_MAX_BYTES)
+        if offline is None:
+            offline = getattr(settings, 'BHAVCOPY_ARCHIVE_OFFLINE', False)
+        if revalidate is None:
+            revalidate = getattr(settings, 'BHAVCOPY_ARCHIVE_REVALIDATE', False)
+
+        self.root = str(root)
+        self.max_bytes = int(max_bytes or 0)
+        self.offline = bool(offline)
+        self.revalidate = bool(revalidate)
+        self.lock = threading.Lock()
+        # Bytes under objects/, counted from disk on the first put and kept up to date after
+        self._size = None
+
+    def _ref_path(self, source, dt):
+        return os.path.join(self.root, 'refs', source, dt.strftime('%Y'), dt.strftime('%Y%m%d') + '.json')
+
+    def _object_path(self, digest):
+        return os.path.join(self.root, 'objects', digest[:2], digest + '.csv.gz')
+
+    def _write_atomic(self, path, data):
+        """Write bytes via a temp file and rename so readers never see partial files."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def get_ref(self, source, dt):
+        """Return the ref dict for a date, or None when it is not archived."""
+        try:
+            with open(self._ref_path(source, dt)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get(self, source, dt):
+        """
+        Read an archived payload.
+
+        Returns:
+            bytes of the original CSV, or None when the date is not archived
+        """
+        ref = self.get_ref(source, dt)
+        if not ref:
+            return None
+
+        path = self._object_path(ref['sha256'])
+        try:
+            with gzip.open(path, 'rb') as f:
+                content = f.read()
+        except OSError:
+            return None
+
+        # Bump the access time used for LRU eviction
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return content
+
+    def put(self, source, dt, content, etag=None, last_modified=None):
+        """
+        Archive a payload for a date, replacing any previous ref.
+
+        Returns:
+            str: SHA-256 hex digest of the payload
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._object_path(digest)
+        added = 0
+        if not os.path.exists(path):
+            compressed = gzip.compress(content, compresslevel=6)
+            self._write_atomic(path, compressed)
+            added = len(compressed)
+
+        ref = {
+            "source": source,
+            "date": dt.strftime('%Y-%m-%d'),
+            "sha256": digest,
+            "size": len(content),
+            "etag": etag,
+            "last_modified": last_modified,
+            "archived_at": time.time(),
+        }
+        self._write_atomic(self._ref_path(source, dt), json.dumps(ref).encode('utf-8'))
+
+        if self.max_bytes:
+            with self.lock:
+                if self._size is None:
+                    self._size = sum(size for _, size, _ in self._objects())
+                else:
+                    self._size += added
+                full = self._size > self.max_bytes
+            if full:
+                self.evict()
+        return digest
+
+    def dates(self, source):
+        """Return the sorted list of archived dates (YYYYMMDD strings) for a source."""
+        found = []
+        for _, _, files in os.walk(os.path.join(self.root, 'refs', source)):
+            found.extend(name[:-5] for name in files if name.endswith('.json'))
+        return sorted(found)
+
+    def _objects(self):
+        """(mtime, size, path) of every archived payload."""
+        objects = []
+        for dirpath, _, files in os.walk(os.path.join(self.root, 'objects')):
+            for name in files:
+                if name.endswith('.csv.gz'):
+                    path = os.path.join(dirpath, name)
+                    stat = os.stat(path)
+                    objects.append((stat.st_mtime, stat.st_size, path))
+        return objects
+
+    def _remove_refs(self, digests):
+        """Delete the refs pointing at any of `digests`; returns how many were removed."""
+        removed = 0
+        for dirpath, _, files in os.walk(os.path.join(self.root, 'refs')):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    with open(path) as f:
+                        digest = json.load(f).get('sha256')
+                except (OSError, ValueError):
+                    continue
+                if digest in digests:
+                    os.remove(path)
+                    removed += 1
+        return removed
+
+    def evict(self):
+        """
+        Delete least recently used payloads, and the refs to them, once the
+        archive outgrows max_bytes.
+
+        The archive is trimmed to EVICT_TO of max_bytes, so put() only scans
+        it again after that much new data.
+
+        Returns:
+            int: number of payloads removed
+        """
+        if not self.max_bytes:
+            return 0
+
+        with self.lock:
+            objects = self._objects()
+            total = sum(size for _, size, _ in objects)
+            self._size = total
+            if total <= self.max_bytes:
+                return 0
+
+            removed = set()
+            for _, size, path in sorted(objects):
+                if total <= self.max_bytes * EVICT_TO:
+                    break
+                os.remove(path)
+                total -= size
+                removed.add(os.path.basename(path)[:-len('.csv.gz')])
+            self._size = total
+            refs = self._remove_refs(removed)
+
+            logger.info(f"Evicted {len(removed)} payloads and {refs} refs from raw archive")
+            return len(removed)
+
+    def fetch(self, session, source, dt, url, timeout=None):
+        """
+        Return the payload for a date, preferring the archive over the network.
+
+        Archived dates are served locally. With revalidation on, a conditional
+        GET is sent and a 304 keeps the archived copy. Fresh downloads are
+        archived before returning, unless the body is not a CSV file (NSE
+        serves HTML error and maintenance pages with a 200), which is
+        reported as a failure instead. In offline mode the network is never
+        used.
+
+        Args:
+            session: requests.Session to use on a miss, may be None when offline
+            source: archive source name, e.g. SOURCE_BHAVCOPY
+            dt: date or datetime being fetched
+            url: download URL for the payload
+            timeout: request timeout in seconds
+
+        Returns:
+            dict with "content" (bytes or None), "status_code" (HTTP status,
+            None if no request was made), "origin" ("archive", "network"
+            or "offline") and, for a 200 that is not a CSV file, "error"
+        """
+        ref = self.get_ref(source, dt)
+        cached = self.get(source, dt) if ref else None
+
+        if cached is not None and (self.offline or not self.revalidate):
+            return {"content": cached, "status_code": None, "origin": "archive"}
+
+        if self.offline:
+            return {"content": None, "status_code": None, "origin": "offline"}
+
+        headers = {}
+        if cached is not None:
+            if ref.get('etag'):
+                headers['If-None-Match'] = ref['etag']
+            if ref.get('last_modified'):
+                headers['If-Modified-Since'] = ref['last_modified']
+
+        response = session.get(url, timeout=timeout, headers=headers)
+
+        if response.status_code == 304 and cached is not None:
+            return {"content": cached, "status_code": 304, "origin": "archive"}
+
+        if response.status_code != 200:
+            return {"content": None, "status_code": response.status_code, "origin": "network"}
+
+        content = response.content
+        if not is_csv(content):
+            logger.warning(f"Not archiving {source} for {dt.strftime('%d-%m-%Y')}: response is not a CSV file")
+            return {"content": None, "status_code": 200, "origin": "network", "error": "Response is not a CSV file"}
+
+        try:
+            self.put(source, dt, content,
+                     etag=response.headers.get('ETag'),
+                     last_modified=response.headers.get('Last-Modified'))
+        except OSError as e:
+            logger.error(f"Could not archive {source} for {dt.strftime('%d-%m-%Y')}: {str(e)}")
+        return {"content": content, "status_code": 200, "origin": "network"}
+
+
+_default_archive = None
+
+
+def get_archive():
+    """Return the process-wide archive configured from settings."""
+    global _default_archive
+    if _default_archive is None:
+        _default_archive = RawArchive()
+    return _default_archive
@@ -0,0 +1,469 @@
+from collections import namedtuple
+from django.db.models import Max, Q
+import functools
+import numpy as np
+import re
+import logging
+from bhavcopy.bulk_upsert import UPDATE_FIELDS
+from bhavcopy.hot_cache import get_hot_cache
+from bhavcopy.indicators import INDICATORS
+from bhavcopy.models import DailyBar, DailyIndicator, IndicatorState, FIXED_POINT_FIELDS, FIXED_POINT_SCALE
+from bhavcopy.streaming import InvalidQuery
+
+logger = logging.getLogger(__name__)
+
+# Fields a screen can reference
+TEXT_FIELDS = ['SYMBOL', 'SERIES']
+BAR_FIELDS = list(UPDATE_FIELDS)
+INDICATOR_FIELDS = list(INDICATORS)
+NUMERIC_FIELDS = BAR_FIELDS + INDICATOR_FIELDS
+
+# DailyBar lookups for pushed-down predicates
+FIELD_LOOKUPS = {'SYMBOL': 'security__SYMBOL', 'SERIES': 'security__SERIES'}
+
+COMPARISONS = {
+    '>': (np.greater, 'gt'),
+    '>=': (np.greater_equal, 'gte'),
+    '<': (np.less, 'lt'),
+    '<=': (np.less_equal, 'lte'),
+    '=': (np.equal, 'exact'),
+    '==': (np.equal, 'exact'),
+    '!=': (np.not_equal, None),
+}
+# The same comparison with its operands swapped
+FLIPPED = {'>': '<', '>=': '<=', '<': '>', '<=': '>=', '=': '=', '==': '==', '!=': '!='}
+ARITHMETIC = {'+': np.add, '-': np.subtract, '*': np.multiply, '/': np.divide}
+
+DEFAULT_SERIES = 'EQ'
+
+Field = namedtuple('Field', 'name')
+Number = namedtuple('Number', 'value')
+String = namedtuple('String', 'value')
+BinOp = namedtuple('BinOp', 'op left right')
+Compare = namedtuple('Compare', 'op left right')
+BoolOp = namedtuple('BoolOp', 'op operands')
+Not = namedtuple('Not', 'operand')
+
+
+class ScreenSyntaxError(InvalidQuery):
+    """Raised for an expression that does not parse or type check."""
+
+
+_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<number>\d+(?:\.\d*)?|\.\d+)
+      | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+      | (?P<string>'[^']*'|"[^"]*")
+      | (?P<op>>=|<=|==|!=|[<>=+\-*/(),])
+    )""", re.VERBOSE)
+
+
+def tokenize(text):
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None:
+            raise ScreenSyntaxError(f"Unexpected character at position {position}: {text[position:position + 10]!r}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'name':
+            value = value.upper()
+            if value in ('AND', 'OR', 'NOT'):
+                kind = 'keyword'
+        tokens.append((kind, value))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """
+    Recursive descent parser for screen expressions.
+
+        expression := conjunction ("or" conjunction)*
+        conjunction := negation ("and" negation)*
+        negation   := "not" negation | comparison
+        comparison := sum (("<" | "<=" | ">" | ">=" | "=" | "!=") sum)?
+        sum        := product (("+" | "-") product)*
+        product    := unary (("*" | "/") unary)*
+        unary      := "-" unary | atom
+        atom       := number | 'string' | FIELD | NAME "(" number ")" | "(" expression ")"
+
+    NAME(n) refers to the indicator column NAME_n, e.g. SMA(200) is SMA_200.
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self, kind=None, value=None):
+        token = self.peek()
+        if token[0] is None or (kind and token[0] != kind) or (value and token[1] != value):
+            expected = value or kind or 'more input'
+            found = token[1] if token[0] else 'end of expression'
+            raise ScreenSyntaxError(f"Expected {expected}, found {found}")
+        self.position += 1
+        return token
+
+    def parse(self):
+        node = self.expression()
+        if self.peek()[0] is not None:
+            raise ScreenSyntaxError(f"Unexpected {self.peek()[1]}")
+        return node
+
+    def expression(self):
+        operands = [self.conjunction()]
+        while self.peek() == ('keyword', 'OR'):
+            self.take()
+            operands.append(self.conjunction())
+        return operands[0] if len(operands) == 1 else BoolOp('or', tuple(operands))
+
+    def conjunction(self):
+        operands = [self.negation()]
+        while self.peek() == ('keyword', 'AND'):
+            self.take()
+            operands.append(self.negation())
+        return operands[0] if len(operands) == 1 else BoolOp('and', tuple(operands))
+
+    def negation(self):
+        if self.peek() == ('keyword', 'NOT'):
+            self.take()
+            return Not(self.negation())
+        return self.comparison()
+
+    def comparison(self):
+        left = self.sum()
+        kind, value = self.peek()
+        if kind == 'op' and value in COMPARISONS:
+            self.take()
+            return Compare(value, left, self.sum())
+        return left
+
+    def sum(self):
+        node = self.product()
+        while self.peek()[0] == 'op' and self.peek()[1] in ('+', '-'):
+            node = BinOp(self.take()[1], node, self.product())
+        return node
+
+    def product(self):
+        node = self.unary()
+        while self.peek()[0] == 'op' and self.peek()[1] in ('*', '/'):
+            node = BinOp(self.take()[1], node, self.unary())
+        return node
+
+    def unary(self):
+        if self.peek() == ('op', '-'):
+            self.take()
+            operand = self.unary()
+            if isinstance(operand, Number):
+                return Number(-operand.value)
+            return BinOp('-', Number(0.0), operand)
+        return self.atom()
+
+    def atom(self):
+        kind, value = self.take()
+        if kind == 'number':
+            return Number(float(value))
+        if kind == 'string':
+            return String(value[1:-1])
+        if kind == 'op' and value == '(':
+            node = self.expression()
+            self.take('op', ')')
+            return node
+        if kind == 'name':
+            if self.peek() == ('op', '('):
+                self.take()
+                argument = self.take('number')[1]
+                self.take('op', ')')
+                value = f"{value}_{int(float(argument))}"
+            if value not in TEXT_FIELDS and value not in NUMERIC_FIELDS:
+                raise ScreenSyntaxError(f"Unknown field {value}")
+            return Field(value)
+        raise ScreenSyntaxError(f"Unexpected {value}")
+
+
+def _check(node):
+    """Type check a node; returns 'bool', 'number' or 'text'."""
+    if isinstance(node, Number):
+        return 'number'
+    if isinstance(node, String):
+        return 'text'
+    if isinstance(node, Field):
+        return 'text' if node.name in TEXT_FIELDS else 'number'
+    if isinstance(node, BinOp):
+        if _check(node.left) != 'number' or _check(node.right) != 'number':
+            raise ScreenSyntaxError(f"'{node.op}' needs numeric operands")
+        return 'number'
+    if isinstance(node, Compare):
+        left, right = _check(node.left), _check(node.right)
+        if 'bool' in (left, right) or left != right:
+            raise ScreenSyntaxError(f"Cannot compare {left} with {right}")
+        if left == 'text' and node.op not in ('=', '==', '!='):
+            raise ScreenSyntaxError("Text fields only support = and !=")
+        return 'bool'
+    if isinstance(node, Not):
+        if _check(node.operand) != 'bool':
+            raise ScreenSyntaxError("'not' needs a condition")
+        return 'bool'
+    if isinstance(node, BoolOp):
+        if any(_check(operand) != 'bool' for operand in node.operands):
+            raise ScreenSyntaxError(f"'{node.op}' needs conditions on both sides")
+        return 'bool'
+    raise ScreenSyntaxError(f"Unsupported expression {node!r}")
+
+
+def parse_screen(text):
+    """
+    Parse a screen expression such as
+    "CLOSE_PRICE > SMA(200) and DELIV_PER > 60 and TURNOVER_LACS > 500".
+
+    Returns:
+        the AST root, always a condition
+
+    Raises:
+        ScreenSyntaxError: for syntax, unknown field or type errors
+    """
+    if not text or not text.strip():
+        raise ScreenSyntaxError("Empty screen expression")
+    node = _Parser(tokenize(text)).parse()
+    if _check(node) != 'bool':
+        raise ScreenSyntaxError("A screen must be a condition, e.g. CLOSE_PRICE > 100")
+    return node
+
+
+def referenced_fields(node):
+    """Every field name in an AST, in first-use order."""
+    if isinstance(node, Field):
+        return [node.name]
+    children = []
+    if isinstance(node, (BinOp, Compare)):
+        children = [node.left, node.right]
+    elif isinstance(node, BoolOp):
+        children = list(node.operands)
+    elif isinstance(node, Not):
+        children = [node.operand]
+    fields = []
+    for child in children:
+        fields += [f for f in referenced_fields(child) if f not in fields]
+    return fields
+
+
+def _pushdown(node):
+    """
+    Q object for a `field <op> literal` comparison on a DailyBar column, or
+    None when the node has to be evaluated in NumPy.
+    """
+    if not isinstance(node, Compare):
+        return None
+    op, left, right = node.op, node.left, node.right
+    if isinstance(left, (Number, String)):
+        op, left, right = FLIPPED[op], right, left
+    if not isinstance(left, Field) or not isinstance(right, (Number, String)):
+        return None
+    if left.name not in BAR_FIELDS and left.name not in TEXT_FIELDS:
+        return None
+
+    value = right.value
+    if left.name in FIXED_POINT_FIELDS:
+        # Rounded so 100.1 matches the stored 10010 exactly
+        value = round(value * FIXED_POINT_SCALE, 6)
+    lookup = FIELD_LOOKUPS.get(left.name, left.name)
+    if op == '!=':
+        return ~Q(**{lookup: value})
+    return Q(**{f"{lookup}__{COMPARISONS[op][1]}": value})
+
+
+def split_screen(node):
+    """
+    Split a screen into SQL-pushable predicates and a NumPy residual.
+
+    Only top-level `and` terms can move to SQL without changing the result.
+
+    Returns:
+        tuple: (Q or None, list of residual nodes still to evaluate)
+    """
+    terms = list(node.operands) if isinstance(node, BoolOp) and node.op == 'and' else [node]
+    query = None
+    residual = []
+    for term in terms:
+        predicate = _pushdown(term)
+        if predicate is None:
+            residual.append(term)
+        else:
+            query = predicate if query is None else query & predicate
+    return query, residual
+
+
+def _mask(values, rows):
+    """A condition's result as one boolean per row, also when it compared constants."""
+    return np.broadcast_to(np.asarray(values, dtype=bool), (rows,))
+
+
+def evaluate(node, columns):
+    """
+    Evaluate an AST over a dict of equal-length column arrays.
+
+    Conditions come back as boolean arrays with one entry per row.
+    """
+    rows = len(next(iter(columns.values()))) if columns else 0
+    if isinstance(node, Field):
+        return columns[node.name]
+    if isinstance(node, (Number, String)):
+        return node.value
+    if isinstance(node, BinOp):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return ARITHMETIC[node.op](evaluate(node.left, columns), evaluate(node.right, columns))
+    if isinstance(node, Compare):
+        # NaN (indicator not available yet) compares False
+        with np.errstate(invalid='ignore'):
+            result = COMPARISONS[node.op][0](evaluate(node.left, columns), evaluate(node.right, columns))
+        return _mask(result, rows)
+    if isinstance(node, Not):
+        return ~evaluate(node.operand, columns)
+    if isinstance(node, BoolOp):
+        combine = np.logical_and if node.op == 'and' else np.logical_or
+        return functools.reduce(combine, [evaluate(operand, columns) for operand in node.operands])
+    raise ScreenSyntaxError(f"Unsupported expression {node!r}")
+
+
+def load_cross_section(dt, query=None, fields=None, series=DEFAULT_SERIES):
+    """
+    Read one date into column arrays for evaluation.
+
+    Args:
+        dt: trading date
+        query: Q object on DailyBar from split_screen, pushed into SQL
+        fields: numeric fields to load, all of NUMERIC_FIELDS by default
+        series: SERIES to keep, None for every series
+
+    Returns:
+        dict of field -> numpy array, with security_id, SYMBOL and SERIES;
+        prices are decoded to floats and missing indicators are NaN
+    """
+    fields = NUMERIC_FIELDS if fields is None else fields
+    bar_fields = [f for f in BAR_FIELDS if f in fields]
+    indicator_fields = [f for f in INDICATOR_FIELDS if f in fields]
+
+    bars = DailyBar.objects.filter(DATE1=dt)
+    if series:
+        bars = bars.filter(security__SERIES=series)
+    if query is not None:
+        bars = bars.filter(query)
+    rows = list(bars.order_by('security_id')
+                .values_list('security_id', 'security__SYMBOL', 'security__SERIES', *bar_fields))
+
+    columns = {
+        'security_id': np.array([r[0] for r in rows], dtype='int64'),
+        'SYMBOL': np.array([r[1] for r in rows], dtype=object),
+        'SERIES': np.array([r[2] for r in rows], dtype=object),
+    }
+    for i, field in enumerate(bar_fields, start=3):
+        values = np.array([r[i] for r in rows], dtype='float64')
+        columns[field] = values / FIXED_POINT_SCALE if field in FIXED_POINT_FIELDS else values
+
+    for field in indicator_fields:
+        columns[field] = np.full(len(rows), np.nan)
+    if indicator_fields and rows:
+        indicators = DailyIndicator.objects.filter(DATE1=dt).values_list('security_id', *indicator_fields)
+        if query is not None or series:
+            indicators = indicators.filter(security_id__in=bars.values('security_id'))
+        indicators = list(indicators)
+        if indicators:
+            ids = np.array([r[0] for r in indicators], dtype='int64')
+            positions = np.searchsorted(columns['security_id'], ids)
+            for i, field in enumerate(indicator_fields, start=1):
+                columns[field][positions] = np.array([r[i] for r in indicators], dtype='float64')
+    return columns
+
+
+def latest_date():
+    return DailyBar.objects.aggregate(latest=Max('DATE1'))['latest']
+
+
+def latest_cross_section(series=DEFAULT_SERIES):
+    """
+    Every field for the latest date, read through the hot cache.
+
+    The indicator state's timestamp is part of the cache key, so a copy
+    loaded before another process computed the day's indicators is replaced
+    once they exist.
+
+    Returns:
+        tuple: (date, columns) or (None, None) when nothing is stored
+    """
+    dt = latest_date()
+    if dt is None:
+        return None, None
+    version = IndicatorState.objects.order_by('-pk').values_list('updated_at', flat=True).first()
+    columns = get_hot_cache().cross_section(dt, series, lambda: load_cross_section(dt, series=series), version)
+    return dt, columns
+
+
+def run_screen(expression, dt=None, series=DEFAULT_SERIES, sort=None, limit=None):
+    """
+    Run a screen over one date.
+
+    The latest date is screened entirely in memory. For other dates the
+    pushable predicates filter rows in SQL and only the residual is evaluated
+    as NumPy masks over the rows that come back.
+
+    Args:
+        expression: screen text, see parse_screen
+        dt: date to screen, defaults to the latest stored date
+        series: SERIES to screen, None for all
+        sort: field to order matches by, prefixed with '-' for descending
+        limit: maximum rows returned (count still reports every match)
+
+    Returns:
+        dict with "date", "count", "fields" and "results" (one dict per match)
+    """
+    node = parse_screen(expression)
+    fields = referenced_fields(node)
+    sort_field = sort.lstrip('-').upper() if sort else 'SYMBOL'
+    if sort_field not in TEXT_FIELDS and sort_field not in NUMERIC_FIELDS:
+        raise InvalidQuery(f"Unknown sort field {sort_field}")
+
+    latest = latest_date()
+    if dt is None or dt == latest:
+        dt, columns = latest_cross_section(series)
+        residual = [node]
+    else:
+        query, residual = split_screen(node)
+        needed = [f for f in NUMERIC_FIELDS if f in fields or f in ('CLOSE_PRICE', sort_field)]
+        columns = load_cross_section(dt, query=query, fields=needed, series=series)
+
+    if columns is None or not len(columns['security_id']):
+        return {"date": dt, "count": 0, "fields": fields, "results": []}
+
+    mask = np.ones(len(columns['security_id']), dtype=bool)
+    for term in residual:
+        mask &= evaluate(term, columns)
+    matches = np.nonzero(mask)[0]
+
+    keys = columns[sort_field][matches]
+    descending = bool(sort and sort.startswith('-'))
+    if sort_field in TEXT_FIELDS:
+        order = np.argsort(keys.astype(str), kind='stable')
+        order = order[::-1] if descending else order
+    else:
+        # NaN sorts last in either direction
+        order = np.argsort(np.where(np.isnan(keys), np.inf, -keys if descending else keys), kind='stable')
+    matches = matches[order[:limit] if limit else order]
+
+    output = TEXT_FIELDS + [f for f in ['CLOSE_PRICE'] + fields if f not in TEXT_FIELDS]
+    output = list(dict.fromkeys(output))
+    results = []
+    for i in matches:
+        row = {}
+        for field in output:
+            value = columns[field][i]
+            if field in TEXT_FIELDS:
+                row[field] = value
+            else:
+                row[field] = None if np.isnan(value) else float(value)
+        results.append(row)
+    return {"date": dt, "count": int(mask.sum()), "fields": output, "results": results}
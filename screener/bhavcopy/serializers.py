@@ -2,6 +2,15 @@ from rest_framework import serializers
 from bhavcopy.models import Bhavcopy
 
 class BhavcopySerializer(serializers.ModelSerializer):
+    """Serializes Bhavcopy rows; pass `fields=[...]` to return only some columns."""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
     class Meta:
         model = Bhavcopy
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Sent once bhavcopy rows have been committed to the database.
+# Arguments: dates - sorted list of datetime.date values that received rows
+bhavcopy_dates_written = Signal()
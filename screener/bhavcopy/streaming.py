@@ -0,0 +1,162 @@
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+import base64
+import csv
+import datetime
+import io
+import json
+from bhavcopy.models import Bhavcopy
+
+# Every readable column, in model order
+FIELD_NAMES = [f.name for f in Bhavcopy._meta.fields if f.name != 'id']
+
+# Keyset order; SERIES breaks ties between series of the same symbol
+ORDERING = ['DATE1', 'SYMBOL', 'SERIES']
+
+STREAM_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+}
+
+STREAM_CHUNK_SIZE = 2000
+
+
+class InvalidQuery(ValueError):
+    """Raised for unusable query parameters; views turn it into a 400."""
+
+
+def parse_fields(param):
+    """
+    Turn a comma-separated `fields` parameter into a list of column names.
+
+    Returns:
+        list of field names, all fields when param is empty
+    """
+    if not param:
+        return list(FIELD_NAMES)
+    fields = [f.strip().upper() for f in param.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in FIELD_NAMES]
+    if unknown:
+        raise InvalidQuery(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def parse_date(value):
+    """Accept DD-MM-YYYY (as the fetch endpoints do) or YYYY-MM-DD."""
+    for fmt in ("%d-%m-%Y", "%Y-%m-%d"):
+        try:
+            return datetime.datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise InvalidQuery(f"Invalid date '{value}', expected DD-MM-YYYY")
+
+
+def encode_cursor(date1, symbol, series):
+    """Opaque cursor pointing just after the given row key."""
+    raw = json.dumps([date1.isoformat(), symbol, series]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        date_str, symbol, series = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.date.fromisoformat(date_str), symbol, series
+    except (ValueError, TypeError):
+        raise InvalidQuery("Invalid cursor")
+
+
+def apply_cursor(queryset, token):
+    """Restrict an ORDERING-sorted queryset to rows after the cursor."""
+    if not token:
+        return queryset
+    date1, symbol, series = decode_cursor(token)
+    return queryset.filter(
+        Q(DATE1__gt=date1) |
+        Q(DATE1=date1, SYMBOL__gt=symbol) |
+        Q(DATE1=date1, SYMBOL=symbol, SERIES__gt=series)
+    )
+
+
+def page(queryset, fields, limit, cursor=None):
+    """
+    Read one keyset page as dicts.
+
+    The key columns are always fetched so the next cursor can be built, and
+    dropped again if they were not requested.
+
+    Returns:
+        tuple: (rows, next_cursor) where next_cursor is None on the last page
+    """
+    columns = list(dict.fromkeys(fields + ORDERING))
+    rows = list(apply_cursor(queryset, cursor).order_by(*ORDERING).values(*columns)[:limit + 1])
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last['DATE1'], last['SYMBOL'], last['SERIES'])
+
+    extra = [c for c in columns if c not in fields]
+    if extra:
+        for row in rows:
+            for c in extra:
+                del row[c]
+    return rows, next_cursor
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime.date) else value
+
+
+def _csv_rows(fields, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for row in rows:
+        writer.writerow(row)
+        # Flush in chunks so each yield carries a few KB, not one line
+        if buffer.tell() > 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson_rows(fields, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(fields, map(_json_value, row)))) + '\n'
+
+
+def _json_rows(fields, rows):
+    yield '['
+    first = True
+    for row in rows:
+        item = json.dumps(dict(zip(fields, map(_json_value, row))))
+        yield item if first else ',' + item
+        first = False
+    yield ']'
+
+
+ENCODERS = {'csv': _csv_rows, 'ndjson': _ndjson_rows, 'json': _json_rows}
+
+
+def stream_response(queryset, fields, fmt, cursor=None, filename=None):
+    """
+    Stream every matching row straight from a database cursor.
+
+    Rows come from values_list().iterator(), so no model or serializer
+    instances are built and memory stays flat regardless of result size.
+    """
+    if fmt not in STREAM_FORMATS:
+        raise InvalidQuery(f"Unknown stream format '{fmt}', use one of: {', '.join(STREAM_FORMATS)}")
+
+    rows = apply_cursor(queryset, cursor).order_by(*ORDERING).values_list(*fields)
+    response = StreamingHttpResponse(
+        ENCODERS[fmt](fields, rows.iterator(chunk_size=STREAM_CHUNK_SIZE)),
+        content_type=STREAM_FORMATS[fmt],
+    )
+    if filename:
+        response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
@@ -0,0 +1,234 @@
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import hashlib
+import re
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+# Rough share of each series in a real sec_bhavdata_full file
+SERIES_MIX = [('EQ', 0.78), ('BE', 0.07), ('SM', 0.05), ('BZ', 0.02), ('ST', 0.02),
+              ('GB', 0.02), ('N1', 0.02), ('IV', 0.01), ('RR', 0.01)]
+
+# Series that trade for delivery only report '-' in the delivery columns
+NO_DELIVERY_SERIES = ('GB', 'N1', 'IV', 'RR')
+
+HEADER = ['SYMBOL', 'SERIES', 'DATE1', 'PREV_CLOSE', 'OPEN_PRICE', 'HIGH_PRICE',
+          'LOW_PRICE', 'LAST_PRICE', 'CLOSE_PRICE', 'AVG_PRICE', 'TTL_TRD_QNTY',
+          'TURNOVER_LACS', 'NO_OF_TRADES', 'DELIV_QTY', 'DELIV_PER']
+
+
+def symbol_universe(symbols=2500, seed=0):
+    """
+    Deterministic list of (symbol, series, base_price) tuples.
+
+    The same seed always yields the same names and base prices, so files
+    generated for different dates line up like a real market would.
+    """
+    rng = np.random.default_rng(seed)
+    letters = np.array(list('ABCDEFGHIJKLMNOPQRSTUVWXYZ'))
+    lengths = rng.integers(3, 11, size=symbols)
+    names = set()
+    universe = []
+    probabilities = np.array([p for _, p in SERIES_MIX])
+    series_draw = rng.choice(len(SERIES_MIX), size=symbols, p=probabilities / probabilities.sum())
+    base_prices = np.round(np.exp(rng.normal(5.0, 1.3, size=symbols)), 2)
+
+    for i in range(symbols):
+        name = ''.join(rng.choice(letters, size=lengths[i]))
+        while name in names:
+            name += str(i % 10)
+        names.add(name)
+        universe.append((name, SERIES_MIX[series_draw[i]][0], float(base_prices[i])))
+    return universe
+
+
+def _close(base, ordinal, seed):
+    """Closing prices on a date: a smooth per-symbol path plus noise seeded by the date alone."""
+    phase = np.arange(len(base)) * 0.37
+    drift = 1 + 0.25 * np.sin((ordinal + phase * 40) / 60.0)
+    noise = np.random.default_rng([seed, ordinal, 1]).normal(0, 0.01, len(base))
+    return np.round(base * drift * (1 + noise), 2)
+
+
+def generate_bhavcopy_frame(dt, symbols=2500, seed=0):
+    """
+    Build one day of synthetic bhavcopy data as a DataFrame of display strings.
+
+    Prices follow a smooth per-symbol path keyed on the date ordinal plus
+    seeded noise, so consecutive dates look continuous, PREV_CLOSE matches
+    the previous weekday's CLOSE_PRICE and reruns are identical. Delivery
+    columns are '-' for delivery-less series and a few illiquid rows have
+    '-' for LAST_PRICE, matching the real file quirks.
+    """
+    universe = symbol_universe(symbols, seed)
+    ordinal = dt.toordinal()
+    rng = np.random.default_rng([seed, ordinal])
+    n = len(universe)
+
+    names = np.array([u[0] for u in universe], dtype=object)
+    series = np.array([u[1] for u in universe], dtype=object)
+    base = np.array([u[2] for u in universe])
+
+    close = _close(base, ordinal, seed)
+    # PREV_CLOSE is the previous weekday's close, as in the real files
+    previous = ordinal - (3 if dt.weekday() == 0 else 2 if dt.weekday() == 6 else 1)
+    prev_close = _close(base, previous, seed)
+    open_ = np.round(prev_close * (1 + rng.normal(0, 0.008, n)), 2)
+    high = np.round(np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, n))), 2)
+    low = np.round(np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, n))), 2)
+    last = np.round(close * (1 + rng.normal(0, 0.001, n)), 2)
+    avg = np.round((high + low + close) / 3, 2)
+    qty = rng.lognormal(9, 2, n).astype(np.int64) + 1
+    trades = np.maximum(1, (qty / rng.uniform(20, 200, n)).astype(np.int64))
+    turnover = np.round(qty * avg / 1e5, 2)
+    deliv_qty = (qty * rng.uniform(0.1, 0.9, n)).astype(np.int64)
+    deliv_per = np.round(deliv_qty / qty * 100, 2)
+
+    def fmt(values, decimals):
+        return np.char.mod(f'%.{decimals}f', values).astype(object)
+
+    frame = pd.DataFrame({
+        'SYMBOL': names,
+        'SERIES': series,
+        'DATE1': dt.strftime('%d-%b-%Y'),
+        'PREV_CLOSE': fmt(prev_close, 2),
+        'OPEN_PRICE': fmt(open_, 2),
+        'HIGH_PRICE': fmt(high, 2),
+        'LOW_PRICE': fmt(low, 2),
+        'LAST_PRICE': fmt(last, 2),
+        'CLOSE_PRICE': fmt(close, 2),
+        'AVG_PRICE': fmt(avg, 2),
+        'TTL_TRD_QNTY': qty.astype(str).astype(object),
+        'TURNOVER_LACS': fmt(turnover, 2),
+        'NO_OF_TRADES': trades.astype(str).astype(object),
+        'DELIV_QTY': deliv_qty.astype(str).astype(object),
+        'DELIV_PER': fmt(deliv_per, 2),
+    })
+
+    no_delivery = np.isin(series, NO_DELIVERY_SERIES)
+    frame.loc[no_delivery, ['DELIV_QTY', 'DELIV_PER']] = '-'
+    illiquid = rng.random(n) < 0.01
+    frame.loc[illiquid, 'LAST_PRICE'] = '-'
+    return frame.sort_values(['SYMBOL', 'SERIES'], kind='stable').reset_index(drop=True)
+
+
+def generate_bhavcopy_csv(dt, symbols=2500, seed=0):
+    """
+    Render a synthetic sec_bhavdata_full CSV for a date.
+
+    Uses the NSE layout of ", " separators with padded headers.
+
+    Returns:
+        bytes of the CSV file
+    """
+    frame = generate_bhavcopy_frame(dt, symbols, seed)
+    body = frame.to_csv(index=False, header=False, lineterminator='\n').replace(',', ', ')
+    return (', '.join(HEADER) + '\n' + body).encode('utf-8')
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Request handler for StubNSEServer; the server instance holds the data."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        stub = self.server.stub
+        match = StubNSEServer.PATH_PATTERN.search(self.path)
+        content = stub.content_for(match) if match else None
+        if stub.latency:
+            time.sleep(stub.latency)
+        with stub.lock:
+            stub.requests += 1
+        if content is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        etag = '"' + hashlib.sha1(content).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/csv')
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class StubNSEServer:
+    """
+    Local stand-in for the NSE archive serving synthetic bhavcopies.
+
+    GET .../sec_bhavdata_full_DDMMYYYY.csv answers with generate_bhavcopy_csv
+    for that date, 404 on weekends and `missing` dates, and 304 when the
+    client's If-None-Match still matches. An optional fixed `latency` per
+    response stands in for the network, so backfills can be measured end to
+    end without touching NSE.
+
+    Use it as a context manager; `bhavcopy_url` drops in for
+    constants.link_bhavcopy:
+
+        with StubNSEServer(symbols=3000) as stub:
+            downloader.bhavcopy_url = stub.bhavcopy_url
+    """
+    PATH_PATTERN = re.compile(r'sec_bhavdata_full_(\d{2})(\d{2})(\d{4})\.csv')
+
+    def __init__(self, symbols=2500, seed=0, latency=0.0, missing=()):
+        self.symbols = symbols
+        self.seed = seed
+        self.latency = latency
+        self.missing = set(missing)
+        self.requests = 0
+        self.lock = threading.Lock()
+        self._files = {}
+        self._server = None
+        self._thread = None
+
+    @property
+    def bhavcopy_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/products/content/sec_bhavdata_full_{{dd}}{{mm}}{{yyyy}}.csv"
+
+    def content_for(self, match):
+        """The CSV served for a matched path, None for a date with no file."""
+        try:
+            dt = date(int(match.group(3)), int(match.group(2)), int(match.group(1)))
+        except ValueError:
+            return None
+        if dt.weekday() >= 5 or dt in self.missing:
+            return None
+        with self.lock:
+            content = self._files.get(dt)
+        if content is None:
+            content = generate_bhavcopy_csv(dt, self.symbols, self.seed)
+            with self.lock:
+                self._files[dt] = content
+        return content
+
+    def start(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _StubHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = threading.Thread(target=self._server.serve_forever, name='stub-nse', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
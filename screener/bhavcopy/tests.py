@@ -1,3 +1,940 @@
-from django.test import TestCase
+from datetime import date, datetime, timedelta
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from unittest import mock, skipUnless
+import asyncio
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import numpy as np
+import pandas as pd
+from bhavcopy.backfill_scheduler import BackfillScheduler
+from bhavcopy import partitioning
+from bhavcopy.bulk_upsert import bulk_upsert_bhavcopy, use_copy
+from bhavcopy.corporate_actions import detect_corporate_actions, detect_written_dates
+from bhavcopy.gaps import find_gaps
+from bhavcopy.hot_cache import HotCache, apply_written_dates, get_hot_cache
+from bhavcopy.indicators import INDICATORS, update_indicators
+from bhavcopy.ingest_events import (EVENT_FIELDS, GAP_SECONDS, RETRY_MILLISECONDS, EventBroadcaster, date_checksum,
+                                    format_sse, sse_stream)
+from bhavcopy.jobs import DownloadWorker, claim_tasks, enqueue_download_job, finish_task, release_tasks
+from bhavcopy.signals import bhavcopy_dates_written
+from bhavcopy.screens import (BinOp, Compare, Field, Number, ScreenSyntaxError, evaluate, parse_screen,
+                              run_screen, split_screen)
+from bhavcopy.ohlc import ohlc_series
+from bhavcopy.metrics import CONTENT_TYPE, get_metrics, observe_file, run_summary
+from bhavcopy.models import (Bhavcopy, CorporateAction, DailyBar, DailyIndicator, DownloadJob, DownloadTask, IngestEvent,
+                             Security, TradingCalendarDay)
+from bhavcopy.parsing import parse_bhavcopy
+from bhavcopy.raw_archive import RawArchive, SOURCE_BHAVCOPY
+from bhavcopy.partitioning import is_partitioned, partition_name, partition_years
+from bhavcopy.streaming import InvalidQuery, ORDERING, decode_cursor, encode_cursor, page
+from bhavcopy.synthetic import HEADER, generate_bhavcopy_csv
+from bhavcopy.trading_calendar import (EXCHANGE_TIMEZONE, TradingCalendar, get_trading_calendar,
+                                       learn_sessions_from_data, load_holiday_file, record_missing_day,
+                                       reset_trading_calendar)
+from bhavcopy.views import _ohlc_etag, _ohlc_params
+from bhavcopy.yearly_bhavcopy_download_views import YearlyBhavcopyDownloaderView
 
-# Create your tests here.
+
+def bhavcopy_frame(dt, symbols=50, seed=0):
+    """A parsed synthetic bhavcopy for one date."""
+    return parse_bhavcopy(generate_bhavcopy_csv(dt, symbols=symbols, seed=seed))[0]
+
+
+class BulkUpsertTests(TestCase):
+
+    def test_counts_created_then_updated(self):
+        df = bhavcopy_frame(date(2024, 3, 4))
+        result = bulk_upsert_bhavcopy(df, batch_size=7)
+        self.assertEqual(result["records_created"], len(df))
+        self.assertEqual(result["records_updated"], 0)
+        self.assertEqual(result["records_with_errors"], 0)
+        # COPY loads every row at once and reports a single batch
+        self.assertEqual(len(result["batches"]), 1 if use_copy() else -(-len(df) // 7))
+
+        df.loc[0, 'CLOSE_PRICE'] = 123.45
+        result = bulk_upsert_bhavcopy(df)
+        self.assertEqual(result["records_created"], 0)
+        self.assertEqual(result["records_updated"], len(df))
+        self.assertEqual(DailyBar.objects.count(), len(df))
+        stored = Bhavcopy.objects.get(SYMBOL=df.loc[0, 'SYMBOL'], SERIES=df.loc[0, 'SERIES'], DATE1=date(2024, 3, 4))
+        self.assertEqual(stored.CLOSE_PRICE, 123.45)
+
+    def test_duplicate_keys_keep_the_last_row(self):
+        df = bhavcopy_frame(date(2024, 3, 4), symbols=5)
+        repeated = df.iloc[[0]].assign(CLOSE_PRICE=99.5)
+        result = bulk_upsert_bhavcopy(pd.concat([df, repeated]))
+        self.assertEqual(result["records_created"], len(df))
+        self.assertEqual(result["records_updated"], 1)
+        stored = Bhavcopy.objects.get(SYMBOL=df.loc[0, 'SYMBOL'], SERIES=df.loc[0, 'SERIES'])
+        self.assertEqual(stored.CLOSE_PRICE, 99.5)
+
+    def test_rejects_nan_and_missing_keys(self):
+        df = bhavcopy_frame(date(2024, 3, 4), symbols=10)
+        df.loc[1, 'CLOSE_PRICE'] = np.nan
+        df.loc[2, 'SYMBOL'] = None
+        df.loc[3, 'DELIV_PER'] = np.nan
+        result = bulk_upsert_bhavcopy(df)
+        self.assertEqual(result["records_with_errors"], 3)
+        self.assertEqual(result["records_created"], len(df) - 3)
+        self.assertEqual(DailyBar.objects.count(), len(df) - 3)
+        self.assertFalse(Bhavcopy.objects.filter(SYMBOL=df.loc[1, 'SYMBOL'], SERIES=df.loc[1, 'SERIES']).exists())
+
+
+class SlowArchiveDownloader:
+    """Downloader serving every date from the archive after a short delay."""
+
+    def __init__(self):
+        self.stored = []
+
+    def _fetch_archived_csv(self, dt):
+        time.sleep(0.02)
+        return {"date": dt.strftime('%d-%m-%Y'), "status": "fetched", "content": b""}
+
+    def _store_bhavcopy_csv(self, content, dt):
+        self.stored.append(dt)
+        return {"date": dt.strftime('%d-%m-%Y'), "status": "success"}
+
+
+class BackfillSchedulerTests(TestCase):
+    dates = [datetime(2024, 3, 1) + timedelta(days=i) for i in range(20)]
+
+    def run_in_thread(self, scheduler):
+        summary = {}
+        thread = threading.Thread(target=lambda: summary.update(scheduler.run(self.dates)), daemon=True)
+        thread.start()
+        thread.join(timeout=10)
+        self.assertFalse(thread.is_alive(), "run() did not return")
+        return summary
+
+    def test_every_date_is_stored_once(self):
+        downloader = SlowArchiveDownloader()
+        summary = self.run_in_thread(BackfillScheduler(downloader=downloader, workers=4))
+        self.assertEqual(summary["successful_dates"], len(self.dates))
+        self.assertEqual(sorted(downloader.stored), self.dates)
+
+    def test_stop_from_an_event_handler_returns(self):
+        downloader = SlowArchiveDownloader()
+        scheduler = BackfillScheduler(downloader=downloader, workers=4)
+        scheduler.on_event = lambda event: event["event"] == "date_completed" and scheduler.stop()
+
+        summary = self.run_in_thread(scheduler)
+        self.assertEqual(summary["total_dates"], len(self.dates))
+        self.assertEqual(len(summary["results"]), len(self.dates))
+        self.assertEqual(summary["successful_dates"], len(downloader.stored))
+        self.assertGreater(summary["skipped_dates"], 0)
+        self.assertEqual(summary["successful_dates"] + summary["skipped_dates"], len(self.dates))
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, content=b'', headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+
+class FakeSession:
+    """Session answering every GET with the next queued response."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, timeout=None, headers=None):
+        self.requests.append(headers or {})
+        return self.responses.pop(0)
+
+
+class RawArchiveTests(TestCase):
+    day = date(2024, 3, 4)
+    csv = b'SYMBOL, SERIES, CLOSE_PRICE\nABC, EQ, 10.5\n'
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def archive(self, **kwargs):
+        return RawArchive(root=self.root, **kwargs)
+
+    def test_fetch_archives_then_serves_locally(self):
+        archive = self.archive()
+        session = FakeSession(FakeResponse(200, self.csv, {'ETag': '"v1"'}))
+        fetched = archive.fetch(session, SOURCE_BHAVCOPY, self.day, 'url')
+        self.assertEqual((fetched["content"], fetched["origin"]), (self.csv, "network"))
+
+        fetched = archive.fetch(session, SOURCE_BHAVCOPY, self.day, 'url')
+        self.assertEqual((fetched["content"], fetched["origin"]), (self.csv, "archive"))
+        self.assertEqual(len(session.requests), 1)
+        self.assertEqual(archive.dates(SOURCE_BHAVCOPY), ['20240304'])
+
+    def test_revalidate_sends_the_etag(self):
+        self.archive().put(SOURCE_BHAVCOPY, self.day, self.csv, etag='"v1"')
+        session = FakeSession(FakeResponse(304))
+        fetched = self.archive(revalidate=True).fetch(session, SOURCE_BHAVCOPY, self.day, 'url')
+        self.assertEqual(session.requests, [{'If-None-Match': '"v1"'}])
+        self.assertEqual((fetched["content"], fetched["status_code"], fetched["origin"]), (self.csv, 304, "archive"))
+
+    def test_offline_miss_never_uses_the_network(self):
+        session = FakeSession()
+        fetched = self.archive(offline=True).fetch(session, SOURCE_BHAVCOPY, self.day, 'url')
+        self.assertEqual((fetched["content"], fetched["origin"]), (None, "offline"))
+        self.assertEqual(session.requests, [])
+
+    def test_html_pages_are_not_archived(self):
+        archive = self.archive()
+        page = b'<!DOCTYPE html><html><body>Under maintenance</body></html>'
+        fetched = archive.fetch(FakeSession(FakeResponse(200, page)), SOURCE_BHAVCOPY, self.day, 'url')
+        self.assertIsNone(fetched["content"])
+        self.assertIn("error", fetched)
+        self.assertIsNone(archive.get_ref(SOURCE_BHAVCOPY, self.day))
+
+    def test_eviction_removes_payloads_with_their_refs(self):
+        archive = self.archive(max_bytes=20000)
+        days = [self.day + timedelta(days=i) for i in range(12)]
+        with mock.patch('bhavcopy.raw_archive.os.walk', wraps=os.walk) as walk:
+            for day in days:
+                archive.put(SOURCE_BHAVCOPY, day, b'SYMBOL,VALUE\n' + os.urandom(4000).hex().encode())
+        # One scan to size the archive, then two (objects and refs) per eviction
+        self.assertLess(walk.call_count, len(days))
+
+        sizes = [os.path.getsize(os.path.join(dirpath, name))
+                 for dirpath, _, files in os.walk(os.path.join(self.root, 'objects')) for name in files]
+        self.assertLessEqual(sum(sizes), 20000)
+        self.assertEqual(len(archive.dates(SOURCE_BHAVCOPY)), len(sizes))
+        self.assertIsNotNone(archive.get(SOURCE_BHAVCOPY, days[-1]))
+        for day in days:
+            self.assertEqual(archive.get_ref(SOURCE_BHAVCOPY, day) is None, archive.get(SOURCE_BHAVCOPY, day) is None)
+
+
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for dt in (date(2024, 3, 4), date(2024, 3, 5)):
+            bulk_upsert_bhavcopy(bhavcopy_frame(dt, symbols=30))
+        cls.keys = list(Bhavcopy.objects.order_by(*ORDERING).values_list(*ORDERING))
+
+    def test_pages_cover_every_row_once_in_order(self):
+        seen, cursor = [], None
+        while True:
+            rows, cursor = page(Bhavcopy.objects.all(), ['CLOSE_PRICE'], 7, cursor=cursor)
+            self.assertTrue(all(list(row) == ['CLOSE_PRICE'] for row in rows))
+            seen.extend(rows)
+            if cursor is None:
+                break
+            self.assertEqual(len(rows), 7)
+        self.assertEqual(len(seen), len(self.keys))
+
+        rows, cursor = page(Bhavcopy.objects.all(), ORDERING, len(self.keys) - 1)
+        self.assertEqual([tuple(row.values()) for row in rows], self.keys[:-1])
+        self.assertEqual(decode_cursor(cursor), self.keys[-2])
+
+    def test_cursor_resumes_after_its_key(self):
+        date1, symbol, series = self.keys[29]
+        rows, _ = page(Bhavcopy.objects.all(), ORDERING, 3, cursor=encode_cursor(date1, symbol, series))
+        self.assertEqual([tuple(row.values()) for row in rows], self.keys[30:33])
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(InvalidQuery):
+            decode_cursor('not-a-cursor')
+        response = self.client.get('/bhavcopy/dates/04-03-2024/', {'cursor': 'bm9wZQ'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_endpoint_follows_next_cursor(self):
+        symbols, params = [], {'fields': 'SYMBOL', 'limit': 8}
+        while True:
+            body = self.client.get('/bhavcopy/dates/05-03-2024/', params).json()
+            symbols.extend(row['SYMBOL'] for row in body['results'])
+            if not body['next_cursor']:
+                break
+            params['cursor'] = body['next_cursor']
+        self.assertEqual(symbols, [symbol for dt, symbol, _ in self.keys if dt == date(2024, 3, 5)])
+
+
+class DownloadJobTests(TestCase):
+    dates = [date(2024, 3, 4), date(2024, 3, 5), date(2024, 3, 6)]
+
+    def setUp(self):
+        self.job, _ = enqueue_download_job(self.dates)
+
+    def task(self, dt):
+        return DownloadTask.objects.get(job=self.job, date=dt)
+
+    def expire_leases(self):
+        DownloadTask.objects.filter(status=DownloadTask.STATUS_RUNNING) \
+            .update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+
+    def test_enqueue_returns_the_active_job_for_a_range(self):
+        job, created = enqueue_download_job(reversed(self.dates))
+        self.assertEqual((job.id, created), (self.job.id, False))
+        self.assertEqual(self.job.tasks.count(), 3)
+
+        DownloadJob.objects.filter(id=self.job.id).update(status=DownloadJob.STATUS_COMPLETED)
+        job, created = enqueue_download_job(self.dates)
+        self.assertTrue(created)
+        self.assertNotEqual(job.id, self.job.id)
+
+    def test_claims_are_exclusive_and_in_date_order(self):
+        first = claim_tasks('a', 2)
+        second = claim_tasks('b', 2)
+        self.assertEqual([t.date for t in first], self.dates[:2])
+        self.assertEqual([t.date for t in second], self.dates[2:])
+        self.assertEqual(claim_tasks('c', 2), [])
+        self.assertEqual(self.task(self.dates[0]).lease_owner, 'a')
+        self.assertEqual(self.task(self.dates[0]).attempts, 1)
+        self.assertEqual(DownloadJob.objects.get(id=self.job.id).status, DownloadJob.STATUS_RUNNING)
+
+    def test_claim_loses_a_task_taken_after_it_was_selected(self):
+        # Another worker leases the first task between the SELECT and the UPDATE
+        claim_update = DownloadTask.objects.filter
+
+        def take_first(*args, **kwargs):
+            if kwargs.get('pk') == self.task(self.dates[0]).pk:
+                claim_update(pk=kwargs['pk']).update(status=DownloadTask.STATUS_RUNNING, lease_owner='b',
+                                                     lease_expires_at=timezone.now() + timedelta(minutes=5))
+            return claim_update(*args, **kwargs)
+
+        with mock.patch.object(DownloadTask.objects, 'filter', side_effect=take_first):
+            claimed = claim_tasks('a', 3)
+        self.assertEqual([t.date for t in claimed], self.dates[1:])
+        self.assertEqual(self.task(self.dates[0]).lease_owner, 'b')
+
+    def test_expired_leases_are_reclaimed_until_max_attempts(self):
+        claim_tasks('a', 1, max_attempts=2)
+        self.assertEqual(claim_tasks('b', 1, max_attempts=2)[0].date, self.dates[1])
+
+        self.expire_leases()
+        reclaimed = claim_tasks('c', 3, max_attempts=2)
+        self.assertEqual([t.date for t in reclaimed], self.dates)
+        self.assertEqual(self.task(self.dates[0]).attempts, 2)
+
+        # The first two used up their attempts; the third was only leased once before
+        self.expire_leases()
+        self.assertEqual([t.date for t in claim_tasks('d', 3, max_attempts=2)], self.dates[2:])
+        for dt in self.dates[:2]:
+            failed = self.task(dt)
+            self.assertEqual((failed.status, failed.error), (DownloadTask.STATUS_FAILED, 'Lease expired'))
+
+    def test_failures_retry_with_backoff_until_max_attempts(self):
+        failure = {"date": "04-03-2024", "status": "failed", "error": "HTTP 503", "http_status": 503}
+        task = claim_tasks('a', 1)[0]
+        self.assertTrue(finish_task(task, failure, 'a', max_attempts=2, retry_delay=60))
+        retried = self.task(task.date)
+        self.assertEqual(retried.status, DownloadTask.STATUS_PENDING)
+        self.assertGreater(retried.available_at, timezone.now() + timedelta(seconds=50))
+        self.assertNotIn(task.date, [t.date for t in claim_tasks('a', 3)])
+
+        DownloadTask.objects.filter(pk=task.pk).update(available_at=timezone.now())
+        release_tasks('a')
+        task = claim_tasks('a', 1)[0]
+        self.assertEqual(task.attempts, 2)
+        self.assertTrue(finish_task(task, failure, 'a', max_attempts=2))
+        self.assertEqual(self.task(task.date).status, DownloadTask.STATUS_FAILED)
+
+    def test_finish_outcomes(self):
+        holiday, stopped, stored = claim_tasks('a', 3)
+        self.assertTrue(finish_task(holiday, {"status": "failed", "http_status": 404}, 'a'))
+        self.assertTrue(finish_task(stopped, {"status": "skipped", "reason": "Deadline exceeded"}, 'a'))
+        self.assertFalse(finish_task(stored, {"status": "success"}, 'b'))
+        self.assertTrue(finish_task(stored, {"status": "success"}, 'a'))
+
+        self.assertEqual(self.task(holiday.date).status, DownloadTask.STATUS_SKIPPED)
+        released = self.task(stopped.date)
+        self.assertEqual((released.status, released.attempts, released.lease_owner), (DownloadTask.STATUS_PENDING, 0, None))
+        self.assertEqual(self.task(stored.date).status, DownloadTask.STATUS_SUCCESS)
+
+    def test_release_returns_tasks_without_an_attempt(self):
+        claim_tasks('a', 2)
+        claim_tasks('b', 1)
+        self.assertEqual(release_tasks('a'), 2)
+        self.assertEqual([(t.status, t.attempts) for t in self.job.tasks.order_by('date')],
+                         [(DownloadTask.STATUS_PENDING, 0)] * 2 + [(DownloadTask.STATUS_RUNNING, 1)])
+
+    def test_worker_drains_the_queue(self):
+        downloader = SlowArchiveDownloader()
+        processed = DownloadWorker(downloader=downloader, workers=2, owner='w').run(once=True)
+        self.assertEqual(processed, 3)
+        self.assertEqual(sorted(dt.date() for dt in downloader.stored), self.dates)
+        self.assertEqual(DownloadJob.objects.get(id=self.job.id).status, DownloadJob.STATUS_COMPLETED)
+
+    def test_worker_stops_at_its_deadline(self):
+        worker = DownloadWorker(downloader=SlowArchiveDownloader(), owner='w', deadline=0)
+        self.assertEqual(worker.run(poll=60), 0)
+        self.assertTrue(worker.deadline_passed())
+        self.assertEqual(set(self.job.tasks.values_list('status', 'attempts')), {(DownloadTask.STATUS_PENDING, 0)})
+
+
+class MissingFileDownloader:
+    """Downloader whose every date comes back as a 404."""
+
+    def _fetch_archived_csv(self, dt):
+        return {"date": dt.strftime('%d-%m-%Y'), "status": "failed", "error": "Failed to fetch CSV: 404",
+                "http_status": 404}
+
+
+class TradingCalendarTests(TestCase):
+
+    def setUp(self):
+        reset_trading_calendar()
+        self.addCleanup(reset_trading_calendar)
+
+    def load_holidays(self, rows):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('Date,Description\n' + ''.join(f'{day},{description}\n' for day, description in rows))
+        self.addCleanup(os.remove, f.name)
+        return load_holiday_file(f.name)
+
+    def test_holidays_and_muhurat_sessions(self):
+        counts = self.load_holidays([('26-Jan-2024', 'Republic Day'), ('12-Nov-2023', 'Diwali Muhurat Trading')])
+        self.assertEqual(counts, {"holidays": 1, "special_sessions": 1})
+
+        calendar = get_trading_calendar()
+        self.assertTrue(calendar.is_holiday(date(2024, 1, 26)))
+        self.assertFalse(calendar.is_holiday(date(2024, 1, 27)))
+        self.assertEqual(calendar.trading_dates(date(2024, 1, 22), date(2024, 1, 28)),
+                         [date(2024, 1, 22), date(2024, 1, 23), date(2024, 1, 24), date(2024, 1, 25)])
+        self.assertEqual(calendar.previous_trading_day(date(2024, 1, 29)), date(2024, 1, 25))
+
+        # Muhurat trading on a Sunday is a session
+        self.assertTrue(calendar.is_trading_day(date(2023, 11, 12)))
+        self.assertEqual(calendar.trading_dates(date(2023, 11, 10), date(2023, 11, 13)),
+                         [date(2023, 11, 10), date(2023, 11, 12), date(2023, 11, 13)])
+        self.assertEqual(calendar.next_trading_day(date(2023, 11, 10)), date(2023, 11, 12))
+
+    def test_muhurat_session_on_a_holiday(self):
+        calendar = TradingCalendar(holidays=[date(2024, 11, 1)], special_sessions=[date(2024, 11, 1)])
+        self.assertFalse(calendar.is_holiday(date(2024, 11, 1)))
+        self.assertTrue(calendar.is_trading_day(date(2024, 11, 1)))
+        self.assertEqual(calendar.count(date(2024, 10, 28), date(2024, 11, 3)), 5)
+
+    def test_learns_holidays_only_for_past_weekdays(self):
+        today = datetime.now(EXCHANGE_TIMEZONE).date()
+        self.assertFalse(record_missing_day(today, "Empty bhavcopy published"))
+        self.assertFalse(record_missing_day(date(2024, 3, 9), "Empty bhavcopy published"))
+        self.assertTrue(record_missing_day(date(2024, 3, 8), "Empty bhavcopy published"))
+        self.assertFalse(record_missing_day(date(2024, 3, 8), "Empty bhavcopy published"))
+        self.assertTrue(get_trading_calendar().is_holiday(date(2024, 3, 8)))
+
+        self.load_holidays([('25-Mar-2024', 'Holi')])
+        self.assertFalse(record_missing_day(date(2024, 3, 25), "Empty bhavcopy published"))
+        self.assertEqual(TradingCalendarDay.objects.get(date=date(2024, 3, 25)).source, TradingCalendarDay.SOURCE_FILE)
+
+    def test_empty_file_learns_a_holiday_but_a_404_does_not(self):
+        YearlyBhavcopyDownloaderView()._store_bhavcopy_csv((', '.join(HEADER) + '\n').encode(), datetime(2024, 3, 8))
+        self.assertTrue(TradingCalendarDay.objects.filter(date=date(2024, 3, 8)).exists())
+
+        summary = BackfillScheduler(downloader=MissingFileDownloader(), workers=1).run(
+            [datetime(2024, 3, 11), datetime(2024, 3, 12)])
+        self.assertEqual(summary["failed_dates"], 2)
+        self.assertFalse(TradingCalendarDay.objects.filter(date__gte=date(2024, 3, 11)).exists())
+
+    def test_stored_data_overrides_holidays(self):
+        self.load_holidays([('25-Mar-2024', 'Holi')])
+        record_missing_day(date(2024, 3, 8), "Empty bhavcopy published")
+        learn_sessions_from_data(dates=[date(2024, 3, 8), date(2024, 3, 25), date(2024, 3, 23)])
+
+        self.assertFalse(TradingCalendarDay.objects.filter(date=date(2024, 3, 8)).exists())
+        for day in (date(2024, 3, 25), date(2024, 3, 23)):
+            self.assertEqual(TradingCalendarDay.objects.get(date=day).kind, TradingCalendarDay.KIND_SPECIAL_SESSION)
+        self.assertTrue(get_trading_calendar().is_trading_day(date(2024, 3, 23)))
+
+
+class GapDetectionTests(TestCase):
+    calendar = TradingCalendar()
+
+    @classmethod
+    def setUpTestData(cls):
+        # 4-15 March 2024 with the 8th missing and the 13th only partly stored
+        for dt in cls.calendar.trading_dates(date(2024, 3, 4), date(2024, 3, 15)):
+            if dt == date(2024, 3, 8):
+                continue
+            df = bhavcopy_frame(dt, symbols=40)
+            bulk_upsert_bhavcopy(df.head(10) if dt == date(2024, 3, 13) else df)
+
+    def test_missing_and_partial_dates(self):
+        gaps = find_gaps(start=date(2024, 3, 1), end=date(2024, 3, 19), calendar=self.calendar)
+        self.assertEqual(gaps["checked"], 13)
+        self.assertEqual(gaps["missing"], [date(2024, 3, 1), date(2024, 3, 8), date(2024, 3, 18), date(2024, 3, 19)])
+        self.assertEqual(gaps["partial"], [date(2024, 3, 13)])
+
+    def test_holidays_are_not_gaps(self):
+        calendar = TradingCalendar(holidays=[date(2024, 3, 8)])
+        gaps = find_gaps(start=date(2024, 3, 4), end=date(2024, 3, 15), calendar=calendar)
+        self.assertEqual(gaps["missing"], [])
+        self.assertEqual(gaps["checked"], 9)
+
+    @override_settings(BHAVCOPY_CATCHUP_LOOKBACK_DAYS=5)
+    def test_default_start_is_bounded_by_the_lookback(self):
+        with CaptureQueriesContext(connection) as queries:
+            gaps = find_gaps(end=date(2024, 3, 15), calendar=self.calendar)
+        self.assertEqual(gaps["start"], date(2024, 3, 11))
+        self.assertEqual(gaps["partial"], [date(2024, 3, 13)])
+        self.assertEqual(gaps["missing"], [])
+        self.assertIn('"DATE1" >=', queries[0]['sql'])
+
+    @override_settings(BHAVCOPY_CATCHUP_LOOKBACK_DAYS=5)
+    def test_catch_up_after_an_outage_resumes_from_the_latest_date(self):
+        gaps = find_gaps(end=date(2024, 4, 5), calendar=self.calendar)
+        self.assertEqual(gaps["start"], date(2024, 3, 15))
+        self.assertEqual(gaps["missing"], self.calendar.trading_dates(date(2024, 3, 18), date(2024, 4, 5)))
+        self.assertEqual(gaps["partial"], [])
+
+    @override_settings(BHAVCOPY_CATCHUP_LOOKBACK_DAYS=5)
+    def test_empty_database_checks_the_lookback(self):
+        DailyBar.objects.all().delete()
+        gaps = find_gaps(end=date(2024, 3, 15), calendar=self.calendar)
+        self.assertEqual(gaps["start"], date(2024, 3, 10))
+        self.assertEqual(gaps["missing"], self.calendar.trading_dates(date(2024, 3, 11), date(2024, 3, 15)))
+
+
+class IndicatorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Symbols that list on day 20 widen the carried state
+        cls.dates = TradingCalendar().trading_dates(date(2024, 1, 1), date(2024, 3, 29))
+        for i, dt in enumerate(cls.dates):
+            df = bhavcopy_frame(dt, symbols=30)
+            bulk_upsert_bhavcopy(df if i >= 20 else df.iloc[5:])
+
+    def indicator_frame(self):
+        rows = DailyIndicator.objects.order_by('security_id', 'DATE1').values_list('security_id', 'DATE1', *INDICATORS)
+        return pd.DataFrame(list(rows), columns=['security_id', 'DATE1', *INDICATORS]).astype({c: 'float64' for c in INDICATORS})
+
+    def test_incremental_updates_match_a_rebuild(self):
+        result = update_indicators(rebuild=True)
+        self.assertEqual(result["dates"], len(self.dates))
+        rebuilt = self.indicator_frame()
+        self.assertEqual(len(rebuilt), DailyBar.objects.count())
+        self.assertTrue(rebuilt['SMA_50'].notna().any())
+
+        update_indicators(rebuild=True, end=self.dates[9])
+        for dt in self.dates[10:40]:
+            self.assertEqual(update_indicators(end=dt)["dates"], 1)
+        update_indicators(chunk_days=7)
+        self.assertEqual(update_indicators()["dates"], 0)
+        pd.testing.assert_frame_equal(self.indicator_frame(), rebuilt, rtol=1e-9)
+
+    def test_contiguous_update_stops_at_a_hole(self):
+        update_indicators(rebuild=True, end=self.dates[29])
+        DailyBar.objects.filter(DATE1=self.dates[31]).delete()
+        result = update_indicators(contiguous=True)
+        self.assertEqual((result["start"], result["end"]), (self.dates[30], self.dates[30]))
+
+
+class ScreenTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for dt in (date(2024, 3, 4), date(2024, 3, 5)):
+            bulk_upsert_bhavcopy(bhavcopy_frame(dt, symbols=60))
+
+    def setUp(self):
+        get_hot_cache().clear()
+
+    def test_parse(self):
+        node = parse_screen("close_price > sma(200) * 1.1 and not DELIV_PER < 60 or SERIES = 'BE'")
+        self.assertEqual(node.op, 'or')
+        first, second = node.operands
+        self.assertEqual(first.op, 'and')
+        self.assertEqual(first.operands[0],
+                         Compare('>', Field('CLOSE_PRICE'), BinOp('*', Field('SMA_200'), Number(1.1))))
+        self.assertEqual(second, Compare('=', Field('SERIES'), parse_screen("SERIES = 'BE'").right))
+
+        for text in ("", "CLOSE_PRICE", "CLOSE_PRICE >", "FOO > 1", "SYMBOL > 'A'", "CLOSE_PRICE > 'A'",
+                     "CLOSE_PRICE > 1 and 2", "(CLOSE_PRICE > 1", "CLOSE_PRICE > 1 $"):
+            with self.assertRaises(ScreenSyntaxError, msg=text):
+                parse_screen(text)
+
+    def test_pushdown(self):
+        query, residual = split_screen(parse_screen(
+            "CLOSE_PRICE > 100.1 and 60 < DELIV_PER and SMA(20) > 1 and SERIES != 'BE' and OPEN_PRICE > LOW_PRICE"))
+        self.assertEqual(residual, [parse_screen("SMA(20) > 1"), parse_screen("OPEN_PRICE > LOW_PRICE")])
+        self.assertIn(('CLOSE_PRICE__gt', 10010.0), query.children)
+        self.assertIn(('DELIV_PER__gt', 6000), query.children)
+
+        # Terms under "or" must stay together
+        query, residual = split_screen(parse_screen("CLOSE_PRICE > 100 or DELIV_PER > 60"))
+        self.assertIsNone(query)
+        self.assertEqual(len(residual), 1)
+
+    def test_evaluate(self):
+        columns = {'CLOSE_PRICE': np.array([10.0, 20.0, 30.0]), 'SMA_20': np.array([15.0, np.nan, 15.0]),
+                   'SYMBOL': np.array(['A', 'B', 'C'], dtype=object)}
+        cases = {
+            "CLOSE_PRICE > SMA(20)": [False, False, True],
+            "not CLOSE_PRICE > SMA(20)": [True, True, False],
+            "CLOSE_PRICE / 0 > 1 or SYMBOL = 'A'": [True, True, True],
+            "CLOSE_PRICE > 10 and 1 > 0": [False, True, True],
+            "not (1 > 0) and CLOSE_PRICE > 0": [False, False, False],
+            "1 > 0 or CLOSE_PRICE > 100": [True, True, True],
+            "2 > 1": [True, True, True],
+        }
+        for text, expected in cases.items():
+            self.assertEqual(evaluate(parse_screen(text), columns).tolist(), expected, msg=text)
+
+    def test_constant_comparisons_in_run_screen(self):
+        # The latest date is screened in memory, earlier ones with SQL pushdown
+        for dt in (date(2024, 3, 5), date(2024, 3, 4)):
+            expected = run_screen("CLOSE_PRICE > 10", dt=dt)["count"]
+            self.assertGreater(expected, 0)
+            self.assertEqual(run_screen("CLOSE_PRICE > 10 and 1 > 0", dt=dt)["count"], expected)
+            self.assertEqual(run_screen("not (1 > 0) and CLOSE_PRICE > 0", dt=dt)["count"], 0)
+            self.assertEqual(run_screen("1 > 0", dt=dt, series=None)["count"], Bhavcopy.objects.filter(DATE1=dt).count())
+
+        response = self.client.get('/bhavcopy/screen/', {'q': "CLOSE_PRICE > 10 and 1 > 0"})
+        self.assertEqual(response.status_code, 200)
+
+
+class HotCacheTests(TestCase):
+    MON, TUE = date(2024, 3, 4), date(2024, 3, 5)
+
+    def setUp(self):
+        # Writes below are made as by another process: only this cache's own receiver is missing
+        bhavcopy_dates_written.disconnect(dispatch_uid='bhavcopy_hot_cache')
+        self.addCleanup(bhavcopy_dates_written.connect, apply_written_dates, dispatch_uid='bhavcopy_hot_cache')
+        self.cache = HotCache(version_seconds=0)
+
+    def store(self, df):
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_upsert_bhavcopy(df)
+
+    def test_writes_by_another_process_reach_the_cache(self):
+        monday = bhavcopy_frame(self.MON, symbols=5)
+        self.store(monday)
+        symbol, series = monday.loc[0, 'SYMBOL'], monday.loc[0, 'SERIES']
+        self.assertEqual(len(self.cache.symbol_series(symbol, series)['DATE1']), 1)
+        loads = []
+        self.cache.cross_section(self.MON, series, lambda: loads.append(1))
+
+        self.store(bhavcopy_frame(self.TUE, symbols=5))
+        self.assertEqual(IngestEvent.objects.count(), 2)
+        self.assertEqual(self.cache.symbol_series(symbol, series)['DATE1'].astype(object).tolist(), [self.MON, self.TUE])
+        self.cache.cross_section(self.MON, series, lambda: loads.append(1))
+        self.assertEqual(len(loads), 1)
+
+        # A corrected file for a cached date
+        self.store(monday.assign(CLOSE_PRICE=monday['CLOSE_PRICE'] + 1))
+        self.assertEqual(self.cache.symbol_series(symbol, series)['CLOSE_PRICE'][0], monday.loc[0, 'CLOSE_PRICE'] + 1)
+        self.cache.cross_section(self.MON, series, lambda: loads.append(1))
+        self.assertEqual(len(loads), 2)
+
+    def test_actions_changed_elsewhere_drop_adjusted_series(self):
+        monday = bhavcopy_frame(self.MON, symbols=5)
+        self.store(monday)
+        symbol, series = monday.loc[0, 'SYMBOL'], monday.loc[0, 'SERIES']
+        loads = []
+        self.cache.adjusted_series(symbol, series, lambda: loads.append(1))
+        self.cache.adjusted_series(symbol, series, lambda: loads.append(1))
+        self.assertEqual(len(loads), 1)
+
+        CorporateAction.objects.create(security=Security.objects.get(SYMBOL=symbol, SERIES=series),
+                                       EX_DATE=self.TUE, FACTOR=0.5, source=CorporateAction.SOURCE_FILE)
+        self.cache.adjusted_series(symbol, series, lambda: loads.append(1))
+        self.assertEqual(len(loads), 2)
+
+
+class CorporateActionTests(TestCase):
+    MON, TUE, WED = date(2024, 3, 4), date(2024, 3, 5), date(2024, 3, 6)
+
+    def setUp(self):
+        reset_trading_calendar()
+        get_hot_cache().clear()
+
+    def store(self, dt, symbols=300, changes=None):
+        """Write a synthetic day and run the corporate actions receiver on it."""
+        df = bhavcopy_frame(dt, symbols=symbols)
+        for symbol, prev_close in (changes or {}).items():
+            df.loc[df['SYMBOL'] == symbol, 'PREV_CLOSE'] = prev_close
+        bulk_upsert_bhavcopy(df)
+        detect_written_dates(sender=None, dates=[dt])
+        return df
+
+    def test_out_of_order_writes_infer_nothing(self):
+        for dt in (self.MON, self.WED, self.TUE):
+            self.store(dt)
+        self.assertFalse(CorporateAction.objects.exists())
+        self.assertEqual(detect_corporate_actions(), {"filled": 0, "created": 0, "updated": 0, "deleted": 0})
+
+    def test_gaps_are_not_compared(self):
+        self.store(self.MON)
+        self.store(self.WED)
+        self.assertEqual(detect_corporate_actions()["created"], 0)
+
+        # Across a holiday the sessions are consecutive again
+        calendar = TradingCalendar(holidays=[self.TUE])
+        self.assertEqual(detect_corporate_actions(calendar=calendar)["created"], 0)
+
+    def test_split_and_bonus_factors(self):
+        monday = self.store(self.MON, symbols=20)
+        close = dict(zip(monday['SYMBOL'], monday['CLOSE_PRICE']))
+        split, bonus, noise = list(close)[:3]
+        self.store(self.TUE, symbols=20, changes={
+            split: round(close[split] / 5, 2),
+            bonus: round(close[bonus] / 2, 2),
+            noise: round(close[noise] * 0.93, 2),
+        })
+        factors = dict(CorporateAction.objects.values_list('security__SYMBOL', 'FACTOR'))
+        self.assertEqual(factors, {split: 0.2, bonus: 0.5})
+
+    def test_backfilled_date_retracts_stale_actions(self):
+        monday = self.store(self.MON, symbols=20)
+        self.store(self.WED, symbols=20)
+        symbols = list(monday['SYMBOL'][:2])
+        securities = dict(Security.objects.filter(SYMBOL__in=symbols).values_list('SYMBOL', 'id'))
+        # As the Monday-to-Wednesday comparison used to infer them
+        CorporateAction.objects.bulk_create([
+            CorporateAction(security_id=securities[symbol], EX_DATE=self.WED, FACTOR=0.96,
+                            source=CorporateAction.SOURCE_INFERRED) for symbol in symbols])
+        CorporateAction.objects.create(security_id=securities[symbols[0]], EX_DATE=self.WED + timedelta(days=7),
+                                       FACTOR=0.5, source=CorporateAction.SOURCE_FILE, PURPOSE='Bonus 1:1')
+
+        self.store(self.TUE, symbols=20)
+        self.assertEqual(list(CorporateAction.objects.values_list('source', flat=True)), [CorporateAction.SOURCE_FILE])
+
+
+def stored_partitions(dt):
+    """Names of the DailyBar partitions holding the rows of one date."""
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT DISTINCT tableoid::regclass::text FROM bhavcopy_dailybar WHERE "DATE1" = %s', [dt])
+        return [name for name, in cursor.fetchall()]
+
+
+@skipUnless(connection.vendor == 'postgresql', 'needs PostgreSQL (set DATABASE_URL)')
+class PostgresTests(TestCase):
+
+    def setUp(self):
+        # Partitions created by a test are rolled back with it
+        partitioning._known_years.clear()
+
+    def tearDown(self):
+        partitioning._known_years.clear()
+
+    def test_daily_bars_are_partitioned_by_year(self):
+        self.assertTrue(is_partitioned())
+        this_year = date.today().year
+        self.assertLessEqual({this_year, this_year + 1}, set(partition_years()))
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, DailyBar._meta.db_table)
+        self.assertIn(['id', 'DATE1'], [info['columns'] for info in constraints.values() if info['primary_key']])
+
+        # The writer adds the partition of a year before its first rows
+        self.assertNotIn(2019, partition_years())
+        bulk_upsert_bhavcopy(bhavcopy_frame(date(2019, 3, 4), symbols=10))
+        self.assertIn(2019, partition_years())
+        self.assertEqual(stored_partitions(date(2019, 3, 4)), [partition_name(2019)])
+        self.assertEqual(Bhavcopy.objects.filter(DATE1=date(2019, 3, 4)).count(), 10)
+
+    def test_copy_ingest_merges_on_conflict(self):
+        self.assertTrue(use_copy())
+        df = bhavcopy_frame(date(2024, 3, 4), symbols=40)
+        result = bulk_upsert_bhavcopy(df.iloc[:30], batch_size=7)
+        self.assertEqual(len(result["batches"]), 1)
+        self.assertEqual(result["records_created"], 30)
+
+        df.loc[0, 'CLOSE_PRICE'] = 123.45
+        df.loc[1, 'TTL_TRD_QNTY'] = 42
+        result = bulk_upsert_bhavcopy(df)
+        self.assertEqual((result["records_created"], result["records_updated"]), (10, 30))
+        self.assertEqual(DailyBar.objects.count(), 40)
+        stored = Bhavcopy.objects.get(SYMBOL=df.loc[0, 'SYMBOL'], SERIES=df.loc[0, 'SERIES'])
+        self.assertEqual(stored.CLOSE_PRICE, 123.45)
+        stored = Bhavcopy.objects.get(SYMBOL=df.loc[1, 'SYMBOL'], SERIES=df.loc[1, 'SERIES'])
+        self.assertEqual(stored.TTL_TRD_QNTY, 42)
+
+    @override_settings(BHAVCOPY_POSTGRES_COPY=False)
+    def test_batched_insert_merges_on_conflict(self):
+        self.assertFalse(use_copy())
+        df = bhavcopy_frame(date(2024, 3, 4), symbols=20)
+        result = bulk_upsert_bhavcopy(df, batch_size=7)
+        self.assertEqual(len(result["batches"]), -(-len(df) // 7))
+        self.assertEqual(result["records_created"], len(df))
+
+        df.loc[0, 'CLOSE_PRICE'] = 123.45
+        result = bulk_upsert_bhavcopy(df, batch_size=7)
+        self.assertEqual(result["records_updated"], len(df))
+        stored = Bhavcopy.objects.get(SYMBOL=df.loc[0, 'SYMBOL'], SERIES=df.loc[0, 'SERIES'])
+        self.assertEqual(stored.CLOSE_PRICE, 123.45)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'needs PostgreSQL (set DATABASE_URL)')
+class PartitionMigrationTests(TransactionTestCase):
+
+    def tearDown(self):
+        partitioning._known_years.clear()
+
+    def test_unpartition_and_partition_keep_rows(self):
+        bulk_upsert_bhavcopy(bhavcopy_frame(date(2024, 3, 4), symbols=20))
+        executor = MigrationExecutor(connection)
+        latest = executor.loader.graph.leaf_nodes('bhavcopy')
+
+        executor.migrate([('bhavcopy', '0008_corporate_actions')])
+        self.assertFalse(is_partitioned())
+        self.assertEqual(Bhavcopy.objects.filter(DATE1=date(2024, 3, 4)).count(), 20)
+
+        executor.loader.build_graph()
+        executor.migrate(latest)
+        self.assertTrue(is_partitioned())
+        self.assertEqual(stored_partitions(date(2024, 3, 4)), [partition_name(2024)])
+
+        # New ids continue after the copied rows
+        partitioning._known_years.clear()
+        bulk_upsert_bhavcopy(bhavcopy_frame(date(2024, 3, 5), symbols=20))
+        self.assertEqual(Bhavcopy.objects.count(), 40)
+        self.assertEqual(DailyBar.objects.values('id').distinct().count(), 40)
+
+
+class IngestEventTests(TestCase):
+    MON = date(2024, 3, 4)
+
+    def store(self, df):
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_upsert_bhavcopy(df)
+
+    def test_a_commit_appends_one_event(self):
+        df = bhavcopy_frame(self.MON, symbols=10)
+        self.store(df)
+        event = IngestEvent.objects.get()
+        self.assertEqual((event.DATE1, event.ROWS), (self.MON, 10))
+        self.assertEqual(event.CHECKSUM, date_checksum(self.MON)[1])
+
+        # The same file again changes nothing and logs nothing
+        self.store(df)
+        self.assertEqual(IngestEvent.objects.count(), 1)
+        self.store(df.assign(CLOSE_PRICE=df['CLOSE_PRICE'] + 1))
+        self.assertEqual(list(IngestEvent.objects.values_list('ROWS', flat=True)), [10, 10])
+        self.assertNotEqual(IngestEvent.objects.last().CHECKSUM, event.CHECKSUM)
+
+    def test_stream_starts_with_retry_then_replays_missed_events(self):
+        self.store(bhavcopy_frame(self.MON, symbols=10))
+        event = IngestEvent.objects.values(*EVENT_FIELDS).get()
+
+        async def first_frames(count):
+            stream = sse_stream(last_id=0)
+            frames = [await anext(stream) for _ in range(count)]
+            await stream.aclose()
+            # Let the poll task see there is nobody left
+            await asyncio.sleep(0.05)
+            return frames
+
+        with mock.patch('bhavcopy.ingest_events._broadcaster', EventBroadcaster(poll_seconds=0.01)):
+            frames = async_to_sync(first_frames)(2)
+        self.assertEqual(frames[0], f"retry: {RETRY_MILLISECONDS}\n\n")
+        self.assertEqual(frames[1], format_sse(event))
+        self.assertTrue(frames[1].startswith(f"id: {event['id']}\nevent: ingest\ndata: "))
+        self.assertEqual(json.loads(frames[1].split('data: ', 1)[1])['rows'], 10)
+
+    def test_events_behind_a_missing_id_are_held_back(self):
+        broadcaster = EventBroadcaster()
+        broadcaster.latest_id = 5
+        self.assertEqual(broadcaster._ready([{'id': 7}, {'id': 8}]), [])
+        # Id 6 committed after 7 and 8
+        self.assertEqual([e['id'] for e in broadcaster._ready([{'id': 6}, {'id': 7}, {'id': 8}])], [6, 7, 8])
+
+        broadcaster.latest_id = 8
+        self.assertEqual(broadcaster._ready([{'id': 10}]), [])
+        with mock.patch('bhavcopy.ingest_events.time.monotonic', return_value=time.monotonic() + GAP_SECONDS):
+            self.assertEqual(broadcaster._ready([{'id': 10}]), [{'id': 10}])
+
+
+class SymbolOHLCTests(TestCase):
+    MON, TUE = date(2024, 3, 4), date(2024, 3, 5)
+
+    def setUp(self):
+        # Days are written as by run_download_worker: the web process's cache receiver never runs
+        bhavcopy_dates_written.disconnect(dispatch_uid='bhavcopy_hot_cache')
+        self.addCleanup(bhavcopy_dates_written.connect, apply_written_dates, dispatch_uid='bhavcopy_hot_cache')
+        patcher = mock.patch('bhavcopy.hot_cache._default_cache', HotCache(version_seconds=0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def store(self, dt):
+        with self.captureOnCommitCallbacks(execute=True):
+            df = bhavcopy_frame(dt, symbols=5)
+            bulk_upsert_bhavcopy(df)
+        return df
+
+    def test_etag_follows_the_served_candles(self):
+        df = self.store(self.MON)
+        url = f"/bhavcopy/symbols/{df.loc[0, 'SYMBOL']}/ohlc/"
+        params = {'interval': 'D', 'series': df.loc[0, 'SERIES']}
+        response = self.client.get(url, params)
+        self.assertEqual(response.json()['count'], 1)
+        first = response['ETag']
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=first).status_code, 304)
+
+        self.store(self.TUE)
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH=first)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 2)
+        self.assertNotEqual(response['ETag'], first)
+
+        not_modified = self.client.get(url, params, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+
+    def test_etag_is_the_version_the_candles_were_built_from(self):
+        df = self.store(self.MON)
+        symbol, series = df.loc[0, 'SYMBOL'], df.loc[0, 'SERIES']
+        # An ingest lands between every read of the data version
+        versions = itertools.count(1)
+        with mock.patch.object(HotCache, 'data_version', side_effect=lambda: next(versions)), \
+                mock.patch('bhavcopy.views.ohlc_series', wraps=ohlc_series) as built:
+            response = self.client.get(f'/bhavcopy/symbols/{symbol}/ohlc/', {'interval': 'D', 'series': series})
+        self.assertEqual(response.status_code, 200)
+        request = mock.Mock(GET={'interval': 'D', 'series': series})
+        self.assertEqual(response['ETag'], _ohlc_etag(_ohlc_params(request, symbol), built.call_args.kwargs['version']))
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        # The registry is process-wide, so each test observes under a source of its own
+        self.source = self.id()
+
+    def observe(self, dt, read_seconds, rows=1000):
+        parse_stats = {"rows": rows, "read_seconds": read_seconds, "clean_seconds": 0.0}
+        upsert_result = {"prepare_seconds": 0.0, "write_seconds": 0.5}
+        observe_file(self.source, dt, parse_stats, upsert_result, stored_seconds=0.75)
+
+    def test_exposition_has_bucket_sum_and_count_lines(self):
+        self.observe(date(2024, 3, 4), 0.0625)
+        self.observe(date(2024, 3, 5), 0.00390625)
+        response = self.client.get('/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], CONTENT_TYPE)
+        lines = response.content.decode().splitlines()
+
+        labels = f'source="{self.source}",stage="parse"'
+        self.assertIn('# TYPE bhavcopy_stage_seconds histogram', lines)
+        for bound, count in [('0.005', 1), ('0.05', 1), ('0.1', 2), ('+Inf', 2)]:
+            self.assertIn(f'bhavcopy_stage_seconds_bucket{{{labels},le="{bound}"}} {count}', lines)
+        self.assertIn(f'bhavcopy_stage_seconds_sum{{{labels}}} 0.06640625', lines)
+        self.assertIn(f'bhavcopy_stage_seconds_count{{{labels}}} 2', lines)
+        self.assertIn(f'bhavcopy_stage_rows_total{{{labels}}} 2000', lines)
+        # Commit is what the store took beyond preparing and writing
+        self.assertIn(f'bhavcopy_stage_seconds_sum{{source="{self.source}",stage="commit"}} 0.5', lines)
+
+    def test_run_summary_covers_only_the_run(self):
+        self.observe(date(2024, 3, 1), 1.0)
+        before = get_metrics().snapshot()
+        self.observe(date(2024, 3, 4), 0.25, rows=500)
+        self.observe(date(2024, 3, 5), 0.75, rows=1500)
+
+        summary = run_summary(before)
+        self.assertEqual([d["date"] for d in summary["dates"]], ['04-03-2024', '05-03-2024'])
+        parse = summary["stages"]["parse"]
+        self.assertEqual((parse["dates"], parse["seconds"], parse["mean"], parse["max"]), (2, 1.0, 0.5, 0.75))
+        self.assertEqual(parse["rows"], 2000)
+        self.assertEqual(parse["rows_per_second"], 2000.0)
+        self.assertEqual(summary["stages"]["commit"]["seconds"], 0.5)
+        self.assertNotIn('fetch', summary["stages"])
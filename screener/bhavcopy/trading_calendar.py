@@ -0,0 +1,226 @@
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+import numpy as np
+import pandas as pd
+import threading
+import time
+import logging
+from bhavcopy.models import TradingCalendarDay
+
+logger = logging.getLogger(__name__)
+
+# NSE trades Monday to Friday
+WEEKMASK = '1111100'
+
+# Descriptions in holiday files that mark a special session rather than a closure
+SPECIAL_SESSION_KEYWORDS = ('muhurat', 'special session', 'special trading')
+
+# Seconds a process keeps the calendar before re-reading the table
+CALENDAR_TTL = 60
+
+# NSE dates and publication times are India time
+EXCHANGE_TIMEZONE = ZoneInfo('Asia/Kolkata')
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, np.datetime64):
+        return value.astype('datetime64[D]').astype(date)
+    return value
+
+
+class TradingCalendar:
+    """
+    Exchange trading days: the Monday-Friday week minus holidays plus special
+    sessions (weekend or holiday sessions such as Muhurat trading).
+
+    All range operations are vectorized over numpy datetime64[D] arrays with
+    np.busdaycalendar, so generating a decade of trading days is a single
+    array operation rather than a Python loop.
+    """
+
+    def __init__(self, holidays=(), special_sessions=()):
+        self.holidays = np.array(sorted(_as_date(d) for d in holidays), dtype='datetime64[D]')
+        self.special_sessions = np.array(sorted(_as_date(d) for d in special_sessions), dtype='datetime64[D]')
+        self.busdaycalendar = np.busdaycalendar(weekmask=WEEKMASK, holidays=self.holidays)
+
+    @classmethod
+    def from_db(cls):
+        """Build the calendar from the TradingCalendarDay table."""
+        rows = TradingCalendarDay.objects.values_list('date', 'kind')
+        holidays = [d for d, kind in rows if kind == TradingCalendarDay.KIND_HOLIDAY]
+        special = [d for d, kind in rows if kind == TradingCalendarDay.KIND_SPECIAL_SESSION]
+        return cls(holidays, special)
+
+    def trading_days(self, start, end):
+        """
+        Every trading day between start and end, inclusive.
+
+        Returns:
+            numpy datetime64[D] array in ascending order
+        """
+        start = np.datetime64(_as_date(start), 'D')
+        end = np.datetime64(_as_date(end), 'D')
+        if end < start:
+            return np.array([], dtype='datetime64[D]')
+        days = np.arange(start, end + 1, dtype='datetime64[D]')
+        regular = days[np.is_busday(days, busdaycal=self.busdaycalendar)]
+        special = self.special_sessions[(self.special_sessions >= start) & (self.special_sessions <= end)]
+        return np.union1d(regular, special)
+
+    def trading_dates(self, start, end):
+        """trading_days() as a list of datetime.date objects."""
+        return self.trading_days(start, end).astype(date).tolist()
+
+    def is_trading_day(self, value):
+        day = np.datetime64(_as_date(value), 'D')
+        return bool(np.is_busday(day, busdaycal=self.busdaycalendar) or day in self.special_sessions)
+
+    def is_holiday(self, value):
+        """True for a weekday without a session (weekends are not holidays)."""
+        day = np.datetime64(_as_date(value), 'D')
+        return bool(day in self.holidays and day not in self.special_sessions)
+
+    def count(self, start, end):
+        """Number of trading days between start and end, inclusive."""
+        return len(self.trading_days(start, end))
+
+    def offset(self, value, sessions):
+        """
+        The trading day `sessions` sessions after (or before, when negative)
+        `value`. A non-trading `value` is first rolled back to the previous
+        trading day, so offset(d, 0) is the last session on or before d.
+        """
+        value = _as_date(value)
+        # Roughly 1.5 calendar days per session, padded for holiday clusters
+        span = timedelta(days=abs(int(sessions)) * 2 + 30)
+        days = self.trading_days(value - span, value + span)
+        position = int(np.searchsorted(days, np.datetime64(value, 'D'), side='right')) - 1 + int(sessions)
+        if position < 0 or position >= len(days):
+            raise ValueError(f"No trading day {sessions} sessions from {value}")
+        return days[position].astype(date)
+
+    def previous_trading_day(self, value):
+        """The last trading day strictly before `value`."""
+        return self.offset(_as_date(value) - timedelta(days=1), 0)
+
+    def next_trading_day(self, value):
+        """The first trading day strictly after `value`."""
+        return self.offset(value, 1)
+
+
+_calendar = None
+_calendar_loaded_at = 0.0
+_calendar_lock = threading.Lock()
+
+
+def get_trading_calendar():
+    """Return the process-wide calendar, re-read from the table every CALENDAR_TTL seconds."""
+    global _calendar, _calendar_loaded_at
+    with _calendar_lock:
+        if _calendar is None or time.monotonic() - _calendar_loaded_at > CALENDAR_TTL:
+            _calendar = TradingCalendar.from_db()
+            _calendar_loaded_at = time.monotonic()
+        return _calendar
+
+
+def reset_trading_calendar():
+    """Drop the cached calendar after the table changes."""
+    global _calendar
+    with _calendar_lock:
+        _calendar = None
+
+
+def load_holiday_file(path):
+    """
+    Load holidays and special sessions from a CSV file into the table.
+
+    Accepts the NSE holiday list layout (a "Date" column such as 26-Jan-2024
+    plus "Description") or any CSV with "date" and optional "description" and
+    "kind" columns. Rows whose description mentions Muhurat or a special
+    session are stored as special sessions.
+
+    Returns:
+        dict with "holidays" and "special_sessions" counts
+    """
+    df = pd.read_csv(path, skipinitialspace=True)
+    columns = {c.strip().lower(): c for c in df.columns}
+    if 'date' not in columns:
+        raise ValueError(f"{path} has no 'date' column")
+
+    dates = pd.to_datetime(df[columns['date']].astype(str).str.strip(), dayfirst=True, format='mixed').dt.date
+    descriptions = df[columns['description']].fillna('').astype(str).str.strip() \
+        if 'description' in columns else pd.Series('', index=df.index)
+    kinds = df[columns['kind']].fillna('').astype(str).str.strip().str.lower() \
+        if 'kind' in columns else pd.Series('', index=df.index)
+
+    counts = {"holidays": 0, "special_sessions": 0}
+    for day, description, kind in zip(dates, descriptions, kinds):
+        special = kind == TradingCalendarDay.KIND_SPECIAL_SESSION or \
+            any(k in description.lower() for k in SPECIAL_SESSION_KEYWORDS)
+        kind = TradingCalendarDay.KIND_SPECIAL_SESSION if special else TradingCalendarDay.KIND_HOLIDAY
+        TradingCalendarDay.objects.update_or_create(
+            date=day,
+            defaults={"kind": kind, "description": description[:200], "source": TradingCalendarDay.SOURCE_FILE},
+        )
+        counts["special_sessions" if special else "holidays"] += 1
+
+    reset_trading_calendar()
+    return counts
+
+
+def record_missing_day(value, reason):
+    """
+    Learn a holiday from a weekday that was fetched but has no data.
+
+    Called only when NSE publishes an empty file for a past weekday: a 404
+    may be a rate limit, an outage or a file not yet published, so it is
+    never taken as a holiday. Days loaded from a file are never
+    overwritten, and today (India time) is left alone.
+    """
+    day = _as_date(value)
+    if day.weekday() >= 5 or day >= datetime.now(EXCHANGE_TIMEZONE).date():
+        return False
+    _, created = TradingCalendarDay.objects.get_or_create(
+        date=day,
+        defaults={"kind": TradingCalendarDay.KIND_HOLIDAY, "description": reason,
+                  "source": TradingCalendarDay.SOURCE_LEARNED},
+    )
+    if created:
+        logger.info(f"Learned holiday {day}: {reason}")
+        reset_trading_calendar()
+    return created
+
+
+def learn_sessions_from_data(sender=None, dates=(), **kwargs):
+    """
+    bhavcopy_dates_written receiver: reconcile the calendar with stored data.
+
+    A date that now has rows cannot be a holiday: a learned holiday for it is
+    removed (the earlier 404 was transient), and a weekend or file-listed
+    holiday that traded is recorded as a special session.
+    """
+    changed = False
+    for day in dates:
+        day = _as_date(day)
+        existing = TradingCalendarDay.objects.filter(date=day).first()
+        if existing is None:
+            if day.weekday() >= 5:
+                TradingCalendarDay.objects.create(
+                    date=day, kind=TradingCalendarDay.KIND_SPECIAL_SESSION,
+                    description='Weekend session found in data', source=TradingCalendarDay.SOURCE_LEARNED,
+                )
+                changed = True
+        elif existing.kind == TradingCalendarDay.KIND_HOLIDAY:
+            if existing.source == TradingCalendarDay.SOURCE_LEARNED:
+                existing.delete()
+            else:
+                existing.kind = TradingCalendarDay.KIND_SPECIAL_SESSION
+                existing.description = f"Session on {existing.description or 'holiday'}"[:200]
+                existing.save(update_fields=['kind', 'description'])
+            changed = True
+
+    if changed:
+        logger.info(f"Trading calendar updated from data for {len(dates)} dates")
+        reset_trading_calendar()
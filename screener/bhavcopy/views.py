@@ -1,23 +1,31 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from django.http import JsonResponse
-import requests
-import pandas as pd
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.views import View
 import numpy as np
-import io
-from datetime import datetime
-from rest_framework.views import APIView
-from rest_framework.response import Response
-from rest_framework import status
-from django.http import JsonResponse
-import requests
-import pandas as pd
-import io
-from datetime import datetime
 import time
-from bhavcopy.models import Bhavcopy
+import hashlib
+from datetime import datetime
+from bhavcopy.bulk_upsert import bulk_upsert_bhavcopy
+from bhavcopy.raw_archive import get_archive, SOURCE_BHAVCOPY
+from bhavcopy.nse_client import get_nse_client
+from bhavcopy.parsing import parse_bhavcopy
+from bhavcopy.models import Bhavcopy, IndexBar, RelativeStrength, IngestEvent
+from bhavcopy.ingest_events import EVENT_FIELDS, serialize_event, sse_stream
+from bhavcopy.indices import INDEX_VALUE_FIELDS, RS_WINDOWS, DEFAULT_BENCHMARK
+from bhavcopy.serializers import BhavcopySerializer
+from bhavcopy.streaming import InvalidQuery, parse_fields, parse_date, page, stream_response
+from bhavcopy.screens import run_screen
+from bhavcopy.hot_cache import get_hot_cache
+from bhavcopy.corporate_actions import adjusted_series
+from bhavcopy.ohlc import INTERVALS, candle_rows, ohlc_series
+from bhavcopy.metrics import CONTENT_TYPE, FETCH_SECONDS, get_metrics, observe_file, observe_stage
 import bhavcopy.constants as constant
+from django.conf import settings
+from django.db.models import F, Max
 import logging
 
 logger = logging.getLogger(__name__)
@@ -26,7 +34,6 @@ class FetchBhavcopyDataView(APIView):
     """
     API view to fetch, process and store Bhavcopy data from external source
     """
-    nse_main_url = "https://www.nseindia.com/"
     timeout= 4
     def get(self, request, *args, **kwargs):
         try:
@@ -45,99 +52,50 @@ class FetchBhavcopyDataView(APIView):
             csv_url = constant.link_bhavcopy.format(dd=dd, mm=mm, yyyy=yyyy)
             print(csv_url)
             
-            # Setup headers for the request
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/84.0.4147.135 Safari/537.36",
-                "Accept": "*/*",
-                "Accept-Encoding": "gzip, deflate",
-                "Accept-Language": "en-GB,en-US;q=0.9,en;q=0.8",
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-            }
-            
-            # Create a session and update headers
-            session = requests.Session()
-            session.headers.update(headers)
-
-            # Step 1: Hit the main NSE page first to get session cookies
-            logger.info("Hitting NSE main page to establish session...")
-            main_page_response = session.get(self.nse_main_url, timeout=self.timeout)
-            
-            if main_page_response.status_code != 200:
-                logger.error(f"Failed to access NSE main page: {main_page_response.status_code}")
-                return Response(
-                    {"error": f"Failed to establish NSE session: {main_page_response.status_code}"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-                
-            # Step 2: Wait a couple of seconds to avoid being flagged as a bot
-            logger.info("Waiting before making bhavcopy request...")
-            time.sleep(2)
-
-            # Step 3: Use the same session (with cookies) to fetch the CSV file
-            logger.info("Fetching bhavcopy data with established session...")
-            response = session.get(csv_url, timeout=self.timeout)
+            # Serve the file from the raw archive when we already have it
+            archive = get_archive()
+            content = None
+            started = time.perf_counter()
+            if archive.offline or not archive.revalidate:
+                content = archive.get(SOURCE_BHAVCOPY, dt)
+                if content is not None:
+                    FETCH_SECONDS.observe(time.perf_counter() - started, source=SOURCE_BHAVCOPY, origin='archive')
             
-            if response.status_code != 200:
-                logger.error(f"Failed to fetch CSV: {response.status_code}")
+            if content is None and archive.offline:
                 return Response(
-                    {"error": f"Failed to fetch CSV: {response.status_code}"},
-                    status=status.HTTP_400_BAD_REQUEST
+                    {"error": "Bhavcopy not in archive (offline mode)"},
+                    status=status.HTTP_404_NOT_FOUND
                 )
             
-            # Use pandas to read the CSV content
-            csv_content = io.StringIO(response.content.decode('utf-8'))
-            df = pd.read_csv(csv_content)
-            
-            # Clean column names and handle potential spaces
-            df.columns = df.columns.str.strip()
-            
-            # Convert date format (if necessary)
-            df['DATE1'] = pd.to_datetime(df['DATE1'].str.strip(), format='%d-%b-%Y').dt.date
-            
-            df = self.clean_numerical_columns(df)
-            # Process each row and save to database
-            records_created = 0
-            records_updated = 0
-            
-            for _, row in df.iterrows():
-                # Convert row to dict
-                data_dict = row.to_dict()
+            if content is None:
+                # One request on a pooled session that already holds NSE cookies
+                logger.info("Fetching bhavcopy data with the shared NSE client...")
+                fetched = archive.fetch(get_nse_client(), SOURCE_BHAVCOPY, dt, csv_url, timeout=self.timeout)
+                FETCH_SECONDS.observe(time.perf_counter() - started, source=SOURCE_BHAVCOPY, origin=fetched["origin"])
                 
-                # Try to get existing record or create new one
-                try:
-                    obj, created = Bhavcopy.objects.update_or_create(
-                        SYMBOL=data_dict['SYMBOL'],
-                        SERIES=data_dict['SERIES'],
-                        DATE1=data_dict['DATE1'],
-                        defaults={
-                            'PREV_CLOSE': data_dict['PREV_CLOSE'],
-                            'OPEN_PRICE': data_dict['OPEN_PRICE'],
-                            'HIGH_PRICE': data_dict['HIGH_PRICE'],
-                            'LOW_PRICE': data_dict['LOW_PRICE'],
-                            'LAST_PRICE': data_dict['LAST_PRICE'],
-                            'CLOSE_PRICE': data_dict['CLOSE_PRICE'],
-                            'AVG_PRICE': data_dict['AVG_PRICE'],
-                            'TTL_TRD_QNTY': data_dict['TTL_TRD_QNTY'],
-                            'TURNOVER_LACS': data_dict['TURNOVER_LACS'],
-                            'NO_OF_TRADES': data_dict['NO_OF_TRADES'],
-                            'DELIV_QTY': data_dict['DELIV_QTY'],
-                            'DELIV_PER': data_dict['DELIV_PER'],
-                        }
+                if fetched["content"] is None:
+                    logger.error(f"Failed to fetch CSV: {fetched.get('error') or fetched['status_code']}")
+                    return Response(
+                        {"error": f"Failed to fetch CSV: {fetched.get('error') or fetched['status_code']}"},
+                        status=status.HTTP_400_BAD_REQUEST
                     )
-                    
-                    if created:
-                        records_created += 1
-                    else:
-                        records_updated += 1
-                        
-                except Exception as e:
-                    logger.error(f"Error processing row {data_dict['SYMBOL']}: {str(e)}")
+                content = fetched["content"]
+            observe_stage(SOURCE_BHAVCOPY, 'fetch', time.perf_counter() - started, dt=dt)
+            
+            # Parse straight into typed, cleaned columns
+            df, parse_stats = parse_bhavcopy(content)
+            
+            # Upsert all rows in batches instead of one query per row
+            started = time.perf_counter()
+            upsert_result = bulk_upsert_bhavcopy(df)
+            observe_file(SOURCE_BHAVCOPY, dt, parse_stats, upsert_result, time.perf_counter() - started)
             
             return Response({
                 "message": "CSV processed successfully",
-                "records_created": records_created,
-                "records_updated": records_updated,
+                "records_created": upsert_result["records_created"],
+                "records_updated": upsert_result["records_updated"],
+                "records_with_errors": upsert_result["records_with_errors"],
+                "values_filled": parse_stats["filled"],
                 "total_rows": len(df)
             }, status=status.HTTP_200_OK)
             
@@ -147,22 +105,436 @@ class FetchBhavcopyDataView(APIView):
                 {"error": f"Error processing CSV: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-    def clean_numerical_columns(self,df:None):
-        """Handles the data cleaning for numerical columns."""
-        # Clean numerical columns that might contain '-' or other non-numeric values
-        numerical_columns = ['PREV_CLOSE', 'OPEN_PRICE', 'HIGH_PRICE', 'LOW_PRICE', 
-                            'LAST_PRICE', 'CLOSE_PRICE', 'AVG_PRICE', 'TTL_TRD_QNTY',
-                            'TURNOVER_LACS', 'NO_OF_TRADES', 'DELIV_QTY', 'DELIV_PER']
-        
-        # Replace '-', ' -', '- ' or any non-numeric value with NaN and then with 0
-        for col in numerical_columns:
-            if col in df.columns:
-                # Convert to string first to handle any type of data
-                df[col] = df[col].astype(str).str.strip()
-                # Replace any variant of dash with empty string
-                df[col] = df[col].replace(['-', ' -', '- ', ' - '], '')
-                # Convert empty strings to NaN
-                df[col] = df[col].replace('', np.nan)
-                # Convert to float and replace NaN with 0
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-        return df
\ No newline at end of file
+
+
+class BhavcopyReadView(APIView):
+    """
+    Shared read behaviour for the bhavcopy query endpoints.
+
+    Query parameters:
+        fields: comma-separated columns to return (default: all)
+        limit: page size for paginated JSON (default 500, max 5000)
+        cursor: opaque keyset cursor from a previous page's "next_cursor"
+        stream: csv, ndjson or json to stream every matching row instead of paging
+    """
+    default_limit = 500
+    max_limit = 5000
+    default_stream = None
+    export_name = 'bhavcopy'
+
+    def get_queryset(self, request, **kwargs):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        try:
+            queryset = self.get_queryset(request, **kwargs)
+            fields = parse_fields(request.GET.get("fields"))
+            cursor = request.GET.get("cursor")
+            stream_format = request.GET.get("stream", self.default_stream)
+
+            if stream_format:
+                return stream_response(queryset, fields, stream_format, cursor=cursor, filename=self.export_name)
+
+            try:
+                limit = int(request.GET.get("limit", self.default_limit))
+            except ValueError:
+                raise InvalidQuery("'limit' must be an integer")
+            limit = max(1, min(limit, self.max_limit))
+
+            rows, next_cursor = page(queryset, fields, limit, cursor=cursor)
+            next_url = None
+            if next_cursor:
+                params = request.GET.copy()
+                params["cursor"] = next_cursor
+                next_url = request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+
+            return Response({
+                "count": len(rows),
+                "next_cursor": next_cursor,
+                "next": next_url,
+                "results": BhavcopySerializer(rows, many=True, fields=fields).data,
+            }, status=status.HTTP_200_OK)
+
+        except InvalidQuery as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Error reading bhavcopy data: {str(e)}")
+            return Response(
+                {"error": f"Error reading bhavcopy data: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    def _date_range(self, request, queryset):
+        """Apply the optional start/end query parameters."""
+        if request.GET.get("start"):
+            queryset = queryset.filter(DATE1__gte=parse_date(request.GET["start"]))
+        if request.GET.get("end"):
+            queryset = queryset.filter(DATE1__lte=parse_date(request.GET["end"]))
+        return queryset
+
+
+class SymbolTimeSeriesView(BhavcopyReadView):
+    """
+    Daily rows for one symbol, oldest first.
+
+    GET /bhavcopy/symbols/<symbol>/?series=EQ&start=01-01-2024&end=31-03-2024
+    """
+
+    def get_queryset(self, request, **kwargs):
+        self.export_name = kwargs["symbol"].upper()
+        queryset = Bhavcopy.objects.filter(SYMBOL=kwargs["symbol"].upper())
+        if request.GET.get("series"):
+            queryset = queryset.filter(SERIES=request.GET["series"].upper())
+        return self._date_range(request, queryset)
+
+
+class AdjustedSeriesView(APIView):
+    """
+    Daily rows for one symbol adjusted for splits and bonuses, oldest first.
+
+    GET /bhavcopy/symbols/<symbol>/adjusted/?series=EQ&start=01-01-2024&end=31-03-2024
+
+    Prices are multiplied and quantities divided by ADJ_FACTOR, the product
+    of the factors of all later corporate actions.
+    """
+
+    def get(self, request, symbol, *args, **kwargs):
+        try:
+            symbol = symbol.upper()
+            series = request.GET.get("series", "EQ").upper()
+            columns, actions = adjusted_series(symbol, series)
+            if not len(columns['DATE1']):
+                return Response({"error": f"No data for {symbol} ({series})"}, status=status.HTTP_404_NOT_FOUND)
+
+            selected = np.ones(len(columns['DATE1']), dtype=bool)
+            if request.GET.get("start"):
+                selected &= columns['DATE1'] >= np.datetime64(parse_date(request.GET["start"]), 'D')
+            if request.GET.get("end"):
+                selected &= columns['DATE1'] <= np.datetime64(parse_date(request.GET["end"]), 'D')
+
+            fields = [f for f in columns if f != 'DATE1']
+            dates = columns['DATE1'][selected].astype(str)
+            values = [columns[f][selected].tolist() for f in fields]
+            results = [{"DATE1": dt, **dict(zip(fields, row))} for dt, row in zip(dates.tolist(), zip(*values))]
+            return Response({
+                "symbol": symbol,
+                "series": series,
+                "actions": [{"EX_DATE": ex_date, "FACTOR": factor, "PURPOSE": purpose, "source": source}
+                            for ex_date, factor, purpose, source in actions],
+                "count": len(results),
+                "results": results,
+            }, status=status.HTTP_200_OK)
+        except InvalidQuery as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+def _ohlc_params(request, symbol):
+    """(symbol, series, interval, start, end, adjusted) from an /ohlc/ request."""
+    interval = request.GET.get("interval", "W").upper()
+    if interval not in INTERVALS:
+        raise InvalidQuery(f"'interval' must be one of {', '.join(INTERVALS)}")
+    start = parse_date(request.GET["start"]) if request.GET.get("start") else None
+    end = parse_date(request.GET["end"]) if request.GET.get("end") else None
+    adjusted = request.GET.get("adjusted", "").lower() in ("1", "true", "yes")
+    return symbol.upper(), request.GET.get("series", "EQ").upper(), interval, start, end, adjusted
+
+
+def _ohlc_etag(params, version):
+    """Strong ETag of an /ohlc/ response: its parameters and the data version its candles were built from."""
+    return quote_etag(hashlib.sha256(repr((params, version)).encode('utf-8')).hexdigest()[:32])
+
+
+class SymbolOHLCView(APIView):
+    """
+    Candles for one symbol resampled on the server, oldest first.
+
+    GET /bhavcopy/symbols/<symbol>/ohlc/?interval=W&series=EQ&start=01-01-2020&end=31-03-2024&adjusted=1
+
+    interval is D, W (default), M or Q. Each candle's DATE1 is its last
+    session. Responses carry a strong ETag that changes with the latest
+    ingest or corporate action, so If-None-Match revalidations are answered
+    with 304 Not Modified without resampling. The tag and the candles come
+    from one read of the hot cache's data version, so a body is never
+    served under a newer tag than the data it was built from.
+    """
+
+    def get(self, request, symbol, *args, **kwargs):
+        try:
+            params = _ohlc_params(request, symbol)
+            symbol, series, interval, start, end, adjusted = params
+            # Brings the hot cache up to date with every recorded ingest first
+            version = get_hot_cache().data_version()
+            etag = _ohlc_etag(params, version)
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                not_modified['ETag'] = etag
+                return not_modified
+
+            candles = ohlc_series(symbol, series, interval, start, end, adjusted, version=version)
+            if not len(candles['DATE1']) and not get_hot_cache().symbol_series(symbol, series)['DATE1'].size:
+                return Response({"error": f"No data for {symbol} ({series})"}, status=status.HTTP_404_NOT_FOUND)
+            results = candle_rows(candles)
+            response = Response({
+                "symbol": symbol,
+                "series": series,
+                "interval": interval,
+                "adjusted": adjusted,
+                "count": len(results),
+                "results": results,
+            }, status=status.HTTP_200_OK)
+            # Cacheable, but revalidated with the ETag on every use
+            response['ETag'] = etag
+            response['Cache-Control'] = 'no-cache'
+            return response
+        except InvalidQuery as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class DailyCrossSectionView(BhavcopyReadView):
+    """
+    Every row for one trading date.
+
+    GET /bhavcopy/dates/<DD-MM-YYYY>/?series=EQ&fields=SYMBOL,CLOSE_PRICE
+    """
+
+    def get_queryset(self, request, **kwargs):
+        dt = parse_date(kwargs["date"])
+        self.export_name = f"bhavcopy_{dt.isoformat()}"
+        queryset = Bhavcopy.objects.filter(DATE1=dt)
+        if request.GET.get("series"):
+            queryset = queryset.filter(SERIES=request.GET["series"].upper())
+        return queryset
+
+
+class BhavcopyExportView(BhavcopyReadView):
+    """
+    Bulk export of a date range, streamed as CSV unless another format is asked for.
+
+    GET /bhavcopy/export/?start=01-01-2024&end=31-12-2024&stream=ndjson
+    """
+    default_stream = 'csv'
+
+    def get_queryset(self, request, **kwargs):
+        if not request.GET.get("start") or not request.GET.get("end"):
+            raise InvalidQuery("Missing 'start' or 'end' query parameter.")
+        queryset = Bhavcopy.objects.all()
+        if request.GET.get("series"):
+            queryset = queryset.filter(SERIES=request.GET["series"].upper())
+        return self._date_range(request, queryset)
+
+
+class ScreenView(APIView):
+    """
+    Run a screen expression over one trading day.
+
+    GET /bhavcopy/screen/?q=CLOSE_PRICE > SMA(200) and DELIV_PER > 60&sort=-TURNOVER_LACS
+
+    Query parameters:
+        q: screen expression (see bhavcopy.screens.parse_screen)
+        date: DD-MM-YYYY, defaults to the latest stored date
+        series: SERIES to screen (default EQ), "all" for every series
+        sort: result field, prefix with '-' for descending (default SYMBOL)
+        limit: maximum rows returned (default 500, max 5000)
+    """
+    default_limit = 500
+    max_limit = 5000
+
+    def get(self, request, *args, **kwargs):
+        try:
+            expression = request.GET.get("q")
+            if not expression:
+                raise InvalidQuery("Missing 'q' query parameter.")
+            dt = parse_date(request.GET["date"]) if request.GET.get("date") else None
+            series = request.GET.get("series", "EQ").upper()
+            try:
+                limit = int(request.GET.get("limit", self.default_limit))
+            except ValueError:
+                raise InvalidQuery("'limit' must be an integer")
+            limit = max(1, min(limit, self.max_limit))
+
+            started = time.perf_counter()
+            result = run_screen(expression, dt=dt, series=None if series == "ALL" else series,
+                                sort=request.GET.get("sort"), limit=limit)
+            return Response({
+                "date": result["date"],
+                "expression": expression,
+                "count": result["count"],
+                "fields": result["fields"],
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+                "results": result["results"],
+            }, status=status.HTTP_200_OK)
+
+        except InvalidQuery as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Error running screen: {str(e)}")
+            return Response(
+                {"error": f"Error running screen: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class HotCacheStatsView(APIView):
+    """
+    Hit rate, evictions and memory use of this process's hot cache.
+
+    GET /bhavcopy/cache/
+    """
+
+    def get(self, request, *args, **kwargs):
+        return Response(get_hot_cache().stats(), status=status.HTTP_200_OK)
+
+
+class IndexSnapshotView(APIView):
+    """
+    Every index level for one date.
+
+    GET /bhavcopy/indices/?date=15-03-2024 (default: latest stored date)
+    """
+
+    def get(self, request, *args, **kwargs):
+        try:
+            if request.GET.get("date"):
+                dt = parse_date(request.GET["date"])
+            else:
+                dt = IndexBar.objects.aggregate(latest=Max('DATE1'))['latest']
+            rows = IndexBar.objects.filter(DATE1=dt).order_by('INDEX_NAME').values('INDEX_NAME', *INDEX_VALUE_FIELDS)
+            return Response({"date": dt, "count": len(rows), "results": list(rows)}, status=status.HTTP_200_OK)
+        except InvalidQuery as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class IndexSeriesView(APIView):
+    """
+    Daily values of one index, oldest first.
+
+    GET /bhavcopy/indices/Nifty 50/?start=01-01-2024&end=31-03-2024
+    """
+
+    def get(self, request, name, *args, **kwargs):
+        try:
+            rows = IndexBar.objects.filter(INDEX_NAME=name)
+            if request.GET.get("start"):
+                rows = rows.filter(DATE1__gte=parse_date(request.GET["start"]))
+            if request.GET.get("end"):
+                rows = rows.filter(DATE1__lte=parse_date(request.GET["end"]))
+            rows = list(rows.order_by('DATE1').values('DATE1', *INDEX_VALUE_FIELDS))
+            if not rows and not IndexBar.objects.filter(INDEX_NAME=name).exists():
+                return Response({"error": f"Unknown index '{name}'"}, status=status.HTTP_404_NOT_FOUND)
+            return Response({"index": name, "count": len(rows), "results": rows}, status=status.HTTP_200_OK)
+        except InvalidQuery as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class RelativeStrengthView(APIView):
+    """
+    Relative strength of securities against an index on one date.
+
+    GET /bhavcopy/relative-strength/?index=Nifty IT&date=15-03-2024&sort=-RS_63&limit=50
+
+    index defaults to the benchmark (BHAVCOPY_RS_BENCHMARK), date to the
+    latest computed date, sort to -RS_63.
+    """
+    default_limit = 500
+    max_limit = 5000
+
+    def get(self, request, *args, **kwargs):
+        try:
+            index_name = request.GET.get("index") or getattr(settings, 'BHAVCOPY_RS_BENCHMARK', DEFAULT_BENCHMARK)
+            rows = RelativeStrength.objects.filter(INDEX_NAME=index_name)
+            if request.GET.get("date"):
+                dt = parse_date(request.GET["date"])
+            else:
+                dt = rows.aggregate(latest=Max('DATE1'))['latest']
+
+            sort = request.GET.get("sort", "-RS_63")
+            if sort.lstrip('-').upper() not in RS_WINDOWS:
+                raise InvalidQuery(f"'sort' must be one of {', '.join(RS_WINDOWS)}")
+            sort = ('-' if sort.startswith('-') else '') + sort.lstrip('-').upper()
+            try:
+                limit = int(request.GET.get("limit", self.default_limit))
+            except ValueError:
+                raise InvalidQuery("'limit' must be an integer")
+            limit = max(1, min(limit, self.max_limit))
+
+            field = F(sort.lstrip('-'))
+            ordering = field.desc(nulls_last=True) if sort.startswith('-') else field.asc(nulls_last=True)
+            results = rows.filter(DATE1=dt).order_by(ordering).values(
+                'security__SYMBOL', 'security__SERIES', *RS_WINDOWS)[:limit]
+            results = [{"SYMBOL": r.pop('security__SYMBOL'), "SERIES": r.pop('security__SERIES'), **r} for r in results]
+            return Response({"date": dt, "index": index_name, "count": len(results), "results": results},
+                            status=status.HTTP_200_OK)
+        except InvalidQuery as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+def _event_id(value):
+    try:
+        return int(value) if value else None
+    except ValueError:
+        raise InvalidQuery(f"Invalid event id '{value}'")
+
+
+class IngestEventListView(APIView):
+    """
+    The ingest event log, oldest first.
+
+    GET /bhavcopy/events/?after=120&limit=100
+    """
+    default_limit = 100
+    max_limit = 1000
+
+    def get(self, request, *args, **kwargs):
+        try:
+            events = IngestEvent.objects.order_by('id')
+            after = _event_id(request.GET.get("after"))
+            if after is not None:
+                events = events.filter(id__gt=after)
+            if request.GET.get("date"):
+                events = events.filter(DATE1=parse_date(request.GET["date"]))
+            try:
+                limit = int(request.GET.get("limit", self.default_limit))
+            except ValueError:
+                raise InvalidQuery("'limit' must be an integer")
+            limit = max(1, min(limit, self.max_limit))
+            results = [serialize_event(event) for event in events.values(*EVENT_FIELDS)[:limit]]
+            return Response({"count": len(results), "results": results}, status=status.HTTP_200_OK)
+        except InvalidQuery as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class IngestEventStreamView(View):
+    """
+    Server-sent events for every newly ingested date.
+
+    GET /bhavcopy/events/stream/
+
+    Each event is the JSON of an ingest log entry. A client resuming with
+    the Last-Event-ID header (browsers' EventSource sends it on reconnect)
+    or ?after=<id> first gets the events it missed. The view is async:
+    served through screener/asgi.py an idle subscriber holds no thread.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            last_id = _event_id(request.headers.get("Last-Event-ID") or request.GET.get("after"))
+        except InvalidQuery as e:
+            return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        response = StreamingHttpResponse(sse_stream(last_id), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Keep reverse proxies such as nginx from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class MetricsView(View):
+    """
+    Ingest pipeline metrics of this process in the Prometheus text format.
+
+    GET /metrics/ (?format=json adds the recent per-date stage timings)
+    """
+
+    def get(self, request, *args, **kwargs):
+        if request.GET.get("format") == "json":
+            return JsonResponse(get_metrics().as_dict())
+        return HttpResponse(get_metrics().render(), content_type=CONTENT_TYPE)
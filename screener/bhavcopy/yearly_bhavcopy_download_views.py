@@ -1,14 +1,18 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from django.http import JsonResponse
-import requests
-import pandas as pd
-import io
-from datetime import datetime, timedelta
+from django.urls import reverse
+from datetime import datetime
 import time
-import numpy as np
-from bhavcopy.models import Bhavcopy
+from django.db import transaction
+from bhavcopy.bulk_upsert import bulk_upsert_bhavcopy
+from bhavcopy.raw_archive import get_archive, SOURCE_BHAVCOPY
+from bhavcopy.nse_client import get_nse_client
+from bhavcopy.jobs import enqueue_download_job, job_progress
+from bhavcopy.metrics import FETCH_SECONDS, observe_file, observe_stage
+from bhavcopy.models import DownloadJob
+from bhavcopy.parsing import parse_bhavcopy
+from bhavcopy.trading_calendar import get_trading_calendar, record_missing_day
 import bhavcopy.constants as constant
 import logging
 
@@ -18,13 +22,18 @@ class YearlyBhavcopyDownloaderView(APIView):
     """
     API view to fetch, process and store Bhavcopy data for an entire year.
     Implements proper session management, rate limiting, and error handling.
+    
+    GET queues a DownloadJob; the fetch/store methods are used by the
+    download worker and the management commands.
     """
     timeout = 15
-    nse_main_url = "https://www.nseindia.com/"
-    session_refresh_interval = 50  # Refresh session after every 50 requests
+    bhavcopy_url = constant.link_bhavcopy
+    source = SOURCE_BHAVCOPY  # Raw archive source the downloaded files are kept under
+    archive = None  # RawArchive to read through, None uses the settings-configured one
+    batch_size = None  # Rows per upsert statement, None uses settings.BHAVCOPY_UPSERT_BATCH_SIZE
     
     def _get_business_days(self, year):
-        """Generate business days for the given year, excluding weekends."""
+        """Generate the trading days of the given year."""
         start_date = f"01-01-{year}"
         end_date = f"31-12-{year}"
         
@@ -32,155 +41,151 @@ class YearlyBhavcopyDownloaderView(APIView):
         start_dt = datetime.strptime(start_date, "%d-%m-%Y")
         end_dt = datetime.strptime(end_date, "%d-%m-%Y")
         
-        # Generate all business days (excluding weekends)
-        date_range = []
-        current_dt = start_dt
+        return self._get_business_days_between(start_dt, end_dt)
+    
+    def _get_business_days_between(self, start_dt, end_dt):
+        """
+        Generate trading days between two datetimes (inclusive).
         
-        while current_dt <= end_dt:
-            # Weekday 0-4 corresponds to Monday-Friday
-            if current_dt.weekday() < 5:
-                date_range.append(current_dt)
-            current_dt += timedelta(days=1)
-            
-        return date_range
+        Weekends and known holidays are left out and special sessions such
+        as Muhurat trading are included, per the trading calendar.
+        """
+        days = get_trading_calendar().trading_dates(start_dt, end_dt)
+        return [datetime.combine(d, datetime.min.time()) for d in days]
     
     def _establish_session(self):
-        """Establish a new session with NSE by hitting the main page."""
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/84.0.4147.135 Safari/537.36",
-            "Accept": "*/*",
-            "Accept-Encoding": "gzip, deflate",
-            "Accept-Language": "en-GB,en-US;q=0.9,en;q=0.8",
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-        }
+        """
+        Return the shared NSE client used as the download session.
         
-        session = requests.Session()
-        session.headers.update(headers)
+        Its pooled connections keep their own cookies fresh, so there is no
+        per-run warm-up request.
+        """
+        return get_nse_client()
+    
+    def _get_archive(self):
+        """Return the raw-file archive used by this downloader."""
+        return self.archive or get_archive()
+    
+    def _fetch_archived_csv(self, dt):
+        """
+        Serve a date from the raw-file archive without touching the network.
         
-        logger.info("Establishing new session with NSE...")
-        try:
-            main_page_response = session.get(self.nse_main_url, timeout=self.timeout)
-            
-            if main_page_response.status_code != 200:
-                logger.error(f"Failed to access NSE main page: {main_page_response.status_code}")
-                return None
-                
-            logger.info("Session established successfully.")
-            return session
-        except Exception as e:
-            logger.error(f"Error establishing session: {str(e)}")
+        Returns:
+            a "fetched" dict when the archive can answer on its own, a "failed"
+            dict for an offline miss, or None when a download is needed
+        """
+        archive = self._get_archive()
+        date_str = dt.strftime('%d-%m-%Y')
+        if archive.revalidate and not archive.offline:
             return None
+        
+        started = time.perf_counter()
+        content = archive.get(self.source, dt)
+        if content is not None:
+            seconds = time.perf_counter() - started
+            FETCH_SECONDS.observe(seconds, source=self.source, origin='archive')
+            observe_stage(self.source, 'fetch', seconds, dt=dt)
+            logger.info(f"Using archived bhavcopy for date: {date_str}")
+            return {
+                "date": date_str,
+                "status": "fetched",
+                "content": content,
+                "origin": "archive"
+            }
+        
+        if archive.offline:
+            return {
+                "date": date_str,
+                "status": "failed",
+                "error": "Not in archive (offline mode)"
+            }
+        return None
     
-    def _process_bhavcopy_data(self, session, dt):
-        """Process Bhavcopy data for a specific date."""
+    def _fetch_bhavcopy_csv(self, session, dt):
+        """
+        Download the raw Bhavcopy CSV for a specific date, archive first.
+        
+        Returns:
+            dict with status "fetched" and the raw bytes under "content",
+            or a "failed" result in the same shape as _process_bhavcopy_data
+        """
+        date_str = dt.strftime('%d-%m-%Y')
         try:
+            archived = self._fetch_archived_csv(dt)
+            if archived is not None:
+                return archived
+            
             # Format date components
             dd = dt.strftime('%d')
             mm = dt.strftime('%m')
             yyyy = dt.year
             
             # URL to fetch the CSV file
-            csv_url = constant.link_bhavcopy.format(dd=dd, mm=mm, yyyy=yyyy)
-            date_str = dt.strftime('%d-%m-%Y')
+            csv_url = self.bhavcopy_url.format(dd=dd, mm=mm, yyyy=yyyy)
             logger.info(f"Fetching bhavcopy for date: {date_str}")
             
-            # Use the session to fetch the CSV file
-            response = session.get(csv_url, timeout=self.timeout)
+            # Use the session to fetch the CSV file, revalidating any archived copy
+            started = time.perf_counter()
+            fetched = self._get_archive().fetch(session, self.source, dt, csv_url, timeout=self.timeout)
+            seconds = time.perf_counter() - started
+            FETCH_SECONDS.observe(seconds, source=self.source, origin=fetched["origin"])
+            observe_stage(self.source, 'fetch', seconds, dt=dt)
             
-            if response.status_code != 200:
-                logger.error(f"Failed to fetch CSV for {date_str}: {response.status_code}")
+            if fetched["content"] is None:
+                logger.error(f"Failed to fetch CSV for {date_str}: {fetched.get('error') or fetched['status_code']}")
                 return {
                     "date": date_str,
                     "status": "failed",
-                    "error": f"HTTP {response.status_code}"
+                    "error": fetched.get("error") or f"HTTP {fetched['status_code']}",
+                    "http_status": fetched["status_code"]
                 }
             
-            # Use pandas to read the CSV content
-            csv_content = io.StringIO(response.content.decode('utf-8'))
-            df = pd.read_csv(csv_content)
+            return {
+                "date": date_str,
+                "status": "fetched",
+                "content": fetched["content"],
+                "origin": fetched["origin"]
+            }
+            
+        except Exception as e:
+            logger.error(f"Error fetching CSV for date {date_str}: {str(e)}")
+            return {
+                "date": date_str,
+                "status": "failed",
+                "error": str(e)
+            }
+    
+    def _store_bhavcopy_csv(self, content, dt):
+        """Parse, clean and upsert a downloaded Bhavcopy CSV for a specific date."""
+        try:
+            date_str = dt.strftime('%d-%m-%Y')
+            
+            # Parse straight into typed, cleaned columns
+            df, parse_stats = parse_bhavcopy(content)
             
             if df.empty:
                 logger.warning(f"Empty CSV data for {date_str}")
+                record_missing_day(dt, "Empty bhavcopy published")
                 return {
                     "date": date_str,
                     "status": "skipped",
                     "reason": "Empty data"
                 }
             
-            # Clean column names and handle potential spaces
-            df.columns = df.columns.str.strip()
-            
-            # Convert date format (if necessary)
-            df['DATE1'] = pd.to_datetime(df['DATE1'].str.strip(), format='%d-%b-%Y').dt.date
-            
-            # Clean numerical columns that might contain '-' or other non-numeric values
-            numerical_columns = ['PREV_CLOSE', 'OPEN_PRICE', 'HIGH_PRICE', 'LOW_PRICE', 
-                               'LAST_PRICE', 'CLOSE_PRICE', 'AVG_PRICE', 'TTL_TRD_QNTY',
-                               'TURNOVER_LACS', 'NO_OF_TRADES', 'DELIV_QTY', 'DELIV_PER']
-            
-            # Replace '-', ' -', '- ' or any non-numeric value with NaN and then with 0
-            for col in numerical_columns:
-                if col in df.columns:
-                    # Convert to string first to handle any type of data
-                    df[col] = df[col].astype(str).str.strip()
-                    # Replace any variant of dash with empty string
-                    df[col] = df[col].replace(['-', ' -', '- ', ' - '], '')
-                    # Convert empty strings to NaN
-                    df[col] = df[col].replace('', np.nan)
-                    # Convert to float and replace NaN with 0
-                    df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-            
-            # Process each row and save to database
-            records_created = 0
-            records_updated = 0
-            records_error = 0
-            
-            # Use transaction for better performance and data integrity
-            from django.db import transaction
-            
+            # Upsert all rows in batches instead of one query per row,
+            # inside one transaction so a date is committed as a whole
+            started = time.perf_counter()
             with transaction.atomic():
-                for _, row in df.iterrows():
-                    # Convert row to dict
-                    data_dict = row.to_dict()
-                    
-                    # Try to get existing record or create new one
-                    try:
-                        obj, created = Bhavcopy.objects.update_or_create(
-                            SYMBOL=data_dict['SYMBOL'],
-                            SERIES=data_dict['SERIES'],
-                            DATE1=data_dict['DATE1'],
-                            defaults={
-                                'PREV_CLOSE': data_dict['PREV_CLOSE'],
-                                'OPEN_PRICE': data_dict['OPEN_PRICE'],
-                                'HIGH_PRICE': data_dict['HIGH_PRICE'],
-                                'LOW_PRICE': data_dict['LOW_PRICE'],
-                                'LAST_PRICE': data_dict['LAST_PRICE'],
-                                'CLOSE_PRICE': data_dict['CLOSE_PRICE'],
-                                'AVG_PRICE': data_dict['AVG_PRICE'],
-                                'TTL_TRD_QNTY': data_dict['TTL_TRD_QNTY'],
-                                'TURNOVER_LACS': data_dict['TURNOVER_LACS'],
-                                'NO_OF_TRADES': data_dict['NO_OF_TRADES'],
-                                'DELIV_QTY': data_dict['DELIV_QTY'],
-                                'DELIV_PER': data_dict['DELIV_PER'],
-                            }
-                        )
-                        
-                        if created:
-                            records_created += 1
-                        else:
-                            records_updated += 1
-                            
-                    except Exception as e:
-                        records_error += 1
-                        logger.error(f"Error processing row {data_dict['SYMBOL']} for date {date_str}: {str(e)}")
+                upsert_result = bulk_upsert_bhavcopy(df, batch_size=self.batch_size)
+            observe_file(self.source, dt, parse_stats, upsert_result, time.perf_counter() - started)
             
             return {
                 "date": date_str,
                 "status": "success",
-                "records_created": records_created,
-                "records_updated": records_updated,
-                "records_with_errors": records_error,
+                "records_created": upsert_result["records_created"],
+                "records_updated": upsert_result["records_updated"],
+                "records_with_errors": upsert_result["records_with_errors"],
+                "values_filled": parse_stats["filled"],
                 "total_rows": len(df)
             }
             
@@ -192,6 +197,13 @@ class YearlyBhavcopyDownloaderView(APIView):
                 "error": str(e)
             }
     
+    def _process_bhavcopy_data(self, session, dt):
+        """Process Bhavcopy data for a specific date."""
+        fetched = self._fetch_bhavcopy_csv(session, dt)
+        if fetched["status"] != "fetched":
+            return fetched
+        return self._store_bhavcopy_csv(fetched["content"], dt)
+    
     def get(self, request, *args, **kwargs):
         """API endpoint to trigger yearly bhavcopy download."""
         try:
@@ -210,80 +222,21 @@ class YearlyBhavcopyDownloaderView(APIView):
                 start_dt = datetime.strptime(start_from, "%d-%m-%Y")
                 business_days = [d for d in business_days if d >= start_dt]
             
-            # Results tracking
-            results = []
-            successful_dates = 0
-            failed_dates = 0
-            skipped_dates = 0
-            
-            # For immediate response
-            from threading import Thread
-            
-            def process_dates_in_background():
-                nonlocal successful_dates, failed_dates, skipped_dates
-                
-                # Track when to refresh the session
-                request_count = 0
-                session = self._establish_session()
-                
-                if not session:
-                    logger.error("Could not establish initial session. Aborting.")
-                    return
-                
-                for dt in business_days:
-                    try:
-                        # Check if we need to refresh the session
-                        if request_count >= self.session_refresh_interval:
-                            logger.info("Refreshing session...")
-                            session = self._establish_session()
-                            if not session:
-                                logger.error("Failed to refresh session. Retrying...")
-                                time.sleep(30)  # Wait longer before retry
-                                session = self._establish_session()
-                                if not session:
-                                    logger.error("Could not re-establish session after retry. Aborting.")
-                                    break
-                            request_count = 0
-                        
-                        # Process the data for this date
-                        result = self._process_bhavcopy_data(session, dt)
-                        results.append(result)
-                        
-                        # Update counters
-                        if result["status"] == "success":
-                            successful_dates += 1
-                        elif result["status"] == "failed":
-                            failed_dates += 1
-                        else:  # skipped
-                            skipped_dates += 1
-                        
-                        # Log progress
-                        total_processed = successful_dates + failed_dates + skipped_dates
-                        logger.info(f"Progress: {total_processed}/{len(business_days)} dates processed. " +
-                                   f"Success: {successful_dates}, Failed: {failed_dates}, Skipped: {skipped_dates}")
-                        
-                        # Increment request counter
-                        request_count += 1
-                        
-                        # Rate limiting - wait between requests
-                        time.sleep(3)  # 3 seconds between requests
-                        
-                    except Exception as e:
-                        logger.error(f"Error processing date {dt.strftime('%d-%m-%Y')}: {str(e)}")
-                        failed_dates += 1
-                
-                logger.info(f"Yearly download completed. Success: {successful_dates}, Failed: {failed_dates}, Skipped: {skipped_dates}")
+            if not business_days:
+                return Response({"error": "No business days to download."}, status=status.HTTP_400_BAD_REQUEST)
             
-            # Start background processing
-            thread = Thread(target=process_dates_in_background)
-            thread.daemon = True
-            thread.start()
+            # Persist the work; a run_download_worker process picks it up and
+            # resumes from the first unfinished date after a restart
+            job, created = enqueue_download_job(business_days)
             
             return Response({
-                "message": f"Download started for year {year}. Processing {len(business_days)} business days in the background.",
+                "message": (f"Download queued for year {year}. {len(business_days)} business days will be processed by the download worker."
+                            if created else f"A download for this range is already {job.status} (job {job.id})."),
+                "job_id": job.id,
+                "status_url": reverse('download-job-status', args=[job.id]),
                 "total_dates": len(business_days),
-                "status": "processing"
-            }, status=status.HTTP_202_ACCEPTED)
+                "status": job.status
+            }, status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK)
             
         except Exception as e:
             logger.error(f"Error starting yearly download: {str(e)}")
@@ -293,3 +246,22 @@ class YearlyBhavcopyDownloaderView(APIView):
             )
 
 
+
+
+class DownloadJobListView(APIView):
+    """Recent download jobs with their progress."""
+    
+    def get(self, request, *args, **kwargs):
+        jobs = DownloadJob.objects.order_by('-created_at')[:50]
+        return Response({"results": [job_progress(job) for job in jobs]})
+
+
+class DownloadJobStatusView(APIView):
+    """Progress of one download job: task counts, next date and failed dates."""
+    
+    def get(self, request, job_id, *args, **kwargs):
+        try:
+            job = DownloadJob.objects.get(id=job_id)
+        except DownloadJob.DoesNotExist:
+            return Response({"error": f"Download job {job_id} not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(job_progress(job))
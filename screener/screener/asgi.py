@@ -3,6 +3,10 @@ ASGI config for screener project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server (e.g. ``uvicorn screener.asgi:application``) so
+the server-sent event stream at /bhavcopy/events/stream/ keeps idle
+subscribers as coroutines rather than one worker thread each.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
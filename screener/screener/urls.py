@@ -18,8 +18,14 @@ from django.contrib import admin
 from django.urls import path
 from screener.views.HomeView import homepage
 from screener.views.AboutView import about
-from bhavcopy.views import FetchBhavcopyDataView
-from bhavcopy.yearly_bhavcopy_download_views import YearlyBhavcopyDownloaderView
+from bhavcopy.views import (
+    AdjustedSeriesView, BhavcopyExportView, DailyCrossSectionView, FetchBhavcopyDataView, HotCacheStatsView,
+    IndexSeriesView, IndexSnapshotView, IngestEventListView, IngestEventStreamView, MetricsView,
+    RelativeStrengthView, ScreenView, SymbolOHLCView, SymbolTimeSeriesView,
+)
+from bhavcopy.yearly_bhavcopy_download_views import (
+    DownloadJobListView, DownloadJobStatusView, YearlyBhavcopyDownloaderView,
+)
 
 
 urlpatterns = [
@@ -27,6 +33,21 @@ urlpatterns = [
     path('', homepage),
     path('about/', about),
     path('fetch-bhavcopy/', FetchBhavcopyDataView.as_view(), name='fetch-bhavcopy'),
-    path('YearlyBhavcopyDownloaderView/', YearlyBhavcopyDownloaderView.as_view(), name='YearlyBhavcopyDownloaderView')
+    path('YearlyBhavcopyDownloaderView/', YearlyBhavcopyDownloaderView.as_view(), name='YearlyBhavcopyDownloaderView'),
+    path('bhavcopy/symbols/<str:symbol>/', SymbolTimeSeriesView.as_view(), name='bhavcopy-symbol-series'),
+    path('bhavcopy/symbols/<str:symbol>/adjusted/', AdjustedSeriesView.as_view(), name='bhavcopy-adjusted-series'),
+    path('bhavcopy/symbols/<str:symbol>/ohlc/', SymbolOHLCView.as_view(), name='bhavcopy-symbol-ohlc'),
+    path('bhavcopy/dates/<str:date>/', DailyCrossSectionView.as_view(), name='bhavcopy-cross-section'),
+    path('bhavcopy/export/', BhavcopyExportView.as_view(), name='bhavcopy-export'),
+    path('bhavcopy/screen/', ScreenView.as_view(), name='bhavcopy-screen'),
+    path('bhavcopy/indices/', IndexSnapshotView.as_view(), name='bhavcopy-indices'),
+    path('bhavcopy/indices/<str:name>/', IndexSeriesView.as_view(), name='bhavcopy-index-series'),
+    path('bhavcopy/relative-strength/', RelativeStrengthView.as_view(), name='bhavcopy-relative-strength'),
+    path('bhavcopy/cache/', HotCacheStatsView.as_view(), name='bhavcopy-cache-stats'),
+    path('bhavcopy/events/', IngestEventListView.as_view(), name='bhavcopy-events'),
+    path('bhavcopy/events/stream/', IngestEventStreamView.as_view(), name='bhavcopy-event-stream'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('bhavcopy/jobs/', DownloadJobListView.as_view(), name='download-job-list'),
+    path('bhavcopy/jobs/<int:job_id>/', DownloadJobStatusView.as_view(), name='download-job-status'),
     
 ]